@@ -28,10 +28,16 @@ struct architecture *arch_init(void)
 		exit(1);
 	}
 
+	arch->tiles = NULL;
+	arch->cores = NULL;
 	arch->tile_count = 0;
+	arch->max_tiles = 0;
 	arch->core_count = 0;
 	arch->is_init = 0;
 	arch->spike_vector_on = 0;
+	arch->event_driven_on = 0;
+	arch->parallel_schedule_on = 0;
+	arch->thread_count = 0;
 
 	return arch;
 }
@@ -48,6 +54,24 @@ void arch_free(struct architecture *const arch)
 
 			free(c->neurons);
 			c->neurons = NULL;
+			free(c->neuron_state);
+			c->neuron_state = NULL;
+			free(c->soma_block_runs);
+			c->soma_block_runs = NULL;
+			free(c->soma_block_ids);
+			c->soma_block_ids = NULL;
+			free(c->soma_block_inputs);
+			c->soma_block_inputs = NULL;
+			free(c->soma_block_status);
+			c->soma_block_status = NULL;
+			free(c->neuron_active);
+			c->neuron_active = NULL;
+			free(c->active_neurons);
+			c->active_neurons = NULL;
+			free(c->updated_neurons);
+			c->updated_neurons = NULL;
+			free(c->soma_block_active_ids);
+			c->soma_block_active_ids = NULL;
 
 			for (int k = 0; k < c->axon_in.map_count; k++)
 			{
@@ -55,8 +79,16 @@ void arch_free(struct architecture *const arch)
 				free(a->connections);
 				a->connections = NULL;
 			}
+			free(c->axon_in.map);
+			c->axon_in.map = NULL;
+			free(c->axon_out.map_ptr);
+			c->axon_out.map_ptr = NULL;
 		}
+		free(t->cores);
+		t->cores = NULL;
 	}
+	free(arch->tiles);
+	free(arch->cores);
 	free(arch);
 }
 
@@ -90,7 +122,12 @@ int arch_create_noc(struct architecture *const arch, struct attributes *attr,
 			sscanf(a->value_str, "%d", &arch->noc_height);
 		}
 	}
-	assert((arch->noc_height * arch->noc_width) <= ARCH_MAX_TILES);
+	if ((arch->noc_height * arch->noc_width) > arch->tile_count)
+	{
+		INFO("Error: NoC (%dx%d) has more positions than tiles (%d).\n",
+			arch->noc_width, arch->noc_height, arch->tile_count);
+		exit(1);
+	}
 
 	for (int y = 0; y < arch->noc_height; y++)
 	{
@@ -155,21 +192,59 @@ int arch_create_noc(struct architecture *const arch, struct attributes *attr,
 	return 0;
 }
 
+void arch_grow_tiles(struct architecture *const arch)
+{
+	// Tiles are added one at a time as the description is parsed, so grow
+	//  the tile array geometrically. Cores link back to their parent tile,
+	//  so these links must be updated whenever the tiles move
+	struct tile *tiles;
+	int max_tiles;
+
+	max_tiles = (arch->max_tiles > 0) ? (2 * arch->max_tiles) : 1;
+	tiles = (struct tile *) realloc(arch->tiles,
+		sizeof(struct tile) * max_tiles);
+	if (tiles == NULL)
+	{
+		INFO("Error: Couldn't allocate %d tiles.\n", max_tiles);
+		exit(1);
+	}
+	arch->tiles = tiles;
+	arch->max_tiles = max_tiles;
+
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			struct core *c = &(t->cores[j]);
+			c->t = t;
+			c->axon_in.t = t;
+			c->axon_out.t = t;
+		}
+	}
+
+	return;
+}
+
 int arch_create_tile(struct architecture *const arch, struct attributes *attr,
 	const int attribute_count)
 {
 	struct tile *t;
 	int id;
 
-	if (arch->tile_count >= ARCH_MAX_TILES)
+	if (arch->is_init)
 	{
-		INFO("Error: Only %d tiles supported.\n", ARCH_MAX_TILES);
+		INFO("Error: Tiles must be defined before the NoC.\n");
 		exit(1);
 	}
 
+	if (arch->tile_count >= arch->max_tiles)
+	{
+		arch_grow_tiles(arch);
+	}
 	id = arch->tile_count;
 	arch->tile_count++;
-	assert(arch->tile_count <= ARCH_MAX_TILES);
+	assert(arch->tile_count <= arch->max_tiles);
 	t = &(arch->tiles[id]);
 
 	t->id = id;
@@ -177,14 +252,9 @@ int arch_create_tile(struct architecture *const arch, struct attributes *attr,
 
 	t->x = 0;
 	t->y = 0;
+	t->cores = NULL;
 	t->core_count = 0;
-	for (int i = 0; i < ARCH_MAX_CORES_PER_TILE; i++)
-	{
-		struct core *c = &(t->cores[i]);
-
-		c->id = i;
-		c->t = t;
-	}
+	t->max_cores = 0;
 
 	// Set attributes
 	t->is_blocking = 0;
@@ -258,9 +328,24 @@ int arch_create_core(struct architecture *const arch, struct tile *const t,
 	unsigned int core_id;
 
 	assert(t != NULL);
+	if (t->core_count >= t->max_cores)
+	{
+		// Grow this tile's core array. Nothing links to a core until the
+		//  network is mapped, so the cores are free to move here
+		int max_cores = (t->max_cores > 0) ? (2 * t->max_cores) : 1;
+		struct core *cores = (struct core *) realloc(t->cores,
+			sizeof(struct core) * max_cores);
+		if (cores == NULL)
+		{
+			INFO("Error: Couldn't allocate %d cores.\n", max_cores);
+			exit(1);
+		}
+		t->cores = cores;
+		t->max_cores = max_cores;
+	}
 	core_id = t->core_count;
 	t->core_count++;
-	assert(t->core_count <= ARCH_MAX_CORES_PER_TILE);
+	assert(t->core_count <= t->max_cores);
 
 	c = &(t->cores[core_id]);
 	c->offset = core_id;
@@ -283,20 +368,36 @@ int arch_create_core(struct architecture *const arch, struct tile *const t,
 
 	// Initialize core state
 	c->neuron_count = 0;
+	c->max_neurons = 0;
 	c->soma_count = 0;
 	c->synapse_count = 0;
-	c->neurons = (struct neuron **) malloc(
-		sizeof(struct neuron *) * ARCH_MAX_COMPARTMENTS);
-	if (c->neurons == NULL)
-	{
-		INFO("Error: Couldn't allocate neuron memory.\n");
-		exit(1);
-	}
-	for (int i = 0; i < ARCH_MAX_COMPARTMENTS; i++)
-	{
-		c->neurons[i] = NULL;
-	}
+	// Neurons are allocated as they are mapped to this core
+	c->neurons = NULL;
+	c->neuron_state = NULL;
+	c->soma_block_runs = NULL;
+	c->soma_block_ids = NULL;
+	c->soma_block_run_count = 0;
+	c->soma_block_inputs = NULL;
+	c->soma_block_status = NULL;
+	c->neuron_active = NULL;
+	c->active_neurons = NULL;
+	c->updated_neurons = NULL;
+	c->soma_block_active_ids = NULL;
+	c->active_count = 0;
+	c->updated_count = 0;
 	c->energy = 0.0;
+	c->hops = 0;
+	c->east_hops = 0;
+	c->west_hops = 0;
+	c->south_hops = 0;
+	c->north_hops = 0;
+	c->messages_received = 0;
+	c->axon_in.map = NULL;
+	c->axon_in.map_count = 0;
+	c->axon_in.max_maps = 0;
+	c->axon_out.map_ptr = NULL;
+	c->axon_out.map_count = 0;
+	c->axon_out.max_maps = 0;
 
 	// Update misc links between tiles and axon units
 	c->axon_in.t = t;
@@ -522,7 +623,65 @@ void arch_create_axon_out(struct core *const c, struct attributes *attr,
 
 void arch_create_connection_maps(struct architecture *const arch)
 {
+	// Create the connection maps in two passes. First count how many maps
+	//  go in and out of each core, so that the map arrays are sized exactly
+	//  for the mapped network. Then create and fill every map
+	struct core **cores;
+	int *core_connection_count, *dest_core_ids;
+
 	TRACE1("Creating all connection maps.\n");
+	cores = (struct core **) malloc(sizeof(struct core *) *
+		arch->core_count);
+	core_connection_count = (int *) malloc(sizeof(int) * arch->core_count);
+	dest_core_ids = (int *) malloc(sizeof(int) * arch->core_count);
+	if ((cores == NULL) || (core_connection_count == NULL) ||
+		(dest_core_ids == NULL))
+	{
+		INFO("Error: Couldn't allocate connection map memory.\n");
+		exit(1);
+	}
+
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			struct core *c = &(t->cores[j]);
+			assert(c->id < arch->core_count);
+			cores[c->id] = c;
+			c->axon_in.max_maps = 0;
+			c->axon_out.max_maps = 0;
+		}
+	}
+	for (int i = 0; i < arch->core_count; i++)
+	{
+		core_connection_count[i] = 0;
+	}
+
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			struct core *c = &(t->cores[j]);
+			for (int k = 0; k < c->neuron_count; k++)
+			{
+				const int map_count = arch_count_neuron_maps(
+					c->neurons[k], core_connection_count,
+					dest_core_ids);
+				c->axon_out.max_maps += map_count;
+				for (int m = 0; m < map_count; m++)
+				{
+					const int id = dest_core_ids[m];
+					cores[id]->axon_in.max_maps++;
+					core_connection_count[id] = 0;
+				}
+			}
+		}
+	}
+
+	arch_allocate_core_maps(arch);
+
 	for (int i = 0; i < arch->tile_count; i++)
 	{
 		struct tile *t = &(arch->tiles[i]);
@@ -531,15 +690,98 @@ void arch_create_connection_maps(struct architecture *const arch)
 			struct core *c = &(t->cores[j]);
 			for (int k = 0; k < c->neuron_count; k++)
 			{
-				arch_map_neuron_connections(c->neurons[k]);
+				arch_map_neuron_connections(c->neurons[k],
+					core_connection_count, dest_core_ids,
+					cores);
 			}
 		}
 	}
 
+	free(cores);
+	free(core_connection_count);
+	free(dest_core_ids);
+
 	TRACE1("Finished creating connection maps.\n");
 	arch_print_connection_map_summary(arch);
 }
 
+void arch_allocate_core_maps(struct architecture *const arch)
+{
+	// Allocate the connection maps going in and out of every core, sized
+	//  for the max number of maps already counted for each core
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			struct core *c = &(t->cores[j]);
+
+			free(c->axon_in.map);
+			free(c->axon_out.map_ptr);
+			c->axon_in.map = (struct connection_map *) malloc(
+				sizeof(struct connection_map) *
+				c->axon_in.max_maps);
+			c->axon_out.map_ptr = (struct connection_map **) malloc(
+				sizeof(struct connection_map *) *
+				c->axon_out.max_maps);
+			if (((c->axon_in.max_maps > 0) &&
+				(c->axon_in.map == NULL)) ||
+				((c->axon_out.max_maps > 0) &&
+				(c->axon_out.map_ptr == NULL)))
+			{
+				INFO("Error: Couldn't allocate connection "
+					"maps.\n");
+				exit(1);
+			}
+			c->axon_in.map_count = 0;
+			c->axon_out.map_count = 0;
+		}
+	}
+}
+
+static int arch_compare_core_work(const void *a, const void *b)
+{
+	const struct core *c1 = *((const struct core **) a);
+	const struct core *c2 = *((const struct core **) b);
+	const long int work1 = c1->neuron_count + c1->axon_in.map_count;
+	const long int work2 = c2->neuron_count + c2->axon_in.map_count;
+
+	// Sort by decreasing work, then by core id
+	if (work1 != work2)
+	{
+		return (work1 < work2) ? 1 : -1;
+	}
+	return c1->id - c2->id;
+}
+
+void arch_create_core_list(struct architecture *const arch)
+{
+	// List all cores, ordered by an estimate of the work each core does
+	//  per timestep. Parallel loops are dynamically scheduled over cores,
+	//  so handing out the busiest cores first balances skewed mappings
+	free(arch->cores);
+	arch->cores = (struct core **) malloc(
+		sizeof(struct core *) * arch->core_count);
+	if ((arch->core_count > 0) && (arch->cores == NULL))
+	{
+		INFO("Error: Couldn't allocate core list.\n");
+		exit(1);
+	}
+
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			struct core *c = &(t->cores[j]);
+			assert(c->id < arch->core_count);
+			arch->cores[c->id] = c;
+		}
+	}
+	qsort(arch->cores, arch->core_count, sizeof(struct core *),
+		arch_compare_core_work);
+}
+
 void arch_print_connection_map_summary(struct architecture *const arch)
 {
 	int in_count, out_count, core_count, core_used;
@@ -583,51 +825,71 @@ void arch_print_connection_map_summary(struct architecture *const arch)
 	return;
 }
 
-void arch_map_neuron_connections(struct neuron *const pre_neuron)
+static int arch_compare_core_ids(const void *a, const void *b)
 {
-	// Setup the connections between neurons and map them to hardware
-	int connection_count[ARCH_MAX_TILES * ARCH_MAX_CORES_PER_TILE];
-	struct core *cores[ARCH_MAX_TILES * ARCH_MAX_CORES_PER_TILE];
-
-	assert(pre_neuron->core != NULL);
+	return (*((const int *) a) - *((const int *) b));
+}
 
-	// Zero initialize all counters and tracking
-	for (int x = 0; x < ARCH_MAX_TILES * ARCH_MAX_CORES_PER_TILE; x++)
-	{
-		connection_count[x] = 0;
-		cores[x] = NULL;
-	}
+int arch_count_neuron_maps(const struct neuron *const pre_neuron,
+	int *const core_connection_count, int *const dest_core_ids)
+{
+	// Count how many connections go out from this neuron to each core.
+	//  Returns the number of destination cores, with their ids sorted in
+	//  ascending order. The caller must clear the per-core counts again
+	//  for the returned ids
+	int map_count = 0;
 
-	// Count how many connections go out from this neuron to each core
+	assert(pre_neuron->core != NULL);
 	TRACE2("Counting connections for neuron nid:%d\n", pre_neuron->id);
 	for (int conn = 0; conn < pre_neuron->connection_out_count; conn++)
 	{
 		TRACE2("Looking at connection id: %d\n", conn);
-		struct connection *curr = &(pre_neuron->connections_out[conn]);
-		struct core *dest_core = curr->post_neuron->core;
-		int core_id = dest_core->id;
+		const struct connection *curr =
+			&(pre_neuron->connections_out[conn]);
+		const int core_id = curr->post_neuron->core->id;
 
-		connection_count[core_id]++;
-		cores[core_id] = dest_core;
+		if (core_connection_count[core_id] == 0)
+		{
+			dest_core_ids[map_count++] = core_id;
+		}
+		core_connection_count[core_id]++;
 		TRACE2("Connected to dest core: %d\n", core_id);
 	}
 
+	// Maps are always created in order of destination core
+	if (map_count > 1)
+	{
+		qsort(dest_core_ids, map_count, sizeof(int),
+			arch_compare_core_ids);
+	}
+
+	return map_count;
+}
+
+void arch_map_neuron_connections(struct neuron *const pre_neuron,
+	int *const core_connection_count, int *const dest_core_ids,
+	struct core **const cores)
+{
+	// Setup the connections between neurons and map them to hardware
+	int total_map_count;
+
+	assert(pre_neuron->core != NULL);
+	total_map_count = arch_count_neuron_maps(
+		pre_neuron, core_connection_count, dest_core_ids);
+
 	TRACE2("Creating connections for neuron nid:%d\n", pre_neuron->id);
-	int total_map_count = 0;
-	for (int x = 0; x < ARCH_MAX_TILES * ARCH_MAX_CORES_PER_TILE; x++)
+	for (int x = 0; x < total_map_count; x++)
 	{
-		if (connection_count[x] > 0)
-		{
-			// Create the connection map, and add it to both the
-			//  destination and source cores
-			arch_allocate_connection_map(
-				pre_neuron, cores[x], connection_count[x]);
-			total_map_count++;
-		}
+		const int core_id = dest_core_ids[x];
+
+		// Create the connection map, and add it to both the
+		//  destination and source cores
+		arch_allocate_connection_map(pre_neuron, cores[core_id],
+			core_connection_count[core_id]);
+		core_connection_count[core_id] = 0;
 	}
 	TRACE3("Counted all maps for nid:%d connection map count: %d\n",
 		pre_neuron->id, total_map_count);
-	assert(total_map_count < ARCH_MAX_CONNECTION_MAP);
 
 	for (int conn = 0; conn < pre_neuron->connection_out_count; conn++)
 	{
@@ -653,22 +915,39 @@ int arch_map_neuron(struct neuron *n, struct core *c)
 	// Map the neuron to hardware units
 	assert(n != NULL);
 	assert(c != NULL);
-	assert(c->neurons != NULL);
 	assert(n->core == NULL);
 
 	n->core = c;
 	TRACE1("Mapping neuron %d to core %d\n", n->id, c->id);
+	if (c->neuron_count >= c->max_neurons)
+	{
+		int max_neurons = (c->max_neurons > 0) ?
+			(2 * c->max_neurons) : 1;
+		struct neuron **neurons = (struct neuron **) realloc(
+			c->neurons, sizeof(struct neuron *) * max_neurons);
+		if (neurons == NULL)
+		{
+			INFO("Error: Couldn't allocate neuron memory.\n");
+			exit(1);
+		}
+		c->neurons = neurons;
+		c->max_neurons = max_neurons;
+	}
 	c->neurons[c->neuron_count] = n;
+	n->local_id = c->neuron_count;
 	c->neuron_count++;
 
 	// Map neuron model to soma hardware unit in this core. Search through
 	//  all neuron models implemented by this core and return the one that
 	//  matches.
+	const struct neuron_description *description =
+		&(n->group->descriptions[n->id]);
 	struct soma_processor *soma_hw = NULL;
 	for (soma_id = 0; soma_id < c->soma_count; soma_id++)
 	{
 		soma_hw = &(c->soma[soma_id]);
-		if (strncmp(n->soma_hw_name, soma_hw->name, MAX_FIELD_LEN) == 0)
+		if (strncmp(description->soma_hw_name, soma_hw->name,
+			MAX_FIELD_LEN) == 0)
 		{
 			break;
 		}
@@ -676,7 +955,7 @@ int arch_map_neuron(struct neuron *n, struct core *c)
 	if (soma_id >= c->soma_count)
 	{
 		INFO("Error: Could not map neuron nid:%d (hw:%s) "
-			"to any soma h/w.\n", n->id, n->soma_hw_name);
+			"to any soma h/w.\n", n->id, description->soma_hw_name);
 		exit(1);
 	}
 	n->soma_hw = soma_hw;
@@ -699,7 +978,7 @@ void arch_allocate_connection_map(struct neuron *const pre_neuron,
 	struct axon_input *axon_in = &(post_core->axon_in);
 	int map_count = axon_in->map_count++;
 	assert(axon_in->map_count >= 0);
-	assert(axon_in->map_count < ARCH_MAX_CONNECTION_MAP);
+	assert(axon_in->map_count <= axon_in->max_maps);
 	int map_size;
 
 	TRACE2("axon in map count:%d for core:%d.%d, adding %d connections\n",
@@ -714,10 +993,10 @@ void arch_allocate_connection_map(struct neuron *const pre_neuron,
 	map->active_synapses = 0;
 	map->last_updated = -1;
 
-	map_size = connection_count * sizeof(struct connection);
+	map_size = connection_count * sizeof(struct connection *);
 	TRACE3("Axon has %d connections, allocate %d bytes\n",
 		connection_count, map_size);
-	map->connections = (connection**) malloc(connection_count * map_size);
+	map->connections = (connection**) malloc(map_size);
 	if (map->connections == NULL)
 	{
 		INFO("Error: Couldn't allocate map memory.\n");
@@ -727,7 +1006,7 @@ void arch_allocate_connection_map(struct neuron *const pre_neuron,
 	// Link to this map in the pre-synaptic (src) core
 	map_count = pre_core->axon_out.map_count++;
 	assert(pre_core->axon_out.map_count >= 0);
-	assert(pre_core->axon_out.map_count < ARCH_MAX_CONNECTION_MAP);
+	assert(pre_core->axon_out.map_count <= pre_core->axon_out.max_maps);
 	pre_core->axon_out.map_ptr[map_count] = map;
 	if (pre_neuron->maps_out == NULL)
 	{
@@ -759,7 +1038,7 @@ void arch_add_connection_to_map(
 	int synapse_id;
 
 	assert(map_count > 0);
-	assert(map_count <= ARCH_MAX_CONNECTION_MAP);
+	assert(map_count <= post_core->axon_in.max_maps);
 	TRACE3("Adding to connection to map:%d\n", map_count - 1);
 
 	// Access the most recently created axon for the core
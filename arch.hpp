@@ -26,21 +26,10 @@ axon input -> synapse --------> dendrite ------> soma -------> axon output
 
 using namespace std;
 
-// Hard define maximum defined h/w sizes
-#define ARCH_MAX_COMPARTMENTS 16384
-#define ARCH_MAX_CONNECTION_MAP (ARCH_MAX_COMPARTMENTS*4)
-// TODO: better dynamically define or allocate these numbers, so that we can
-//  support a range of architectures seamlessly. At the moment, a large amount
-//  of memory is needed if we want to support lots of large cores
-// TrueNorth
-//#define ARCH_MAX_TILES 4096
-//#define ARCH_MAX_CORES_PER_TILE 1
-// Loihi
-#define ARCH_MAX_TILES 256
-//#define ARCH_MAX_TILES 32
-#define ARCH_MAX_CORES_PER_TILE 4
+// Hard define maximum defined h/w sizes. Tiles, cores, neurons and
+//  connection maps are all allocated at run-time, based on the architecture
+//  description and the mapped network
 #define ARCH_MAX_UNITS 3
-#define ARCH_MAX_CORES (ARCH_MAX_TILES * ARCH_MAX_CORES_PER_TILE)
 
 #define ARCH_MAX_LINKS 4
 #define ARCH_MAX_DESCRIPTION_LINE 256
@@ -114,7 +103,7 @@ struct message_fifo
 {
 	int count;
 	struct message *head, *tail;
-	struct message_fifo *next;  // For priority queue of core fifos
+	long int priority_order;  // Tie-breaker in the timing priority queue
 };
 
 struct connection_map
@@ -131,11 +120,11 @@ struct axon_input
 {
 	char name[MAX_FIELD_LEN];
 	struct tile *t;
-	struct connection_map map[ARCH_MAX_CONNECTION_MAP];
+	struct connection_map *map;
 	long int spike_messages_in;
 	double energy, time;
 	double energy_spike_message, latency_spike_message;
-	int map_count;
+	int map_count, max_maps;
 };
 
 struct synapse_processor
@@ -167,13 +156,20 @@ struct soma_processor
 	double energy_spiking, latency_spiking;
 };
 
+struct soma_block_run
+{
+	// Consecutive neurons in a core that share the same soma block
+	struct neuron_group *group;
+	int first, count;
+};
+
 struct axon_output
 {
 	// The axon output points to a number of axons, stored at the
 	//  post-synaptic core. A neuron can point to a number of these
-	struct connection_map *map_ptr[ARCH_MAX_CONNECTION_MAP];
+	struct connection_map **map_ptr;
 	struct tile *t;
-	int map_count;
+	int map_count, max_maps;
 	char name[MAX_FIELD_LEN];
 
 	long int packets_out;
@@ -185,6 +181,8 @@ struct core
 {
 	struct tile *t;
 	struct neuron **neurons;
+	// State of the neurons mapped to this core, indexed by local id
+	struct neuron_state *neuron_state;
 
 	struct axon_input axon_in;
 	struct synapse_processor synapse[ARCH_MAX_UNITS];
@@ -196,13 +194,33 @@ struct core
 	struct message next_message;  // Since last spike
 	double energy, blocked_until, latency_after_last_message;
 	int id, offset, buffer_pos, is_blocking, soma_count, synapse_count;
-	int neuron_count, message_count;
+	int neuron_count, max_neurons, message_count;
 	int curr_axon;
+
+	// Network counters for messages received by this core, these are
+	//  merged into the tile's counters every timestep
+	long int hops, messages_received;
+	long int east_hops, west_hops, north_hops, south_hops;
+
+	// Runs of neurons with somas updated in blocks. For each neuron,
+	//  store its id in the group, its soma input and new status
+	struct soma_block_run *soma_block_runs;
+	int *soma_block_ids;
+	double *soma_block_inputs;
+	Neuron_Status *soma_block_status;
+	int soma_block_run_count;
+
+	// Event-driven mode. Flag and list the neurons that need updating
+	//  next timestep and list the neurons updated last timestep. Somas
+	//  updated in blocks are gathered using the active ids
+	char *neuron_active;
+	int *active_neurons, *updated_neurons, *soma_block_active_ids;
+	int active_count, updated_count;
 };
 
 struct tile
 {
-	struct core cores[ARCH_MAX_CORES_PER_TILE];
+	struct core *cores;
 	struct tile *links[ARCH_MAX_LINKS];
 	char name[MAX_FIELD_LEN];
 	double energy;
@@ -213,19 +231,23 @@ struct tile
 	double blocked_until;
 	long int hops, messages_received, total_neurons_fired;
 	long int east_hops, west_hops, north_hops, south_hops;
-	int id, x, y, core_count, is_blocking;
+	int id, x, y, core_count, max_cores, is_blocking;
 	int width; // For now just support 2 dimensions
 };
 
 struct architecture
 {
-	struct tile tiles[ARCH_MAX_TILES];
+	struct tile *tiles;
+	// All cores, ordered by their estimated work for parallel loops
+	struct core **cores;
 	char name[MAX_FIELD_LEN];
-	int noc_width, noc_height, tile_count, core_count;
+	int noc_width, noc_height, tile_count, max_tiles, core_count;
 	int is_init;
 
 	vector<vector<int>> spike_vector;
-	int spike_vector_on;
+	int spike_vector_on, event_driven_on;
+	int parallel_schedule_on;
+	int thread_count; // Zero uses the OpenMP default
 };
 
 #include "description.hpp"
@@ -234,6 +256,7 @@ struct architecture *arch_init(void);
 void free_spike_vector(struct architecture* arch);
 void arch_free(struct architecture *const arch);
 int arch_create_noc(struct architecture *const arch, struct attributes *attr, const int attribute_count);
+void arch_grow_tiles(struct architecture *const arch);
 int arch_create_tile(struct architecture *const arch, struct attributes *attr, const int attribute_count);
 int arch_create_core(struct architecture *const arch, struct tile *const t, struct attributes *attr, const int attribute_count);
 void arch_create_axon_in(struct core *const c, const char *const name, const struct attributes *const attr, const int attribute_count);
@@ -241,10 +264,13 @@ void arch_create_synapse(struct core *const c, const char *const name, const str
 void arch_create_soma(struct core *const c, const char *const name, struct attributes *attr, const int attribute_count);
 void arch_create_axon_out(struct core *const c, struct attributes *attr, const int attribute_count);
 void arch_create_connection_maps(struct architecture *const arch);
+void arch_allocate_core_maps(struct architecture *const arch);
+void arch_create_core_list(struct architecture *const arch);
 void arch_create_core_connection_map(struct core *const core);
 void arch_print_connection_map_summary(struct architecture *const arch);
 int arch_map_neuron(struct neuron *const n, struct core *c);
-void arch_map_neuron_connections(struct neuron *const n);
+int arch_count_neuron_maps(const struct neuron *const pre_neuron, int *const core_connection_count, int *const dest_core_ids);
+void arch_map_neuron_connections(struct neuron *const n, int *const core_connection_count, int *const dest_core_ids, struct core **const cores);
 void arch_allocate_connection_map(struct neuron *const pre_neuron, struct core *const post_core, const int connection_count);
 void arch_add_connection_to_map(struct connection *const con, struct core *const post_core);
 int arch_parse_neuron_model(const char *model_str);
@@ -15,7 +15,7 @@
 #include "sim.hpp"
 
 int command_parse_input_spikes(struct network *const net,
-	char fields[][MAX_FIELD_LEN], const int field_count)
+	char *fields[], const int field_count)
 {
 	double val;
 	int ret, input_count;
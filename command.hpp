@@ -18,7 +18,7 @@ struct simulation;
 struct architecture;
 struct network;
 
-int command_parse_input_spikes(struct network *const net, char fields[][MAX_FIELD_LEN], const int field_count);
+int command_parse_input_spikes(struct network *const net, char *fields[], const int field_count);
 int command_parse_step_sim(struct network *const net, struct architecture *const arch, struct simulation *sim);
 
 #endif
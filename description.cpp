@@ -1,22 +1,52 @@
 #include <assert.h>
 #include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 
 #include "description.hpp"
 #include "arch.hpp"
 #include "print.hpp"
 #include "command.hpp"
+#include "sim.hpp"
 
 int description_parse_file(
 	FILE *fp, struct network *net, struct architecture *arch)
 {
-	char *line;
-	char(*fields)[MAX_FIELD_LEN];
+	struct stat file_stat;
+	char *line, *buffer;
+	char **fields;
 	int ret;
 
 	assert((arch != NULL) || (net != NULL));
 
-	fields = (char(*)[MAX_FIELD_LEN]) malloc(
-		sizeof(char[MAX_FIELD_LEN]) * MAX_FIELDS);
+	// Memory map regular files, so that they can be tokenized in place.
+	//  Anything else (e.g. a pipe) is read line by line
+	buffer = (char *) MAP_FAILED;
+	if ((fstat(fileno(fp), &file_stat) == 0) &&
+		S_ISREG(file_stat.st_mode) && (file_stat.st_size > 0))
+	{
+		buffer = (char *) mmap(NULL, file_stat.st_size, PROT_READ,
+			MAP_PRIVATE, fileno(fp), 0);
+	}
+	if (buffer != MAP_FAILED)
+	{
+		madvise(buffer, file_stat.st_size, MADV_SEQUENTIAL);
+		if (description_is_binary(buffer, file_stat.st_size))
+		{
+			ret = description_parse_binary_network(
+				buffer, file_stat.st_size, net, arch);
+		}
+		else
+		{
+			ret = description_parse_buffer(
+				buffer, file_stat.st_size, net, arch);
+		}
+		munmap(buffer, file_stat.st_size);
+		return ret;
+	}
+
+	fields = (char **) malloc(sizeof(char *) * MAX_FIELDS);
 	line = (char *) malloc(sizeof(char) * MAX_LINE);
 	ret = RET_OK;
 
@@ -39,33 +69,661 @@ int description_parse_file(
 	return ret;
 }
 
-int description_read_line(char *line, char fields[][MAX_FIELD_LEN],
+int description_parse_buffer(const char *buffer, const long int size,
 	struct network *net, struct architecture *arch)
 {
-	char *token;
-	int field_count, last_char_idx;
+	struct description_edge *edges;
+	char *line;
+	char **fields;
+	long int pos;
+	int ret, edge_count;
 
-	assert((net != NULL) || (arch != NULL));
-	// Zero initialize all fields, each entry is variable length
-	//  The neuron fields are fixed, but this is follow by a
-	//  variable number of connections (0-MAX_FANOUT).  The synaptic
-	//  fields are null delimited
-	for (int i = 0; i < MAX_FIELDS; i++)
+	fields = (char **) malloc(sizeof(char *) * MAX_FIELDS);
+	line = (char *) malloc(sizeof(char) * MAX_LINE);
+	edges = (struct description_edge *) malloc(
+		sizeof(struct description_edge) * DESCRIPTION_EDGE_BATCH);
+	ret = RET_OK;
+
+	if ((line == NULL) || (fields == NULL) || (edges == NULL))
+	{
+		INFO("Error: Couldn't allocate memory for text input.\n");
+		ret = RET_FAIL;
+	}
+
+	pos = 0;
+	edge_count = 0;
+	while ((pos < size) && (ret != RET_FAIL))
+	{
+		const char *start = &(buffer[pos]);
+		const char *end = (const char *) memchr(start, '\n', size - pos);
+		const long int len =
+			(end != NULL) ? ((end - start) + 1) : (size - pos);
+		pos += len;
+
+		if ((net != NULL) && description_is_edge(start, len))
+		{
+			// Edges are the bulk of most networks. No other entry
+			//  depends on them, so they are batched up and parsed
+			//  in parallel
+			edges[edge_count].line = start;
+			edges[edge_count].line_len = len;
+			edge_count++;
+			if (edge_count >= DESCRIPTION_EDGE_BATCH)
+			{
+				ret = description_read_edges(edges, edge_count,
+					line, fields, net, arch);
+				edge_count = 0;
+			}
+		}
+		else
+		{
+			ret = description_read_buffer_line(
+				start, len, line, fields, net, arch);
+		}
+	}
+	if ((edge_count > 0) && (ret != RET_FAIL))
+	{
+		ret = description_read_edges(
+			edges, edge_count, line, fields, net, arch);
+	}
+
+	free(edges);
+	free(line);
+	free(fields);
+
+	return ret;
+}
+
+int description_read_buffer_line(const char *start, const long int len,
+	char *line, char *fields[], struct network *net,
+	struct architecture *arch)
+{
+	// Copy a line out of the file buffer, so it can be read like a line
+	//  returned by fgets()
+	if ((len + 1) >= MAX_LINE)
+	{
+		INFO("Error: Line too long (%ld chars).\n", len);
+		return RET_FAIL;
+	}
+	memcpy(line, start, len);
+	if (line[len - 1] == '\n')
+	{
+		line[len] = '\0';
+	}
+	else
+	{
+		line[len] = '\n';
+		line[len + 1] = '\0';
+	}
+
+	return description_read_line(line, fields, net, arch);
+}
+
+int description_is_edge(const char *start, const long int len)
+{
+	long int i = 0;
+
+	while ((i < len) && ((start[i] == ' ') || (start[i] == '\t')))
+	{
+		i++;
+	}
+
+	return (i < len) && (start[i] == 'e');
+}
+
+const char *description_parse_id(
+	const char *curr, const char *const end, int *id)
+{
+	// Parse a non-negative integer, returning NULL if there isn't one
+	const char *first = curr;
+
+	*id = 0;
+	while ((curr < end) && (*curr >= '0') && (*curr <= '9') &&
+		((curr - first) < 9))
+	{
+		*id = (*id * 10) + (*curr - '0');
+		curr++;
+	}
+	if ((curr == first) ||
+		((curr < end) && (*curr >= '0') && (*curr <= '9')))
+	{
+		return NULL;
+	}
+
+	return curr;
+}
+
+int description_parse_ids(
+	const char *str, const char *separators, int *ids)
+{
+	// Parse a field of non-negative ids with the given separators e.g.
+	//  "0.1@2.3" and ".@.", returning the number of ids. Anything else
+	//  returns RET_FAIL, and should be parsed with sscanf() instead
+	const char *end = str + strlen(str);
+	const int id_count = strlen(separators) + 1;
+
+	for (int i = 0; i < id_count; i++)
+	{
+		str = description_parse_id(str, end, &(ids[i]));
+		if (str == NULL)
+		{
+			return RET_FAIL;
+		}
+		if (i < (id_count - 1))
+		{
+			if (*str != separators[i])
+			{
+				return RET_FAIL;
+			}
+			str++;
+		}
+	}
+	if (str != end)
+	{
+		return RET_FAIL;
+	}
+
+	return id_count;
+}
+
+int description_parse_edge(struct description_edge *const edge)
+{
+	// Parse the common form of edge, "e <gid>.<nid>-><gid>.<nid> w=<w>".
+	//  This is called from multiple threads, so only touches the edge
+	const char *curr = edge->line;
+	const char *end = edge->line + edge->line_len;
+
+	edge->is_parsed = 0;
+	edge->weight = 1.0;
+	if ((end > curr) && (end[-1] == '\n'))
+	{
+		end--;
+	}
+
+	// Skip the entry type
+	while ((curr < end) && ((*curr == ' ') || (*curr == '\t')))
+	{
+		curr++;
+	}
+	while ((curr < end) && (*curr != ' ') && (*curr != '\t'))
+	{
+		curr++;
+	}
+	while ((curr < end) && ((*curr == ' ') || (*curr == '\t')))
+	{
+		curr++;
+	}
+
+	curr = description_parse_id(curr, end, &(edge->src_group_id));
+	if ((curr == NULL) || (curr >= end) || (*curr++ != '.'))
+	{
+		return RET_FAIL;
+	}
+	curr = description_parse_id(curr, end, &(edge->src_neuron_id));
+	if ((curr == NULL) || ((end - curr) < 2) || (curr[0] != '-') ||
+		(curr[1] != '>'))
+	{
+		return RET_FAIL;
+	}
+	curr = description_parse_id(curr + 2, end, &(edge->dest_group_id));
+	if ((curr == NULL) || (curr >= end) || (*curr++ != '.'))
+	{
+		return RET_FAIL;
+	}
+	curr = description_parse_id(curr, end, &(edge->dest_neuron_id));
+	if ((curr == NULL) ||
+		((curr < end) && (*curr != ' ') && (*curr != '\t')))
+	{
+		return RET_FAIL;
+	}
+
+	// Parse weight attributes, any key starting with 'w'
+	while (curr < end)
+	{
+		char value_str[MAX_FIELD_LEN];
+		const char *value_start;
+		char *value_end;
+		long int value_len;
+
+		while ((curr < end) && ((*curr == ' ') || (*curr == '\t')))
+		{
+			curr++;
+		}
+		if (curr >= end)
+		{
+			break;
+		}
+		if (*curr != 'w')
+		{
+			return RET_FAIL;
+		}
+		while ((curr < end) && (*curr != '=') && (*curr != ' ') &&
+			(*curr != '\t'))
+		{
+			curr++;
+		}
+		if ((curr >= end) || (*curr != '='))
+		{
+			return RET_FAIL;
+		}
+		value_start = ++curr;
+		while ((curr < end) && (*curr != '=') && (*curr != ' ') &&
+			(*curr != '\t'))
+		{
+			curr++;
+		}
+		value_len = curr - value_start;
+		if ((value_len == 0) || (value_len >= MAX_FIELD_LEN) ||
+			((curr < end) && (*curr == '=')))
+		{
+			return RET_FAIL;
+		}
+		memcpy(value_str, value_start, value_len);
+		value_str[value_len] = '\0';
+		edge->weight = strtod(value_str, &value_end);
+		if (value_end != &(value_str[value_len]))
+		{
+			return RET_FAIL;
+		}
+	}
+
+	edge->is_parsed = 1;
+	return RET_OK;
+}
+
+int description_read_edges(struct description_edge *const edges,
+	const int edge_count, char *line, char *fields[],
+	struct network *net, struct architecture *arch)
+{
+	int ret = RET_OK;
+
+	// Tokenize and parse all edges in parallel, then add them to the
+	//  network in file order
+#pragma omp parallel for schedule(static) num_threads(sim_thread_count(arch))
+	for (int i = 0; i < edge_count; i++)
+	{
+		description_parse_edge(&(edges[i]));
+	}
+
+	for (int i = 0; (i < edge_count) && (ret != RET_FAIL); i++)
+	{
+		const struct description_edge *e = &(edges[i]);
+		struct neuron *n, *dest;
+
+		n = NULL;
+		dest = NULL;
+		if (e->is_parsed &&
+			(e->src_group_id < net->neuron_group_count) &&
+			(e->dest_group_id < net->neuron_group_count))
+		{
+			struct neuron_group *group, *dest_group;
+
+			group = &(net->groups[e->src_group_id]);
+			dest_group = &(net->groups[e->dest_group_id]);
+			if ((e->src_neuron_id < group->neuron_count) &&
+				(e->dest_neuron_id < dest_group->neuron_count))
+			{
+				n = &(group->neurons[e->src_neuron_id]);
+				dest = &(dest_group->neurons[e->dest_neuron_id]);
+			}
+		}
+
+		if ((n != NULL) &&
+			(n->connection_out_count < n->max_connections_out))
+		{
+			struct connection *con =
+				&(n->connections_out[n->connection_out_count]);
+			n->connection_out_count++;
+			ret = network_connect_neurons(con, n, dest, NULL, 0);
+			con->weight = e->weight;
+		}
+		else
+		{
+			// Anything unusual, including errors, is handled and
+			//  reported by the line-at-a-time parser
+			ret = description_read_buffer_line(
+				e->line, e->line_len, line, fields, net, arch);
+		}
+	}
+
+	return ret;
+}
+
+int description_is_binary(const char *buffer, const long int size)
+{
+	const long int magic_len = strlen(DESCRIPTION_BINARY_MAGIC);
+
+	return (size >= magic_len) &&
+		(memcmp(buffer, DESCRIPTION_BINARY_MAGIC, magic_len) == 0);
+}
+
+const void *description_binary_table(const char *buffer, const long int size,
+	long int *pos, const uint64_t count, const size_t element_size)
+{
+	// Return the next table in the file and move past it, or NULL if the
+	//  file is too short to hold the table
+	const void *table;
+	const uint64_t remaining = size - *pos;
+
+	if ((*pos > size) || (count > (remaining / element_size)))
+	{
+		return NULL;
+	}
+	table = &(buffer[*pos]);
+	*pos += ((count * element_size) + 7) & ~((uint64_t) 7);
+
+	return table;
+}
+
+int description_parse_binary_network(const char *buffer, const long int size,
+	struct network *net, struct architecture *arch)
+{
+	const struct description_binary_header *header;
+	const uint64_t *string_offsets, *attribute_set_offsets, *edge_offsets;
+	const uint32_t *attribute_strings, *groups, *neuron_attribute_sets;
+	const uint32_t *edge_dest, *edge_synapse;
+	const uint32_t *mapping_neurons, *mapping_tiles, *mapping_cores;
+	const double *edge_weights;
+	const char *strings;
+	struct attributes *attributes;
+	struct neuron **neurons;
+	long int pos;
+	uint64_t neuron_count;
+	int ret;
+
+	header = (const struct description_binary_header *) buffer;
+	if ((net == NULL) || (arch == NULL))
+	{
+		INFO("Error: Binary files can only describe networks.\n");
+		return RET_FAIL;
+	}
+	if (size < (long int) sizeof(struct description_binary_header))
+	{
+		INFO("Error: Binary network file is truncated.\n");
+		return RET_FAIL;
+	}
+	if (header->version != DESCRIPTION_BINARY_VERSION)
+	{
+		INFO("Error: Binary network version %u not supported (%d).\n",
+			header->version, DESCRIPTION_BINARY_VERSION);
+		return RET_FAIL;
+	}
+	if ((net->neuron_group_count + (uint64_t) header->group_count) >
+		NETWORK_MAX_NEURON_GROUPS)
+	{
+		INFO("Error: Too many groups (%u).\n", header->group_count);
+		return RET_FAIL;
+	}
+
+	// Find all the tables, they are stored in this order
+	pos = sizeof(struct description_binary_header);
+	string_offsets = (const uint64_t *) description_binary_table(buffer,
+		size, &pos, header->string_count + 1, sizeof(uint64_t));
+	strings = (const char *) description_binary_table(
+		buffer, size, &pos, header->string_bytes, sizeof(char));
+	attribute_set_offsets = (const uint64_t *) description_binary_table(
+		buffer, size, &pos, header->attribute_set_count + 1,
+		sizeof(uint64_t));
+	attribute_strings = (const uint32_t *) description_binary_table(buffer,
+		size, &pos, 2 * header->attribute_count, sizeof(uint32_t));
+	groups = (const uint32_t *) description_binary_table(buffer, size,
+		&pos, 2 * (uint64_t) header->group_count, sizeof(uint32_t));
+	neuron_attribute_sets = (const uint32_t *) description_binary_table(
+		buffer, size, &pos, header->neuron_count, sizeof(uint32_t));
+	edge_offsets = (const uint64_t *) description_binary_table(buffer,
+		size, &pos, header->neuron_count + 1, sizeof(uint64_t));
+	edge_dest = (const uint32_t *) description_binary_table(buffer, size,
+		&pos, header->edge_count, sizeof(uint32_t));
+	edge_synapse = (const uint32_t *) description_binary_table(buffer,
+		size, &pos, header->edge_count, sizeof(uint32_t));
+	edge_weights = (const double *) description_binary_table(buffer, size,
+		&pos, header->edge_count, sizeof(double));
+	mapping_neurons = (const uint32_t *) description_binary_table(buffer,
+		size, &pos, header->mapping_count, sizeof(uint32_t));
+	mapping_tiles = (const uint32_t *) description_binary_table(buffer,
+		size, &pos, header->mapping_count, sizeof(uint32_t));
+	mapping_cores = (const uint32_t *) description_binary_table(buffer,
+		size, &pos, header->mapping_count, sizeof(uint32_t));
+	if ((string_offsets == NULL) || (strings == NULL) ||
+		(attribute_set_offsets == NULL) ||
+		(attribute_strings == NULL) || (groups == NULL) ||
+		(neuron_attribute_sets == NULL) || (edge_offsets == NULL) ||
+		(edge_dest == NULL) || (edge_synapse == NULL) ||
+		(edge_weights == NULL) || (mapping_neurons == NULL) ||
+		(mapping_tiles == NULL) || (mapping_cores == NULL))
+	{
+		INFO("Error: Binary network file is truncated.\n");
+		return RET_FAIL;
+	}
+
+	// Every string must be null terminated
+	for (uint64_t i = 0; i < header->string_count; i++)
+	{
+		if ((string_offsets[i] >= string_offsets[i + 1]) ||
+			(string_offsets[i + 1] > header->string_bytes) ||
+			(strings[string_offsets[i + 1] - 1] != '\0'))
+		{
+			INFO("Error: Invalid string (%lu).\n", i);
+			return RET_FAIL;
+		}
+	}
+
+	// Build the attributes once, they are shared between all the groups
+	//  and neurons that use the same set of attributes
+	attributes = (struct attributes *) malloc(
+		sizeof(struct attributes) * (header->attribute_count + 1));
+	neurons = (struct neuron **) malloc(
+		sizeof(struct neuron *) * (header->neuron_count + 1));
+	if ((attributes == NULL) || (neurons == NULL))
+	{
+		INFO("Error: Couldn't allocate memory for binary input.\n");
+		exit(1);
+	}
+	ret = RET_OK;
+	for (uint64_t i = 0; i < header->attribute_count; i++)
+	{
+		const uint32_t key = attribute_strings[2 * i];
+		const uint32_t value = attribute_strings[(2 * i) + 1];
+
+		if ((key >= header->string_count) ||
+			(value >= header->string_count))
+		{
+			INFO("Error: Invalid attribute (%lu).\n", i);
+			ret = RET_FAIL;
+			break;
+		}
+		strncpy(attributes[i].key, &(strings[string_offsets[key]]),
+			MAX_FIELD_LEN - 1);
+		attributes[i].key[MAX_FIELD_LEN - 1] = '\0';
+		strncpy(attributes[i].value_str,
+			&(strings[string_offsets[value]]), MAX_FIELD_LEN - 1);
+		attributes[i].value_str[MAX_FIELD_LEN - 1] = '\0';
+	}
+	for (uint64_t i = 0; i < header->attribute_set_count; i++)
+	{
+		if ((attribute_set_offsets[i] > attribute_set_offsets[i + 1]) ||
+			(attribute_set_offsets[i + 1] >
+				header->attribute_count))
+		{
+			INFO("Error: Invalid attribute set (%lu).\n", i);
+			ret = RET_FAIL;
+			break;
+		}
+	}
+
+	// Create the groups and neurons
+	neuron_count = 0;
+	for (uint32_t i = 0; (i < header->group_count) && (ret != RET_FAIL);
+		i++)
+	{
+		const uint32_t group_neuron_count = groups[2 * i];
+		const uint32_t set = groups[(2 * i) + 1];
+		struct neuron_group *group;
+
+		if ((group_neuron_count > (header->neuron_count - neuron_count)) ||
+			(set >= header->attribute_set_count))
+		{
+			INFO("Error: Invalid group (%u).\n", i);
+			ret = RET_FAIL;
+			break;
+		}
+		ret = network_create_neuron_group(net, group_neuron_count,
+			&(attributes[attribute_set_offsets[set]]),
+			attribute_set_offsets[set + 1] -
+				attribute_set_offsets[set]);
+		group = &(net->groups[net->neuron_group_count - 1]);
+		for (uint32_t j = 0; j < group_neuron_count; j++)
+		{
+			neurons[neuron_count] = &(group->neurons[j]);
+			neuron_count++;
+		}
+	}
+	if ((ret != RET_FAIL) && (neuron_count != header->neuron_count))
+	{
+		INFO("Error: Groups have %lu neurons, expected %lu.\n",
+			neuron_count, header->neuron_count);
+		ret = RET_FAIL;
+	}
+	for (uint64_t i = 0; (i < neuron_count) && (ret != RET_FAIL); i++)
 	{
-		fields[i][0] = '\0';
+		const uint32_t set = neuron_attribute_sets[i];
+
+		if (set == DESCRIPTION_BINARY_NONE)
+		{
+			continue; // Neuron isn't defined
+		}
+		if (set >= header->attribute_set_count)
+		{
+			INFO("Error: Invalid neuron (%lu).\n", i);
+			ret = RET_FAIL;
+			break;
+		}
+		if (network_create_neuron(net, neurons[i],
+			&(attributes[attribute_set_offsets[set]]),
+			attribute_set_offsets[set + 1] -
+				attribute_set_offsets[set]) ==
+			NETWORK_INVALID_NID)
+		{
+			ret = RET_FAIL;
+		}
+	}
+
+	// Connect neurons, edges are stored in compressed sparse row format
+	if ((ret != RET_FAIL) && ((edge_offsets[0] != 0) ||
+		(edge_offsets[neuron_count] != header->edge_count)))
+	{
+		INFO("Error: Invalid edge offsets.\n");
+		ret = RET_FAIL;
+	}
+	for (uint64_t i = 0; (i < neuron_count) && (ret != RET_FAIL); i++)
+	{
+		struct neuron *n = neurons[i];
+
+		if (edge_offsets[i] > edge_offsets[i + 1])
+		{
+			INFO("Error: Invalid edge offsets.\n");
+			ret = RET_FAIL;
+			break;
+		}
+		for (uint64_t e = edge_offsets[i]; e < edge_offsets[i + 1]; e++)
+		{
+			struct connection *con;
+			const uint32_t synapse = edge_synapse[e];
+
+			if ((edge_dest[e] >= neuron_count) ||
+				((synapse != DESCRIPTION_BINARY_NONE) &&
+				(synapse >= header->string_count)))
+			{
+				INFO("Error: Invalid edge (%lu).\n", e);
+				ret = RET_FAIL;
+				break;
+			}
+			if (n->connection_out_count >= n->max_connections_out)
+			{
+				INFO("Edge (%d) >= neuron connections (%d)\n",
+					n->connection_out_count,
+					n->max_connections_out);
+				ret = RET_FAIL;
+				break;
+			}
+			con = &(n->connections_out[n->connection_out_count]);
+			n->connection_out_count++;
+			ret = network_connect_neurons(
+				con, n, neurons[edge_dest[e]], NULL, 0);
+			con->weight = edge_weights[e];
+			if (synapse != DESCRIPTION_BINARY_NONE)
+			{
+				strncpy(con->synapse_hw_name,
+					&(strings[string_offsets[synapse]]),
+					MAX_FIELD_LEN - 1);
+				con->synapse_hw_name[MAX_FIELD_LEN - 1] = '\0';
+			}
+		}
 	}
 
+	// Map neurons to hardware, in the same order as they were saved
+	for (uint64_t i = 0; (i < header->mapping_count) && (ret != RET_FAIL);
+		i++)
+	{
+		struct tile *t;
+		const uint32_t tile_id = mapping_tiles[i];
+		const uint32_t core_offset = mapping_cores[i];
+
+		if (mapping_neurons[i] >= neuron_count)
+		{
+			INFO("Error: Invalid mapping (%lu).\n", i);
+			ret = RET_FAIL;
+			break;
+		}
+		if (tile_id >= (uint32_t) arch->tile_count)
+		{
+			INFO("Error: Tile (%u) >= tile count (%d)\n", tile_id,
+				arch->tile_count);
+			ret = RET_FAIL;
+			break;
+		}
+		t = &(arch->tiles[tile_id]);
+		if (core_offset >= (uint32_t) t->core_count)
+		{
+			INFO("Error: Core (%u) >= core count (%d)\n",
+				core_offset, t->core_count);
+			ret = RET_FAIL;
+			break;
+		}
+		ret = arch_map_neuron(
+			neurons[mapping_neurons[i]], &(t->cores[core_offset]));
+	}
+
+	free(neurons);
+	free(attributes);
+
+	return ret;
+}
+
+int description_read_line(char *line, char *fields[],
+	struct network *net, struct architecture *arch)
+{
+	char *token;
+	int field_count, last_char_idx;
+
+	assert((net != NULL) || (arch != NULL));
+	// Tokenize the line in place, each field points into the line. Any
+	//  unused fields are set to an empty string
 	field_count = 0;
 	last_char_idx = strlen(line) - 1;
 	assert(line[last_char_idx] == '\n');
 	line[last_char_idx] = '\0';
 	token = strtok(line, TOKEN_SEPERATORS);
-	while (token != NULL)
+	while ((token != NULL) && (field_count < MAX_FIELDS))
 	{
-		strncpy(fields[field_count], token, MAX_FIELD_LEN);
+		fields[field_count] = token;
 		token = strtok(NULL, TOKEN_SEPERATORS);
 		field_count++;
 	}
+	for (int i = field_count; i < MAX_FIELDS; i++)
+	{
+		fields[i] = &(line[last_char_idx]);
+	}
 
 	if (arch != NULL)
 	{
@@ -86,7 +744,7 @@ int description_read_line(char *line, char fields[][MAX_FIELD_LEN],
 	}
 }
 
-int description_read_arch_entry(char fields[][MAX_FIELD_LEN],
+int description_read_arch_entry(char *fields[],
 	const int field_count, struct architecture *arch)
 {
 	struct attributes attributes[128];
@@ -121,6 +779,12 @@ int description_read_arch_entry(char fields[][MAX_FIELD_LEN],
 			INFO("Error: Couldn't parse tile ID (%s)\n", fields[2]);
 			exit(1);
 		}
+		if ((tile_id < 0) || (tile_id >= arch->tile_count))
+		{
+			INFO("Error: Tile (%d) >= tile count (%d)\n", tile_id,
+				arch->tile_count);
+			exit(1);
+		}
 		t = &(arch->tiles[tile_id]);
 		first_field++;
 	}
@@ -134,6 +798,12 @@ int description_read_arch_entry(char fields[][MAX_FIELD_LEN],
 		}
 
 		assert(t != NULL);
+		if ((core_offset < 0) || (core_offset >= t->core_count))
+		{
+			INFO("Error: Core (%d) >= core count (%d)\n",
+				core_offset, t->core_count);
+			exit(1);
+		}
 		c = &(t->cores[core_offset]);
 		first_field++;
 	}
@@ -199,7 +869,7 @@ int description_read_arch_entry(char fields[][MAX_FIELD_LEN],
 	return ret;
 }
 
-int description_read_network_entry(char fields[][MAX_FIELD_LEN],
+int description_read_network_entry(char *fields[],
 	const int field_count, struct architecture *arch, struct network *net)
 {
 	struct attributes attributes[DESCRIPTION_MAX_ATTRIBUTES];
@@ -243,8 +913,21 @@ int description_read_network_entry(char fields[][MAX_FIELD_LEN],
 	}
 	else if (entry_type == '&')
 	{
-		ret = sscanf(fields[1], "%d.%d@%d.%d", &neuron_group_id,
-			&neuron_id, &tile_id, &core_offset);
+		int ids[4];
+
+		ret = description_parse_ids(fields[1], ".@.", ids);
+		if (ret == 4)
+		{
+			neuron_group_id = ids[0];
+			neuron_id = ids[1];
+			tile_id = ids[2];
+			core_offset = ids[3];
+		}
+		else
+		{
+			ret = sscanf(fields[1], "%d.%d@%d.%d", &neuron_group_id,
+				&neuron_id, &tile_id, &core_offset);
+		}
 		if (ret < 4)
 		{
 			INFO("Error couldn't parse mapping.\n");
@@ -304,7 +987,19 @@ int description_read_network_entry(char fields[][MAX_FIELD_LEN],
 	}
 	else // parse neuron or input node
 	{
-		ret = sscanf(fields[1], "%d.%d", &neuron_group_id, &neuron_id);
+		int ids[2];
+
+		ret = description_parse_ids(fields[1], ".", ids);
+		if (ret == 2)
+		{
+			neuron_group_id = ids[0];
+			neuron_id = ids[1];
+		}
+		else
+		{
+			ret = sscanf(fields[1], "%d.%d", &neuron_group_id,
+				&neuron_id);
+		}
 		if (ret < 2)
 		{
 			INFO("Error: Couldn't parse neuron (%s)\n", fields[0]);
@@ -365,7 +1060,7 @@ int description_read_network_entry(char fields[][MAX_FIELD_LEN],
 			net, neuron_count, attributes, attribute_count);
 		break;
 	case 'n': // Add neuron
-		ret = network_create_neuron(n, attributes, attribute_count);
+		ret = network_create_neuron(net, n, attributes, attribute_count);
 		break;
 	case 'e':
 		if (src_is_input)
@@ -692,7 +1387,7 @@ int command_parse_extern_input_node(struct network *const net,
 }
 */
 
-int description_parse_command(char fields[][MAX_FIELD_LEN],
+int description_parse_command(char *fields[],
 	const int field_count, struct network *net, struct architecture *arch,
 	struct simulation *sim)
 {
@@ -6,6 +6,12 @@
 #define MAX_LINE (MAX_FIELDS * MAX_FIELD_LEN)
 #define TOKEN_SEPERATORS " \t"
 #define DESCRIPTION_MAX_ATTRIBUTES 128
+#define DESCRIPTION_EDGE_BATCH 65536 // Edge lines parsed together
+#define DESCRIPTION_BINARY_MAGIC "SANANETB"
+#define DESCRIPTION_BINARY_VERSION 1
+#define DESCRIPTION_BINARY_NONE 0xffffffffU
+
+#include <stdint.h>
 
 enum description_ret
 {
@@ -18,6 +24,29 @@ struct attributes
 	char key[MAX_FIELD_LEN], value_str[MAX_FIELD_LEN];
 };
 
+struct description_edge
+{
+	// An edge (e) line, tokenized in place. Lines that aren't in the
+	//  common form are passed to the line-at-a-time parser instead
+	const char *line;
+	double weight;
+	long int line_len;
+	int src_group_id, src_neuron_id, dest_group_id, dest_neuron_id;
+	int is_parsed;
+};
+
+struct description_binary_header
+{
+	// Binary network (.netb) files start with this header. It is followed
+	//  by the tables read in description_parse_binary_network(), each
+	//  starting on an 8 byte boundary. All values are little-endian
+	char magic[8];
+	uint32_t version, group_count;
+	uint64_t neuron_count, edge_count, mapping_count;
+	uint64_t string_count, string_bytes;
+	uint64_t attribute_set_count, attribute_count;
+};
+
 // Forward struct declarations
 struct architecture;
 struct network;
@@ -25,9 +54,19 @@ struct simulation;
 #include <stdio.h>
 
 int description_parse_file(FILE *fp, struct network *net, struct architecture *arch);
-int description_read_line(char *line, char fields[][MAX_FIELD_LEN], struct network *net, struct architecture *arch);
-int description_read_arch_entry(char fields[][MAX_FIELD_LEN], const int field_count, struct architecture *arch);
-int description_read_network_entry(char fields[][MAX_FIELD_LEN], const int field_count, struct architecture *arch, struct network *net);
-int description_parse_command(char fields[][MAX_FIELD_LEN], const int field_count, struct network *net, struct architecture *arch, struct simulation *sim);
+int description_parse_buffer(const char *buffer, const long int size, struct network *net, struct architecture *arch);
+int description_read_buffer_line(const char *start, const long int len, char *line, char *fields[], struct network *net, struct architecture *arch);
+int description_is_edge(const char *start, const long int len);
+int description_parse_edge(struct description_edge *const edge);
+int description_parse_ids(const char *str, const char *separators, int *ids);
+const char *description_parse_id(const char *curr, const char *const end, int *id);
+int description_read_edges(struct description_edge *const edges, const int edge_count, char *line, char *fields[], struct network *net, struct architecture *arch);
+int description_is_binary(const char *buffer, const long int size);
+int description_parse_binary_network(const char *buffer, const long int size, struct network *net, struct architecture *arch);
+const void *description_binary_table(const char *buffer, const long int size, long int *pos, const uint64_t count, const size_t element_size);
+int description_read_line(char *line, char *fields[], struct network *net, struct architecture *arch);
+int description_read_arch_entry(char *fields[], const int field_count, struct architecture *arch);
+int description_read_network_entry(char *fields[], const int field_count, struct architecture *arch, struct network *net);
+int description_parse_command(char *fields[], const int field_count, struct network *net, struct architecture *arch, struct simulation *sim);
 
 #endif
@@ -15,11 +15,17 @@
 int main(int argc, char *argv[])
 {
 	SANA_FE sana_fe;
-	int timesteps, ret;
+	char *snapshot_filename;
+	int timesteps, thread_count, probe_interval, ret;
+	int log_perf, log_spikes, log_potential, log_messages;
+	bool spikes_binary, potential_binary, messages_binary;
 
 	// Assume that if we don't get to the point where we write this with
 	//  a valid value, something went wrong and we errored out
 	ret = RET_FAIL;
+	snapshot_filename = NULL;
+	log_perf = log_spikes = log_potential = log_messages = 0;
+	spikes_binary = potential_binary = messages_binary = false;
 
 	if (argc < 1)
 	{
@@ -42,17 +48,77 @@ int main(int argc, char *argv[])
 				argv++;
 				argc--;
 				break;
+			case 'o':
+				sana_fe.set_output_dir(argv[1]);
+				argv++;
+				argc--;
+				break;
+			case 'S':
+				snapshot_filename = argv[1];
+				argv++;
+				argc--;
+				break;
 			case 'p':
-				sana_fe.set_perf_flag();
+				log_perf = 1;
 				break;
 			case 's':
-				sana_fe.set_spike_flag();
+				log_spikes = 1;
+				spikes_binary = false;
+				break;
+			case 'b':
+				log_spikes = 1;
+				spikes_binary = true;
 				break;
 			case 'v':
-				sana_fe.set_pot_flag();
+				log_potential = 1;
+				potential_binary = false;
+				break;
+			case 'V':
+				log_potential = 1;
+				potential_binary = true;
+				break;
+			case 'k':
+				probe_interval = 0;
+				ret = sscanf(argv[1], "%d", &probe_interval);
+				if ((ret < 1) || (probe_interval < 1))
+				{
+					INFO("Error: Probe interval must be "
+						"integer > 0 (%s).\n", argv[1]);
+					sana_fe.clean_up(RET_FAIL);
+				}
+				sana_fe.set_probe_interval(probe_interval);
+				argv++;
+				argc--;
 				break;
 			case 'm':
-				sana_fe.set_mess_flag();
+				log_messages = 1;
+				messages_binary = false;
+				break;
+			case 'M':
+				log_messages = 1;
+				messages_binary = true;
+				break;
+			case 'a':
+				sana_fe.set_async_trace_flag();
+				break;
+			case 'e':
+				sana_fe.set_event_driven_flag();
+				break;
+			case 'c':
+				sana_fe.set_parallel_schedule_flag();
+				break;
+			case 't':
+				thread_count = 0;
+				ret = sscanf(argv[1], "%d", &thread_count);
+				if (ret < 1)
+				{
+					INFO("Error: Thread count must be integer "
+						"(%s).\n", argv[1]);
+					sana_fe.clean_up(RET_FAIL);
+				}
+				sana_fe.set_thread_count(thread_count);
+				argv++;
+				argc--;
 				break;
 			default:
 				INFO("Error: Flag %c not recognized.\n",
@@ -71,15 +137,52 @@ int main(int argc, char *argv[])
 	if (argc < PROGRAM_NARGS)
 	{
 		INFO("Usage: ./sim [-p<log perf> -s<spike trace> "
-				"-v<potential trace> -i <input vectors>] "
+				"-b<binary spike trace> -v<potential trace> "
+				"-V<binary potential trace> "
+				"-m<message trace> -M<binary message trace> "
+				"-a<async trace writer> "
+				"-k <probe interval> -i <input vectors> "
+				"-o <output directory> -S <snapshot> "
+				"-e<event-driven> "
+				"-c<parallel scheduler> "
+				"-t <threads>] "
 				"<arch description> <network description> "
 							"<timesteps>\n");
 		sana_fe.clean_up(RET_FAIL);
 	}
 
+	// Only open the traces once all flags are parsed, so that they are all
+	//  created in the output directory, wherever -o was given
+	if (log_perf)
+	{
+		sana_fe.set_perf_flag();
+	}
+	if (log_spikes)
+	{
+		sana_fe.set_spike_flag(true, spikes_binary);
+	}
+	if (log_potential)
+	{
+		sana_fe.set_pot_flag(true, potential_binary);
+	}
+	if (log_messages)
+	{
+		sana_fe.set_mess_flag(true, messages_binary);
+	}
+
 	// Read in program args, sanity check and parse inputs
 	sana_fe.set_arch(argv[ARCH_FILENAME]);
-	sana_fe.set_net(argv[NETWORK_FILENAME]);
+	if (snapshot_filename == NULL)
+	{
+		sana_fe.set_net(argv[NETWORK_FILENAME]);
+	}
+	else if (!sana_fe.load_snapshot(
+		snapshot_filename, argv[NETWORK_FILENAME]))
+	{
+		// Build the network and save it for the next run
+		sana_fe.set_net(argv[NETWORK_FILENAME]);
+		sana_fe.save_snapshot(snapshot_filename);
+	}
 
 	timesteps = 0;
 	ret = sscanf(argv[TIMESTEPS], "%d", &timesteps);
@@ -8,6 +8,9 @@
 #include <stdlib.h>
 #include <string.h>
 #include <time.h>
+#include <errno.h>
+#include <unistd.h>
+#include <sys/stat.h>
 
 #include "module.hpp"
 
@@ -21,8 +24,13 @@ void SANA_FE::init(){
 	network_init(&net);
 	INFO("Initializing simulation.\n");
 	sim = sim_init_sim();
+	variants = NULL;
+	active_variant = 0;
+	output_dir = "";
+	arch_hash = SNAPSHOT_HASH_INIT;
+	net_filename = "";
 }
-int SANA_FE::update_neuron(int group_id, int n_id, vector<string> kwargs, int count){
+int SANA_FE::update_neuron(int group_id, int n_id, vector<string> kwargs, int count, int variant){
 	for (string item: kwargs){
 		INFO("Kwarg: %s\n", item.c_str());
 	}
@@ -32,23 +40,60 @@ int SANA_FE::update_neuron(int group_id, int n_id, vector<string> kwargs, int co
 		return -1;
 	if (n_id >= net.groups[group_id].neuron_count)
 		return -1;
+	if ((variant < 0) || (variant >= net.batch_size))
+		return -1;
 	struct attributes attr[128];
 	for (int i = 0; i < count; ++i){
 		string s = kwargs[i];
-		strcpy(&attr->key[i], s.substr(0, s.find('=')).c_str());
-		strcpy(&attr->value_str[i], s.substr(s.find('=')+1).c_str());
-		INFO("neuron: %d.%d updated with key: %s and val: %s\n", group_id, n_id, &attr->key[i], &attr->value_str[i]);
+		strcpy(attr[i].key, s.substr(0, s.find('=')).c_str());
+		strcpy(attr[i].value_str, s.substr(s.find('=')+1).c_str());
+		INFO("neuron: %d.%d updated with key: %s and val: %s\n", group_id, n_id, attr[i].key, attr[i].value_str);
+	}
+	struct neuron *n = &(net.groups[group_id].neurons[n_id]);
+	network_set_soma_parameters(n, variant, attr, count);
+	// The neuron's state has changed, so it must be updated again
+	if (variant == active_variant){
+		sim_activate_neuron(n);
+	}
+	else{
+		long int neuron_id = n_id;
+		for (int i = 0; i < group_id; ++i){
+			neuron_id += net.groups[i].neuron_count;
+		}
+		variants[variant].neuron_active[neuron_id] = 1;
 	}
-	net.groups[group_id].neurons[n_id].soma_class->parameters(attr, count);
 	return 1;
 }
 void SANA_FE::run_timesteps(int timesteps){
-	store_data_init(&run_data, sim, timesteps);
-	for (int i = 0; i < timesteps; ++i){
-		++sim->ts.timestep;
-		run(sim, &net, arch);
+	if (variants == NULL){
+		store_data_init(&run_data, sim, timesteps);
+		for (int i = 0; i < timesteps; ++i){
+			++sim->ts.timestep;
+			run(sim, &net, arch);
+		}
+		store_data(&run_data, sim);
+		sim_trace_flush_spikes(sim);
+		sim_trace_flush_messages(sim);
+		return;
+	}
+
+	// Advance every variant in the batch by the same number of
+	//  timesteps. Variants are run one after another, not interleaved:
+	//  each variant's state is swapped in and run for all the timesteps,
+	//  reusing the same network, architecture and connection maps
+	for (int v = 0; v < net.batch_size; ++v){
+		select_variant(v);
+		store_data_init(&(batch_run_data[v]), sim, timesteps);
+		for (int i = 0; i < timesteps; ++i){
+			++sim->ts.timestep;
+			run(sim, &net, arch);
+		}
+		store_data(&(batch_run_data[v]), sim);
 	}
-	store_data(&run_data, sim);
+	select_variant(0);
+	run_data = batch_run_data[0];
+	sim_trace_flush_spikes(sim);
+	sim_trace_flush_messages(sim);
 }
 void SANA_FE::set_input(char *filename){
 	input_fp = fopen(filename, "r");
@@ -58,11 +103,45 @@ void SANA_FE::set_input(char *filename){
 		clean_up(RET_FAIL);
 	}
 }
+void SANA_FE::set_output_dir(string dir){
+	// Write all traces and the run summary to this directory, so that
+	//  simulations running at the same time don't share any files
+	if (!dir.empty() && (mkdir(dir.c_str(), 0777) != 0) &&
+		(errno != EEXIST))
+	{
+		INFO("Error: Couldn't create output directory %s.\n",
+			dir.c_str());
+		clean_up(RET_FAIL);
+	}
+	output_dir = dir;
+
+	// Restart any traces already enabled in the new directory
+	if (sim->log_perf)
+		set_perf_flag(true);
+	if (sim->log_spikes)
+		set_spike_flag(true, sim->log_spikes_binary);
+	if (sim->log_potential)
+		set_pot_flag(true, sim->log_potential_binary);
+	if (sim->log_messages)
+		set_mess_flag(true, sim->log_messages_binary);
+}
+FILE *SANA_FE::open_output(const char *filename, const char *mode){
+	if (output_dir.empty())
+		return fopen(filename, mode);
+
+	string path = output_dir + "/" + filename;
+	return fopen(path.c_str(), mode);
+}
 void SANA_FE::set_perf_flag(bool flag){
 	if (flag){
 		sim->log_perf = 1;
 
-		sim->perf_fp = fopen("perf.csv", "w");
+		if (sim->perf_fp != NULL){
+			if (sim->writer != NULL)
+				sim_writer_flush(sim->writer);
+			fclose(sim->perf_fp);
+		}
+		sim->perf_fp = open_output("perf.csv", "w");
 		if (sim->perf_fp == NULL)
 		{
 			INFO("Error: Couldn't open perf file for writing.\n");
@@ -72,62 +151,168 @@ void SANA_FE::set_perf_flag(bool flag){
 	}
 	else{
 		sim->log_perf = 0;
+		if (sim->writer != NULL)
+			sim_writer_flush(sim->writer);
 		if (sim->perf_fp != NULL)
 			fclose(sim->perf_fp);
+		sim->perf_fp = NULL;
 	}
 }
-void SANA_FE::set_spike_flag(bool flag){
+void SANA_FE::set_spike_flag(bool flag, bool binary){
+	if (sim->spike_trace_fp != NULL){
+		sim_trace_flush_spikes(sim);
+		if (sim->writer != NULL)
+			sim_writer_flush(sim->writer);
+		fclose(sim->spike_trace_fp);
+		sim->spike_trace_fp = NULL;
+	}
 	if (flag){
 		sim->log_spikes = 1;
+		sim->log_spikes_binary = binary;
 
-		sim->spike_trace_fp = fopen("spikes.trace", "w");
+		if (binary)
+			sim->spike_trace_fp = open_output("spikes.bin", "wb");
+		else
+			sim->spike_trace_fp = open_output("spikes.trace", "w");
 		if (sim->spike_trace_fp == NULL)
 		{
 			INFO("Error: Couldn't open trace file for writing.\n");
 			clean_up(RET_FAIL);
 		}
-		sim_spike_trace_write_header(sim);
+		if (binary)
+			sim_spike_trace_write_binary_header(sim);
+		else
+			sim_spike_trace_write_header(sim);
 	}
 	else{
 		sim->log_spikes = 0;
-		if (sim->spike_trace_fp != NULL)
-			fclose(sim->spike_trace_fp);
+		sim->log_spikes_binary = 0;
 	}
 }
-void SANA_FE::set_pot_flag(bool flag){
+void SANA_FE::set_pot_flag(bool flag, bool binary){
+	if (sim->potential_trace_fp != NULL){
+		if (sim->writer != NULL)
+			sim_writer_flush(sim->writer);
+		fclose(sim->potential_trace_fp);
+		sim->potential_trace_fp = NULL;
+	}
 	if (flag){
 		sim->log_potential = 1;
+		sim->log_potential_binary = binary;
 
-		sim->potential_trace_fp = fopen("potential.trace", "w");
+		if (binary)
+			sim->potential_trace_fp = open_output("potential.bin", "wb");
+		else
+			sim->potential_trace_fp = open_output("potential.trace", "w");
 		if (sim->potential_trace_fp == NULL)
 		{
 			INFO("Error: Couldn't open trace file for writing.\n");
 			clean_up(RET_FAIL);
 		}
-		sim_potential_trace_write_header(sim, &net);
+		sim_init_potential_probes(sim, &net);
+		if (binary)
+			sim_potential_trace_write_binary_header(sim);
+		else
+			sim_potential_trace_write_header(sim, &net);
 	}
 	else{
 		sim->log_potential = 0;
-		if (sim->potential_trace_fp != NULL)
-			fclose(sim->potential_trace_fp);
+		sim->log_potential_binary = 0;
+		sim_free_potential_probes(sim);
 	}
 }
-void SANA_FE::set_mess_flag(bool flag){
+void SANA_FE::set_probe_interval(int interval){
+	if (interval < 1){
+		INFO("Error: Probe interval must be > 0 (%d).\n", interval);
+		clean_up(RET_FAIL);
+	}
+	sim->potential_probe_interval = interval;
+
+	// The binary trace header records the interval, so restart the trace
+	if (sim->log_potential){
+		set_pot_flag(true, sim->log_potential_binary);
+	}
+}
+void SANA_FE::set_mess_flag(bool flag, bool binary){
+	if (sim->message_trace_fp != NULL){
+		sim_trace_flush_messages(sim);
+		if (sim->writer != NULL)
+			sim_writer_flush(sim->writer);
+		fclose(sim->message_trace_fp);
+		sim->message_trace_fp = NULL;
+	}
 	if (flag){
 		sim->log_messages = 1;
+		sim->log_messages_binary = binary;
 
-		sim->message_trace_fp = fopen("messages.trace", "w");
+		if (binary)
+			sim->message_trace_fp = open_output("messages.bin", "wb");
+		else
+			sim->message_trace_fp = open_output("messages.trace", "w");
 		if (sim->message_trace_fp == NULL)
 		{
 			INFO("Error: Couldn't open trace file for writing.\n");
 			clean_up(RET_FAIL);
 		}
-		sim_message_trace_write_header(sim);
+		if (binary)
+			sim_message_trace_write_binary_header(sim);
+		else
+			sim_message_trace_write_header(sim);
 	}
 	else{
 		sim->log_messages = 0;
-		if (sim->message_trace_fp != NULL)
-			fclose(sim->message_trace_fp);
+		sim->log_messages_binary = 0;
+	}
+}
+void SANA_FE::set_message_sampling(int interval, double fraction,
+	vector<int> cores){
+	// Only trace messages every interval timesteps, a random fraction of
+	//  them, and if any cores are given, only messages sent from them
+	if (interval < 1){
+		INFO("Error: Message trace interval must be > 0 (%d).\n",
+			interval);
+		clean_up(RET_FAIL);
+	}
+	if ((fraction < 0.0) || (fraction > 1.0)){
+		INFO("Error: Message trace fraction must be in [0, 1] (%lf).\n",
+			fraction);
+		clean_up(RET_FAIL);
+	}
+	for (int core_id: cores){
+		if (core_id < 0){
+			INFO("Error: Invalid core id %d for message trace.\n",
+				core_id);
+			clean_up(RET_FAIL);
+		}
+	}
+	sim->message_trace_interval = interval;
+	sim->message_trace_fraction = fraction;
+
+	free(sim->message_trace_cores);
+	sim->message_trace_cores = NULL;
+	sim->message_trace_core_count = cores.size();
+	if (!cores.empty()){
+		sim->message_trace_cores = (int *) malloc(
+			sizeof(int) * cores.size());
+		if (sim->message_trace_cores == NULL){
+			INFO("Error: Couldn't allocate message trace cores.\n");
+			clean_up(RET_FAIL);
+		}
+		for (size_t i = 0; i < cores.size(); i++){
+			sim->message_trace_cores[i] = cores[i];
+		}
+	}
+}
+void SANA_FE::set_async_trace_flag(bool flag){
+	// Format and write traces on a background thread, overlapping file
+	//  output with simulating the following timesteps
+	if (flag){
+		if (sim->writer == NULL)
+			sim->writer = sim_writer_init();
+	}
+	else if (sim->writer != NULL){
+		sim_writer_free(sim->writer);
+		sim->writer = NULL;
 	}
 }
 void SANA_FE::set_gui_flag(bool flag){
@@ -140,6 +325,64 @@ void SANA_FE::set_gui_flag(bool flag){
 		arch->spike_vector_on = 0;
 	}
 }
+void SANA_FE::set_event_driven_flag(bool flag){
+	if (flag){
+		arch->event_driven_on = 1;
+		// Make sure every neuron is updated at least once, in case
+		//  this mode is enabled part way through a run
+		sim_init_active_neurons(arch);
+		for (int v = 0; (variants != NULL) && (v < net.batch_size); ++v){
+			for (long int i = 0; i < variants[v].neuron_count; ++i){
+				variants[v].neuron_active[i] = 1;
+			}
+		}
+	}
+	else{
+		arch->event_driven_on = 0;
+	}
+}
+void SANA_FE::set_parallel_schedule_flag(bool flag){
+	if (flag){
+		arch->parallel_schedule_on = 1;
+	}
+	else{
+		arch->parallel_schedule_on = 0;
+	}
+}
+void SANA_FE::set_thread_count(int thread_count){
+	if (thread_count < 0)
+	{
+		INFO("Error: Thread count must be >= 0 (%d).\n", thread_count);
+		clean_up(RET_FAIL);
+	}
+	// Zero uses the OpenMP default e.g., set by OMP_NUM_THREADS
+	arch->thread_count = thread_count;
+}
+void SANA_FE::set_batch_size(int batch_size){
+	if (batch_size < 1)
+	{
+		INFO("Error: Batch size must be >= 1 (%d).\n", batch_size);
+		clean_up(RET_FAIL);
+	}
+	if (net.neuron_group_count > 0)
+	{
+		INFO("Error: Batch size must be set before loading the network.\n");
+		clean_up(RET_FAIL);
+	}
+	// Variants share the network topology and connection maps, and are
+	//  simulated sequentially by run_timesteps()
+	net.batch_size = batch_size;
+}
+void SANA_FE::select_variant(int variant){
+	// Store the state of the active variant and load the next one, all
+	//  variants share the same network and architecture structures
+	if ((variants == NULL) || (variant == active_variant))
+		return;
+	sim_save_variant(&(variants[active_variant]), &net, arch);
+	sim_load_variant(&(variants[variant]), &net, arch, variant);
+	sim = variants[variant].sim;
+	active_variant = variant;
+}
 void SANA_FE::set_arch(char* filename){
 	FILE* arch_fp = fopen(filename, "r");
 	if (arch_fp == NULL)
@@ -147,6 +390,7 @@ void SANA_FE::set_arch(char* filename){
 		INFO("Error: Architecture file %s failed to open.\n", filename);
 		clean_up(RET_FAIL);
 	}
+	arch_hash = snapshot_hash_file(arch_hash, arch_fp);
 	int ret = description_parse_file(arch_fp, NULL, arch);
 	//arch_print_description(&description, 0);
 	fclose(arch_fp);
@@ -155,6 +399,18 @@ void SANA_FE::set_arch(char* filename){
 		clean_up(RET_FAIL);
 	}
 }
+void SANA_FE::set_arch_description(string description){
+	// Load an architecture that is already in the description format,
+	//  e.g. parsed from YAML by Python, without an intermediate file
+	arch_hash = snapshot_hash(
+		arch_hash, description.c_str(), description.size());
+	int ret = description_parse_buffer(description.c_str(),
+		description.size(), NULL, arch);
+	if (ret == RET_FAIL)
+	{
+		clean_up(RET_FAIL);
+	}
+}
 void SANA_FE::set_net(char* filename){
 	FILE* network_fp = fopen(filename, "r");
 	if (network_fp == NULL)
@@ -170,14 +426,138 @@ void SANA_FE::set_net(char* filename){
 		clean_up(RET_FAIL);
 	}
 	network_check_mapped(&net);
-
 	arch_create_connection_maps(arch);
+	net_filename = filename;
+	init_net();
+}
+void SANA_FE::init_net(){
+	// Set up the simulation once the network is built and mapped
+	arch_create_core_list(arch);
+	sim_allocate_messages(&(sim->ts), arch);
+	sim_init_neuron_state(arch);
+	sim_init_active_neurons(arch);
+
+	if (net.batch_size > 1)
+	{
+		// Every variant starts from the same initial state. The first
+		//  variant uses the existing simulation, and so keeps any traces
+		variants = (struct sim_variant *) malloc(
+			sizeof(struct sim_variant) * net.batch_size);
+		if (variants == NULL)
+		{
+			INFO("Error: Couldn't allocate batch memory.\n");
+			clean_up(RET_FAIL);
+		}
+		for (int v = 0; v < net.batch_size; ++v)
+		{
+			struct simulation *variant_sim = sim;
+			if (v > 0)
+			{
+				variant_sim = sim_init_sim();
+				sim_allocate_messages(&(variant_sim->ts), arch);
+			}
+			sim_init_variant(&(variants[v]), variant_sim, &net,
+				arch);
+			sim_save_variant(&(variants[v]), &net, arch);
+		}
+		batch_run_data.resize(net.batch_size);
+		active_variant = 0;
+	}
 
 	// Change Potential logging with new headers from net.
 	if (sim->log_potential){
-		set_pot_flag(true);
+		set_pot_flag(true, sim->log_potential_binary);
 	}
 }
+bool SANA_FE::load_snapshot(string filename, string net_filename){
+	// Load the network from a snapshot saved by save_snapshot(), instead
+	//  of parsing and mapping it again. Returns false if there is no
+	//  snapshot, or it was saved for a different architecture or network
+	FILE *network_fp = fopen(net_filename.c_str(), "r");
+	if (network_fp == NULL)
+	{
+		INFO("Network data (%s) failed to open.\n",
+			net_filename.c_str());
+		clean_up(RET_FAIL);
+	}
+	const uint64_t net_hash =
+		snapshot_hash_file_info(SNAPSHOT_HASH_INIT, network_fp);
+	fclose(network_fp);
+
+	FILE *snapshot_fp = fopen(filename.c_str(), "rb");
+	if (snapshot_fp == NULL)
+	{
+		// The network will be built and then saved, which needs the
+		//  attributes it was created with
+		net.record_attributes = 1;
+		return false;
+	}
+	INFO("Reading network from snapshot %s.\n", filename.c_str());
+	int ret = snapshot_load(snapshot_fp, &net, arch, arch_hash, net_hash);
+	fclose(snapshot_fp);
+	if (ret == RET_FAIL)
+	{
+		// Stale snapshots are rejected before anything is built
+		if (net.neuron_group_count > 0)
+		{
+			clean_up(RET_FAIL);
+		}
+		net.record_attributes = 1;
+		return false;
+	}
+	network_check_mapped(&net);
+	this->net_filename = net_filename;
+	init_net();
+	return true;
+}
+bool SANA_FE::save_snapshot(string filename){
+	// Save the mapped network, so later runs can load it with
+	//  load_snapshot(). The snapshot is written under a temporary name
+	//  first, so that other processes never load a partial snapshot
+	if (net_filename.empty())
+	{
+		INFO("Error: No network loaded to save a snapshot of.\n");
+		return false;
+	}
+	if (!net.record_attributes)
+	{
+		INFO("Error: Network attributes weren't recorded, call "
+			"load_snapshot() before building the network.\n");
+		return false;
+	}
+	FILE *network_fp = fopen(net_filename.c_str(), "r");
+	if (network_fp == NULL)
+	{
+		INFO("Network data (%s) failed to open.\n",
+			net_filename.c_str());
+		return false;
+	}
+	const uint64_t net_hash =
+		snapshot_hash_file_info(SNAPSHOT_HASH_INIT, network_fp);
+	fclose(network_fp);
+
+	string tmp_filename = filename + "." + to_string(getpid());
+	FILE *snapshot_fp = fopen(tmp_filename.c_str(), "wb");
+	if (snapshot_fp == NULL)
+	{
+		INFO("Error: Couldn't open snapshot %s for writing.\n",
+			tmp_filename.c_str());
+		return false;
+	}
+	int ret = snapshot_save(snapshot_fp, &net, arch, arch_hash, net_hash);
+	if (fclose(snapshot_fp) != 0)
+	{
+		ret = RET_FAIL;
+	}
+	if ((ret == RET_FAIL) ||
+		(rename(tmp_filename.c_str(), filename.c_str()) != 0))
+	{
+		INFO("Error: Couldn't save snapshot %s.\n", filename.c_str());
+		remove(tmp_filename.c_str());
+		return false;
+	}
+	return true;
+}
 
 double SANA_FE::get_power(){
 	if (sim->total_sim_time > 0.0)
@@ -189,27 +569,64 @@ double SANA_FE::get_power(){
 		return 0.0;
 	}
 }
-vector<int> SANA_FE::get_status(int gid){
+vector<int> SANA_FE::get_status(int gid, int variant){
 	vector<int> statuses = vector<int>();
 	if (gid >= net.neuron_group_count){
 		INFO("Error: Got gid of %d with only %d groups in net.\n",
 			gid, net.neuron_group_count);
 		return statuses;
 	}
+	if ((variant < 0) || (variant >= net.batch_size)){
+		INFO("Error: Got variant %d with batch size of %d.\n",
+			variant, net.batch_size);
+		return statuses;
+	}
+	if (variant == active_variant){
+		for (int i = 0; i < net.groups[gid].neuron_count; ++i){
+			statuses.push_back(
+				net.groups[gid].neurons[i].state->neuron_status);
+		}
+		return statuses;
+	}
+
+	long int neuron_id = 0;
+	for (int i = 0; i < gid; ++i){
+		neuron_id += net.groups[i].neuron_count;
+	}
 	for (int i = 0; i < net.groups[gid].neuron_count; ++i){
-		statuses.push_back(net.groups[gid].neurons[i].neuron_status);
+		statuses.push_back(
+			variants[variant].neurons[neuron_id+i].neuron_status);
 	}
 	return statuses;
 }
 
-void SANA_FE::sim_summary(){
+map<string, double> SANA_FE::sim_summary(bool write_file){
 	sim_write_summary(stdout, sim);
 
-	sim->stats_fp = fopen("run_summary.yaml", "w");
-	if (sim->stats_fp != NULL)
+	if (write_file)
 	{
-		sim_write_summary(sim->stats_fp, sim);
+		if (sim->stats_fp != NULL)
+		{
+			fclose(sim->stats_fp);
+		}
+		sim->stats_fp = open_output("run_summary.yaml", "w");
+		if (sim->stats_fp != NULL)
+		{
+			sim_write_summary(sim->stats_fp, sim);
+			fflush(sim->stats_fp);
+		}
 	}
+
+	// The same values as run_summary.yaml, except for the git version
+	map<string, double> summary;
+	summary["energy"] = sim->total_energy;
+	summary["time"] = sim->total_sim_time;
+	summary["total_spikes"] = sim->total_spikes;
+	summary["total_packets"] = sim->total_messages_sent;
+	summary["total_neurons_fired"] = sim->total_neurons_fired;
+	summary["wall_time"] = sim->wall_time;
+	summary["timesteps"] = sim->timesteps;
+	return summary;
 }
 vector<vector<int>> SANA_FE::run_summary(){
 	print_run_data(stdout, &run_data);
@@ -226,22 +643,165 @@ vector<vector<int>> SANA_FE::run_summary(){
 	Vector_Cleanup_Class help_class(arch);
 	return arch->spike_vector;
 }
+vector<map<string, double>> SANA_FE::batch_summary(){
+	// Return the results of the last run for every variant in the batch
+	vector<map<string, double>> summary;
+	for (int v = 0; v < net.batch_size; ++v){
+		struct run_ts_data *data = &run_data;
+		if (variants != NULL){
+			data = &(batch_run_data[v]);
+		}
+		map<string, double> variant_summary;
+		variant_summary["energy"] = data->energy;
+		variant_summary["time"] = data->time;
+		variant_summary["total_spikes"] = data->spikes;
+		variant_summary["total_packets"] = data->packets;
+		variant_summary["total_neurons_fired"] = data->neurons;
+		variant_summary["wall_time"] = data->wall_time;
+		variant_summary["timesteps"] = data->timesteps;
+		summary.push_back(variant_summary);
+	}
+	return summary;
+}
+py::dict SANA_FE::get_perf(int variant){
+	// Return the perf.csv columns for every timestep simulated so far. The
+	//  arrays are read-only views of the simulator's counters. They hold a
+	//  reference to the counter buffer, which keeps it alive after the
+	//  simulator moves on to a larger buffer or is freed
+	py::dict perf;
+	if ((variant < 0) || (variant >= net.batch_size)){
+		INFO("Error: Got variant %d with batch size of %d.\n",
+			variant, net.batch_size);
+		return perf;
+	}
+	struct simulation *variant_sim = sim;
+	if (variants != NULL){
+		variant_sim = variants[variant].sim;
+	}
+
+	const long int count = variant_sim->perf_count;
+	struct sim_perf_buffer *buffer = variant_sim->perf;
+	if (buffer == NULL){
+		perf["time"] = py::array_t<double>(0);
+		perf["fired"] = py::array_t<long int>(0);
+		perf["packets"] = py::array_t<long int>(0);
+		perf["hops"] = py::array_t<long int>(0);
+		perf["total_energy"] = py::array_t<double>(0);
+		return perf;
+	}
+	buffer->references++;
+	py::capsule release(buffer, [](void *p){
+		sim_release_perf_buffer((struct sim_perf_buffer *) p); });
+	perf["time"] = py::array_t<double>(count, buffer->time, release);
+	perf["fired"] = py::array_t<long int>(count, buffer->fired, release);
+	perf["packets"] = py::array_t<long int>(
+		count, buffer->packets, release);
+	perf["hops"] = py::array_t<long int>(count, buffer->hops, release);
+	perf["total_energy"] = py::array_t<double>(
+		count, buffer->energy, release);
+	for (auto column: perf){
+		column.second.attr("setflags")(py::arg("write") = false);
+	}
+	return perf;
+}
+void SANA_FE::set_spike_recorder(bool flag, vector<int> groups){
+	// Record spikes in memory, either for all groups or only the groups
+	//  given. Spikes are kept until they are drained by get_spikes()
+	for (int gid: groups){
+		if ((gid < 0) || (gid >= NETWORK_MAX_NEURON_GROUPS)){
+			INFO("Error: Invalid group id %d for spike recorder.\n",
+				gid);
+			clean_up(RET_FAIL);
+		}
+	}
+	sim->record_spikes = flag;
+	for (int i = 0; i < NETWORK_MAX_NEURON_GROUPS; i++){
+		sim->spike_record_groups[i] = groups.empty();
+	}
+	for (int gid: groups){
+		sim->spike_record_groups[gid] = 1;
+	}
+}
+py::tuple SANA_FE::get_spikes(){
+	// Return the (timesteps, group ids, neuron ids) recorded since the
+	//  last call. The arrays take ownership of the recorded buffers, so
+	//  no spikes are copied
+	const long int count = sim->spike_record_count;
+	if (count == 0){
+		return py::make_tuple(py::array_t<long int>(0),
+			py::array_t<int>(0), py::array_t<int>(0));
+	}
+
+	py::capsule free_timesteps(sim->spike_record_timesteps,
+		[](void *p){ free(p); });
+	py::capsule free_group_ids(sim->spike_record_group_ids,
+		[](void *p){ free(p); });
+	py::capsule free_neuron_ids(sim->spike_record_neuron_ids,
+		[](void *p){ free(p); });
+	py::tuple spikes = py::make_tuple(
+		py::array_t<long int>(count, sim->spike_record_timesteps,
+			free_timesteps),
+		py::array_t<int>(count, sim->spike_record_group_ids,
+			free_group_ids),
+		py::array_t<int>(count, sim->spike_record_neuron_ids,
+			free_neuron_ids));
+
+	sim->spike_record_timesteps = NULL;
+	sim->spike_record_group_ids = NULL;
+	sim->spike_record_neuron_ids = NULL;
+	sim->spike_record_count = 0;
+	sim->spike_record_capacity = 0;
+	return spikes;
+}
 void SANA_FE::clean_up(int ret){
+	if (sim == NULL)
+	{
+		// Already cleaned up, e.g. before the destructor was called
+		if (ret == RET_FAIL)
+		{
+			exit(1);
+		}
+		return;
+	}
+
 	// Free any larger structures here
+	select_variant(0);
+	if (variants != NULL)
+	{
+		for (int v = 0; v < net.batch_size; ++v)
+		{
+			if (v > 0)
+			{
+				sim_free_messages(&(variants[v].sim->ts));
+				sim_free_perf(variants[v].sim);
+				free(variants[v].sim);
+			}
+			sim_free_variant(&(variants[v]));
+		}
+		free(variants);
+		variants = NULL;
+	}
 	network_free(&net);
 	arch_free(arch);
 
-	// Close any open files here
+	// Close any open files here, after everything queued is written
+	if (sim->writer != NULL)
+	{
+		sim_writer_free(sim->writer);
+		sim->writer = NULL;
+	}
 	if (sim->potential_trace_fp != NULL)
 	{
 		fclose(sim->potential_trace_fp);
 	}
 	if (sim->spike_trace_fp != NULL)
 	{
+		sim_trace_flush_spikes(sim);
 		fclose(sim->spike_trace_fp);
 	}
 	if (sim->message_trace_fp != NULL)
 	{
+		sim_trace_flush_messages(sim);
 		fclose(sim->message_trace_fp);
 	}
 	if (sim->perf_fp != NULL)
@@ -254,16 +814,22 @@ void SANA_FE::clean_up(int ret){
 	}
 
 	// Free the simulation structure only after we close all files
+	sim_free_messages(&(sim->ts));
+	free(sim->spike_trace_buffer);
+	sim_free_potential_probes(sim);
+	sim_free_perf(sim);
+	sim_free_spike_record(sim);
+	free(sim->message_trace_cores);
+	free(sim->message_trace_buffer);
 	free(sim);
+	sim = NULL;
+	arch = NULL;
 
+	// Only exit on errors, so that Python callers get their results back
 	if (ret == RET_FAIL)
 	{
 		exit(1);
 	}
-	else
-	{
-		exit(0);
-	}
 }
 
 void run(struct simulation *sim, struct network *net, struct architecture *arch)
@@ -288,36 +854,45 @@ void run(struct simulation *sim, struct network *net, struct architecture *arch)
 	sim->total_spikes += ts->spike_count;
 	sim->total_neurons_fired += ts->total_neurons_fired;
 	sim->total_messages_sent += ts->packets_sent;
-	if (sim->log_spikes)
+	sim_perf_record_timestep(sim, ts);
+	if (sim->record_spikes)
+	{
+		sim_record_spikes(sim, net, sim->timesteps);
+	}
+	if (sim->log_spikes && sim->log_spikes_binary)
+	{
+		sim_trace_record_spikes_binary(sim, net);
+	}
+	else if (sim->log_spikes)
 	{
 		sim_trace_record_spikes(sim, net);
 	}
-	if (sim->log_potential)
+	if (sim->log_potential &&
+		sim_potential_probe_is_due(sim, ts->timestep))
 	{
-		sim_trace_record_potentials(sim, net);
+		if (sim->log_potential_binary)
+		{
+			sim_trace_record_potentials_binary(sim);
+		}
+		else
+		{
+			sim_trace_record_potentials(sim, net);
+		}
 	}
 	if (sim->log_perf)
 	{
-		sim_perf_log_timestep(ts, sim->perf_fp);
+		sim_perf_log_timestep(sim, ts);
 	}
 	if (sim->log_messages)
 	{
-		for (int i = 0; i < ARCH_MAX_CORES; i++)
-		{
-			for (int j = 0; j < ts->message_queues[i].count; j++)
-			{
-				struct message *m = &(ts->messages[i][j]);
-				if (m->dest_neuron != NULL)
-				{
-					// Ignore dummy messages (without a
-					//  destination). These are inserted to
-					//  account for processing that doesn't
-					//  result in a spike being sent
-					sim_trace_record_message(sim, m);
-				}
-			}
-		}
+		sim_trace_record_messages(sim, ts);
+	}
+	if (sim->writer != NULL)
+	{
+		// Pass this timestep's records to the writer if it's idle
+		sim_writer_submit(sim->writer, 0);
 	}
+
 	sim->timesteps = ts->timestep;
 	sim->wall_time += (double) ts_elapsed.tv_sec+(ts_elapsed.tv_nsec/1.0e9);
 	TRACE1("Time-step took: %fs.\n",
@@ -386,22 +961,39 @@ PYBIND11_MODULE(simcpp, m) {
 		   SANA_FE
     )pbdoc";
 
+	m.attr("git_version") = GIT_COMMIT;
+
 	py::class_<SANA_FE>(m, "SANA_FE")
 		.def(py::init())
 		.def("init", &SANA_FE::init)
-        .def("update_neuron", &SANA_FE::update_neuron)
+        .def("update_neuron", &SANA_FE::update_neuron, py::arg("group_id"), py::arg("n_id"), py::arg("kwargs"), py::arg("count"), py::arg("variant") = 0)
         .def("run_timesteps", &SANA_FE::run_timesteps, py::arg("timesteps") = 1)
 		.def("set_input", &SANA_FE::set_input)
+		.def("set_output_dir", &SANA_FE::set_output_dir, py::arg("dir") = "")
 		.def("set_perf_flag", &SANA_FE::set_perf_flag, py::arg("flag") = true)
-		.def("set_spike_flag", &SANA_FE::set_spike_flag, py::arg("flag") = true)
-		.def("set_pot_flag", &SANA_FE::set_pot_flag, py::arg("flag") = true)
-		.def("set_mess_flag", &SANA_FE::set_mess_flag, py::arg("flag") = true)
+		.def("set_spike_flag", &SANA_FE::set_spike_flag, py::arg("flag") = true, py::arg("binary") = false)
+		.def("set_pot_flag", &SANA_FE::set_pot_flag, py::arg("flag") = true, py::arg("binary") = false)
+		.def("set_probe_interval", &SANA_FE::set_probe_interval, py::arg("interval") = 1)
+		.def("set_mess_flag", &SANA_FE::set_mess_flag, py::arg("flag") = true, py::arg("binary") = false)
+		.def("set_message_sampling", &SANA_FE::set_message_sampling, py::arg("interval") = 1, py::arg("fraction") = 1.0, py::arg("cores") = vector<int>())
+		.def("set_async_trace_flag", &SANA_FE::set_async_trace_flag, py::arg("flag") = true)
 		.def("set_gui_flag", &SANA_FE::set_gui_flag, py::arg("flag") = true)
+		.def("set_event_driven_flag", &SANA_FE::set_event_driven_flag, py::arg("flag") = true)
+		.def("set_parallel_schedule_flag", &SANA_FE::set_parallel_schedule_flag, py::arg("flag") = true)
+		.def("set_thread_count", &SANA_FE::set_thread_count, py::arg("thread_count") = 0)
+		.def("set_batch_size", &SANA_FE::set_batch_size, py::arg("batch_size") = 1)
 		.def("set_arch", &SANA_FE::set_arch)
+		.def("set_arch_description", &SANA_FE::set_arch_description)
 		.def("set_net", &SANA_FE::set_net)
+		.def("load_snapshot", &SANA_FE::load_snapshot, py::arg("filename"), py::arg("net_filename"))
+		.def("save_snapshot", &SANA_FE::save_snapshot, py::arg("filename"))
 		.def("get_power", &SANA_FE::get_power)
-		.def("get_status", &SANA_FE::get_status)
-		.def("sim_summary", &SANA_FE::sim_summary)
+		.def("get_status", &SANA_FE::get_status, py::arg("gid"), py::arg("variant") = 0)
+		.def("sim_summary", &SANA_FE::sim_summary, py::arg("write_file") = true)
 		.def("run_summary", &SANA_FE::run_summary)
+		.def("batch_summary", &SANA_FE::batch_summary)
+		.def("get_perf", &SANA_FE::get_perf, py::arg("variant") = 0)
+		.def("set_spike_recorder", &SANA_FE::set_spike_recorder, py::arg("flag") = true, py::arg("groups") = vector<int>())
+		.def("get_spikes", &SANA_FE::get_spikes)
 		.def("clean_up", &SANA_FE::clean_up, py::arg("ret") = 0);
 }
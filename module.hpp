@@ -4,8 +4,11 @@
 #include "arch.hpp"
 #include "description.hpp"
 #include "command.hpp"
+#include "snapshot.hpp"
 #include "pybind11/pybind11.h"
 #include "pybind11/stl.h"
+#include "pybind11/numpy.h"
+#include <map>
 
 #define PYBIND11_DETAILED_ERROR_MESSAGES
 
@@ -36,23 +39,52 @@ class SANA_FE{
 		int timesteps;
 		FILE *input_fp;
 		struct run_ts_data run_data;
+		// Batched simulation, where each variant has its own state
+		struct sim_variant *variants;
+		vector<struct run_ts_data> batch_run_data;
+		int active_variant;
+		// Directory for trace and summary files, the working directory
+		//  if empty
+		string output_dir;
+		// Hash of the architecture description, and the network file it
+		//  was built from. Both are used to check snapshots are still valid
+		uint64_t arch_hash;
+		string net_filename;
 
         SANA_FE();
 		void init();
-		int update_neuron(int group_id, int n_id, vector<string> kwargs, int count);
+		int update_neuron(int group_id, int n_id, vector<string> kwargs, int count, int variant = 0);
 		void run_timesteps(int timesteps = 1);
 		void set_input(char *filename);
+		void set_output_dir(string dir = "");
+		FILE *open_output(const char *filename, const char *mode);
 		void set_perf_flag(bool flag = true);
-		void set_spike_flag(bool flag = true);
-		void set_pot_flag(bool flag = true);
-		void set_mess_flag(bool flag = true);
+		void set_spike_flag(bool flag = true, bool binary = false);
+		void set_pot_flag(bool flag = true, bool binary = false);
+		void set_probe_interval(int interval = 1);
+		void set_mess_flag(bool flag = true, bool binary = false);
+		void set_message_sampling(int interval = 1, double fraction = 1.0, vector<int> cores = vector<int>());
+		void set_async_trace_flag(bool flag = true);
 		void set_gui_flag(bool flag = true);
+		void set_event_driven_flag(bool flag = true);
+		void set_parallel_schedule_flag(bool flag = true);
+		void set_thread_count(int thread_count = 0);
+		void set_batch_size(int batch_size = 1);
+		void select_variant(int variant);
 		void set_arch(char* filename);
+		void set_arch_description(string description);
 		void set_net(char* filename);
+		void init_net();
+		bool load_snapshot(string filename, string net_filename);
+		bool save_snapshot(string filename);
         double get_power();
-		vector<int> get_status(int gid);
-        void sim_summary();
+		vector<int> get_status(int gid, int variant = 0);
+        map<string, double> sim_summary(bool write_file = true);
 		vector<vector<int>> run_summary();
+		vector<map<string, double>> batch_summary();
+		pybind11::dict get_perf(int variant = 0);
+		void set_spike_recorder(bool flag = true, vector<int> groups = vector<int>());
+		pybind11::tuple get_spikes();
 		void clean_up(int ret = RET_OK);
 		~SANA_FE(){clean_up();};
 };
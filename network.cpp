@@ -26,13 +26,18 @@ int network_create_neuron_group(struct network *net, const int neuron_count,
 	group = &(net->groups[id]);
 	group->neurons =
 		(struct neuron *) malloc(sizeof(struct neuron) * neuron_count);
-	if (group->neurons == NULL)
+	group->descriptions = (struct neuron_description *) malloc(
+		sizeof(struct neuron_description) * neuron_count);
+	if ((group->neurons == NULL) || (group->descriptions == NULL))
 	{
 		INFO("Error: Couldn't allocate neuron group %d\n", id);
 		exit(1);
 	}
 
 	group->neuron_count = neuron_count;
+	group->batch_size = net->batch_size;
+	group->attribute_set =
+		network_record_attributes(net, attr, attribute_count);
 
 	group->default_soma_hw_name[0] = 0;
 	group->default_soma_model[0] = 0;
@@ -149,6 +154,35 @@ int network_create_neuron_group(struct network *net, const int neuron_count,
 		}
 	}
 
+	// If the soma plugin supports it, create a single block instance
+	//  shared by every neuron in the group. Otherwise each neuron gets its
+	//  own instance. Each variant in a batch has its own instances
+	group->soma_block_batch = NULL;
+	group->soma_block = get_soma_block(
+		group->default_soma_model, group->neuron_count);
+	if (group->soma_block != NULL)
+	{
+		group->soma_block->parameters(attr, attribute_count);
+	}
+	if ((group->soma_block != NULL) && (group->batch_size > 1))
+	{
+		group->soma_block_batch = (Base_Soma_Block **) malloc(
+			sizeof(Base_Soma_Block *) * group->batch_size);
+		if (group->soma_block_batch == NULL)
+		{
+			INFO("Error: Couldn't allocate batch memory.\n");
+			exit(1);
+		}
+		group->soma_block_batch[0] = group->soma_block;
+		for (int v = 1; v < group->batch_size; v++)
+		{
+			group->soma_block_batch[v] = get_soma_block(
+				group->default_soma_model, group->neuron_count);
+			group->soma_block_batch[v]->parameters(
+				attr, attribute_count);
+		}
+	}
+
 	// Initialize all neurons in this group
 	for (int i = 0; i < group->neuron_count; i++)
 	{
@@ -157,27 +191,25 @@ int network_create_neuron_group(struct network *net, const int neuron_count,
 		n->id = i;
 		n->group = group;
 		n->connection_out_count = 0;
-		strncpy(n->soma_hw_name, group->default_soma_hw_name,
-			MAX_FIELD_LEN);
-		strncpy(n->soma_model, group->default_soma_model,
-			MAX_FIELD_LEN);
+		strncpy(group->descriptions[i].soma_hw_name,
+			group->default_soma_hw_name, MAX_FIELD_LEN);
+		strncpy(group->descriptions[i].soma_model,
+			group->default_soma_model, MAX_FIELD_LEN);
 
 		// Initialize neuron using group attributes
 		n->log_spikes = group->default_log_spikes;
 		n->log_potential = group->default_log_potential;
 		n->force_update = group->default_force_update;
 		n->max_connections_out = group->default_max_connections_out;
+		n->dendritic_current_decay = 0.0;
 
-		n->fired = 0;
-		// By default, dendrite current resets every timestep
-
-		n->update_needed = 0;
-		n->neuron_status = IDLE;
-		n->spike_count = 0;
 		n->connections_out = NULL;
+		n->attribute_set = -1;
 
-		// Initially the neuron is not mapped to anything
+		// Initially the neuron is not mapped to anything, and its
+		//  state is only allocated once it is
 		n->core = NULL;
+		n->state = NULL;
 		n->soma_hw = NULL;
 
 		n->maps_in = NULL;
@@ -187,9 +219,38 @@ int network_create_neuron_group(struct network *net, const int neuron_count,
 
 		n->is_init = 0;
 
-		// Create Soma Class Instance 
-		n->soma_class = get_soma(n->soma_model);
-		n->soma_class->parameters(attr, attribute_count);
+		// Create Soma Class Instance, with a separate instance for
+		//  every variant in a batch
+		n->soma_class = NULL;
+		n->soma_batch = NULL;
+		if (group->soma_block != NULL)
+		{
+			// Updated using the group's block instead
+			continue;
+		}
+		else if (group->batch_size > 1)
+		{
+			n->soma_batch = (Base_Soma **) malloc(
+				sizeof(Base_Soma *) * group->batch_size);
+			if (n->soma_batch == NULL)
+			{
+				INFO("Error: Couldn't allocate batch memory.\n");
+				exit(1);
+			}
+			for (int v = 0; v < group->batch_size; v++)
+			{
+				n->soma_batch[v] = get_soma(
+					group->default_soma_model);
+				n->soma_batch[v]->parameters(
+					attr, attribute_count);
+			}
+			n->soma_class = n->soma_batch[0];
+		}
+		else
+		{
+			n->soma_class = get_soma(group->default_soma_model);
+			n->soma_class->parameters(attr, attribute_count);
+		}
 	}
 
 	INFO("Created neuron group gid:%d count:%d "
@@ -204,8 +265,35 @@ int network_create_neuron_group(struct network *net, const int neuron_count,
 	return id;
 }
 
-int network_create_neuron(struct neuron *const n, struct attributes *attr,
-	const int attribute_count)
+void network_set_soma_parameters(struct neuron *const n, const int variant,
+	struct attributes *attr, const int attribute_count)
+{
+	// Set the soma parameters of a single neuron, for one variant of a
+	//  batch (which is always variant 0 if not batched)
+	struct neuron_group *group = n->group;
+
+	if (group->soma_block_batch != NULL)
+	{
+		group->soma_block_batch[variant]->neuron_parameters(
+			n->id, attr, attribute_count);
+	}
+	else if (group->soma_block != NULL)
+	{
+		group->soma_block->neuron_parameters(
+			n->id, attr, attribute_count);
+	}
+	else if (n->soma_batch != NULL)
+	{
+		n->soma_batch[variant]->parameters(attr, attribute_count);
+	}
+	else
+	{
+		n->soma_class->parameters(attr, attribute_count);
+	}
+}
+
+int network_create_neuron(struct network *const net, struct neuron *const n,
+	struct attributes *attr, const int attribute_count)
 {
 	// Each hardware timestep corresponds to a simulation of the spiking
 	//  network for dt seconds. This relates to the LIF time constant.
@@ -217,6 +305,8 @@ int network_create_neuron(struct neuron *const n, struct attributes *attr,
 	}
 
 	/*** Set attributes ***/
+	struct neuron_description *description =
+		&(n->group->descriptions[n->id]);
 	for (int i = 0; i < attribute_count; i++)
 	{
 		struct attributes *a = &(attr[i]);
@@ -224,11 +314,12 @@ int network_create_neuron(struct neuron *const n, struct attributes *attr,
 
 		if (strncmp("name", a->key, MAX_FIELD_LEN) == 0)
 		{
-			strncpy(n->soma_hw_name, a->value_str, MAX_FIELD_LEN);
+			strncpy(description->soma_hw_name, a->value_str,
+				MAX_FIELD_LEN);
 		}
 		else if (strncmp("soma_model", a->key, MAX_FIELD_LEN) == 0)
 		{
-			strncpy(n->soma_model, a->value_str,
+			strncpy(description->soma_model, a->value_str,
 				MAX_FIELD_LEN);
 			ret = 1;
 		}
@@ -263,14 +354,8 @@ int network_create_neuron(struct neuron *const n, struct attributes *attr,
 		}
 	}
 
-	// Set the initial update state, no spikes can arrive before the first
-	//  time-step but we can force the neuron to update, or bias it
-	n->update_needed = n->force_update; // || (fabs(n->bias) > 0.0));
-	n->neuron_status = IDLE;
-
-	n->soma_last_updated = 0;
-	n->dendrite_last_updated = 0;
-
+	// The initial update state is set once the neuron is mapped, see
+	//  sim_init_neuron_state()
 	n->core = NULL;
 	assert(n->connections_out == NULL);
 	TRACE1("Allocating memory (%lu b) for connections\n",
@@ -301,14 +386,20 @@ int network_create_neuron(struct neuron *const n, struct attributes *attr,
 	}
 
 	// Check if need to create Soma Class instance
-	if (n->soma_class == nullptr){
-		n->soma_class = get_soma(n->soma_model);
-		// INFO("Creating new neuron %d with model: %s\n", n->id, n->soma_model);
+	if ((n->soma_class == nullptr) && (n->group->soma_block == NULL)){
+		n->soma_class = get_soma(description->soma_model);
+		// INFO("Creating new neuron %d with model: %s\n", n->id, description->soma_model);
 	}
-	n->soma_class->parameters(attr, attribute_count);
+	for (int v = 0; v < n->group->batch_size; v++)
+	{
+		network_set_soma_parameters(n, v, attr, attribute_count);
+	}
+
+	n->attribute_set = network_record_attributes(net, attr, attribute_count);
 
 	TRACE1("Created neuron: gid:%d nid:%d force:%d soma:%s model:%s\n",
-		n->group->id, n->id, n->force_update, n->soma_hw_name, n->soma_model);
+		n->group->id, n->id, n->force_update, description->soma_hw_name,
+		description->soma_model);
 	n->is_init = 1;
 	return n->id;
 }
@@ -420,6 +511,14 @@ void network_init(struct network *const net)
 	net->neuron_group_count = 0;
 	net->external_input_count = 0;
 	net->external_inputs = NULL;
+	net->batch_size = 1;
+	net->record_attributes = 0;
+	net->attribute_data = NULL;
+	net->attribute_set_offsets = NULL;
+	net->attribute_data_size = 0;
+	net->attribute_data_capacity = 0;
+	net->attribute_set_count = 0;
+	net->attribute_set_capacity = 0;
 
 	for (int i = 0; i < NETWORK_MAX_NEURON_GROUPS; i++)
 	{
@@ -440,9 +539,28 @@ void network_free(struct network *const net)
 		for (int j = 0; j < group->neuron_count; j++)
 		{
 			free(group->neurons[j].connections_out);
+			free(group->neurons[j].soma_batch);
 		}
+		// Destroy the group's soma blocks, one for each variant if
+		//  the group is batched
+		if (group->soma_block_batch != NULL)
+		{
+			for (int v = 0; v < group->batch_size; v++)
+			{
+				free_soma_block(group->default_soma_model,
+					group->soma_block_batch[v]);
+			}
+		}
+		else
+		{
+			free_soma_block(group->default_soma_model,
+				group->soma_block);
+		}
+		group->soma_block = NULL;
 		// Finally free the neurons allocated in the group
 		free(net->groups[i].neurons);
+		free(net->groups[i].descriptions);
+		free(net->groups[i].soma_block_batch);
 	}
 
 	for (int i = 0; i < net->external_input_count; i++)
@@ -451,10 +569,146 @@ void network_free(struct network *const net)
 		free(in->connections);
 	}
 	free(net->external_inputs);
+	free(net->attribute_data);
+	free(net->attribute_set_offsets);
+	net->attribute_data = NULL;
+	net->attribute_set_offsets = NULL;
+	net->attribute_data_size = 0;
+	net->attribute_set_count = 0;
 
 	return;
 }
 
+static int network_is_last_attribute_set(const struct network *const net,
+	const struct attributes *attr, const int attribute_count)
+{
+	// Compare the attributes to the last set, without packing them
+	const long int last = net->attribute_set_count - 1;
+	const char *data, *end;
+
+	if (last < 0)
+	{
+		return 0;
+	}
+	data = &(net->attribute_data[net->attribute_set_offsets[last]]);
+	end = &(net->attribute_data[net->attribute_set_offsets[last + 1]]);
+	for (int i = 0; i < attribute_count; i++)
+	{
+		if ((data >= end) ||
+			(strncmp(data, attr[i].key, MAX_FIELD_LEN) != 0))
+		{
+			return 0;
+		}
+		data += strlen(data) + 1;
+		if ((data >= end) ||
+			(strncmp(data, attr[i].value_str, MAX_FIELD_LEN) != 0))
+		{
+			return 0;
+		}
+		data += strlen(data) + 1;
+	}
+
+	return (data == end);
+}
+
+long int network_record_attributes(struct network *const net,
+	const struct attributes *attr, const int attribute_count)
+{
+	// Pack the attributes after the last set, and return the id of the
+	//  new set. Neurons are usually created with the same attributes as
+	//  the last neuron, in which case the last set is reused. Returns -1 if
+	//  attributes aren't being recorded
+	long int size = 0;
+	long int start = net->attribute_data_size;
+
+	if (!net->record_attributes)
+	{
+		return -1;
+	}
+	if (network_is_last_attribute_set(net, attr, attribute_count))
+	{
+		return net->attribute_set_count - 1;
+	}
+	for (int i = 0; i < attribute_count; i++)
+	{
+		size += strnlen(attr[i].key, MAX_FIELD_LEN) + 1;
+		size += strnlen(attr[i].value_str, MAX_FIELD_LEN) + 1;
+	}
+	if ((start + size) > net->attribute_data_capacity)
+	{
+		long int capacity = 2 * net->attribute_data_capacity;
+		if (capacity < (start + size))
+		{
+			capacity = start + size;
+		}
+		net->attribute_data =
+			(char *) realloc(net->attribute_data, capacity);
+		if (net->attribute_data == NULL)
+		{
+			INFO("Error: Couldn't allocate attribute memory.\n");
+			exit(1);
+		}
+		net->attribute_data_capacity = capacity;
+	}
+	if ((net->attribute_set_count + 2) > net->attribute_set_capacity)
+	{
+		long int capacity = 2 * net->attribute_set_capacity;
+		if (capacity == 0)
+		{
+			capacity = NETWORK_ATTRIBUTE_SET_CAPACITY;
+		}
+		net->attribute_set_offsets = (long int *) realloc(
+			net->attribute_set_offsets,
+			sizeof(long int) * capacity);
+		if (net->attribute_set_offsets == NULL)
+		{
+			INFO("Error: Couldn't allocate attribute memory.\n");
+			exit(1);
+		}
+		net->attribute_set_capacity = capacity;
+		net->attribute_set_offsets[0] = 0;
+	}
+
+	char *data = &(net->attribute_data[start]);
+	for (int i = 0; i < attribute_count; i++)
+	{
+		const int key_len = strnlen(attr[i].key, MAX_FIELD_LEN);
+		const int value_len = strnlen(attr[i].value_str, MAX_FIELD_LEN);
+		memcpy(data, attr[i].key, key_len);
+		data[key_len] = '\0';
+		data += key_len + 1;
+		memcpy(data, attr[i].value_str, value_len);
+		data[value_len] = '\0';
+		data += value_len + 1;
+	}
+
+	net->attribute_data_size += size;
+	net->attribute_set_count++;
+	net->attribute_set_offsets[net->attribute_set_count] =
+		net->attribute_data_size;
+
+	return net->attribute_set_count - 1;
+}
+
+int network_unpack_attributes(const char *data, const long int size,
+	struct attributes *attr)
+{
+	// Unpack a recorded set of attributes, returning the attribute count
+	const char *end = &(data[size]);
+	int attribute_count = 0;
+
+	while ((data < end) && (attribute_count < MAX_FIELDS))
+	{
+		strncpy(attr[attribute_count].key, data, MAX_FIELD_LEN);
+		data += strlen(data) + 1;
+		strncpy(attr[attribute_count].value_str, data, MAX_FIELD_LEN);
+		data += strlen(data) + 1;
+		attribute_count++;
+	}
+
+	return attribute_count;
+}
+
 struct neuron *network_id_to_neuron_ptr(
 	struct network *const net, const struct neuron_id id)
 {
@@ -15,6 +15,7 @@
 #define NETWORK_INVALID_NID -1
 #define MAX_FIELDs 128
 #define MAX_FIELD_LEN 64
+#define NETWORK_ATTRIBUTE_SET_CAPACITY 1024
 
 #include <stdint.h>
 #include "plugins.hpp"
@@ -42,33 +43,39 @@ struct neuron_id
 	int group, neuron;
 };
 
-struct neuron
+struct neuron_state
 {
-	struct neuron_group *group;
-	struct connection *connections_out;
-	struct connection_map *maps_in;
-	struct connection_map **maps_out;
+	// Neuron state that changes every timestep. This is kept apart from
+	//  the rest of the neuron, in a contiguous array for each core that is
+	//  indexed by the neuron's local id
+	double charge, current, processing_latency;
+	Neuron_Status neuron_status;
+	int fired, update_needed, spike_count, forced_spikes;
+	// Track the timestep each hardware unit was last updated
+	int soma_last_updated, dendrite_last_updated;
+};
 
-	// Mapped hardware
-	struct core *core, *post_synaptic_cores;
+struct neuron
+{
+	// Mapped hardware and simulation state
+	struct core *core;
+	struct neuron_state *state;
 	struct soma_processor *soma_hw;
+	class Base_Soma *soma_class; // NULL if the group has a soma block
 
-	class Base_Soma *soma_class;
-
-	char soma_hw_name[MAX_FIELD_LEN];
-	char soma_model[MAX_FIELD_LEN];
-
-	// Track the timestep each hardware unit was last updated
-	int id, is_init, fired, connection_out_count;
-	int max_connections_out, log_spikes, log_potential, update_needed;
-	int force_update, spike_count;
-	int soma_last_updated, dendrite_last_updated;
+	struct connection_map *maps_in;
+	struct connection_map **maps_out;
 	int maps_in_count, maps_out_count;
+	int id, is_init, force_update, log_spikes, log_potential;
+	int local_id; // Index of this neuron in its core's neuron list
+	double dendritic_current_decay;
 
-	double dendritic_current_decay, processing_latency;
-	double current, charge;
-	Neuron_Status neuron_status;
-	int forced_spikes;
+	// Network description, only needed while building the network
+	struct neuron_group *group;
+	struct connection *connections_out;
+	class Base_Soma **soma_batch; // One soma per batch variant, if batched
+	long int attribute_set; // Attributes the neuron was created with
+	int connection_out_count, max_connections_out;
 
 	// LIF specific
 	// unsigned int random_range_mask;
@@ -79,6 +86,14 @@ struct neuron
 	// End of LIF specific
 };
 
+struct neuron_description
+{
+	// Neuron names are only used to create and map the neuron, so are
+	//  stored separately to the neurons themselves
+	char soma_hw_name[MAX_FIELD_LEN];
+	char soma_model[MAX_FIELD_LEN];
+};
+
 struct connection
 {
 	struct neuron *post_neuron, *pre_neuron;
@@ -104,10 +119,16 @@ struct neuron_group
 	//  same models. If implemented in hardware, they also must share common
 	//  hardware i.e. the same core and processor blocks in the core
 	struct neuron *neurons;
+	struct neuron_description *descriptions;
+	// Soma plugin instance shared by all neurons, if the model supports
+	//  block updates. Batched groups have one block per variant
+	class Base_Soma_Block *soma_block;
+	class Base_Soma_Block **soma_block_batch;
 	char default_soma_hw_name[MAX_FIELD_LEN];
 	char default_soma_model[MAX_FIELD_LEN];
 	char default_synapse_hw_name[MAX_FIELD_LEN];
-	int id, neuron_count;
+	long int attribute_set; // Attributes the group was created with
+	int id, neuron_count, batch_size;
 	int default_log_potential, default_log_spikes;
 	int default_max_connections_out, default_force_update;
 
@@ -123,6 +144,18 @@ struct network
 	struct neuron_group groups[NETWORK_MAX_NEURON_GROUPS];
 	struct input *external_inputs;
 	int neuron_group_count, external_input_count;
+	// Number of variants simulated together, sharing the same topology
+	int batch_size;
+	// Attributes of every group and neuron as they were created, packed as
+	//  pairs of key and value strings. These are kept so the network can
+	//  be saved to a snapshot, and are only recorded if record_attributes
+	//  is set. A neuron with the same attributes as the last neuron shares
+	//  its set
+	int record_attributes;
+	char *attribute_data;
+	long int *attribute_set_offsets;
+	long int attribute_data_size, attribute_data_capacity;
+	long int attribute_set_count, attribute_set_capacity;
 };
 
 struct architecture;
@@ -132,7 +165,10 @@ struct core;
 
 void network_init(struct network *const net);
 void network_free(struct network *const net);
-int network_create_neuron(struct neuron *const n, struct attributes *attr, const int attribute_count);
+int network_create_neuron(struct network *const net, struct neuron *const n, struct attributes *attr, const int attribute_count);
+long int network_record_attributes(struct network *const net, const struct attributes *attr, const int attribute_count);
+int network_unpack_attributes(const char *data, const long int size, struct attributes *attr);
+void network_set_soma_parameters(struct neuron *const n, const int variant, struct attributes *attr, const int attribute_count);
 int network_create_neuron_group(struct network *net, const int neuron_count, struct attributes *attr, const int attribute_count);
 struct neuron *network_id_to_neuron_ptr(struct network *const net, const struct neuron_id id);
 int network_create_inputs(struct network *const net, const int input_count, const int input_type);
@@ -3,6 +3,7 @@
 //  Engineering Solutions of Sandia, LLC which is under contract
 //  No. DE-NA0003525 with the U.S. Department of Energy.
 //  plugins.cpp
+#include <assert.h>
 #include <dlfcn.h>
 #include <string.h>
 #include <iostream>
@@ -12,6 +13,8 @@
 
 std::map<std::string, _create_soma *> create_soma;
 std::map<std::string, _destroy_soma *> destroy_soma;
+std::map<std::string, _create_soma_block *> create_soma_block;
+std::map<std::string, _destroy_soma_block *> destroy_soma_block;
 
 void init_soma(char* name){
     char lib_path[11 + MAX_SOMA_LEN] = "./plugins/";
@@ -21,6 +24,12 @@ void init_soma(char* name){
     strcat(create, name);
     char destroy[9 + MAX_SOMA_LEN] = "destroy_";
     strcat(destroy, name);
+    char create_block[14 + MAX_SOMA_LEN] = "create_";
+    strcat(create_block, name);
+    strcat(create_block, "_block");
+    char destroy_block[15 + MAX_SOMA_LEN] = "destroy_";
+    strcat(destroy_block, name);
+    strcat(destroy_block, "_block");
 
     // load the soma library
     void* soma = dlopen(lib_path, RTLD_LAZY | RTLD_GLOBAL );
@@ -29,26 +38,28 @@ void init_soma(char* name){
         exit(1);
     }
 
-    // reset errors
+    // Plugins may implement the per-neuron interface, the block interface
+    //  or both. Look up all symbols, and check at least one pair exists
     dlerror();
-    
-    // Function to create an instance of the Soma class
-    _create_soma* create_func = (_create_soma*) dlsym(soma, create);
-    create_soma[std::string(name)] = create_func;
-    const char* dlsym_error = dlerror();
-    if (dlsym_error) {
-        INFO("Error: Couldn't load symbol %s: %s\n", create, dlsym_error);
-        exit(1);
-    }
-    
-    // Function to destroy an instance of the Soma class
+    create_soma[std::string(name)] = (_create_soma*) dlsym(soma, create);
     destroy_soma[std::string(name)] = (_destroy_soma*) dlsym(soma, destroy);
-    dlsym_error = dlerror();
-    if (dlsym_error) {
-        INFO("Error: Couldn't load symbol %s: %s\n", destroy, dlsym_error);
+    create_soma_block[std::string(name)] =
+        (_create_soma_block*) dlsym(soma, create_block);
+    destroy_soma_block[std::string(name)] =
+        (_destroy_soma_block*) dlsym(soma, destroy_block);
+    dlerror();
+
+    const int has_soma = (create_soma[std::string(name)] != NULL) &&
+        (destroy_soma[std::string(name)] != NULL);
+    const int has_soma_block = (create_soma_block[std::string(name)] != NULL) &&
+        (destroy_soma_block[std::string(name)] != NULL);
+    if (!has_soma && !has_soma_block) {
+        INFO("Error: Couldn't load symbols %s/%s or %s/%s\n", create,
+            destroy, create_block, destroy_block);
         exit(1);
     }
-    INFO("Loaded plugin symbols for %s.\n", name);
+    INFO("Loaded plugin symbols for %s (block:%d).\n", name,
+        has_soma_block);
 }
 
 Base_Soma* get_soma(char* name){
@@ -56,5 +67,33 @@ Base_Soma* get_soma(char* name){
     if(!create_soma.count(name_s)){
         init_soma(name);
     }
+    if (create_soma[name_s] == NULL) {
+        INFO("Error: Plugin %s doesn't support per-neuron updates\n", name);
+        exit(1);
+    }
     return create_soma[name_s]();
-}
\ No newline at end of file
+}
+
+Base_Soma_Block* get_soma_block(char* name, const int neuron_count){
+    // Returns NULL if the plugin only supports per-neuron updates
+    std::string name_s = std::string(name);
+    if(!create_soma_block.count(name_s)){
+        init_soma(name);
+    }
+    if ((create_soma_block[name_s] == NULL) ||
+        (destroy_soma_block[name_s] == NULL)) {
+        return NULL;
+    }
+    return create_soma_block[name_s](neuron_count);
+}
+
+void free_soma_block(char* name, Base_Soma_Block* block){
+    // Destroy a block created by get_soma_block(), using the same plugin
+    std::string name_s = std::string(name);
+    if (block == NULL) {
+        return;
+    }
+    assert(destroy_soma_block.count(name_s) &&
+        (destroy_soma_block[name_s] != NULL));
+    destroy_soma_block[name_s](block);
+}
@@ -13,12 +13,35 @@ public:
     virtual ~Base_Soma(){}
 	virtual Neuron_Status update_soma(double input) = 0;
 	virtual void parameters(struct attributes* attr, const int attribute_count) = 0;
+	// Only used by potential probes, so models without a potential
+	//  don't need to implement it
+	virtual double get_potential(){ return 0.0; }
+};
+
+// Plugins can instead update a whole block of neurons that share a soma
+//  model, i.e. a neuron group, in one call. Parameters set for the group
+//  are shared by all neurons in the block, while neuron parameters only
+//  apply to a single neuron. Neurons are identified by their id in the
+//  group. The simulator may update disjoint sets of neurons in the same
+//  block concurrently
+class Base_Soma_Block {
+public:
+	Base_Soma_Block(){}
+	virtual ~Base_Soma_Block(){}
+	virtual void update_soma(const int count, const int *ids, const double *inputs, Neuron_Status *statuses) = 0;
+	virtual void parameters(struct attributes* attr, const int attribute_count) = 0;
+	virtual void neuron_parameters(const int id, struct attributes* attr, const int attribute_count) = 0;
+	virtual double get_potential(const int id){ return 0.0; }
 };
 
 typedef Base_Soma* _create_soma();
 typedef void _destroy_soma(Base_Soma*);
+typedef Base_Soma_Block* _create_soma_block(const int neuron_count);
+typedef void _destroy_soma_block(Base_Soma_Block*);
 
 void init_soma(char* name);
 Base_Soma* get_soma(char* name);
+Base_Soma_Block* get_soma_block(char* name, const int neuron_count);
+void free_soma_block(char* name, Base_Soma_Block* block);
 
 #endif
\ No newline at end of file
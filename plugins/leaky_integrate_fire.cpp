@@ -4,6 +4,7 @@
 #include "../arch.hpp"
 #include <iostream>
 #include <math.h>
+#include <vector>
 
 using namespace std;
 
@@ -37,42 +38,104 @@ int network_parse_reset_mode(const char *str)
 }
 
 
-class leaky_integrate_fire: public Base_Soma {
+struct lif_parameters
+{
+    double reset, reverse_reset, threshold, reverse_threshold;
+    double leak_decay, leak_bias, potential_time_const;
+    int reset_mode, reverse_reset_mode;
+};
 
-    // LIF specific
+class leaky_integrate_fire_block: public Base_Soma_Block {
+
+    // LIF specific. All neurons in the block share the group's parameters,
+    //  unless a neuron sets its own. The potential and bias are always
+    //  stored for each neuron
     public:
-        unsigned int random_range_mask;
-        double potential, current, charge, bias;
-        double reset, reverse_reset, threshold, reverse_threshold;
-        double leak_decay, leak_bias, potential_time_const;
-        // double dendritic_current_decay, processing_latency;
-        int reset_mode, reverse_reset_mode;
-
-        leaky_integrate_fire(){
-            reset = 0.0;
-            reverse_reset = 0.0;
-            threshold = 1.0;
-            reverse_threshold = -1.0;
+        vector<struct lif_parameters> parameter_sets;
+        vector<int> parameter_ids;
+        vector<double> potential, bias;
+
+        leaky_integrate_fire_block(const int neuron_count){
+            struct lif_parameters p;
+
+            p.reset = 0.0;
+            p.reverse_reset = 0.0;
+            p.threshold = 1.0;
+            p.reverse_threshold = -1.0;
 
             // Default is no leak (potential decay), i.e., the potential for the
             //  next timestep is 100% of the previous timestep's
-            leak_decay = 1.0;
-            leak_bias = 0.0;
-            potential_time_const = 0.0;
-
-            random_range_mask = 0;
-            potential = 0.0;
-            current = 0.0;
-            // charge = 0.0;
-            bias = 0.0;
-            
-            // dendritic_current_decay = 0.0;
-            reset_mode = 0;
-            reverse_reset_mode = 0;
+            p.leak_decay = 1.0;
+            p.leak_bias = 0.0;
+            p.potential_time_const = 0.0;
+
+            p.reset_mode = 0;
+            p.reverse_reset_mode = 0;
+
+            parameter_sets.push_back(p);
+            parameter_ids.assign(neuron_count, 0);
+            potential.assign(neuron_count, 0.0);
+            bias.assign(neuron_count, 0.0);
+        }
+
+        int set_parameter(struct lif_parameters *p, struct attributes *a) {
+            // Returns 0 if the attribute was invalid
+            int ret = 1;
+
+            if (strncmp("reset", a->key, MAX_FIELD_LEN) == 0)
+            {
+                ret = sscanf(a->value_str, "%lf", &p->reset);
+            }
+            else if (strncmp("reverse_reset", a->key, MAX_FIELD_LEN) == 0)
+            {
+                ret = sscanf(a->value_str, "%lf", &p->reverse_reset);
+            }
+            else if (strncmp("threshold", a->key, MAX_FIELD_LEN) == 0)
+            {
+                ret = sscanf(a->value_str, "%lf", &p->threshold);
+            }
+            else if (strncmp("reverse_threshold", a->key, MAX_FIELD_LEN) ==
+                0)
+            {
+                ret = sscanf(
+                    a->value_str, "%lf", &p->reverse_threshold);
+            }
+            else if (strncmp("leak_decay", a->key, MAX_FIELD_LEN) == 0)
+            {
+                ret = sscanf(a->value_str, "%lf",
+                    &p->leak_decay);
+            }
+            else if (strncmp("leak_bias", a->key, MAX_FIELD_LEN) == 0)
+            {
+                ret = sscanf(
+                    a->value_str, "%lf", &p->leak_bias);
+            }
+            else if (strncmp("reset_mode", a->key, MAX_FIELD_LEN) == 0)
+            {
+                p->reset_mode =
+                    network_parse_reset_mode(a->value_str);
+                // Was parsed successfully if we got here
+                ret = 1;
+            }
+            else if (strncmp("reverse_reset_mode", a->key, MAX_FIELD_LEN) ==
+                0)
+            {
+                p->reverse_reset_mode =
+                    network_parse_reset_mode(a->value_str);
+                // Was parsed successfully if we got here
+                ret = 1;
+            }
+
+            return ret;
+        }
+
+        int is_shared_parameter(struct attributes *a) {
+            return (strncmp("bias", a->key, MAX_FIELD_LEN) != 0) &&
+                (strncmp("input_spike", a->key, MAX_FIELD_LEN) != 0);
         }
 
         virtual void parameters(struct attributes* attr, const int attribute_count) {
-            /*** Set attributes ***/
+            /*** Set attributes for the whole group ***/
             for (int i = 0; i < attribute_count; i++)
             {
                 struct attributes *a = &(attr[i]);
@@ -80,55 +143,68 @@ class leaky_integrate_fire: public Base_Soma {
 
                 if (strncmp("bias", a->key, MAX_FIELD_LEN) == 0)
                 {
-                    ret = sscanf(a->value_str, "%lf", &bias);
-                }
-                else if (strncmp("reset", a->key, MAX_FIELD_LEN) == 0)
-                {
-                    ret = sscanf(a->value_str, "%lf", &reset);
-                }
-                else if (strncmp("reverse_reset", a->key, MAX_FIELD_LEN) == 0)
-                {
-                    ret = sscanf(a->value_str, "%lf", &reverse_reset);
-                }
-                else if (strncmp("threshold", a->key, MAX_FIELD_LEN) == 0)
-                {
-                    ret = sscanf(a->value_str, "%lf", &threshold);
+                    double b;
+                    ret = sscanf(a->value_str, "%lf", &b);
+                    bias.assign(bias.size(), b);
                 }
-                else if (strncmp("reverse_threshold", a->key, MAX_FIELD_LEN) ==
-                    0)
+                else if (strncmp("input_spike", a->key, MAX_FIELD_LEN) == 0)
                 {
-                    ret = sscanf(
-                        a->value_str, "%lf", &reverse_threshold);
+                    double res;
+                    ret = sscanf(a->value_str, "%lf", &res);
+                    for (size_t j = 0; j < potential.size(); j++)
+                    {
+                        potential[j] += res;
+                    }
                 }
-                else if (strncmp("leak_decay", a->key, MAX_FIELD_LEN) == 0)
+                else
                 {
-                    ret = sscanf(a->value_str, "%lf",
-                        &leak_decay);
+                    for (size_t j = 0; j < parameter_sets.size(); j++)
+                    {
+                        ret = set_parameter(&(parameter_sets[j]), a);
+                    }
                 }
-                else if (strncmp("leak_bias", a->key, MAX_FIELD_LEN) == 0)
+                if (ret < 1)
                 {
-                    ret = sscanf(
-                        a->value_str, "%lf", &leak_bias);
+                    INFO("Invalid attribute (%s:%s)\n", a->key,
+                        a->value_str);
+                    exit(1);
                 }
-                else if (strncmp("reset_mode", a->key, MAX_FIELD_LEN) == 0)
+            }
+        }
+
+        virtual void neuron_parameters(const int id, struct attributes* attr, const int attribute_count) {
+            /*** Set attributes for a single neuron ***/
+            for (int i = 0; i < attribute_count; i++)
+            {
+                struct attributes *a = &(attr[i]);
+                int ret = 1;
+
+                if (strncmp("bias", a->key, MAX_FIELD_LEN) == 0)
                 {
-                    reset_mode =
-                        network_parse_reset_mode(a->value_str);
-                    // Was parsed successfully if we got here
-                    ret = 1;
+                    ret = sscanf(a->value_str, "%lf", &bias[id]);
                 }
-                else if (strncmp("reverse_reset_mode", a->key, MAX_FIELD_LEN) ==
-                    0)
+                else if (strncmp("input_spike", a->key, MAX_FIELD_LEN) == 0)
                 {
-                    reverse_reset_mode =
-                        network_parse_reset_mode(a->value_str);
-                    // Was parsed successfully if we got here
-                    ret = 1;
-                }
-                else if (strncmp("input_spike", a->key, MAX_FIELD_LEN) == 0){
                     double res;
                     ret = sscanf(a->value_str, "%lf", &res);
-                    potential += res;
+                    potential[id] += res;
+                }
+                else if (is_shared_parameter(a))
+                {
+                    // Give this neuron its own copy of the parameters
+                    //  before changing them
+                    struct lif_parameters p =
+                        parameter_sets[parameter_ids[id]];
+                    ret = set_parameter(&p, a);
+                    if (parameter_ids[id] == 0)
+                    {
+                        parameter_ids[id] = parameter_sets.size();
+                        parameter_sets.push_back(p);
+                    }
+                    else
+                    {
+                        parameter_sets[parameter_ids[id]] = p;
+                    }
                 }
                 if (ret < 1)
                 {
@@ -139,61 +215,94 @@ class leaky_integrate_fire: public Base_Soma {
             }
         }
 
-        Neuron_Status update_soma(double input){
+        virtual double get_potential(const int id) {
+            return potential[id];
+        }
 
-            Neuron_Status neuron_status = IDLE;
+        virtual void update_soma(const int count, const int *ids, const double *inputs, Neuron_Status *statuses) {
+            for (int i = 0; i < count; i++)
+            {
+                const int id = ids[i];
+                const struct lif_parameters *p =
+                    &(parameter_sets[parameter_ids[id]]);
+                double v = potential[id];
+                const double b = bias[id];
+                Neuron_Status neuron_status = IDLE;
 
-        	// Calculate the change in potential since the last update e.g.
-        	//  integate inputs and apply any potential leak
-        	TRACE1("Updating potential, before:%f\n", potential);
+                // Calculate the change in potential since the last update e.g.
+                //  integate inputs and apply any potential leak
+                TRACE1("Updating potential, before:%f\n", v);
+                v *= p->leak_decay;
 
-            potential *= leak_decay;
+                // Add the synaptic / dendrite current to the potential
+                v += inputs[i] + b;
+                TRACE1("Updating potential, after:%f\n", v);
 
-        	// Add the synaptic / dendrite current to the potential
-        	//printf("n->bias:%lf n->potential before:%lf current_in:%lf\n", n->bias, n->potential, current_in);
-        	potential += input + bias;
-        	charge = 0.0;
-        	//printf("n->bias:%lf n->potential after:%lf\n", n->bias, n->potential);
+                if ((fabs(v) > 0.0) || (fabs(b) > 0.0))
+                {
+                    neuron_status = UPDATED;
+                }
 
-        	TRACE1("Updating potential, after:%f\n", potential);
+                // Check against threshold potential (for spiking)
+                if (((b != 0.0) && (v > p->threshold)) ||
+                    ((b == 0.0) && (v >= p->threshold)))
+                {
+                    if (p->reset_mode == NEURON_RESET_HARD)
+                    {
+                        v = p->reset;
+                    }
+                    else if (p->reset_mode == NEURON_RESET_SOFT)
+                    {
+                        v -= p->threshold;
+                    }
+                    neuron_status = FIRED;
+                }
 
-            if ((fabs(potential) > 0.0) || (fabs(bias) > 0.0))
-            {
-                neuron_status = UPDATED;
+                // Check against reverse threshold
+                if (v < p->reverse_threshold)
+                {
+                    if (p->reverse_reset_mode == NEURON_RESET_SOFT)
+                    {
+                        v -= p->reverse_threshold;
+                    }
+                    else if (p->reverse_reset_mode == NEURON_RESET_HARD)
+                    {
+                        v = p->reverse_reset;
+                    }
+                    else if (p->reverse_reset_mode == NEURON_RESET_SATURATE)
+                    {
+                        v = p->reverse_threshold;
+                    }
+                }
+
+                potential[id] = v;
+                statuses[i] = neuron_status;
             }
+        }
+};
+
+class leaky_integrate_fire: public Base_Soma {
+
+    // A single neuron, for simulators and tools using the per-neuron
+    //  interface. This is a block holding one neuron
+    public:
+        leaky_integrate_fire_block block;
+
+        leaky_integrate_fire(): block(1) {}
+
+        virtual void parameters(struct attributes* attr, const int attribute_count) {
+            block.parameters(attr, attribute_count);
+        }
 
-        	// Check against threshold potential (for spiking)
-        	if (((bias != 0.0) && (potential > threshold)) ||
-        		((bias == 0.0) && (potential >= threshold)))
-        	{
-        		if (reset_mode == NEURON_RESET_HARD)
-        		{
-        			potential = reset;
-        		}
-        		else if (reset_mode == NEURON_RESET_SOFT)
-        		{
-        			potential -= threshold;
-        		}
-                neuron_status = FIRED;
-        	}
-
-        	// Check against reverse threshold
-        	if (potential < reverse_threshold)
-        	{
-        		if (reverse_reset_mode == NEURON_RESET_SOFT)
-        		{
-        			potential -= reverse_threshold;
-        		}
-        		else if (reverse_reset_mode == NEURON_RESET_HARD)
-        		{
-        			potential = reverse_reset;
-        		}
-        		else if (reverse_reset_mode == NEURON_RESET_SATURATE)
-        		{
-        			potential = reverse_threshold;
-        		}
-        	}
+        virtual double get_potential() {
+            return block.get_potential(0);
+        }
 
+        virtual Neuron_Status update_soma(double input) {
+            const int id = 0;
+            Neuron_Status neuron_status;
+
+            block.update_soma(1, &id, &input, &neuron_status);
             return neuron_status;
         }
 };
@@ -206,4 +315,14 @@ extern "C" leaky_integrate_fire* create_leaky_integrate_fire() {
 
 extern "C" void destroy_leaky_integrate_fire(leaky_integrate_fire* lif) {
     delete lif;
-}
\ No newline at end of file
+}
+
+extern "C" leaky_integrate_fire_block* create_leaky_integrate_fire_block(
+    const int neuron_count) {
+    return new leaky_integrate_fire_block(neuron_count);
+}
+
+extern "C" void destroy_leaky_integrate_fire_block(
+    leaky_integrate_fire_block* lif) {
+    delete lif;
+}
@@ -33,9 +33,8 @@ MAX_COMPARTMENTS = 1024
 NETWORK_FILENAME = "runs/calibration/connected_layers.net"
 ARCH_FILENAME = "arch/loihi.yaml"
 
-import random
 def fully_connected(layer_neuron_count, spiking=True, force_update=False,
-                    connection_probability=1.0):
+                    connection_probability=1.0, seed=None):
     # Two layers, fully connected
     network = sim.Network(save_mappings=True)
     loihi_compartments = sim.init_compartments(32, 4, 1024)
@@ -62,13 +61,11 @@ def fully_connected(layer_neuron_count, spiking=True, force_update=False,
                                reset=reset, neuron_model="loihi_lif",
                                synapse_model="loihi_dense_synapse")
 
-    # Create connections
+    # Create connections, with the same weight for all connections
     weight = 1.0
-    for src in layer_1.neurons:
-        for dest in layer_2.neurons:
-            if random.random() < connection_probability:
-                # Same weight for all connections
-                src.add_connection(dest, weight)
+    layer_1.connect(layer_2, *sim.bernoulli_connections(
+        layer_neuron_count, layer_neuron_count, connection_probability,
+        weight, seed))
 
     return network
 
@@ -156,15 +153,15 @@ def connected_layers(weights, spiking=True, mapping="l2_split",
                                 neuron_model="loihi_lif",
                                 synapse_model="loihi_dense_synapse")
 
-        for src in layer_1.neurons:
-            # Add bias to force neuron to fire
-            src.add_bias(1.0)
-            for dest in layer_2.neurons:
-                # Take the ID of the neuron in the 2nd layer
-                weight = float(weights[src.id][dest.id]) / 256
-                if abs(weight) >= (1.0 / 256):
-                    # Zero weights are pruned i.e. removed
-                    src.add_connection(dest, weight)
+        # Add bias to force neuron to fire
+        layer_1.neuron_bias[:] = 1.0
+        src, dest, layer_weights = sim.dense_connections(
+            layer_neuron_count, layer_neuron_count,
+            np.asarray(weights, dtype=np.float64)[:, :layer_neuron_count] / 256)
+        # Zero weights are pruned i.e. removed
+        nonzero = np.abs(layer_weights) >= (1.0 / 256)
+        layer_1.connect(layer_2, src[nonzero], dest[nonzero],
+                        layer_weights[nonzero])
 
     return network
 
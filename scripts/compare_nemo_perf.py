@@ -18,7 +18,6 @@ import pandas as pd
 
 # Python built-in libraries
 import subprocess
-import random
 import time
 import csv
 import sys
@@ -32,7 +31,7 @@ sys.path.insert(0, PROJECT_DIR)
 import sim
 
 # Use a dumb seed to get consistent results
-random.seed(1)
+rng = np.random.default_rng(1)
 
 # Global experiment parameters
 TRUENORTH_COMPARTMENTS = 256
@@ -53,32 +52,25 @@ def create_nemo_network(cores):
     compartments = sim.init_compartments(cores, 1, TRUENORTH_COMPARTMENTS)
     print("Creating neuron population")
 
-    mappings = []
-    for i in range(0, cores):
-        m = (i, 0)
-        mappings.extend((m,) * TRUENORTH_COMPARTMENTS)
     # Create neurons to fill every TrueNorth compartment, with a negative
     #  threshold and forced updates i.e., spikes every timestep
     population = sim.create_layer(network, cores*TRUENORTH_COMPARTMENTS,
                                     compartments, 0, 0, 1, 0.0, -1.0, 0.0,
-                                    mappings=mappings, connections_out=1)
+                                    connections_out=1)
 
     print("Generating randomized network connections")
     weight = 1
-    for c in range(0, cores):
-        if (c % 32) == 0:
-            print(f"Generating synaptic connections for core {c}")
-        for n in range(0, TRUENORTH_AXONS):
-            if random.random() < SPIKE_INTRA_CORE_PROB:
-                possible_cores = list(range(0, cores))
-                del(possible_cores[c])
-                dest_core = random.choice(possible_cores)
-            else:  # 20% chance of picking the same core
-                dest_core = c
-            dest_axon = random.randrange(0, TRUENORTH_AXONS)
-            src = population.neurons[(c*TRUENORTH_AXONS) + n]
-            dest = population.neurons[(dest_core*TRUENORTH_AXONS) + dest_axon]
-            src.add_connection(dest, weight)
+    # Every axon connects to one random neuron, on a different core with
+    #  probability SPIKE_INTRA_CORE_PROB and otherwise on the same core
+    src_core = np.repeat(np.arange(cores), TRUENORTH_AXONS)
+    dest_core = src_core.copy()
+    other_core = rng.random(len(src_core)) < SPIKE_INTRA_CORE_PROB
+    # Pick from every core except the source core
+    offset = rng.integers(1, max(cores, 2), size=len(src_core))
+    dest_core[other_core] = (src_core + offset)[other_core] % cores
+    dest_axon = rng.integers(0, TRUENORTH_AXONS, size=len(src_core))
+    population.connect(population, np.arange(len(src_core)),
+                       dest_core*TRUENORTH_AXONS + dest_axon, weight)
 
     network.save(NETWORK_FILENAME)
 
@@ -0,0 +1,29 @@
+"""
+Copyright (c) 2023 - The University of Texas at Austin
+This work was produced under contract #2317831 to National Technology and
+Engineering Solutions of Sandia, LLC which is under contract
+No. DE-NA0003525 with the U.S. Department of Energy.
+
+convert_network.py - Convert SNN descriptions between the text (.net) and
+binary (.netb) formats
+"""
+# Python built-in libraries
+import argparse
+import sys
+import os
+
+# SANA-FE libraries
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath((os.path.join(SCRIPT_DIR, os.pardir)))
+sys.path.insert(0, PROJECT_DIR)
+import sim
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python convert_network.py",
+        description="Convert a network between .net and .netb formats")
+    parser.add_argument("input", help="Network file to convert", type=str)
+    parser.add_argument("output", help="Converted network file", type=str)
+    args = parser.parse_args()
+
+    sim.convert_network(args.input, args.output)
@@ -146,10 +146,11 @@ if __name__ == "__main__":
 
             # Use a pre-generated network for a realistic use case i.e.
             #  dvs-gesture
-            sim.run(ARCH_PATH, GENERATED_NETWORK_PATH, timesteps)
+            results = sim.run(ARCH_PATH, GENERATED_NETWORK_PATH, timesteps,
+                              perf_trace=False)
             # Parse the detailed perf statistics
             print("Reading performance data")
-            stats = pd.read_csv(os.path.join(PROJECT_DIR, "perf.csv"))
+            stats = pd.DataFrame(results["perf"])
             analysis = parse_stats(stats)
             times = np.append(times, analysis["times"])
             energies = np.append(energies, analysis["total_energy"] / timesteps)
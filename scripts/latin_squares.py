@@ -63,44 +63,23 @@ def latin_square(N, tiles=LOIHI_TILES, cores_per_tile=LOIHI_CORES_PER_TILE,
         square.append(row)
 
     # Connect such that every digit in one position inhibits all other digits in
-    #  that position
+    #  that position, and the same digit at all other rows and columns
     connections = 0
+    wta_src, wta_dest, wta_weights = sim.winner_take_all_connections(N, -1)
+    digits, _, digit_weights = sim.one_to_one_connections(N, -1)
     for row in range(0, N):
         for col in range(0, N):
             pos = square[row][col]
-            for digit in range(0, N):
-                pre_neuron = pos.neurons[digit]
-                for d in range(0, N):
-                    if d != digit:
-                        # Add inhibiting connection for all other digits at this
-                        #  position
-                        post_neuron = pos.neurons[d]
-                        pre_neuron.add_connection(post_neuron, -1)
-                        i = calculate_graph_index(N, row, col, digit)
-                        j = calculate_graph_index(N, row, col, d)
-                        # G.add_edge(i, j, weights=-1)
-                        connections += 1
-
-                for r in range(0, N):
-                    if r != row:
-                        # Add inhibiting connection for this digit at all other
-                        #  rows
-                        dest = square[r][col]
-                        post_neuron = dest.neurons[digit]
-                        pre_neuron.add_connection(post_neuron, -1)
-                        j = calculate_graph_index(N, r, col, digit)
-                        # G.add_edge(i, j, weights=-1)
-                        connections += 1
-
-                for c in range(0, N):
-                    if c != col:
-                        # Add inhibiting connection for this digit at other cols
-                        dest = square[row][c]
-                        post_neuron = dest.neurons[digit]
-                        pre_neuron.add_connection(post_neuron, -1)
-                        j = calculate_graph_index(N, row, c, digit)
-                        # G.add_edge(i, j, weights=-1)
-                        connections += 1
+            pos.connect(pos, wta_src, wta_dest, wta_weights)
+            connections += len(wta_src)
+            for r in range(0, N):
+                if r != row:
+                    pos.connect(square[r][col], digits, digits, digit_weights)
+                    connections += N
+            for c in range(0, N):
+                if c != col:
+                    pos.connect(square[row][c], digits, digits, digit_weights)
+                    connections += N
 
     print(f"Latin square network has {connections} connections")
     network_filename = os.path.join("runs", "dse", f"latin_square_N{N}.net")
@@ -15,7 +15,6 @@ import pandas as pd
 
 # Python built-in libraries
 import subprocess
-import random
 import csv
 import yaml
 import sys
@@ -28,7 +27,7 @@ sys.path.insert(0, PROJECT_DIR)
 import sim
 
 # Use a dumb seed to get consistent results
-random.seed(1)
+rng = np.random.default_rng(1)
 
 EXPERIMENT = "tiny"
 # Global experiment parameters
@@ -47,37 +46,24 @@ def create_random_network(cores, neurons_per_core, messages_per_neuron,
                                            neurons_per_core)
 
     neurons = cores * neurons_per_core
-    mappings = []
-    for i in range(0, cores):
-        m = (i/4, i%4)
-        mappings.extend((m,) * neurons_per_core)
 
     print("Creating neuron population")
+    # Filling cores in order places neurons_per_core neurons on each core
     population = sim.create_layer(network, neurons,
                                   compartments, log_spikes=0, log_potential=0,
                                   force_update=0, threshold=0.0, reset=0.0,
-                                  leak=0.0, mappings=mappings)
+                                  leak=0.0)
 
     print("Generating randomized network connections")
     weight = 1.0
     print(f"Cores: {cores}, messages per neuron: {messages_per_neuron}")
     print(f"neurons per core: {neurons_per_core}, spikes per message: {spikes_per_message}")
-    for n in range(0, neurons):
-        src = population.neurons[n]
-        # All neurons with outgoing connections should fire every timestep
-        src.add_bias(1.0)
-        if (n % 1024) == 0:
-            print(f"Generating synaptic connections for neuron {n}")
-
-        dest_core = random.sample(range(0, cores), messages_per_neuron)
-        for c in dest_core:
-            dest_neurons = random.sample(range(0, neurons_per_core),
-                                         spikes_per_message)
-            for d in dest_neurons:
-                dest_id = (c * neurons_per_core) + d
-                assert(dest_id < neurons)
-                dest = population.neurons[dest_id]
-                src.add_connection(dest, weight)
+    # All neurons with outgoing connections should fire every timestep
+    population.neuron_bias[:] = 1.0
+    dest_cores = population.tiles*LOIHI_CORES_PER_TILE + population.cores
+    population.connect(population, *sim.fan_out_connections(
+        neurons, dest_cores, messages_per_neuron, spikes_per_message, weight,
+        rng))
 
     network.save(NETWORK_FILENAME)
 
@@ -122,10 +108,9 @@ if __name__ == "__main__":
 
             for line in reader:
                 results = sim.run(ARCH_FILENAME, line["network"], TIMESTEPS,
-                                  perf_trace=True)
+                                  perf_trace=False, write_summary=False)
                 print(results)
-                df = pd.read_csv("perf.csv")
-                line["total_spikes"] = df.loc[2, "fired"]
+                line["total_spikes"] = results["perf"]["fired"][2]
                 #line["loihi_energy"] = float(line["loihi_energy"])
                 #line["loihi_latency"] = float(line["loihi_latency"])
                 line["sim_energy"] = results["energy"] / TIMESTEPS
@@ -0,0 +1,100 @@
+"""
+Copyright (c) 2023 - The University of Texas at Austin
+This work was produced under contract #2317831 to National Technology and
+Engineering Solutions of Sandia, LLC which is under contract
+No. DE-NA0003525 with the U.S. Department of Energy.
+
+scheduler_benchmark.py - Measure how message scheduling scales with cores
+
+Generate random networks where every neuron fires on every timestep, spread
+over an increasing number of cores. Each neuron sends a fixed number of
+messages, so the total message count grows with the number of cores and
+the global message scheduler dominates the simulation run-time.
+"""
+# Python built-in libraries
+import subprocess
+import random
+import yaml
+import sys
+import os
+
+# SANA-FE libraries
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath((os.path.join(SCRIPT_DIR, os.pardir)))
+sys.path.insert(0, PROJECT_DIR)
+import sim
+
+# Use a fixed seed to get consistent results
+random.seed(1)
+
+ARCH_FILENAME = os.path.join(PROJECT_DIR, "arch", "loihi.yaml")
+RUN_DIR = os.path.join(PROJECT_DIR, "runs", "scheduler")
+NETWORK_FILENAME = os.path.join(RUN_DIR, "scheduler.net")
+CORES_PER_TILE = 4
+NEURONS_PER_CORE = 64
+MESSAGES_PER_NEURON = 4
+TIMESTEPS = 20
+SCHEDULERS = (("serial", ()), ("parallel", ("-c",)))
+
+
+def create_network(cores, neurons_per_core, messages_per_neuron):
+    # Write the network description directly, every neuron is biased so
+    #  that it fires every timestep
+    neurons = cores * neurons_per_core
+    messages_per_neuron = min(messages_per_neuron, cores)
+    with open(NETWORK_FILENAME, "w") as network_file:
+        network_file.write(f"g {neurons} soma_model=leaky_integrate_fire "
+                           "soma_hw_name=loihi_lif "
+                           "synapse_hw_name=loihi_sparse_synapse "
+                           "threshold=0.5 reset=0.0 reset_mode=hard\n")
+        for n in range(0, neurons):
+            network_file.write(f"n 0.{n} bias=1.0 "
+                               f"connections_out={messages_per_neuron}\n")
+        for n in range(0, neurons):
+            dest_cores = random.sample(range(0, cores), messages_per_neuron)
+            for c in dest_cores:
+                dest_id = ((c * neurons_per_core) +
+                           random.randrange(0, neurons_per_core))
+                network_file.write(f"e 0.{n}->0.{dest_id} w=1.0\n")
+        for n in range(0, neurons):
+            core = n // neurons_per_core
+            network_file.write(f"& 0.{n}@{core // CORES_PER_TILE}."
+                               f"{core % CORES_PER_TILE}\n")
+
+
+def run_benchmark(core_counts):
+    parsed_filename = os.path.join(RUN_DIR,
+                                   os.path.basename(ARCH_FILENAME) + ".parsed")
+    sim.parse_file(ARCH_FILENAME, parsed_filename)
+
+    results = []
+    for cores in core_counts:
+        create_network(cores, NEURONS_PER_CORE, MESSAGES_PER_NEURON)
+        for scheduler, flags in SCHEDULERS:
+            run_command = ((os.path.join(PROJECT_DIR, "sim"),) + flags +
+                           (parsed_filename, NETWORK_FILENAME,
+                            f"{TIMESTEPS}"))
+            print("sana-fe command: {0}".format(" ".join(run_command)))
+            subprocess.call(run_command, cwd=PROJECT_DIR,
+                            stdout=subprocess.DEVNULL)
+
+            with open(os.path.join(PROJECT_DIR, "run_summary.yaml"),
+                      "r") as summary_file:
+                summary = yaml.safe_load(summary_file)
+            results.append((cores, scheduler, summary["total_packets"],
+                            summary["time"], summary["wall_time"]))
+
+    return results
+
+
+if __name__ == "__main__":
+    os.makedirs(RUN_DIR, exist_ok=True)
+    core_counts = (1, 2, 4, 8, 16, 32, 64, 128)
+    results = run_benchmark(core_counts)
+
+    print("cores,scheduler,packets,sim_time,wall_time,"
+          "wall_time_per_timestep,wall_time_per_packet")
+    for cores, scheduler, packets, sim_time, wall_time in results:
+        print(f"{cores},{scheduler},{packets},{sim_time:e},{wall_time:e},"
+              f"{wall_time / TIMESTEPS:e},"
+              f"{wall_time / max(packets, 1):e}")
@@ -31,7 +31,7 @@ void sim_init_fifo(struct message_fifo *f)
 	f->count = 0;
 	f->head = NULL;
 	f->tail = NULL;
-	f->next = NULL;
+	f->priority_order = 0L;
 }
 
 void sim_timestep(struct timestep *const ts,
@@ -46,12 +46,22 @@ void sim_timestep(struct timestep *const ts,
 	sim_process_neurons(ts, net, arch);
 	sim_receive_messages(ts, arch);
 
-	ts->sim_time = sim_schedule_messages(ts->message_queues);
+	if (arch->parallel_schedule_on)
+	{
+		ts->sim_time = sim_schedule_messages_parallel(
+			ts->message_queues, ts->core_count, arch->tile_count,
+			sim_thread_count(arch));
+	}
+	else
+	{
+		ts->sim_time = sim_schedule_messages(ts->message_queues,
+			ts->core_count);
+	}
 	// Performance statistics for this time step
 	ts->energy = sim_calculate_energy(arch);
 
 	// Setup spike vector
-	vector<int> spike_tile_vec = vector<int>(ARCH_MAX_TILES);
+	vector<int> spike_tile_vec = vector<int>(arch->tile_count);
 
 	for (int i = 0; i < arch->tile_count; i++)
 	{
@@ -105,24 +115,129 @@ struct simulation *sim_init_sim(void)
 	sim->log_potential = 0;
 	sim->log_spikes = 0;
 	sim->log_messages = 0;
+	sim->log_spikes_binary = 0;
+	sim->spike_trace_buffer = NULL;
+	sim->spike_trace_buffer_used = 0;
+	sim->spike_trace_last_timestep = 0;
+	sim->spike_trace_last_group_id = 0;
+	sim->spike_trace_last_neuron_id = 0;
+	sim->potential_probes = NULL;
+	sim->potential_probe_values = NULL;
+	sim->potential_probe_count = 0;
+	sim->potential_probe_interval = 1;
+	sim->log_potential_binary = 0;
+	sim->perf = NULL;
+	sim->perf_count = 0;
+	sim->perf_capacity = 0;
+	sim->record_spikes = 0;
+	for (int i = 0; i < NETWORK_MAX_NEURON_GROUPS; i++)
+	{
+		sim->spike_record_groups[i] = 1;
+	}
+	sim->spike_record_timesteps = NULL;
+	sim->spike_record_group_ids = NULL;
+	sim->spike_record_neuron_ids = NULL;
+	sim->spike_record_count = 0;
+	sim->spike_record_capacity = 0;
+	sim->log_messages_binary = 0;
+	sim->message_trace_interval = 1;
+	sim->message_trace_cores = NULL;
+	sim->message_trace_core_count = 0;
+	sim->message_trace_fraction = 1.0;
+	sim->message_trace_rng = RAND_SEED;
+	sim->message_trace_buffer = NULL;
+	sim->message_trace_buffer_used = 0;
+	sim->writer = NULL;
 
 	sim->potential_trace_fp = NULL;
 	sim->spike_trace_fp = NULL;
 	sim->perf_fp = NULL;
 	sim->message_trace_fp = NULL;
 	sim->stats_fp = NULL;
-	for (int i = 0; i < ARCH_MAX_CORES; i++)
+	sim->gui_on = 0;
+
+	// Message buffers are allocated once the network has been mapped
+	sim->ts.timestep = 0L;
+	sim->ts.core_count = 0;
+	sim->ts.messages = NULL;
+	sim->ts.message_arena = NULL;
+	sim->ts.message_queues = NULL;
+
+	return sim;
+}
+
+void sim_allocate_messages(struct timestep *const ts,
+	const struct architecture *const arch)
+{
+	// Size each core's message arena using the number of output connection
+	//  maps, after the connection maps have been created. A core sends at
+	//  most one message per map per timestep, plus one dummy message. The
+	//  buffers are kept for all timesteps
+	long int total_messages = 0L;
+
+	sim_free_messages(ts);
+	ts->core_count = arch->core_count;
+	ts->messages = (struct message **) malloc(
+		sizeof(struct message *) * ts->core_count);
+	ts->message_queues = (struct message_fifo *) malloc(
+		sizeof(struct message_fifo) * ts->core_count);
+	if ((ts->messages == NULL) || (ts->message_queues == NULL))
 	{
-		sim_init_fifo(&(sim->ts.message_queues[i]));
+		INFO("Error: Couldn't allocate message queues.\n");
+		exit(1);
 	}
 
-	return sim;
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		const struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			const struct core *c = &(t->cores[j]);
+			total_messages += c->axon_out.map_count + 1;
+		}
+	}
+	TRACE1("Allocating %ld messages.\n", total_messages);
+	ts->message_arena = (struct message *) malloc(
+		sizeof(struct message) * total_messages);
+	if (ts->message_arena == NULL)
+	{
+		INFO("Error: Couldn't allocate %ld messages.\n",
+			total_messages);
+		exit(1);
+	}
+
+	total_messages = 0L;
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		const struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			const struct core *c = &(t->cores[j]);
+			assert(c->id < ts->core_count);
+			ts->messages[c->id] = &(ts->message_arena[total_messages]);
+			total_messages += c->axon_out.map_count + 1;
+			sim_init_fifo(&(ts->message_queues[c->id]));
+		}
+	}
+
+	return;
+}
+
+void sim_free_messages(struct timestep *const ts)
+{
+	free(ts->messages);
+	free(ts->message_arena);
+	free(ts->message_queues);
+	ts->messages = NULL;
+	ts->message_arena = NULL;
+	ts->message_queues = NULL;
+	ts->core_count = 0;
 }
 
 void sim_init_timestep(struct timestep *const ts)
 {
 	ts->spike_count = 0L;
-	for (int i = 0; i < ARCH_MAX_CORES; i++)
+	for (int i = 0; i < ts->core_count; i++)
 	{
 		sim_init_fifo(&(ts->message_queues[i]));
 	}
@@ -134,1319 +249,3176 @@ void sim_init_timestep(struct timestep *const ts)
 	ts->packets_sent = 0L;
 }
 
+int sim_thread_count(const struct architecture *const arch)
+{
+	if (arch->thread_count > 0)
+	{
+		return arch->thread_count;
+	}
+	return omp_get_max_threads();
+}
+
 void sim_process_neurons(struct timestep *const ts, struct network *net,
 	struct architecture *arch)
 {
-#pragma omp parallel for
-	for (int i = 0; i < arch->tile_count; i++)
+	// Every core is a separate work item, since the work per tile can be
+	//  very uneven. The busiest cores are listed (and handed out) first
+#pragma omp parallel for schedule(dynamic) num_threads(sim_thread_count(arch))
+	for (int i = 0; i < arch->core_count; i++)
 	{
-		struct tile *t = &(arch->tiles[i]);
+		struct core *c = arch->cores[i];
+		struct message *dummy_message;
+		int message_count;
 
-		for (int j = 0; j < t->core_count; j++)
+		if (arch->event_driven_on && (c->buffer_pos == BUFFER_SOMA))
 		{
-			struct core *c = &(t->cores[j]);
-			struct message *dummy_message;
-			int message_count;
+			sim_process_active_neurons(ts, c);
+		}
+		else
+		{
+			sim_process_core_neurons(ts, c);
+		}
 
-			for (int k = 0; k < c->neuron_count; k++)
-			{
-				struct neuron *n = c->neurons[k];
-				assert(n != NULL);
-				sim_process_neuron(ts, n);
-			}
+		message_count = ts->message_queues[c->id].count;
+		// Add a dummy message to account for neuron processing
+		//  that does not result in any sent messages. To do
+		//  this, set the dest neuron set as invalid with a 0
+		//  receiving latency)
+		dummy_message = &(ts->messages[c->id][message_count]);
+		*dummy_message = c->next_message;
+		dummy_message->dest_neuron = NULL;
+		dummy_message->receive_latency = 0.0;
+		dummy_message->network_latency = 0.0;
+
+		sim_message_fifo_push(&(ts->message_queues[c->id]),
+			dummy_message);
+	}
+}
+
+void sim_process_core_neurons(struct timestep *const ts, struct core *c)
+{
+	// Process the neurons in chunks, updating somas that support it in
+	//  blocks first. Each chunk's state stays in cache between the soma
+	//  and the rest of the neuron updates
+	int run_id = 0;
 
-			message_count = ts->message_queues[c->id].count;
-			// Add a dummy message to account for neuron processing
-			//  that does not result in any sent messages. To do
-			//  this, set the dest neuron set as invalid with a 0
-			//  receiving latency)
-			dummy_message = &(ts->messages[c->id][message_count]);
-			*dummy_message = c->next_message;
-			dummy_message->dest_neuron = NULL;
-			dummy_message->receive_latency = 0.0;
-			dummy_message->network_latency = 0.0;
+	for (int first = 0; first < c->neuron_count; first += SIM_NEURON_CHUNK)
+	{
+		const int last = MIN(first + SIM_NEURON_CHUNK, c->neuron_count);
 
-			sim_message_fifo_push(&(ts->message_queues[c->id]),
-				dummy_message);
+		if (c->buffer_pos == BUFFER_SOMA)
+		{
+			run_id = sim_update_soma_blocks(c, first, last, run_id);
+		}
+		for (int k = first; k < last; k++)
+		{
+			struct neuron *n = c->neurons[k];
+			assert(n != NULL);
+			sim_process_neuron(ts, n);
 		}
 	}
 }
 
-void sim_receive_messages(struct timestep *const ts,
-	struct architecture *arch)
+int sim_update_soma_blocks(struct core *c, const int first, const int last,
+	int run_id)
 {
-#pragma omp parallel for
-	for (int i = 0; i < arch->tile_count; i++)
+	// Update the somas of a core's neurons in [first, last) that use a
+	//  block plugin, with one call for each run of neurons sharing the
+	//  same block. The rest of each neuron's update then uses the new
+	//  status, in order. A soma update only depends on that neuron's input
+	//  and state, so this gives the same results as updating each neuron
+	//  in turn. Runs are visited in order, starting from run_id, and the
+	//  first run that might overlap the next chunk is returned
+	for (; run_id < c->soma_block_run_count; run_id++)
 	{
-		struct tile *t = &(arch->tiles[i]);
+		const struct soma_block_run *run = &(c->soma_block_runs[run_id]);
+		class Base_Soma_Block *block = run->group->soma_block;
+		const int start = MAX(run->first, first);
+		const int end = MIN(run->first + run->count, last);
 
-		for (int j = 0; j < t->core_count; j++)
+		if (run->first >= last)
 		{
-			struct core *c = &(t->cores[j]);
-			for (int k = 0; k < c->axon_in.map_count; k++)
+			break;
+		}
+		if (end > start)
+		{
+			for (int k = start; k < end; k++)
 			{
-				struct connection_map *axon =
-					&(c->axon_in.map[k]);
-				if (axon->spikes_received > 0)
-				{
-					struct neuron *pre_neuron =
-						axon->pre_neuron;
-					assert(pre_neuron != NULL);
-					struct core *pre_core =
-						pre_neuron->core;
-					assert(pre_core != NULL);
-					struct tile *pre_tile = pre_core->t;
-					assert(pre_tile != NULL);
-					axon->message->network_latency =
-						sim_estimate_network_costs(
-							pre_tile, t);
-					axon->message->receive_latency =
-						sim_pipeline_receive(
-							ts, c, axon);
-				}
+				c->soma_block_inputs[k] = c->neuron_state[k].charge;
 			}
+			block->update_soma(end - start,
+				&(c->soma_block_ids[start]),
+				&(c->soma_block_inputs[start]),
+				&(c->soma_block_status[start]));
+			for (int k = start; k < end; k++)
+			{
+				c->neuron_state[k].neuron_status =
+					c->soma_block_status[k];
+			}
+		}
+		if ((run->first + run->count) > last)
+		{
+			// This run continues into the next chunk
+			break;
 		}
 	}
+
+	return run_id;
 }
 
-double sim_estimate_network_costs(struct tile *const src,
-	struct tile *const dest)
+static int sim_compare_ints(const void *a, const void *b)
 {
-	double network_latency;
-	long int x_hops, y_hops;
-
-	assert(src != NULL);
-	assert(dest != NULL);
-
-	network_latency = 0.0;
-
-	// Calculate the energy and time for sending spike packets
-	x_hops = abs(src->x - dest->x);
-	y_hops = abs(src->y - dest->y);
-	// E-W hops
+	return (*((const int *) a) - *((const int *) b));
+}
 
-	if (src->x < dest->x)
-	{
-		dest->east_hops += x_hops;
-		network_latency += (double) x_hops * src->latency_east_hop;
-	}
-	else
+void sim_process_active_neurons(struct timestep *const ts, struct core *c)
+{
+	// Event-driven update of a core's neurons. Only the neurons listed as
+	//  active are updated, i.e. neurons that received spikes, are biased,
+	//  forced to update or were not idle after their last update. An idle
+	//  neuron's update has no effect other than the latency of accessing
+	//  it, so only the latency of each idle neuron is added. Latencies are
+	//  added one at a time in neuron order, the same as a full update, as
+	//  rounding differences would change the order messages are scheduled
+	int *neurons = c->active_neurons;
+	const int count = c->active_count;
+	int next = 0;
+
+	assert(c->neuron_active != NULL);
+	// Start the list for next timestep, reusing last timestep's list
+	c->active_neurons = c->updated_neurons;
+	c->active_count = 0;
+	c->updated_neurons = neurons;
+	c->updated_count = count;
+	qsort(neurons, count, sizeof(int), sim_compare_ints);
+	for (int i = 0; i < count; i++)
 	{
-		dest->west_hops += x_hops;
-		network_latency += (double) x_hops * src->latency_west_hop;
+		c->neuron_active[neurons[i]] = 0;
 	}
 
-	// N-S hops
-	if (src->y < dest->y)
-	{
-		dest->north_hops += y_hops;
-		network_latency += (double) y_hops * src->latency_north_hop;
-	}
-	else
+	for (int first = 0; first < count; first += SIM_NEURON_CHUNK)
 	{
-		dest->south_hops += y_hops;
-		network_latency += (double) y_hops * src->latency_south_hop;
-	}
+		const int last = MIN(first + SIM_NEURON_CHUNK, count);
 
-	dest->hops += (x_hops + y_hops);
-	dest->messages_received++;
-	TRACE1("xhops:%ld yhops%ld total hops:%ld latency:%e\n", x_hops, y_hops,
-		t->hops, network_latency);
-	return network_latency;
+		sim_update_active_soma_blocks(c, first, last);
+		for (int i = first; i < last; i++)
+		{
+			const int k = neurons[i];
+			struct neuron *n = c->neurons[k];
+			assert(n != NULL);
+
+			sim_add_idle_latency(c, next, k);
+			sim_process_neuron(ts, n);
+			if (sim_neuron_is_active(n))
+			{
+				sim_activate_neuron(n);
+			}
+			next = k + 1;
+		}
+	}
+	sim_add_idle_latency(c, next, c->neuron_count);
 }
 
-struct message *sim_message_fifo_pop(struct message_fifo *queue)
+void sim_update_active_soma_blocks(struct core *c, const int first,
+	const int last)
 {
-	struct message *m;
-
-	assert(queue->count >= 0);
-	if (queue->count == 0)
-	{
-		m = NULL;
-	}
-	else
+	// Update the somas of the active neurons listed in [first, last) that
+	//  use a block plugin, with one call for each run of listed neurons
+	//  in the same group. Ids, inputs and statuses are gathered into
+	//  arrays indexed by list position
+	const int *neurons = c->updated_neurons;
+	int i = first;
+
+	while (i < last)
 	{
-		assert(queue->tail != NULL);
-		assert(queue->head != NULL);
-		queue->count--;
-		m = queue->tail;
-		queue->tail = queue->tail->next;
-		if (queue->count <= 0)
+		const struct neuron *n = c->neurons[neurons[i]];
+		class Base_Soma_Block *block = n->group->soma_block;
+		const int start = i;
+
+		if (!n->is_init || (block == NULL))
 		{
-			queue->head = NULL;
+			i++;
+			continue;
+		}
+		while ((i < last) && c->neurons[neurons[i]]->is_init &&
+			(c->neurons[neurons[i]]->group == n->group))
+		{
+			const int k = neurons[i];
+			c->soma_block_active_ids[i] = c->soma_block_ids[k];
+			c->soma_block_inputs[i] = c->neuron_state[k].charge;
+			i++;
+		}
+		block->update_soma(i - start, &(c->soma_block_active_ids[start]),
+			&(c->soma_block_inputs[start]),
+			&(c->soma_block_status[start]));
+		for (int j = start; j < i; j++)
+		{
+			c->neuron_state[neurons[j]].neuron_status =
+				c->soma_block_status[j];
 		}
 	}
-
-	return m;
 }
 
-void sim_message_fifo_push(struct message_fifo *queue, struct message *m)
+void sim_add_idle_latency(struct core *c, const int first, const int last)
 {
-	assert(queue != NULL);
-	assert(queue->count >= 0);
-	assert(m != NULL);
-
-	m->next = NULL;
-	if (queue->count == 0)
-	{
-		queue->tail = m;
-	}
-	else
+	// Add the latency of accessing the idle neurons in [first, last)
+	for (int k = first; k < last; k++)
 	{
-		queue->head->next = m;
+		const struct neuron *n = c->neurons[k];
+		if (n->is_init)
+		{
+			c->next_message.generation_latency +=
+				n->soma_hw->latency_access_neuron;
+		}
 	}
-	queue->head = m;
-	queue->count++;
 }
 
-double sim_schedule_messages(struct message_fifo *const messages_sent)
+void sim_init_neuron_state(struct architecture *const arch)
 {
-	struct message_fifo *priority_queue;
-	double last_timestamp, t;
-
-	priority_queue = sim_init_timing_priority(messages_sent);
-	last_timestamp = 0.0;
-	// Setup timing counters
-	TRACE1("Scheduling global order of messages.\n");
-
-	// While queue isn't empty
-	while (priority_queue != NULL)
+	// Allocate the state of every mapped neuron, storing it contiguously
+	//  for each core. This is done once all neurons are mapped, so that
+	//  the arrays are not moved afterwards
+	for (int i = 0; i < arch->tile_count; i++)
 	{
-		// Get the core with the earliest simulation time
-		struct message_fifo *q =
-			sim_pop_priority_queue(&priority_queue);
-		struct message *m = sim_message_fifo_pop(q);
-		last_timestamp = fmax(last_timestamp, m->generation_latency);
-
-		if (m->dest_neuron != NULL)
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
 		{
-			if (m->dest_neuron->core->t->is_blocking)
+			struct core *c = &(t->cores[j]);
+
+			free(c->neuron_state);
+			free(c->soma_block_runs);
+			free(c->soma_block_ids);
+			free(c->soma_block_inputs);
+			free(c->soma_block_status);
+			c->neuron_state = (struct neuron_state *) malloc(
+				sizeof(struct neuron_state) * c->neuron_count);
+			c->soma_block_runs = (struct soma_block_run *) malloc(
+				sizeof(struct soma_block_run) * c->neuron_count);
+			c->soma_block_ids = (int *) malloc(
+				sizeof(int) * c->neuron_count);
+			c->soma_block_inputs = (double *) malloc(
+				sizeof(double) * c->neuron_count);
+			c->soma_block_status = (Neuron_Status *) malloc(
+				sizeof(Neuron_Status) * c->neuron_count);
+			if ((c->neuron_count > 0) &&
+				((c->neuron_state == NULL) ||
+				(c->soma_block_runs == NULL) ||
+				(c->soma_block_ids == NULL) ||
+				(c->soma_block_inputs == NULL) ||
+				(c->soma_block_status == NULL)))
 			{
-				m->blocked_latency = fmax(m->blocked_latency,
-					m->dest_neuron->core->t->blocked_until -
-					m->sent_timestamp);
-				// Update the core global time, blocking until
-				//  the receiving tile is free
-				m->sent_timestamp = fmax(m->sent_timestamp,
-					m->dest_neuron->core->t->blocked_until);
+				INFO("Error: Couldn't allocate neuron state.\n");
+				exit(1);
 			}
-			if (m->dest_neuron->core->is_blocking)
+
+			for (int k = 0; k < c->neuron_count; k++)
 			{
-				// Track how long the message is blocked for
-				m->blocked_latency = fmax(m->blocked_latency,
-					m->dest_neuron->core->blocked_until -
-					m->sent_timestamp);
-				// Update the core global time, blocking until
-				//  the receiving core is free
-				m->sent_timestamp = fmax(m->sent_timestamp,
-					m->dest_neuron->core->blocked_until);
-
-				if (m->sent_timestamp <
-					m->dest_neuron->core->blocked_until)
-				{
-					// If we were trying to send a spike to
-					//  a blocked core, also block the tile
-					//  for this duration as well
-					m->dest_neuron->core->t->blocked_until =
-					m->dest_neuron->core->blocked_until;
-					// Update the core global time, blocking
-					//  until the receiving core is free
-					m->sent_timestamp =
-					m->dest_neuron->core->blocked_until;
-				}
+				struct neuron *n = c->neurons[k];
+				struct neuron_state *state = &(c->neuron_state[k]);
+
+				// Set the initial update state, no spikes can
+				//  arrive before the first time-step but we can
+				//  force the neuron to update
+				state->charge = 0.0;
+				state->current = 0.0;
+				state->processing_latency = 0.0;
+				state->neuron_status = IDLE;
+				state->fired = 0;
+				state->update_needed = n->force_update;
+				state->spike_count = 0;
+				state->forced_spikes = 0;
+				state->soma_last_updated = 0;
+				state->dendrite_last_updated = 0;
+				n->state = state;
 			}
-
-			// Set time-stamps, calculating when the receiving H/W will be
-			//  busy until
-			m->sent_timestamp += m->network_latency;
-			last_timestamp =
-				fmax(last_timestamp, m->sent_timestamp);
-			// TODO: for some reason this seems quite important for DVS
-			//  gesture accuracy. The core is busy until the message is
-			//  delivered by the network
-			m->dest_neuron->core->blocked_until = fmax(
-				(m->dest_neuron->core->blocked_until +
-				m->network_latency + m->receive_latency),
-				(m->sent_timestamp + m->receive_latency));
-			m->processed_timestamp =
-				m->dest_neuron->core->blocked_until;
-			last_timestamp =
-				fmax(last_timestamp, m->processed_timestamp);
-
-			TRACE2("\t(cid:%d.%d) synapse at %d.%d busy until %e\n",
-				c->t->id, c->id, m->dest_core->t->id,
-				m->dest_core->id, m->dest_core->blocked_until);
+			sim_init_soma_block_runs(c);
 		}
+	}
+}
 
+void sim_init_soma_block_runs(struct core *c)
+{
+	// Find the runs of neurons in this core that can be updated together
+	//  i.e., initialized neurons in the same group, with a soma block
+	struct soma_block_run *run = NULL;
 
+	c->soma_block_run_count = 0;
+	for (int k = 0; k < c->neuron_count; k++)
+	{
+		const struct neuron *n = c->neurons[k];
 
-		// The time that the last message sent is the time that we
-		//  start the next message's processing
-		t = m->sent_timestamp;
-		// Get the next message, neuron or core
-		m = q->tail;
-		// Regardless of whether we are sending a message, add the
-		//  processing time
-		if (m != NULL)
-		{
-			m->sent_timestamp = t + m->generation_latency;
-			last_timestamp =
-				fmax(last_timestamp, m->sent_timestamp);
-			sim_insert_priority_queue(&priority_queue, q);
-		}
-		else
+		c->soma_block_ids[k] = n->id;
+		if (!n->is_init || (n->group->soma_block == NULL))
 		{
-			TRACE2("\t(cid:%d.%d) finished simulating\n", c->t->id,
-				c->id);
+			run = NULL;
+			continue;
 		}
-
-		if (priority_queue != NULL)
+		if ((run == NULL) || (run->group != n->group))
 		{
-			TRACE2("\t(cid:%d.%d) time:%e\n",
-				(*priority_queue)->t->id,
-				(*priority_queue)->id, (*priority_queue)->time);
+			run = &(c->soma_block_runs[c->soma_block_run_count++]);
+			run->group = n->group;
+			run->first = k;
+			run->count = 0;
 		}
+		run->count++;
 	}
-	TRACE1("Neurons fired: %ld\n", ts->total_neurons_fired);
-
-	return last_timestamp;
 }
 
-void sim_process_neuron(struct timestep *const ts, struct neuron *n)
+void sim_init_active_neurons(struct architecture *const arch)
 {
-	if (!n->is_init)
+	// Setup the event-driven state for every core, initially all neurons
+	//  are active so that they are updated at least once
+	for (int i = 0; i < arch->tile_count; i++)
 	{
-		return;
-	}
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			struct core *c = &(t->cores[j]);
 
-	struct core *c = n->core;
-	n->processing_latency = 0.0;
+			free(c->neuron_active);
+			free(c->active_neurons);
+			free(c->updated_neurons);
+			free(c->soma_block_active_ids);
+			c->neuron_active = (char *) malloc(
+				sizeof(char) * c->neuron_count);
+			c->active_neurons = (int *) malloc(
+				sizeof(int) * c->neuron_count);
+			c->updated_neurons = (int *) malloc(
+				sizeof(int) * c->neuron_count);
+			c->soma_block_active_ids = (int *) malloc(
+				sizeof(int) * c->neuron_count);
+			if ((c->neuron_count > 0) &&
+				((c->neuron_active == NULL) ||
+				(c->active_neurons == NULL) ||
+				(c->updated_neurons == NULL) ||
+				(c->soma_block_active_ids == NULL)))
+			{
+				INFO("Error: Couldn't allocate active neurons.\n");
+				exit(1);
+			}
 
-	// TODO: I think there's a flaw here. We update synapses for the core,
-	//  not for the neuron. Then each neuron does have a single dendritic
-	//  tree. So it's just this, maybe we make it "process neurons"
-	if (c->buffer_pos == BUFFER_SYNAPSE)
-	{
-		for (int i = 0; i < n->maps_in_count; i++)
-		{
-			struct connection_map *axon = &(n->maps_in[i]);
-			n->processing_latency +=
-				sim_update_synapse(ts, axon, 1);
-		}
-	}
-	else if (c->buffer_pos == BUFFER_DENDRITE)
-	{
-		// Go through all synapses connected to this neuron and update
-		//  all synaptic currents into the dendrite
-		for (int i = 0; i < n->maps_in_count; i++)
-		{
-			struct connection_map *a = &(n->maps_in[i]);
-			for (int j = 0; j < a->connection_count; j++)
+			for (int k = 0; k < c->neuron_count; k++)
 			{
-				struct connection *con = a->connections[j];
-				n->processing_latency += sim_update_dendrite(
-					ts, n, con->current);
+				c->neuron_active[k] = (char) c->neurons[k]->is_init;
 			}
+			sim_list_active_neurons(c);
 		}
 	}
-	else if (c->buffer_pos == BUFFER_SOMA)
-	{
-		n->processing_latency = sim_update_soma(ts, n, n->charge);
-	}
-	else if (c->buffer_pos == BUFFER_AXON_OUT)
+}
+
+void sim_list_active_neurons(struct core *c)
+{
+	// List a core's active neurons from their flags. Every neuron is
+	//  listed as updated, so that they are all reset next timestep
+	c->active_count = 0;
+	for (int k = 0; k < c->neuron_count; k++)
 	{
-		if (n->fired)
+		if (c->neuron_active[k])
 		{
-			struct soma_processor *soma = n->soma_hw;
-			n->processing_latency = soma->latency_spiking;
-			sim_neuron_send_spike_message(ts, n);
+			c->active_neurons[c->active_count++] = k;
 		}
+		c->updated_neurons[k] = k;
 	}
-	TRACE1("Updating neuron %d.%d.\n", n->group->id, n->id);
+	c->updated_count = c->neuron_count;
+}
 
-	c->next_message.generation_latency += n->processing_latency;
-	n->update_needed = 0;
-	n->spike_count = 0;
+int sim_neuron_is_active(const struct neuron *const n)
+{
+	// A neuron must be updated next timestep if its state might change
+	//  without receiving any new spikes
+	const struct neuron_state *state = n->state;
+	return n->is_init && ((state->neuron_status != IDLE) ||
+		n->force_update || (state->forced_spikes > 0) ||
+		(state->charge != 0.0));
 }
 
-double sim_pipeline_receive(
-	struct timestep *const ts, struct core *c,
-	struct connection_map *axon)
+void sim_activate_neuron(struct neuron *const n)
 {
-	// We receive a spike and process up to the time-step buffer
-	double message_processing_latency = 0.0;
+	struct core *c = n->core;
 
-	TRACE1("Receiving messages for cid:%d\n", c->id);
-	if (c->buffer_pos >= BUFFER_SYNAPSE)
+	if ((c != NULL) && (c->neuron_active != NULL) &&
+		!c->neuron_active[n->local_id])
 	{
-		int synaptic_lookup = 1;
-		message_processing_latency =
-			sim_update_synapse(ts, axon, synaptic_lookup);
+		c->neuron_active[n->local_id] = 1;
+		c->active_neurons[c->active_count++] = n->local_id;
 	}
-
-	return message_processing_latency;
 }
 
-struct message_fifo *sim_init_timing_priority(
-	struct message_fifo *const message_queues)
+void sim_init_variant(struct sim_variant *const v,
+	struct simulation *const sim, const struct network *const net,
+	const struct architecture *const arch)
 {
-	struct message_fifo *priority_queue;
-	priority_queue = NULL;
-
-	TRACE1("Initializing priority queue.\n");
-	for (int i = 0; i < ARCH_MAX_CORES; i++)
+	v->sim = sim;
+	v->neuron_count = 0L;
+	v->connection_count = 0L;
+	v->map_count = 0L;
+	for (int i = 0; i < net->neuron_group_count; i++)
 	{
-		if ((message_queues[i]).count > 0) // messages
+		const struct neuron_group *group = &(net->groups[i]);
+		v->neuron_count += group->neuron_count;
+		for (int j = 0; j < group->neuron_count; j++)
 		{
-			struct message *m = (message_queues[i]).tail;
-			assert(m != NULL);
-			m->sent_timestamp = m->generation_latency;
-			sim_insert_priority_queue(&priority_queue,
-				&(message_queues[i]));
+			v->connection_count +=
+				group->neurons[j].connection_out_count;
 		}
-		else
+	}
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		const struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
 		{
-			TRACE1("No messages for core %d\n", i);
+			v->map_count += t->cores[j].axon_in.map_count;
 		}
 	}
 
-#ifdef DEBUG2
-	int i = 0;
-	for (struct core *curr = priority_queue; curr != NULL; curr = curr->next)
+	v->neurons = (struct neuron_state *) malloc(
+		sizeof(struct neuron_state) * v->neuron_count);
+	v->neuron_active = (char *) malloc(sizeof(char) * v->neuron_count);
+	v->maps = (struct connection_map_state *) malloc(
+		sizeof(struct connection_map_state) * v->map_count);
+	v->connection_currents = (double *) malloc(
+		sizeof(double) * v->connection_count);
+	if (((v->neuron_count > 0) &&
+		((v->neurons == NULL) || (v->neuron_active == NULL))) ||
+		((v->map_count > 0) && (v->maps == NULL)) ||
+		((v->connection_count > 0) && (v->connection_currents == NULL)))
 	{
-		// TODO
+		INFO("Error: Couldn't allocate batch variant.\n");
+		exit(1);
 	}
-#endif
-
-	return priority_queue;
 }
 
-struct message_fifo *sim_pop_priority_queue(
-	struct message_fifo **priority_queue)
+void sim_free_variant(struct sim_variant *const v)
 {
-	struct message_fifo *curr;
-
-	// Pop the first element from the priority queue
-	curr = *priority_queue;
-	*priority_queue = (*priority_queue)->next;
-
-	// For safety, remove current element from queue and unlink
-	curr->next = NULL;
-	return curr;
+	free(v->neurons);
+	free(v->neuron_active);
+	free(v->maps);
+	free(v->connection_currents);
+	v->neurons = NULL;
+	v->neuron_active = NULL;
+	v->maps = NULL;
+	v->connection_currents = NULL;
 }
 
-void sim_insert_priority_queue(struct message_fifo **priority_queue,
-	struct message_fifo *core_message_fifo)
+void sim_save_variant(struct sim_variant *const v,
+	const struct network *const net, const struct architecture *const arch)
 {
-	struct message_fifo *next;
-	int list_depth = 0;
-
-	// TODO: implement heap-based priority queue rather than list-based.
-	//  Will achieve O(lg N) insertion time rather than O(N)
-
-	assert(priority_queue != NULL);
-	assert(core_message_fifo != NULL);
+	// Copy the simulation state out of the network and architecture.
+	//  Neurons and connections are stored in network order, connection
+	//  maps in core order
+	long int neuron_id = 0L, connection_id = 0L, map_id = 0L;
 
-	//INFO("Inserting into priority queue.\n");
-	if (core_message_fifo->tail == NULL)
-	{
-		INFO("error?\n");
-	}
-	if (((*priority_queue) == NULL) ||
-		(core_message_fifo->tail->sent_timestamp <=
-		(*priority_queue)->tail->sent_timestamp))
-	{
-		// Queue is empty or this is the earliest time (highest
-		//  priority), make this core the head of the queue
-		core_message_fifo->next = (*priority_queue);
-		*priority_queue = core_message_fifo;
-	}
-	else
+	for (int i = 0; i < net->neuron_group_count; i++)
 	{
-		struct message_fifo *curr = *priority_queue;
-		next = curr->next;
-
-		// Reinsert core into the correct place in the priority list
-		while (next != NULL)
+		const struct neuron_group *group = &(net->groups[i]);
+		for (int j = 0; j < group->neuron_count; j++)
 		{
-			if (core_message_fifo->tail->sent_timestamp <
-				next->tail->sent_timestamp)
+			const struct neuron *n = &(group->neurons[j]);
+
+			v->neurons[neuron_id] = *(n->state);
+			v->neuron_active[neuron_id] = 1;
+			if (n->core->neuron_active != NULL)
 			{
-				break;
+				v->neuron_active[neuron_id] =
+					n->core->neuron_active[n->local_id];
+			}
+			neuron_id++;
+			for (int k = 0; k < n->connection_out_count; k++)
+			{
+				v->connection_currents[connection_id++] =
+					n->connections_out[k].current;
 			}
-			curr = next;
-			next = curr->next;
-			list_depth++;
 		}
-		curr->next = core_message_fifo;
-		core_message_fifo->next = next;
 	}
 
-#ifdef DEBUG
-	TRACE3("*** Priority queue ***\n");
-	for (struct core *tmp = *priority_queue; tmp != NULL;
-		tmp = tmp->next_timing)
+	for (int i = 0; i < arch->tile_count; i++)
 	{
-		// TRACE3
-		TRACE3("tmp->time:%e (id:%d)\n", tmp->time, tmp->id);
-		assert((tmp->next_timing == NULL) ||
-			tmp->time <= tmp->next_timing->time);
+		const struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			const struct core *c = &(t->cores[j]);
+			for (int k = 0; k < c->axon_in.map_count; k++)
+			{
+				const struct connection_map *map =
+					&(c->axon_in.map[k]);
+				struct connection_map_state *state =
+					&(v->maps[map_id++]);
+				state->last_updated = map->last_updated;
+				state->spikes_received = map->spikes_received;
+				state->active_synapses = map->active_synapses;
+			}
+		}
 	}
-	// TRACE2
-	TRACE3("List depth = %d\n", list_depth+1);
-#endif
-
-	return;
+	assert(neuron_id == v->neuron_count);
+	assert(connection_id == v->connection_count);
+	assert(map_id == v->map_count);
 }
 
-int sim_input_spikes(struct network *net)
+void sim_load_variant(const struct sim_variant *const v,
+	struct network *const net, struct architecture *const arch,
+	const int variant_id)
 {
-	int input_spike_count = 0;
+	// Copy a variant's state back, so that it can be simulated. Each
+	//  variant has its own soma instances, so just switch to these
+	long int neuron_id = 0L, connection_id = 0L, map_id = 0L;
 
-	// Seed all externally input spikes in the network for this timestep
-	for (int i = 0; i < net->external_input_count; i++)
+	for (int i = 0; i < net->neuron_group_count; i++)
 	{
-		struct input *in = &(net->external_inputs[i]);
-
-		if (in == NULL)
-		{
-			break;
-		}
-
-		if (in->type == INPUT_EVENT)
-		{
-			in->send_spike = (in->spike_val > 0.0);
-		}
-		else if (in->type == INPUT_POISSON)
-		{
-			in->send_spike = sim_poisson_input(in->rate);
-		}
-		else // INPUT_RATE)
-		{
-			in->send_spike =
-				sim_rate_input(in->rate, &(in->spike_val));
-		}
-
-		if (!in->send_spike)
+		struct neuron_group *group = &(net->groups[i]);
+		if (group->soma_block_batch != NULL)
 		{
-			TRACE3("Not sending spike\n");
-			continue;
+			assert(variant_id < group->batch_size);
+			group->soma_block = group->soma_block_batch[variant_id];
 		}
-		for (int j = 0; j < in->post_connection_count; j++)
+		for (int j = 0; j < group->neuron_count; j++)
 		{
-			// Send a spike to all neurons connected to this input
-			//  Normally, we would have a number of input dimensions
-			//  for a given network
-			struct neuron *post_neuron;
-			struct connection *con;
-
-			con = &(in->connections[j]);
-			assert(con);
+			struct neuron *n = &(group->neurons[j]);
 
-			post_neuron = con->post_neuron;
-			TRACE3("nid:%d Energy before: %lf\n", post_neuron->id,
-				post_neuron->current);
-			if (post_neuron->core->buffer_pos == BUFFER_SOMA)
+			if (n->soma_batch != NULL)
 			{
-				post_neuron->charge += con->weight;
+				assert(variant_id < group->batch_size);
+				n->soma_class = n->soma_batch[variant_id];
 			}
-			else
+			*(n->state) = v->neurons[neuron_id];
+			if (n->core->neuron_active != NULL)
 			{
-				post_neuron->current += con->weight;
+				n->core->neuron_active[n->local_id] =
+					v->neuron_active[neuron_id];
+			}
+			neuron_id++;
+			for (int k = 0; k < n->connection_out_count; k++)
+			{
+				n->connections_out[k].current =
+					v->connection_currents[connection_id++];
 			}
-			TRACE3("nid:%d Energy after: %lf\n", post_neuron->id,
-				post_neuron->current);
-
-			con->synapse_hw->time += con->synapse_hw->latency_spike_op;
-
-			post_neuron->update_needed = 1;
-			post_neuron->spike_count++;
-			input_spike_count++;
 		}
-		TRACE1("Sent spikes to %d connections\n",
-			in->post_connection_count);
+	}
 
-		// If inputting sets of events, then reset the spike after
-		//  it's processed i.e. inputs are one-shot. For poisson and
-		//  rate inputs, their values stay unchanged until the user
-		//  sets them again (e.g. until the next input is presented)
-		if (in->type == INPUT_EVENT)
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
 		{
-			in->spike_val = 0.0;
+			struct core *c = &(t->cores[j]);
+			for (int k = 0; k < c->axon_in.map_count; k++)
+			{
+				struct connection_map *map = &(c->axon_in.map[k]);
+				const struct connection_map_state *state =
+					&(v->maps[map_id++]);
+				map->last_updated = state->last_updated;
+				map->spikes_received = state->spikes_received;
+				map->active_synapses = state->active_synapses;
+			}
+			if (c->neuron_active != NULL)
+			{
+				sim_list_active_neurons(c);
+			}
 		}
 	}
-
-	return input_spike_count;
+	assert(neuron_id == v->neuron_count);
+	assert(connection_id == v->connection_count);
+	assert(map_id == v->map_count);
 }
 
-double sim_update_synapse(struct timestep *const ts,
-	struct connection_map *axon, const int synaptic_lookup)
+void sim_receive_messages(struct timestep *const ts,
+	struct architecture *arch)
 {
-	// Update all synapses to different neurons in one core. If a synaptic
-	//  lookup, read and accumulate the synaptic weights. Otherwise, just
-	//  update filtered current and any other connection properties
-	struct core *post_core;
-	double latency, min_synaptic_resolution;
-
-	latency = 0.0;
-	post_core = axon->connections[0]->post_neuron->core;
-
-	TRACE1("Updating synapses for (cid:%d)\n", axon->pre_neuron->id);
-	while (axon->last_updated <= ts->timestep)
+	// Network counters are accumulated per core, so that cores in the
+	//  same tile can be processed by different threads. Merge afterwards
+#pragma omp parallel for schedule(dynamic) num_threads(sim_thread_count(arch))
+	for (int i = 0; i < arch->core_count; i++)
 	{
-		TRACE1("Updating synaptic current (last updated:%ld, ts:%ld)\n",
-			axon->last_updated, sim->timesteps);
-		if (axon->active_synapses > 0)
+		struct core *c = arch->cores[i];
+		for (int k = 0; k < c->axon_in.map_count; k++)
 		{
-			for (int i = 0; i < axon->connection_count; i++)
+			struct connection_map *axon = &(c->axon_in.map[k]);
+			if (axon->spikes_received > 0)
 			{
-				struct neuron *post_neuron;
-				struct connection *con = axon->connections[i];
-
-				post_neuron = con->post_neuron;
-				con->current *= con->synaptic_current_decay;
-
-				// "Turn off" synapses that have basically no
-				//  synaptic current left to decay (based on
-				//  the weight resolution)
-				min_synaptic_resolution = (1.0 /
-					con->synapse_hw->weight_bits);
-				if (fabs(con->current) <
-					min_synaptic_resolution)
-				{
-					con->current = 0.0;
-					axon->active_synapses--;
-				}
-
-				TRACE2("(nid:%d->nid:%d) con->current:%lf\n",
-					con->pre_neuron->id,
-					con->post_neuron->id, con->current);
-				if (post_core->buffer_pos != BUFFER_DENDRITE)
-				{
-					latency += sim_update_dendrite(
-						ts, post_neuron, con->current);
-				}
+				struct neuron *pre_neuron = axon->pre_neuron;
+				assert(pre_neuron != NULL);
+				struct core *pre_core = pre_neuron->core;
+				assert(pre_core != NULL);
+				struct tile *pre_tile = pre_core->t;
+				assert(pre_tile != NULL);
+				axon->message->network_latency =
+					sim_estimate_network_costs(pre_tile, c);
+				axon->message->hops =
+					abs(pre_tile->x - c->t->x) +
+					abs(pre_tile->y - c->t->y);
+				axon->message->receive_latency =
+					sim_pipeline_receive(ts, c, axon);
 			}
 		}
-		axon->last_updated++;
 	}
 
-	if (synaptic_lookup)
+	for (int i = 0; i < arch->tile_count; i++)
 	{
-		if (axon->connection_count > 0)
-		{
-			latency += post_core->axon_in.latency_spike_message;
-			post_core->axon_in.spike_messages_in++;
-		}
-		axon->active_synapses = axon->connection_count;
-
-		for (int i = 0; i < axon->connection_count; i++)
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
 		{
-			struct neuron *post_neuron;
-			struct connection *con = axon->connections[i];
-
-			con->current += con->weight;
-			post_neuron = con->post_neuron;
-			post_neuron->update_needed = 1;
-			post_neuron->spike_count++;
-
-			assert(con->synapse_hw != NULL);
-			con->synapse_hw->spikes_processed++;
-			TRACE2("Sending spike to nid:%d, current:%lf\n",
-				post_neuron->id, con->current);
-			latency += con->synapse_hw->latency_spike_op;
-
-			if (post_core->buffer_pos != BUFFER_DENDRITE)
-			{
-				latency += sim_update_dendrite(
-					ts, post_neuron, con->current);
-			}
+			const struct core *c = &(t->cores[j]);
+			t->hops += c->hops;
+			ts->total_hops += c->hops;
+			t->east_hops += c->east_hops;
+			t->west_hops += c->west_hops;
+			t->north_hops += c->north_hops;
+			t->south_hops += c->south_hops;
+			t->messages_received += c->messages_received;
 		}
 	}
-
-	return latency;
 }
 
-double sim_update_dendrite(
-	struct timestep *const ts, struct neuron *n, const double charge)
+double sim_estimate_network_costs(struct tile *const src,
+	struct core *const dest_core)
 {
-	// TODO: Support dendritic operations, combining the current in
-	//  different neurons in some way, and writing the result to an output
-	double dendritic_current, latency;
-	latency = 0.0;
+	struct tile *dest = dest_core->t;
+	double network_latency;
+	long int x_hops, y_hops;
 
-	dendritic_current = 0.0;
-	while (n->dendrite_last_updated <= ts->timestep)
+	assert(src != NULL);
+	assert(dest != NULL);
+
+	network_latency = 0.0;
+
+	// Calculate the energy and time for sending spike packets
+	x_hops = abs(src->x - dest->x);
+	y_hops = abs(src->y - dest->y);
+	// E-W hops
+
+	if (src->x < dest->x)
 	{
-		TRACE3("Updating dendritic current (last_updated:%d, ts:%ld)\n",
-			n->dendrite_last_updated, sim->timesteps);
-		n->charge *= n->dendritic_current_decay;
-		n->dendrite_last_updated++;
-		dendritic_current = n->charge;
-		TRACE2("nid:%d charge:%lf\n", n->id, n->charge);
+		dest_core->east_hops += x_hops;
+		network_latency += (double) x_hops * src->latency_east_hop;
+	}
+	else
+	{
+		dest_core->west_hops += x_hops;
+		network_latency += (double) x_hops * src->latency_west_hop;
 	}
 
-	// Update dendritic tap currents
-	// TODO: implement multi-tap models
-	TRACE2("Charge:%lf\n", charge);
-	dendritic_current += charge;
-	n->charge += charge;
-
-	// Finally, send dendritic current to the soma
-	TRACE2("nid:%d updating dendrite, charge:%lf\n", n->id, n->charge);
-	if (n->core->buffer_pos != BUFFER_SOMA)
+	// N-S hops
+	if (src->y < dest->y)
 	{
-		latency += sim_update_soma(ts, n, dendritic_current);
+		dest_core->north_hops += y_hops;
+		network_latency += (double) y_hops * src->latency_north_hop;
+	}
+	else
+	{
+		dest_core->south_hops += y_hops;
+		network_latency += (double) y_hops * src->latency_south_hop;
 	}
 
-	return latency;
+	dest_core->hops += (x_hops + y_hops);
+	dest_core->messages_received++;
+	TRACE1("xhops:%ld yhops%ld total hops:%ld latency:%e\n", x_hops, y_hops,
+		dest_core->hops, network_latency);
+	return network_latency;
 }
 
-double sim_update_soma(
-	struct timestep *const ts, struct neuron *n, const double current_in)
+struct message *sim_message_fifo_pop(struct message_fifo *queue)
 {
-	// struct soma_processor *soma = n->soma_hw;
+	struct message *m;
 
-	TRACE1("nid:%d updating, current_in:%lf\n", n->id, current_in);
-	n->neuron_status = n->soma_class->update_soma(current_in);
-
-	if (n->forced_spikes > 0){
-		n->neuron_status = FIRED;
-		n->forced_spikes--;
+	assert(queue->count >= 0);
+	if (queue->count == 0)
+	{
+		m = NULL;
+	}
+	else
+	{
+		assert(queue->tail != NULL);
+		assert(queue->head != NULL);
+		queue->count--;
+		m = queue->tail;
+		queue->tail = queue->tail->next;
+		if (queue->count <= 0)
+		{
+			queue->head = NULL;
+		}
 	}
 
-	double latency = sim_update_soma_latency(ts, n);
+	return m;
+}
 
-	// TODO: FIX the latency returns
-	return latency;
+void sim_message_fifo_push(struct message_fifo *queue, struct message *m)
+{
+	assert(queue != NULL);
+	assert(queue->count >= 0);
+	assert(m != NULL);
+
+	m->next = NULL;
+	if (queue->count == 0)
+	{
+		queue->tail = m;
+	}
+	else
+	{
+		queue->head->next = m;
+	}
+	queue->head = m;
+	queue->count++;
 }
 
-double sim_generate_noise(struct neuron *n)
+double sim_schedule_messages(struct message_fifo *const messages_sent,
+	const int core_count)
 {
-	assert(n != NULL);
-	struct soma_processor *soma_hw = n->soma_hw;
-	int noise_val = 0;
-	int ret;
+	struct timing_queue priority_queue;
+	double last_timestamp;
 
-	if (soma_hw->noise_type == NOISE_FILE_STREAM)
+	sim_init_timing_priority(&priority_queue, messages_sent, core_count);
+	last_timestamp = 0.0;
+	// Setup timing counters
+	TRACE1("Scheduling global order of messages.\n");
+
+	// While queue isn't empty
+	while (priority_queue.count > 0)
 	{
-		// With a noise stream, we have a file containing a series of
-		//  random values. This is useful if we want to exactly
-		//  replicate h/w without knowing how the stream is generated.
-		//  We can record the random sequence and replicate it here
-		char noise_str[MAX_NOISE_FILE_ENTRY];
-		// If we get to the end of the stream, by default reset it.
-		//  However, it is unlikely the stream will be correct at this
-		//  point
-		if (feof(soma_hw->noise_stream))
+		// Get the core with the earliest simulation time
+		struct message_fifo *q =
+			sim_pop_priority_queue(&priority_queue);
+		last_timestamp = fmax(last_timestamp, sim_schedule_message(q));
+		if (q->tail != NULL)
 		{
-			INFO("Warning: At the end of the noise stream. "
-			     "Random values are unlikely to be correct.\n");
-			fseek(soma_hw->noise_stream, 0, SEEK_SET);
+			sim_insert_priority_queue(&priority_queue, q);
 		}
-		(void)! fgets(noise_str, MAX_NOISE_FILE_ENTRY, soma_hw->noise_stream);
-		ret = sscanf(noise_str, "%d", &noise_val);
-		TRACE2("noise val:%d\n", noise_val);
-		if (ret < 1)
+
+		if (priority_queue.count > 0)
 		{
-			INFO("Error: invalid noise stream entry.\n");
+			TRACE2("\tNext message time:%e\n",
+				priority_queue.heap[0]->tail->sent_timestamp);
 		}
 	}
+	sim_free_timing_priority(&priority_queue);
 
-	// Get the number of noise bits required TODO: generalize
-	int sign_bit = noise_val & 0x100;
-	noise_val &= 0x7f; // TODO: hack, fixed for 8 bits
-	if (sign_bit)
+	return last_timestamp;
+}
+
+double sim_schedule_messages_parallel(struct message_fifo *const messages_sent,
+	const int core_count, const int tile_count, const int thread_count)
+{
+	// Conservative parallel version of the message scheduler, giving
+	//  exactly the same results. Sending a message from a core and the
+	//  core's next message are always separated by at least the network
+	//  latency and the next message's generation latency. This gives a
+	//  lookahead horizon, before which no new messages can be sent. All
+	//  messages before the horizon are processed together, partitioned by
+	//  destination tile since only the destination hardware is shared.
+	//  Messages to the same tile are processed in the serial order
+	struct timing_queue priority_queue;
+	struct lookahead_queue lookahead;
+	struct message_fifo **window;
+	int *next_in_tile, *tile_last, *tile_window, *tile_first;
+	double last_timestamp;
+	long int total_messages;
+
+	sim_init_timing_priority(&priority_queue, messages_sent, core_count);
+	last_timestamp = 0.0;
+
+	total_messages = 0L;
+	for (int i = 0; i < core_count; i++)
 	{
-		// Sign extend
-		noise_val |= ~(0x7f);
+		total_messages += messages_sent[i].count;
+	}
+	sim_init_lookahead(&lookahead, total_messages);
+	for (int i = 0; i < priority_queue.count; i++)
+	{
+		sim_push_lookahead(&lookahead, priority_queue.heap[i]);
 	}
 
-	return (double) noise_val;
+	window = (struct message_fifo **) malloc(
+		sizeof(struct message_fifo *) * (core_count + 1));
+	next_in_tile = (int *) malloc(sizeof(int) * (core_count + 1));
+	tile_first = (int *) malloc(sizeof(int) * (core_count + 1));
+	// Use one extra partition for dummy messages, without a destination
+	tile_last = (int *) malloc(sizeof(int) * (tile_count + 1));
+	tile_window = (int *) malloc(sizeof(int) * (tile_count + 1));
+	if ((window == NULL) || (next_in_tile == NULL) ||
+		(tile_first == NULL) || (tile_last == NULL) ||
+		(tile_window == NULL))
+	{
+		INFO("Error: Couldn't allocate parallel scheduler.\n");
+		exit(1);
+	}
+	for (int i = 0; i < (tile_count + 1); i++)
+	{
+		tile_window[i] = -1;
+	}
+
+	TRACE1("Scheduling global order of messages in parallel.\n");
+	for (int window_id = 0; priority_queue.count > 0; window_id++)
+	{
+		struct message_fifo *last;
+		double horizon;
+		int window_count, partition_count;
+
+		// Always process the earliest message, plus every other message
+		//  sent before the horizon. These come out of the priority
+		//  queue in the same order as the serial scheduler
+		horizon = sim_earliest_lookahead(&lookahead);
+		window_count = 0;
+		window[window_count++] = sim_pop_priority_queue(&priority_queue);
+		while ((priority_queue.count > 0) &&
+			(priority_queue.heap[0]->tail->sent_timestamp < horizon))
+		{
+			window[window_count++] =
+				sim_pop_priority_queue(&priority_queue);
+		}
+		TRACE2("Processing %d messages before %e\n", window_count,
+			horizon);
+
+		// Partition messages by destination tile, keeping the order
+		partition_count = 0;
+		for (int i = 0; i < window_count; i++)
+		{
+			const int tile_id = sim_message_dest_tile(
+				window[i]->tail, tile_count);
+			next_in_tile[i] = -1;
+			if (tile_window[tile_id] != window_id)
+			{
+				tile_window[tile_id] = window_id;
+				tile_first[partition_count++] = i;
+			}
+			else
+			{
+				next_in_tile[tile_last[tile_id]] = i;
+			}
+			tile_last[tile_id] = i;
+		}
+
+#pragma omp parallel for schedule(dynamic) reduction(max:last_timestamp) \
+	num_threads(thread_count) if (partition_count > 1)
+		for (int i = 0; i < partition_count; i++)
+		{
+			for (int j = tile_first[i]; j >= 0; j = next_in_tile[j])
+			{
+				last_timestamp = fmax(last_timestamp,
+					sim_schedule_message(window[j]));
+			}
+		}
+
+		// Re-insert cores in the same order as the serial scheduler. All
+		//  but the last core's next messages come after the remaining
+		//  messages in the window, so are put behind any equal times
+		for (int i = 0; i < (window_count - 1); i++)
+		{
+			if (window[i]->tail != NULL)
+			{
+				window[i]->priority_order =
+					++(priority_queue.back_order);
+				sim_push_priority_queue(&priority_queue,
+					window[i]);
+				sim_push_lookahead(&lookahead, window[i]);
+			}
+		}
+		last = window[window_count - 1];
+		if (last->tail != NULL)
+		{
+			sim_insert_priority_queue(&priority_queue, last);
+			sim_push_lookahead(&lookahead, last);
+		}
+	}
+	free(window);
+	free(next_in_tile);
+	free(tile_first);
+	free(tile_last);
+	free(tile_window);
+	sim_free_lookahead(&lookahead);
+	sim_free_timing_priority(&priority_queue);
+
+	return last_timestamp;
 }
 
-double sim_update_soma_latency(
-	struct timestep *const ts, struct neuron *n)
+double sim_schedule_message(struct message_fifo *const q)
 {
-	struct soma_processor *soma = n->soma_hw;
-	double latency = 0.0;
+	// Send the next message in a core's queue, updating the time that
+	//  the receiving hardware is busy until. Then set the time that the
+	//  core's following message is sent. Returns the latest time-stamp
+	double latest, t;
 
-	while (n->soma_last_updated <= ts->timestep)
-	{
-		// n->potential *= n->leak_decay;
-		n->soma_last_updated++;
-	}
+	struct message *m = sim_message_fifo_pop(q);
+	latest = m->generation_latency;
 
-	// Check for spiking
-	if (n->neuron_status == FIRED)
+	if (m->dest_neuron != NULL)
 	{
-		n->fired = 1;
-		soma->neurons_fired++;
-		latency += soma->latency_spiking;
-		if (n->core->buffer_pos != BUFFER_AXON_OUT)
+		if (m->dest_neuron->core->t->is_blocking)
 		{
-			sim_neuron_send_spike_message(ts, n);
+			m->blocked_latency = fmax(m->blocked_latency,
+				m->dest_neuron->core->t->blocked_until -
+				m->sent_timestamp);
+			// Update the core global time, blocking until
+			//  the receiving tile is free
+			m->sent_timestamp = fmax(m->sent_timestamp,
+				m->dest_neuron->core->t->blocked_until);
+		}
+		if (m->dest_neuron->core->is_blocking)
+		{
+			// Track how long the message is blocked for
+			m->blocked_latency = fmax(m->blocked_latency,
+				m->dest_neuron->core->blocked_until -
+				m->sent_timestamp);
+			// Update the core global time, blocking until
+			//  the receiving core is free
+			m->sent_timestamp = fmax(m->sent_timestamp,
+				m->dest_neuron->core->blocked_until);
+
+			if (m->sent_timestamp <
+				m->dest_neuron->core->blocked_until)
+			{
+				// If we were trying to send a spike to
+				//  a blocked core, also block the tile
+				//  for this duration as well
+				m->dest_neuron->core->t->blocked_until =
+				m->dest_neuron->core->blocked_until;
+				// Update the core global time, blocking
+				//  until the receiving core is free
+				m->sent_timestamp =
+				m->dest_neuron->core->blocked_until;
+			}
 		}
+
+		// Set time-stamps, calculating when the receiving H/W will be
+		//  busy until
+		m->sent_timestamp += m->network_latency;
+		latest = fmax(latest, m->sent_timestamp);
+		// TODO: for some reason this seems quite important for DVS
+		//  gesture accuracy. The core is busy until the message is
+		//  delivered by the network
+		m->dest_neuron->core->blocked_until = fmax(
+			(m->dest_neuron->core->blocked_until +
+			m->network_latency + m->receive_latency),
+			(m->sent_timestamp + m->receive_latency));
+		m->processed_timestamp =
+			m->dest_neuron->core->blocked_until;
+		latest = fmax(latest, m->processed_timestamp);
+
+		TRACE2("\t(cid:%d.%d) synapse at %d.%d busy until %e\n",
+			c->t->id, c->id, m->dest_core->t->id,
+			m->dest_core->id, m->dest_core->blocked_until);
 	}
 
-	// Update soma, if there are any received spikes, there is a non-zero
-	//  bias or we force the neuron to update every time-step
-	if (n->neuron_status == UPDATED || n->neuron_status == FIRED || n->force_update)
+	// The time that the last message sent is the time that we
+	//  start the next message's processing
+	t = m->sent_timestamp;
+	// Get the next message, neuron or core
+	m = q->tail;
+	// Regardless of whether we are sending a message, add the
+	//  processing time
+	if (m != NULL)
 	{
-		latency += n->soma_hw->latency_update_neuron;
-		soma->neuron_updates++;
+		m->sent_timestamp = t + m->generation_latency;
+		latest = fmax(latest, m->sent_timestamp);
+	}
+	else
+	{
+		TRACE2("\tFinished simulating queue\n");
 	}
 
-	latency += n->soma_hw->latency_access_neuron;
 
-	return latency;
+	return latest;
 }
 
-// double sim_update_soma_lif(
-// 	struct timestep *const ts, struct neuron *n, const double current_in)
+double sim_message_lookahead(const struct message_fifo *const q)
+{
+	// Get the earliest time the core's following message could be sent.
+	//  Blocking can only delay the current message, so this is a bound
+	const struct message *m = q->tail;
+	double t;
 
-// {
-// 	struct soma_processor *soma = n->soma_hw;
-// 	double random_potential, latency = 0.0;
+	assert(m != NULL);
+	if (m->next == NULL)
+	{
+		return INFINITY;
+	}
+	t = m->sent_timestamp;
+	if (m->dest_neuron != NULL)
+	{
+		t += m->network_latency;
+	}
 
-// 	// Calculate the change in potential since the last update e.g.
-// 	//  integate inputs and apply any potential leak
-// 	TRACE1("Updating potential, before:%f\n", n->potential);
+	return t + m->next->generation_latency;
+}
 
-// 	while (n->soma_last_updated <= ts->timestep)
-// 	{
-// 		n->potential *= n->leak_decay;
-// 		n->soma_last_updated++;
-// 	}
+void sim_init_lookahead(struct lookahead_queue *const lookahead,
+	const long int capacity)
+{
+	lookahead->count = 0;
+	lookahead->capacity = capacity;
+	lookahead->heap = (struct lookahead_entry *) malloc(
+		sizeof(struct lookahead_entry) * capacity);
+	if ((capacity > 0) && (lookahead->heap == NULL))
+	{
+		INFO("Error: Couldn't allocate lookahead queue.\n");
+		exit(1);
+	}
+}
 
-// 	// Add randomized noise to potential if enabled
-// 	if ((soma->model == NEURON_STOCHASTIC_LIF) &&
-// 		(soma->noise_type == NOISE_FILE_STREAM))
-// 	{
-// 		random_potential = sim_generate_noise(n);
-// 		n->potential += random_potential;
-// 	}
+void sim_free_lookahead(struct lookahead_queue *const lookahead)
+{
+	free(lookahead->heap);
+	lookahead->heap = NULL;
+	lookahead->count = 0;
+	lookahead->capacity = 0;
+}
 
-// 	// Add the synaptic / dendrite current to the potential
-// 	//printf("n->bias:%lf n->potential before:%lf current_in:%lf\n", n->bias, n->potential, current_in);
-// 	n->potential += current_in + n->bias;
-// 	n->charge = 0.0;
-// 	//printf("n->bias:%lf n->potential after:%lf\n", n->bias, n->potential);
+void sim_push_lookahead(struct lookahead_queue *const lookahead,
+	struct message_fifo *const q)
+{
+	struct lookahead_entry *heap = lookahead->heap;
+	struct lookahead_entry entry;
+	long int pos;
 
-// 	TRACE1("Updating potential, after:%f\n", n->potential);
+	entry.time = sim_message_lookahead(q);
+	if (isinf(entry.time))
+	{
+		// The core has no following message
+		return;
+	}
+	entry.q = q;
+	entry.m = q->tail;
 
-// 	// Check against threshold potential (for spiking)
-// 	if (((n->bias != 0.0) && (n->potential > n->threshold)) ||
-// 		((n->bias == 0.0) && (n->potential >= n->threshold)))
-// 	{
-// 		if (n->group->reset_mode == NEURON_RESET_HARD)
-// 		{
-// 			n->potential = n->reset;
-// 		}
-// 		else if (n->group->reset_mode == NEURON_RESET_SOFT)
-// 		{
-// 			n->potential -= n->threshold;
-// 		}
-// 		n->fired = 1;
-// 		soma->neurons_fired++;
-// 		latency += soma->latency_spiking;
-// 		if (n->core->buffer_pos != BUFFER_AXON_OUT)
-// 		{
-// 			sim_neuron_send_spike_message(ts, n);
-// 		}
-// 	}
+	// Every message is pushed at most once
+	assert(lookahead->count < lookahead->capacity);
+	pos = lookahead->count++;
+	while (pos > 0)
+	{
+		const long int parent = (pos - 1) / 2;
+		if (heap[parent].time <= entry.time)
+		{
+			break;
+		}
+		heap[pos] = heap[parent];
+		pos = parent;
+	}
+	heap[pos] = entry;
+}
 
-// 	// Check against reverse threshold
-// 	if (n->potential < n->reverse_threshold)
-// 	{
-// 		if (n->group->reverse_reset_mode == NEURON_RESET_SOFT)
-// 		{
-// 			n->potential -= n->reverse_threshold;
-// 		}
-// 		else if (n->group->reverse_reset_mode == NEURON_RESET_HARD)
-// 		{
-// 			n->potential = n->reverse_reset;
-// 		}
-// 		else if (n->group->reverse_reset_mode == NEURON_RESET_SATURATE)
-// 		{
-// 			n->potential = n->reverse_threshold;
-// 		}
-// 	}
+double sim_earliest_lookahead(struct lookahead_queue *const lookahead)
+{
+	// Get the earliest time any core could send its following message.
+	//  Entries are removed lazily once their message has been sent
+	struct lookahead_entry *heap = lookahead->heap;
 
-// 	// Update soma, if there are any received spikes, there is a non-zero
-// 	//  bias or we force the neuron to update every time-step
-// 	if ((fabs(n->potential) > 0.0) || n->spike_count ||
-// 		(fabs(n->bias) > 0.0) || n->force_update)
-// 	{
-// 		// Neuron is turned on and potential write
-// 		latency += n->soma_hw->latency_update_neuron;
-// 		soma->neuron_updates++;
-// 	}
+	while (lookahead->count > 0)
+	{
+		struct lookahead_entry last;
+		long int pos, child;
 
-// 	latency += n->soma_hw->latency_access_neuron;
+		if (heap[0].q->tail == heap[0].m)
+		{
+			return heap[0].time;
+		}
 
-// 	return latency;
-// }
+		// Remove the stale entry and sift the last entry down
+		lookahead->count--;
+		last = heap[lookahead->count];
+		pos = 0;
+		child = 1;
+		while (child < lookahead->count)
+		{
+			if (((child + 1) < lookahead->count) &&
+				(heap[child + 1].time < heap[child].time))
+			{
+				child++;
+			}
+			if (heap[child].time >= last.time)
+			{
+				break;
+			}
+			heap[pos] = heap[child];
+			pos = child;
+			child = (2 * pos) + 1;
+		}
+		heap[pos] = last;
+	}
 
-// double sim_update_soma_truenorth(
+	return INFINITY;
+}
+
+int sim_message_dest_tile(const struct message *const m, const int tile_count)
+{
+	// Dummy messages don't have a destination, use the last partition
+	if (m->dest_neuron == NULL)
+	{
+		return tile_count;
+	}
+	assert(m->dest_neuron->core->t->id < tile_count);
+
+	return m->dest_neuron->core->t->id;
+}
+
+void sim_process_neuron(struct timestep *const ts, struct neuron *n)
+{
+	if (!n->is_init)
+	{
+		return;
+	}
+
+	struct core *c = n->core;
+	struct neuron_state *state = n->state;
+	state->processing_latency = 0.0;
+
+	// TODO: I think there's a flaw here. We update synapses for the core,
+	//  not for the neuron. Then each neuron does have a single dendritic
+	//  tree. So it's just this, maybe we make it "process neurons"
+	if (c->buffer_pos == BUFFER_SYNAPSE)
+	{
+		for (int i = 0; i < n->maps_in_count; i++)
+		{
+			struct connection_map *axon = &(n->maps_in[i]);
+			state->processing_latency +=
+				sim_update_synapse(ts, axon, 1);
+		}
+	}
+	else if (c->buffer_pos == BUFFER_DENDRITE)
+	{
+		// Go through all synapses connected to this neuron and update
+		//  all synaptic currents into the dendrite
+		for (int i = 0; i < n->maps_in_count; i++)
+		{
+			struct connection_map *a = &(n->maps_in[i]);
+			for (int j = 0; j < a->connection_count; j++)
+			{
+				struct connection *con = a->connections[j];
+				state->processing_latency += sim_update_dendrite(
+					ts, n, con->current);
+			}
+		}
+	}
+	else if (c->buffer_pos == BUFFER_SOMA)
+	{
+		if (n->group->soma_block != NULL)
+		{
+			// Already updated with the rest of the block, see
+			//  sim_update_soma_blocks()
+			state->processing_latency =
+				sim_update_soma_status(ts, n);
+		}
+		else
+		{
+			state->processing_latency =
+				sim_update_soma(ts, n, state->charge);
+		}
+	}
+	else if (c->buffer_pos == BUFFER_AXON_OUT)
+	{
+		if (state->fired)
+		{
+			struct soma_processor *soma = n->soma_hw;
+			state->processing_latency = soma->latency_spiking;
+			sim_neuron_send_spike_message(ts, n);
+		}
+	}
+	TRACE1("Updating neuron %d.%d.\n", n->group->id, n->id);
+
+	c->next_message.generation_latency += state->processing_latency;
+	state->update_needed = 0;
+	state->spike_count = 0;
+}
+
+double sim_pipeline_receive(
+	struct timestep *const ts, struct core *c,
+	struct connection_map *axon)
+{
+	// We receive a spike and process up to the time-step buffer
+	double message_processing_latency = 0.0;
+
+	TRACE1("Receiving messages for cid:%d\n", c->id);
+	if (c->buffer_pos >= BUFFER_SYNAPSE)
+	{
+		int synaptic_lookup = 1;
+		message_processing_latency =
+			sim_update_synapse(ts, axon, synaptic_lookup);
+	}
+
+	return message_processing_latency;
+}
+
+void sim_init_timing_priority(struct timing_queue *const priority_queue,
+	struct message_fifo *const message_queues, const int core_count)
+{
+	TRACE1("Initializing priority queue.\n");
+	priority_queue->count = 0;
+	priority_queue->capacity = core_count;
+	priority_queue->front_order = 0L;
+	priority_queue->back_order = 0L;
+	priority_queue->heap = (struct message_fifo **) malloc(
+		sizeof(struct message_fifo *) * priority_queue->capacity);
+	if (priority_queue->heap == NULL)
+	{
+		INFO("Error: Couldn't allocate priority queue.\n");
+		exit(1);
+	}
+
+	for (int i = 0; i < core_count; i++)
+	{
+		if ((message_queues[i]).count > 0) // messages
+		{
+			struct message *m = (message_queues[i]).tail;
+			assert(m != NULL);
+			m->sent_timestamp = m->generation_latency;
+			sim_insert_priority_queue(priority_queue,
+				&(message_queues[i]));
+		}
+		else
+		{
+			TRACE1("No messages for core %d\n", i);
+		}
+	}
+
+	return;
+}
+
+void sim_free_timing_priority(struct timing_queue *const priority_queue)
+{
+	free(priority_queue->heap);
+	priority_queue->heap = NULL;
+	priority_queue->count = 0;
+	priority_queue->capacity = 0;
+}
+
+int sim_priority_queue_less(
+	const struct message_fifo *const a, const struct message_fifo *const b)
+{
+	// Order queues by the send time of their next message. Equal times are
+	//  ordered by when the queue was (re)inserted
+	const double a_time = a->tail->sent_timestamp;
+	const double b_time = b->tail->sent_timestamp;
+
+	if (a_time != b_time)
+	{
+		return (a_time < b_time);
+	}
+	return (a->priority_order < b->priority_order);
+}
+
+struct message_fifo *sim_pop_priority_queue(
+	struct timing_queue *const priority_queue)
+{
+	struct message_fifo **heap = priority_queue->heap;
+	struct message_fifo *curr, *last;
+	int pos, child;
+
+	// Pop the first (earliest) element from the priority queue
+	assert(priority_queue->count > 0);
+	curr = heap[0];
+	priority_queue->count--;
+	if (priority_queue->count == 0)
+	{
+		return curr;
+	}
+
+	// Move the last element to the root and sift it back down
+	last = heap[priority_queue->count];
+	pos = 0;
+	child = 1;
+	while (child < priority_queue->count)
+	{
+		if (((child + 1) < priority_queue->count) &&
+			sim_priority_queue_less(heap[child + 1], heap[child]))
+		{
+			child++;
+		}
+		if (!sim_priority_queue_less(heap[child], last))
+		{
+			break;
+		}
+		heap[pos] = heap[child];
+		pos = child;
+		child = (2 * pos) + 1;
+	}
+	heap[pos] = last;
+
+	return curr;
+}
+
+void sim_insert_priority_queue(struct timing_queue *const priority_queue,
+	struct message_fifo *core_message_fifo)
+{
+	struct message_fifo **heap;
+
+	assert(priority_queue != NULL);
+	assert(core_message_fifo != NULL);
+	assert(core_message_fifo->tail != NULL);
+	heap = priority_queue->heap;
+
+	// Keep the same tie-breaking as the old sorted-list scheduler. A queue
+	//  whose next message is no later than the current earliest message is
+	//  placed ahead of everything (including equal times). Otherwise, it
+	//  goes behind all queues with equal times
+	if ((priority_queue->count == 0) ||
+		(core_message_fifo->tail->sent_timestamp <=
+			heap[0]->tail->sent_timestamp))
+	{
+		core_message_fifo->priority_order =
+			--(priority_queue->front_order);
+	}
+	else
+	{
+		core_message_fifo->priority_order =
+			++(priority_queue->back_order);
+	}
+
+	sim_push_priority_queue(priority_queue, core_message_fifo);
+
+	return;
+}
+
+void sim_push_priority_queue(struct timing_queue *const priority_queue,
+	struct message_fifo *core_message_fifo)
+{
+	// Add a queue to the heap, using its existing tie-break order
+	struct message_fifo **heap;
+	int pos;
+
+	assert(priority_queue->count < priority_queue->capacity);
+	heap = priority_queue->heap;
+
+	// Add to the end of the heap and sift up
+	pos = priority_queue->count++;
+	while (pos > 0)
+	{
+		const int parent = (pos - 1) / 2;
+		if (!sim_priority_queue_less(core_message_fifo, heap[parent]))
+		{
+			break;
+		}
+		heap[pos] = heap[parent];
+		pos = parent;
+	}
+	heap[pos] = core_message_fifo;
+
+#ifdef DEBUG
+	for (int i = 1; i < priority_queue->count; i++)
+	{
+		assert(!sim_priority_queue_less(heap[i], heap[(i - 1) / 2]));
+	}
+	TRACE3("Heap size = %d\n", priority_queue->count);
+#endif
+
+	return;
+}
+
+int sim_input_spikes(struct network *net)
+{
+	int input_spike_count = 0;
+
+	// Seed all externally input spikes in the network for this timestep
+	for (int i = 0; i < net->external_input_count; i++)
+	{
+		struct input *in = &(net->external_inputs[i]);
+
+		if (in == NULL)
+		{
+			break;
+		}
+
+		if (in->type == INPUT_EVENT)
+		{
+			in->send_spike = (in->spike_val > 0.0);
+		}
+		else if (in->type == INPUT_POISSON)
+		{
+			in->send_spike = sim_poisson_input(in->rate);
+		}
+		else // INPUT_RATE)
+		{
+			in->send_spike =
+				sim_rate_input(in->rate, &(in->spike_val));
+		}
+
+		if (!in->send_spike)
+		{
+			TRACE3("Not sending spike\n");
+			continue;
+		}
+		for (int j = 0; j < in->post_connection_count; j++)
+		{
+			// Send a spike to all neurons connected to this input
+			//  Normally, we would have a number of input dimensions
+			//  for a given network
+			struct neuron *post_neuron;
+			struct connection *con;
+
+			con = &(in->connections[j]);
+			assert(con);
+
+			post_neuron = con->post_neuron;
+			TRACE3("nid:%d Energy before: %lf\n", post_neuron->id,
+				post_neuron->state->current);
+			if (post_neuron->core->buffer_pos == BUFFER_SOMA)
+			{
+				post_neuron->state->charge += con->weight;
+			}
+			else
+			{
+				post_neuron->state->current += con->weight;
+			}
+			TRACE3("nid:%d Energy after: %lf\n", post_neuron->id,
+				post_neuron->state->current);
+
+			con->synapse_hw->time += con->synapse_hw->latency_spike_op;
+
+			post_neuron->state->update_needed = 1;
+			post_neuron->state->spike_count++;
+			sim_activate_neuron(post_neuron);
+			input_spike_count++;
+		}
+		TRACE1("Sent spikes to %d connections\n",
+			in->post_connection_count);
+
+		// If inputting sets of events, then reset the spike after
+		//  it's processed i.e. inputs are one-shot. For poisson and
+		//  rate inputs, their values stay unchanged until the user
+		//  sets them again (e.g. until the next input is presented)
+		if (in->type == INPUT_EVENT)
+		{
+			in->spike_val = 0.0;
+		}
+	}
+
+	return input_spike_count;
+}
+
+double sim_update_synapse(struct timestep *const ts,
+	struct connection_map *axon, const int synaptic_lookup)
+{
+	// Update all synapses to different neurons in one core. If a synaptic
+	//  lookup, read and accumulate the synaptic weights. Otherwise, just
+	//  update filtered current and any other connection properties
+	struct core *post_core;
+	double latency, min_synaptic_resolution;
+
+	latency = 0.0;
+	post_core = axon->connections[0]->post_neuron->core;
+
+	TRACE1("Updating synapses for (cid:%d)\n", axon->pre_neuron->id);
+	while (axon->last_updated <= ts->timestep)
+	{
+		TRACE1("Updating synaptic current (last updated:%ld, ts:%ld)\n",
+			axon->last_updated, sim->timesteps);
+		if (axon->active_synapses > 0)
+		{
+			for (int i = 0; i < axon->connection_count; i++)
+			{
+				struct neuron *post_neuron;
+				struct connection *con = axon->connections[i];
+
+				post_neuron = con->post_neuron;
+				con->current *= con->synaptic_current_decay;
+
+				// "Turn off" synapses that have basically no
+				//  synaptic current left to decay (based on
+				//  the weight resolution)
+				min_synaptic_resolution = (1.0 /
+					con->synapse_hw->weight_bits);
+				if (fabs(con->current) <
+					min_synaptic_resolution)
+				{
+					con->current = 0.0;
+					axon->active_synapses--;
+				}
+
+				TRACE2("(nid:%d->nid:%d) con->current:%lf\n",
+					con->pre_neuron->id,
+					con->post_neuron->id, con->current);
+				if (post_core->buffer_pos != BUFFER_DENDRITE)
+				{
+					latency += sim_update_dendrite(
+						ts, post_neuron, con->current);
+				}
+			}
+		}
+		axon->last_updated++;
+	}
+
+	if (synaptic_lookup)
+	{
+		if (axon->connection_count > 0)
+		{
+			latency += post_core->axon_in.latency_spike_message;
+			post_core->axon_in.spike_messages_in++;
+		}
+		axon->active_synapses = axon->connection_count;
+
+		for (int i = 0; i < axon->connection_count; i++)
+		{
+			struct neuron *post_neuron;
+			struct connection *con = axon->connections[i];
+
+			con->current += con->weight;
+			post_neuron = con->post_neuron;
+			post_neuron->state->update_needed = 1;
+			post_neuron->state->spike_count++;
+			sim_activate_neuron(post_neuron);
+
+			assert(con->synapse_hw != NULL);
+			con->synapse_hw->spikes_processed++;
+			TRACE2("Sending spike to nid:%d, current:%lf\n",
+				post_neuron->id, con->current);
+			latency += con->synapse_hw->latency_spike_op;
+
+			if (post_core->buffer_pos != BUFFER_DENDRITE)
+			{
+				latency += sim_update_dendrite(
+					ts, post_neuron, con->current);
+			}
+		}
+	}
+
+	return latency;
+}
+
+double sim_update_dendrite(
+	struct timestep *const ts, struct neuron *n, const double charge)
+{
+	// TODO: Support dendritic operations, combining the current in
+	//  different neurons in some way, and writing the result to an output
+	struct neuron_state *state = n->state;
+	double dendritic_current, latency;
+	latency = 0.0;
+
+	dendritic_current = 0.0;
+	while (state->dendrite_last_updated <= ts->timestep)
+	{
+		TRACE3("Updating dendritic current (last_updated:%d, ts:%ld)\n",
+			state->dendrite_last_updated, sim->timesteps);
+		state->charge *= n->dendritic_current_decay;
+		state->dendrite_last_updated++;
+		dendritic_current = state->charge;
+		TRACE2("nid:%d charge:%lf\n", n->id, state->charge);
+	}
+
+	// Update dendritic tap currents
+	// TODO: implement multi-tap models
+	TRACE2("Charge:%lf\n", charge);
+	dendritic_current += charge;
+	state->charge += charge;
+
+	// Finally, send dendritic current to the soma
+	TRACE2("nid:%d updating dendrite, charge:%lf\n", n->id, state->charge);
+	if (n->core->buffer_pos != BUFFER_SOMA)
+	{
+		latency += sim_update_soma(ts, n, dendritic_current);
+	}
+
+	return latency;
+}
+
+double sim_update_soma(
+	struct timestep *const ts, struct neuron *n, const double current_in)
+{
+	// struct soma_processor *soma = n->soma_hw;
+
+	TRACE1("nid:%d updating, current_in:%lf\n", n->id, current_in);
+	struct neuron_state *state = n->state;
+	if (n->group->soma_block != NULL)
+	{
+		n->group->soma_block->update_soma(
+			1, &(n->id), &current_in, &(state->neuron_status));
+	}
+	else
+	{
+		state->neuron_status = n->soma_class->update_soma(current_in);
+	}
+
+	return sim_update_soma_status(ts, n);
+}
+
+double sim_update_soma_status(struct timestep *const ts, struct neuron *n)
+{
+	// Handle the soma's new status, after its model was updated
+	struct neuron_state *state = n->state;
+
+	if (state->forced_spikes > 0){
+		state->neuron_status = FIRED;
+		state->forced_spikes--;
+	}
+
+	double latency = sim_update_soma_latency(ts, n);
+
+	// TODO: FIX the latency returns
+	return latency;
+}
+
+double sim_generate_noise(struct neuron *n)
+{
+	assert(n != NULL);
+	struct soma_processor *soma_hw = n->soma_hw;
+	int noise_val = 0;
+	int ret;
+
+	if (soma_hw->noise_type == NOISE_FILE_STREAM)
+	{
+		// With a noise stream, we have a file containing a series of
+		//  random values. This is useful if we want to exactly
+		//  replicate h/w without knowing how the stream is generated.
+		//  We can record the random sequence and replicate it here
+		char noise_str[MAX_NOISE_FILE_ENTRY];
+		// If we get to the end of the stream, by default reset it.
+		//  However, it is unlikely the stream will be correct at this
+		//  point
+		if (feof(soma_hw->noise_stream))
+		{
+			INFO("Warning: At the end of the noise stream. "
+			     "Random values are unlikely to be correct.\n");
+			fseek(soma_hw->noise_stream, 0, SEEK_SET);
+		}
+		(void)! fgets(noise_str, MAX_NOISE_FILE_ENTRY, soma_hw->noise_stream);
+		ret = sscanf(noise_str, "%d", &noise_val);
+		TRACE2("noise val:%d\n", noise_val);
+		if (ret < 1)
+		{
+			INFO("Error: invalid noise stream entry.\n");
+		}
+	}
+
+	// Get the number of noise bits required TODO: generalize
+	int sign_bit = noise_val & 0x100;
+	noise_val &= 0x7f; // TODO: hack, fixed for 8 bits
+	if (sign_bit)
+	{
+		// Sign extend
+		noise_val |= ~(0x7f);
+	}
+
+	return (double) noise_val;
+}
+
+double sim_update_soma_latency(
+	struct timestep *const ts, struct neuron *n)
+{
+	struct soma_processor *soma = n->soma_hw;
+	struct neuron_state *state = n->state;
+	double latency = 0.0;
+
+	while (state->soma_last_updated <= ts->timestep)
+	{
+		// n->potential *= n->leak_decay;
+		state->soma_last_updated++;
+	}
+
+	// Check for spiking
+	if (state->neuron_status == FIRED)
+	{
+		state->fired = 1;
+		soma->neurons_fired++;
+		latency += soma->latency_spiking;
+		if (n->core->buffer_pos != BUFFER_AXON_OUT)
+		{
+			sim_neuron_send_spike_message(ts, n);
+		}
+	}
+
+	// Update soma, if there are any received spikes, there is a non-zero
+	//  bias or we force the neuron to update every time-step
+	if (state->neuron_status == UPDATED || state->neuron_status == FIRED || n->force_update)
+	{
+		latency += n->soma_hw->latency_update_neuron;
+		soma->neuron_updates++;
+	}
+
+	latency += n->soma_hw->latency_access_neuron;
+
+	return latency;
+}
+
+// double sim_update_soma_lif(
+// 	struct timestep *const ts, struct neuron *n, const double current_in)
+
+// {
+// 	struct soma_processor *soma = n->soma_hw;
+// 	double random_potential, latency = 0.0;
+
+// 	// Calculate the change in potential since the last update e.g.
+// 	//  integate inputs and apply any potential leak
+// 	TRACE1("Updating potential, before:%f\n", n->potential);
+
+// 	while (n->soma_last_updated <= ts->timestep)
+// 	{
+// 		n->potential *= n->leak_decay;
+// 		n->soma_last_updated++;
+// 	}
+
+// 	// Add randomized noise to potential if enabled
+// 	if ((soma->model == NEURON_STOCHASTIC_LIF) &&
+// 		(soma->noise_type == NOISE_FILE_STREAM))
+// 	{
+// 		random_potential = sim_generate_noise(n);
+// 		n->potential += random_potential;
+// 	}
+
+// 	// Add the synaptic / dendrite current to the potential
+// 	//printf("n->bias:%lf n->potential before:%lf current_in:%lf\n", n->bias, n->potential, current_in);
+// 	n->potential += current_in + n->bias;
+// 	n->charge = 0.0;
+// 	//printf("n->bias:%lf n->potential after:%lf\n", n->bias, n->potential);
+
+// 	TRACE1("Updating potential, after:%f\n", n->potential);
+
+// 	// Check against threshold potential (for spiking)
+// 	if (((n->bias != 0.0) && (n->potential > n->threshold)) ||
+// 		((n->bias == 0.0) && (n->potential >= n->threshold)))
+// 	{
+// 		if (n->group->reset_mode == NEURON_RESET_HARD)
+// 		{
+// 			n->potential = n->reset;
+// 		}
+// 		else if (n->group->reset_mode == NEURON_RESET_SOFT)
+// 		{
+// 			n->potential -= n->threshold;
+// 		}
+// 		n->fired = 1;
+// 		soma->neurons_fired++;
+// 		latency += soma->latency_spiking;
+// 		if (n->core->buffer_pos != BUFFER_AXON_OUT)
+// 		{
+// 			sim_neuron_send_spike_message(ts, n);
+// 		}
+// 	}
+
+// 	// Check against reverse threshold
+// 	if (n->potential < n->reverse_threshold)
+// 	{
+// 		if (n->group->reverse_reset_mode == NEURON_RESET_SOFT)
+// 		{
+// 			n->potential -= n->reverse_threshold;
+// 		}
+// 		else if (n->group->reverse_reset_mode == NEURON_RESET_HARD)
+// 		{
+// 			n->potential = n->reverse_reset;
+// 		}
+// 		else if (n->group->reverse_reset_mode == NEURON_RESET_SATURATE)
+// 		{
+// 			n->potential = n->reverse_threshold;
+// 		}
+// 	}
+
+// 	// Update soma, if there are any received spikes, there is a non-zero
+// 	//  bias or we force the neuron to update every time-step
+// 	if ((fabs(n->potential) > 0.0) || n->spike_count ||
+// 		(fabs(n->bias) > 0.0) || n->force_update)
+// 	{
+// 		// Neuron is turned on and potential write
+// 		latency += n->soma_hw->latency_update_neuron;
+// 		soma->neuron_updates++;
+// 	}
+
+// 	latency += n->soma_hw->latency_access_neuron;
+
+// 	return latency;
+// }
+
+// double sim_update_soma_truenorth(
 // 	struct timestep *const ts, struct neuron *n, const double current_in)
 // {
 // 	struct soma_processor *soma = n->soma_hw;
 // 	double v, latency = 0.0;
 // 	int randomize_threshold;
 
-// 	// Apply leak
-// 	while (n->soma_last_updated <= ts->timestep)
-// 	{
-// 		// Linear leak
-// 		if (soma->leak_towards_zero)
-// 		{
-// 			// TODO: what happens if we're above zero but by less
-// 			//  than the leak amount (for convergent), will we
-// 			//  oscillate between the two? Does it matter
-// 			if (n->potential > 0.0)
-// 			{
-// 				n->potential -= n->leak_bias;
-// 			}
-// 			else if (n->potential < 0.0)
-// 			{
-// 				n->potential += n->leak_bias;
-// 			}
-// 			// else equals zero, so no leak is applied
-// 		}
-// 		else
-// 		{
-// 			n->potential += n->leak_decay;
-// 		}
-// 		n->soma_last_updated++;
-// 	}
+// 	// Apply leak
+// 	while (n->soma_last_updated <= ts->timestep)
+// 	{
+// 		// Linear leak
+// 		if (soma->leak_towards_zero)
+// 		{
+// 			// TODO: what happens if we're above zero but by less
+// 			//  than the leak amount (for convergent), will we
+// 			//  oscillate between the two? Does it matter
+// 			if (n->potential > 0.0)
+// 			{
+// 				n->potential -= n->leak_bias;
+// 			}
+// 			else if (n->potential < 0.0)
+// 			{
+// 				n->potential += n->leak_bias;
+// 			}
+// 			// else equals zero, so no leak is applied
+// 		}
+// 		else
+// 		{
+// 			n->potential += n->leak_decay;
+// 		}
+// 		n->soma_last_updated++;
+// 	}
+
+// 	// Add the synaptic currents, processed by the dendrite
+// 	n->potential += current_in + n->bias;
+// 	n->current = 0.0;
+// 	n->charge = 0.0;
+
+// 	// Apply thresholding and reset
+// 	v = n->potential;
+// 	randomize_threshold = (n->random_range_mask != 0);
+// 	if (randomize_threshold)
+// 	{
+// 		unsigned int r = rand() & n->random_range_mask;
+// 		v += (double) r;
+// 	}
+
+// 	TRACE2("v:%lf +vth:%lf mode:%d -vth:%lf mode:%d\n", v, n->threshold,
+// 		n->group->reset_mode, n->reverse_threshold,
+// 		n->group->reverse_reset_mode);
+// 	if (v >= n->threshold)
+// 	{
+// 		struct soma_processor *soma = n->soma_hw;
+// 		int reset_mode = n->group->reset_mode;
+
+// 		if (reset_mode == NEURON_RESET_HARD)
+// 		{
+// 			n->potential = n->reset;
+// 		}
+// 		else if (reset_mode == NEURON_RESET_SOFT)
+// 		{
+// 			n->potential -= n->threshold;
+// 		}
+// 		else if (reset_mode == NEURON_RESET_SATURATE)
+// 		{
+// 			n->potential = n->threshold;
+// 		}
+// 		n->fired = 1;
+// 		soma->neurons_fired++;
+// 		latency += soma->latency_spiking;
+// 		if (n->core->buffer_pos != BUFFER_AXON_OUT)
+// 		{
+// 			sim_neuron_send_spike_message(ts, n);
+// 		}
+// 	}
+// 	else if (v <= n->reverse_threshold)
+// 	{
+// 		int reset_mode = n->group->reverse_reset_mode;
+// 		if (reset_mode == NEURON_RESET_HARD)
+// 		{
+// 			n->potential = n->reverse_reset;
+// 		}
+// 		else if (reset_mode == NEURON_RESET_SOFT)
+// 		{
+// 			n->potential += n->reverse_threshold;
+// 		}
+// 		else if (reset_mode == NEURON_RESET_SATURATE)
+// 		{
+// 			n->potential = n->reverse_threshold;
+// 		}
+// 		// No spike is generated
+// 	}
+// 	TRACE2("potential:%lf threshold %lf\n", n->potential, n->threshold);
+
+// 	return latency;
+// }
+
+void sim_neuron_send_spike_message(struct timestep *const ts,
+	struct neuron *n)
+{
+	struct core *c = n->core;
+	TRACE1("nid:%d sending spike(s).\n", n->id);
+	int core_id = n->core->id;
+
+
+	for (int k = 0; k < n->maps_out_count; k++)
+	{
+		struct connection_map *dest_axon;
+		struct message *m;
+		int message_index;
+
+		dest_axon = n->maps_out[k];
+		message_index = ts->message_queues[core_id].count;
+		assert(message_index < c->axon_out.map_count);
+
+		// Generate a spike message
+		m = &(ts->messages[core_id][message_index]);
+		arch_init_message(m);
+		m->timestep = ts->timestep;
+		m->src_neuron = n;
+		m->spikes = dest_axon->connection_count;
+		m->dest_neuron = dest_axon->connections[0]->post_neuron;
+		// Add axon access cost to message latency and energy
+		m->generation_latency =
+			c->next_message.generation_latency +
+			c->axon_out.latency_access;
+		sim_message_fifo_push(&(ts->message_queues[core_id]), m);
+
+		c->axon_out.packets_out++;
+
+		// Record a spike message at all the connected cores (axons)
+		dest_axon->spikes_received++;
+		dest_axon->message = m;
+
+		// Reset the next message in this core
+		arch_init_message(&(c->next_message));
+	}
+
+	return;
+}
+
+double sim_calculate_energy(const struct architecture *const arch)
+{
+	// Returns the total energy across the design, for this timestep
+	double network_energy, synapse_energy, soma_energy, axon_out_energy;
+	double axon_in_energy, total_energy;
+
+	network_energy = 0.0;
+	axon_in_energy = 0.0;
+	synapse_energy = 0.0;
+	soma_energy = 0.0;
+	axon_out_energy = 0.0;
+
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		const struct tile *t = &(arch->tiles[i]);
+		double total_hop_energy = t->east_hops * t->energy_east_hop;
+
+		total_hop_energy += t->west_hops * t->energy_west_hop;
+		total_hop_energy += t->south_hops * t->energy_south_hop;
+		total_hop_energy +=  t->north_hops * t->energy_north_hop;
+		network_energy += total_hop_energy;
+
+		for (int j = 0; j < t->core_count; j++)
+		{
+			const struct core *c = &(t->cores[j]);
+
+			axon_in_energy += c->axon_in.spike_messages_in *
+				c->axon_in.energy_spike_message;
+			for (int k = 0; k < c->synapse_count; k++)
+			{
+				synapse_energy +=
+					c->synapse[k].spikes_processed *
+					c->synapse[k].energy_spike_op;
+			}
+			for (int k = 0; k < c->soma_count; k++)
+			{
+
+				soma_energy += c->soma[k].neuron_count *
+					c->soma[k].energy_access_neuron;
+				soma_energy += c->soma[k].neuron_updates *
+					c->soma[k].energy_update_neuron;
+				soma_energy += c->soma[k].neurons_fired *
+					c->soma[k].energy_spiking;
+			}
+
+			axon_out_energy += c->axon_out.packets_out *
+				c->axon_out.energy_access;
+		}
+	}
+
+	total_energy = axon_in_energy + synapse_energy + soma_energy +
+		axon_out_energy + network_energy;
+
+	return total_energy;
+}
+
+void sim_reset_neuron(struct neuron *const n)
+{
+	// Neurons can be manually forced to update, for example
+	//  if they have a constant input bias
+	struct neuron_state *state = n->state;
+
+	state->update_needed |= (n->force_update || (state->neuron_status >= 1));
+	state->processing_latency = 0.0;
+	state->fired = 0;
+
+	for (int k = 0; k < n->maps_out_count; k++)
+	{
+		struct connection_map *a = n->maps_out[k];
+		a->spikes_received = 0;
+	}
+}
+
+void sim_reset_measurements(struct network *net, struct architecture *arch)
+{
+	if (arch->event_driven_on)
+	{
+		// Only neurons updated last timestep can have changed, so
+		//  only these need resetting
+		for (int i = 0; i < arch->core_count; i++)
+		{
+			struct core *c = arch->cores[i];
+			if (c->buffer_pos != BUFFER_SOMA)
+			{
+				for (int k = 0; k < c->neuron_count; k++)
+				{
+					sim_reset_neuron(c->neurons[k]);
+				}
+				continue;
+			}
+			for (int k = 0; k < c->updated_count; k++)
+			{
+				sim_reset_neuron(
+					c->neurons[c->updated_neurons[k]]);
+			}
+		}
+	}
+	else
+	{
+		for (int i = 0; i < net->neuron_group_count; i++)
+		{
+			struct neuron_group *group = &(net->groups[i]);
+
+			for (int j = 0; j < group->neuron_count; j++)
+			{
+				sim_reset_neuron(&(group->neurons[j]));
+			}
+		}
+	}
+
+	// Reset any energy, time latency or other measurements of network
+	//  hardware
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		struct tile *t = &(arch->tiles[i]);
+		// Reset tile
+		t->energy = 0.0;
+		t->blocked_until = 0.0;
+
+		t->hops = 0;
+		t->east_hops = 0;
+		t->west_hops = 0;
+		t->south_hops = 0;
+		t->north_hops = 0;
+		t->messages_received = 0;
+		for (int j = 0; j < t->core_count; j++)
+		{
+			struct core *c = &(t->cores[j]);
+			// Reset core
+			c->energy = 0.0;
+			c->blocked_until = 0.0;
+			c->hops = 0;
+			c->east_hops = 0;
+			c->west_hops = 0;
+			c->south_hops = 0;
+			c->north_hops = 0;
+			c->messages_received = 0;
+			arch_init_message(&(c->next_message));
+
+			c->axon_in.spike_messages_in = 0L;
+			c->axon_in.energy = 0.0;
+			c->axon_in.time = 0;
+			c->dendrite.energy = 0.0;
+			c->dendrite.time = 0.0;
+
+			for (int k = 0; k < c->synapse_count; k++)
+			{
+				c->synapse[k].energy = 0.0;
+				c->synapse[k].time = 0.0;
+				c->synapse[k].spikes_processed = 0;
+			}
+
+			for (int k = 0; k < c->soma_count; k++)
+			{
+				c->soma[k].energy = 0.0;
+				c->soma[k].time = 0.0;
+				c->soma[k].neuron_updates = 0L;
+				c->soma[k].neurons_fired = 0L;
+			}
+
+			c->axon_out.energy = 0.0;
+			c->axon_out.time = 0.0;
+			c->axon_out.packets_out = 0;
+		}
+	}
+}
+
+void sim_perf_write_header(FILE *fp)
+{
+	fprintf(fp, "time,");
+	fprintf(fp, "fired,");
+	fprintf(fp, "packets,");
+	fprintf(fp, "hops,");
+	fprintf(fp, "total_energy,");
+	fprintf(fp, "\n");
+}
+
+void sim_perf_log_timestep(
+	struct simulation *const sim, const struct timestep *const ts)
+{
+	struct sim_write_perf perf;
+	struct sim_write_perf *record = &perf;
+
+	assert(sim->perf_fp != NULL);
+	if (sim->writer != NULL)
+	{
+		record = (struct sim_write_perf *) sim_writer_reserve(
+			sim->writer, sim->perf_fp, SIM_WRITE_PERF,
+			sizeof(struct sim_write_perf));
+	}
+	record->sim_time = ts->sim_time;
+	record->fired = ts->total_neurons_fired;
+	record->packets = ts->packets_sent;
+	record->hops = ts->total_hops;
+	record->energy = ts->energy;
+	if (sim->writer == NULL)
+	{
+		sim_perf_write_timestep(sim->perf_fp, record);
+	}
+}
+
+void sim_perf_write_timestep(FILE *fp, const struct sim_write_perf *const perf)
+{
+	fprintf(fp, "%le,", perf->sim_time);
+	fprintf(fp, "%ld,", perf->fired);
+	fprintf(fp, "%ld,", perf->packets);
+	fprintf(fp, "%ld,", perf->hops);
+	fprintf(fp, "%le,", perf->energy);
+	fprintf(fp, "\n");
+}
+
+void sim_perf_record_timestep(
+	struct simulation *const sim, const struct timestep *const ts)
+{
+	// Store the same counters as perf.csv, doubling the buffer as needed
+	if (sim->perf_count >= sim->perf_capacity)
+	{
+		struct sim_perf_buffer *perf;
+		long int capacity = sim->perf_capacity * 2;
+		if (capacity == 0)
+		{
+			capacity = SIM_PERF_INITIAL_CAPACITY;
+		}
+		// Arrays returned to Python may still use the old buffer, so
+		//  copy the counters to a new buffer instead of reallocating
+		perf = sim_alloc_perf_buffer(capacity);
+		if (sim->perf != NULL)
+		{
+			const long int count = sim->perf_count;
+			memcpy(perf->time, sim->perf->time, sizeof(double) * count);
+			memcpy(perf->energy, sim->perf->energy,
+				sizeof(double) * count);
+			memcpy(perf->fired, sim->perf->fired,
+				sizeof(long int) * count);
+			memcpy(perf->packets, sim->perf->packets,
+				sizeof(long int) * count);
+			memcpy(perf->hops, sim->perf->hops,
+				sizeof(long int) * count);
+			sim_release_perf_buffer(sim->perf);
+		}
+		sim->perf = perf;
+		sim->perf_capacity = capacity;
+	}
+
+	sim->perf->time[sim->perf_count] = ts->sim_time;
+	sim->perf->fired[sim->perf_count] = ts->total_neurons_fired;
+	sim->perf->packets[sim->perf_count] = ts->packets_sent;
+	sim->perf->hops[sim->perf_count] = ts->total_hops;
+	sim->perf->energy[sim->perf_count] = ts->energy;
+	sim->perf_count++;
+
+	return;
+}
+
+struct sim_perf_buffer *sim_alloc_perf_buffer(const long int capacity)
+{
+	// Allocate a buffer with one reference, for the simulation. All
+	//  columns are stored in one allocation
+	struct sim_perf_buffer *perf = (struct sim_perf_buffer *) malloc(
+		sizeof(struct sim_perf_buffer));
+	void *columns = malloc(capacity *
+		((2 * sizeof(double)) + (3 * sizeof(long int))));
+	if ((perf == NULL) || (columns == NULL))
+	{
+		INFO("Error: Couldn't allocate perf counters.\n");
+		exit(1);
+	}
+	perf->time = (double *) columns;
+	perf->energy = perf->time + capacity;
+	perf->fired = (long int *) (perf->energy + capacity);
+	perf->packets = perf->fired + capacity;
+	perf->hops = perf->packets + capacity;
+	perf->references = 1;
+
+	return perf;
+}
+
+void sim_release_perf_buffer(struct sim_perf_buffer *const perf)
+{
+	perf->references--;
+	if (perf->references == 0)
+	{
+		free(perf->time);
+		free(perf);
+	}
+}
+
+void sim_free_perf(struct simulation *const sim)
+{
+	if (sim->perf != NULL)
+	{
+		sim_release_perf_buffer(sim->perf);
+	}
+	sim->perf = NULL;
+	sim->perf_count = 0;
+	sim->perf_capacity = 0;
+
+	return;
+}
+
+void sim_record_spikes(struct simulation *const sim,
+	const struct network *net, const long int timestep)
+{
+	for (int i = 0; i < net->neuron_group_count; i++)
+	{
+		const struct neuron_group *group = &(net->groups[i]);
+		if (!sim->spike_record_groups[group->id])
+		{
+			continue;
+		}
+
+		for (int j = 0; j < group->neuron_count; j++)
+		{
+			const struct neuron *n = &(group->neurons[j]);
+			if ((n->state != NULL) && n->state->fired)
+			{
+				sim_record_spike(sim, timestep, group->id,
+					n->id);
+			}
+		}
+	}
+
+	return;
+}
+
+void sim_record_spike(struct simulation *const sim, const long int timestep,
+	const int group_id, const int neuron_id)
+{
+	if (sim->spike_record_count >= sim->spike_record_capacity)
+	{
+		long int capacity = sim->spike_record_capacity * 2;
+		if (capacity == 0)
+		{
+			capacity = SIM_SPIKE_RECORD_INITIAL_CAPACITY;
+		}
+		sim->spike_record_timesteps = (long int *) realloc(
+			sim->spike_record_timesteps,
+			sizeof(long int) * capacity);
+		sim->spike_record_group_ids = (int *) realloc(
+			sim->spike_record_group_ids, sizeof(int) * capacity);
+		sim->spike_record_neuron_ids = (int *) realloc(
+			sim->spike_record_neuron_ids, sizeof(int) * capacity);
+		if ((sim->spike_record_timesteps == NULL) ||
+			(sim->spike_record_group_ids == NULL) ||
+			(sim->spike_record_neuron_ids == NULL))
+		{
+			INFO("Error: Couldn't allocate spike record.\n");
+			exit(1);
+		}
+		sim->spike_record_capacity = capacity;
+	}
+
+	sim->spike_record_timesteps[sim->spike_record_count] = timestep;
+	sim->spike_record_group_ids[sim->spike_record_count] = group_id;
+	sim->spike_record_neuron_ids[sim->spike_record_count] = neuron_id;
+	sim->spike_record_count++;
+
+	return;
+}
+
+void sim_free_spike_record(struct simulation *const sim)
+{
+	free(sim->spike_record_timesteps);
+	free(sim->spike_record_group_ids);
+	free(sim->spike_record_neuron_ids);
+	sim->spike_record_timesteps = NULL;
+	sim->spike_record_group_ids = NULL;
+	sim->spike_record_neuron_ids = NULL;
+	sim->spike_record_count = 0;
+	sim->spike_record_capacity = 0;
+
+	return;
+}
+
+void sim_write_summary(FILE *fp, const struct simulation *sim)
+{
+	// Write the simulation summary to file
+	fprintf(fp, "git_version: %s\n", GIT_COMMIT);
+	fprintf(fp, "energy: %e\n", sim->total_energy);
+	fprintf(fp, "time: %e\n", sim->total_sim_time);
+	fprintf(fp, "total_spikes: %ld\n", sim->total_spikes);
+	fprintf(fp, "total_packets: %ld\n", sim->total_messages_sent);
+	fprintf(fp, "total_neurons_fired: %ld\n", sim->total_neurons_fired);
+	fprintf(fp, "wall_time: %lf\n", sim->wall_time);
+	fprintf(fp, "timesteps: %ld\n", sim->timesteps);
+}
+
+void sim_spike_trace_write_header(const struct simulation *const sim)
+{
+	assert(sim->spike_trace_fp != NULL);
+	fprintf(sim->spike_trace_fp, "gid.nid,timestep\n");
+
+	return;
+}
+
+void sim_potential_trace_write_header(
+	const struct simulation *const sim, const struct network *net)
+{
+	// Write csv header for probe outputs - record which neurons have been
+	//  probed
+	for (int i = 0; i < net->external_input_count; i++)
+	{
+		const struct input *in = &(net->external_inputs[i]);
+
+		if (sim->potential_trace_fp && sim->log_potential)
+		{
+			fprintf(sim->potential_trace_fp, "i.%d,", in->id);
+		}
+	}
+
+	for (int i = 0; i < sim->potential_probe_count; i++)
+	{
+		const struct neuron *n = sim->potential_probes[i];
+		if (sim->potential_trace_fp && sim->log_potential)
+		{
+			fprintf(sim->potential_trace_fp, "%d.%d,",
+				n->group->id, n->id);
+		}
+	}
+
+	if (sim->potential_trace_fp)
+	{
+		fputc('\n', sim->potential_trace_fp);
+	}
+
+	return;
+}
+
+void sim_message_trace_write_header(const struct simulation *const sim)
+{
+	assert(sim->message_trace_fp);
+	fprintf(sim->message_trace_fp, "timestep,src_neuron,");
+	fprintf(sim->message_trace_fp, "src_hw,dest_hw,hops,spikes,");
+	fprintf(sim->message_trace_fp, "generation_latency,network_latency,");
+	fprintf(sim->message_trace_fp, "processing_latency,blocking_latency\n");
+}
+
+void sim_trace_record_spikes(
+	struct simulation *const sim, const struct network *net)
+{
+	// A trace of all spikes that are generated
+	int spike_probe_count = 0;
+	assert(sim->spike_trace_fp != NULL);
+
+	for (int i = 0; i < net->external_input_count; i++)
+	{
+		const struct input *in = &(net->external_inputs[i]);
+		if (in->send_spike)
+		{
+			char line[64];
+			const int len = snprintf(line, sizeof(line), "i.%d,%d,",
+				in->id, in->send_spike);
+			sim_trace_write(sim, sim->spike_trace_fp, line, len);
+		}
+	}
+
+	for (int i = 0; i < net->neuron_group_count; i++)
+	{
+		const struct neuron_group *group = &(net->groups[i]);
+
+		for (int j = 0; j < group->neuron_count; j++)
+		{
+			const struct neuron *n = &(group->neurons[j]);
+			if (n->log_spikes && n->state->fired)
+			{
+				struct sim_write_spike spike;
+				struct sim_write_spike *record = &spike;
+				if (sim->writer != NULL)
+				{
+					record = (struct sim_write_spike *)
+						sim_writer_reserve(sim->writer,
+							sim->spike_trace_fp,
+							SIM_WRITE_SPIKE,
+							sizeof(spike));
+				}
+				record->timestep = sim->timesteps;
+				record->group_id = n->group->id;
+				record->neuron_id = n->id;
+				if (sim->writer == NULL)
+				{
+					sim_trace_write_spike(
+						sim->spike_trace_fp, record);
+				}
+				spike_probe_count++;
+			}
+		}
+	}
+
+	return;
+}
+
+void sim_trace_write_spike(FILE *fp, const struct sim_write_spike *const spike)
+{
+	fprintf(fp, "%d.%d,%ld\n", spike->group_id, spike->neuron_id,
+		spike->timestep);
+}
+
+void sim_spike_trace_write_binary_header(struct simulation *const sim)
+{
+	const uint32_t version = SIM_SPIKE_TRACE_VERSION;
+	const uint32_t reserved = 0;
+
+	assert(sim->spike_trace_fp != NULL);
+	fwrite(SIM_SPIKE_TRACE_MAGIC, 1, strlen(SIM_SPIKE_TRACE_MAGIC),
+		sim->spike_trace_fp);
+	fwrite(&version, sizeof(version), 1, sim->spike_trace_fp);
+	fwrite(&reserved, sizeof(reserved), 1, sim->spike_trace_fp);
+
+	if (sim->spike_trace_buffer == NULL)
+	{
+		sim->spike_trace_buffer = (unsigned char *) malloc(
+			sizeof(unsigned char) * SIM_SPIKE_TRACE_BUFFER_SIZE);
+		if (sim->spike_trace_buffer == NULL)
+		{
+			INFO("Error: Couldn't allocate spike trace buffer.\n");
+			exit(1);
+		}
+	}
+	sim->spike_trace_buffer_used = 0;
+	sim->spike_trace_last_timestep = 0;
+	sim->spike_trace_last_group_id = 0;
+	sim->spike_trace_last_neuron_id = 0;
+
+	return;
+}
+
+void sim_trace_record_spikes_binary(
+	struct simulation *const sim, const struct network *net)
+{
+	// Each spike is stored as three unsigned varints. The timestep is
+	//  relative to the previous spike. The group id is relative to the
+	//  previous spike in the same timestep, and the neuron id relative to
+	//  the previous spike in the same group and timestep. Otherwise, ids
+	//  are stored as is. Spikes are recorded in id order, so that every
+	//  value is small and positive
+	assert(sim->spike_trace_fp != NULL);
+	assert(sim->spike_trace_buffer != NULL);
+
+	for (int i = 0; i < net->neuron_group_count; i++)
+	{
+		const struct neuron_group *group = &(net->groups[i]);
 
-// 	// Add the synaptic currents, processed by the dendrite
-// 	n->potential += current_in + n->bias;
-// 	n->current = 0.0;
-// 	n->charge = 0.0;
+		for (int j = 0; j < group->neuron_count; j++)
+		{
+			const struct neuron *n = &(group->neurons[j]);
+			unsigned char *record;
+			long int timestep_delta;
+			int group_delta, neuron_delta;
 
-// 	// Apply thresholding and reset
-// 	v = n->potential;
-// 	randomize_threshold = (n->random_range_mask != 0);
-// 	if (randomize_threshold)
-// 	{
-// 		unsigned int r = rand() & n->random_range_mask;
-// 		v += (double) r;
-// 	}
+			if (!n->log_spikes || !n->state->fired)
+			{
+				continue;
+			}
+			if ((sim->spike_trace_buffer_used +
+				SIM_SPIKE_TRACE_MAX_RECORD) >
+				SIM_SPIKE_TRACE_BUFFER_SIZE)
+			{
+				sim_trace_flush_spikes(sim);
+			}
 
-// 	TRACE2("v:%lf +vth:%lf mode:%d -vth:%lf mode:%d\n", v, n->threshold,
-// 		n->group->reset_mode, n->reverse_threshold,
-// 		n->group->reverse_reset_mode);
-// 	if (v >= n->threshold)
-// 	{
-// 		struct soma_processor *soma = n->soma_hw;
-// 		int reset_mode = n->group->reset_mode;
+			timestep_delta = sim->timesteps -
+				sim->spike_trace_last_timestep;
+			group_delta = group->id;
+			neuron_delta = n->id;
+			if (timestep_delta == 0)
+			{
+				group_delta -= sim->spike_trace_last_group_id;
+				if (group_delta == 0)
+				{
+					neuron_delta -=
+						sim->spike_trace_last_neuron_id;
+				}
+			}
+			record = &(sim->spike_trace_buffer[
+				sim->spike_trace_buffer_used]);
+			record += sim_trace_write_varint(record, timestep_delta);
+			record += sim_trace_write_varint(record, group_delta);
+			record += sim_trace_write_varint(record, neuron_delta);
+			sim->spike_trace_buffer_used =
+				record - sim->spike_trace_buffer;
+
+			sim->spike_trace_last_timestep = sim->timesteps;
+			sim->spike_trace_last_group_id = group->id;
+			sim->spike_trace_last_neuron_id = n->id;
+		}
+	}
 
-// 		if (reset_mode == NEURON_RESET_HARD)
-// 		{
-// 			n->potential = n->reset;
-// 		}
-// 		else if (reset_mode == NEURON_RESET_SOFT)
-// 		{
-// 			n->potential -= n->threshold;
-// 		}
-// 		else if (reset_mode == NEURON_RESET_SATURATE)
-// 		{
-// 			n->potential = n->threshold;
-// 		}
-// 		n->fired = 1;
-// 		soma->neurons_fired++;
-// 		latency += soma->latency_spiking;
-// 		if (n->core->buffer_pos != BUFFER_AXON_OUT)
-// 		{
-// 			sim_neuron_send_spike_message(ts, n);
-// 		}
-// 	}
-// 	else if (v <= n->reverse_threshold)
-// 	{
-// 		int reset_mode = n->group->reverse_reset_mode;
-// 		if (reset_mode == NEURON_RESET_HARD)
-// 		{
-// 			n->potential = n->reverse_reset;
-// 		}
-// 		else if (reset_mode == NEURON_RESET_SOFT)
-// 		{
-// 			n->potential += n->reverse_threshold;
-// 		}
-// 		else if (reset_mode == NEURON_RESET_SATURATE)
-// 		{
-// 			n->potential = n->reverse_threshold;
-// 		}
-// 		// No spike is generated
-// 	}
-// 	TRACE2("potential:%lf threshold %lf\n", n->potential, n->threshold);
+	return;
+}
 
-// 	return latency;
-// }
+void sim_trace_flush_spikes(struct simulation *const sim)
+{
+	if ((sim->spike_trace_fp != NULL) &&
+		(sim->spike_trace_buffer_used > 0))
+	{
+		sim_trace_write(sim, sim->spike_trace_fp,
+			sim->spike_trace_buffer, sim->spike_trace_buffer_used);
+		sim_trace_flush_file(sim, sim->spike_trace_fp);
+	}
+	sim->spike_trace_buffer_used = 0;
 
-void sim_neuron_send_spike_message(struct timestep *const ts,
-	struct neuron *n)
+	return;
+}
+
+int sim_trace_write_varint(unsigned char *buffer, uint64_t value)
 {
-	struct core *c = n->core;
-	TRACE1("nid:%d sending spike(s).\n", n->id);
-	int core_id = n->core->id;
+	// Write an unsigned LEB128 varint, returning the number of bytes used
+	int len = 0;
 
+	while (value >= 0x80)
+	{
+		buffer[len++] = (unsigned char) ((value & 0x7f) | 0x80);
+		value >>= 7;
+	}
+	buffer[len++] = (unsigned char) value;
 
-	for (int k = 0; k < n->maps_out_count; k++)
+	return len;
+}
+
+void sim_trace_record_potentials(
+	struct simulation *const sim, const struct network *net)
+{
+	// Each line of this csv file is the potential of all probed neurons for
+	//  one time-step
+	if ((sim->writer != NULL) && (sim->potential_trace_fp != NULL))
 	{
-		struct connection_map *dest_axon;
-		struct message *m;
-		int message_index;
+		const int count = net->external_input_count +
+			sim->potential_probe_count;
+		int *row = (int *) sim_writer_reserve(sim->writer,
+			sim->potential_trace_fp, SIM_WRITE_POTENTIALS,
+			(2 * sizeof(int)) + (count * sizeof(double)));
+		double *potentials = (double *) &(row[2]);
+
+		row[0] = count;
+		row[1] = (sim->potential_probe_count > 0);
+		for (int i = 0; i < net->external_input_count; i++)
+		{
+			*potentials++ = net->external_inputs[i].spike_val;
+		}
+		for (int i = 0; i < sim->potential_probe_count; i++)
+		{
+			*potentials++ =
+				sim_neuron_potential(sim->potential_probes[i]);
+		}
+		return;
+	}
 
-		dest_axon = n->maps_out[k];
-		message_index = ts->message_queues[core_id].count;
+	for (int i = 0; i < net->external_input_count; i++)
+	{
+		const struct input *in = &(net->external_inputs[i]);
+		if (sim->potential_trace_fp)
+		{
+			fprintf(sim->potential_trace_fp, "%lf,", in->spike_val);
+		}
+	}
 
-		// Generate a spike message
-		m = &(ts->messages[core_id][message_index]);
-		arch_init_message(m);
-		m->timestep = ts->timestep;
-		m->src_neuron = n;
-		m->spikes = dest_axon->connection_count;
-		m->dest_neuron = dest_axon->connections[0]->post_neuron;
-		// Add axon access cost to message latency and energy
-		m->generation_latency =
-			c->next_message.generation_latency +
-			c->axon_out.latency_access;
-		sim_message_fifo_push(&(ts->message_queues[core_id]), m);
+	for (int i = 0; i < sim->potential_probe_count; i++)
+	{
+		if (sim->potential_trace_fp)
+		{
+			fprintf(sim->potential_trace_fp, "%lf,",
+				sim_neuron_potential(sim->potential_probes[i]));
+		}
+	}
 
-		c->axon_out.packets_out++;
+	// Each timestep takes up a line in the respective csv file
+	if (sim->potential_trace_fp && (sim->potential_probe_count > 0))
+	{
+		fputc('\n', sim->potential_trace_fp);
+	}
 
-		// Record a spike message at all the connected cores (axons)
-		dest_axon->spikes_received++;
-		dest_axon->message = m;
+	return;
+}
 
-		// Reset the next message in this core
-		arch_init_message(&(c->next_message));
+void sim_trace_write_potentials(FILE *fp, const double *potentials,
+	const int count, const int newline)
+{
+	for (int i = 0; i < count; i++)
+	{
+		fprintf(fp, "%lf,", potentials[i]);
+	}
+	if (newline)
+	{
+		fputc('\n', fp);
+	}
+}
+
+void sim_init_potential_probes(
+	struct simulation *const sim, const struct network *net)
+{
+	// Find every probed neuron up front, so that recording potentials
+	//  doesn't need to check all neurons in the network each timestep
+	sim_free_potential_probes(sim);
+	for (int i = 0; i < net->neuron_group_count; i++)
+	{
+		const struct neuron_group *group = &(net->groups[i]);
+		for (int j = 0; j < group->neuron_count; j++)
+		{
+			if (group->neurons[j].log_potential)
+			{
+				sim->potential_probe_count++;
+			}
+		}
+	}
+	if (sim->potential_probe_count == 0)
+	{
+		return;
+	}
+
+	sim->potential_probes = (struct neuron **) malloc(
+		sizeof(struct neuron *) * sim->potential_probe_count);
+	sim->potential_probe_values = (float *) malloc(
+		sizeof(float) * sim->potential_probe_count);
+	if ((sim->potential_probes == NULL) ||
+		(sim->potential_probe_values == NULL))
+	{
+		INFO("Error: Couldn't allocate potential probes.\n");
+		exit(1);
+	}
+
+	int probe = 0;
+	for (int i = 0; i < net->neuron_group_count; i++)
+	{
+		const struct neuron_group *group = &(net->groups[i]);
+		for (int j = 0; j < group->neuron_count; j++)
+		{
+			if (group->neurons[j].log_potential)
+			{
+				sim->potential_probes[probe++] =
+					&(group->neurons[j]);
+			}
+		}
 	}
 
 	return;
 }
 
-double sim_calculate_energy(const struct architecture *const arch)
+void sim_free_potential_probes(struct simulation *const sim)
 {
-	// Returns the total energy across the design, for this timestep
-	double network_energy, synapse_energy, soma_energy, axon_out_energy;
-	double axon_in_energy, total_energy;
+	free(sim->potential_probes);
+	free(sim->potential_probe_values);
+	sim->potential_probes = NULL;
+	sim->potential_probe_values = NULL;
+	sim->potential_probe_count = 0;
 
-	network_energy = 0.0;
-	axon_in_energy = 0.0;
-	synapse_energy = 0.0;
-	soma_energy = 0.0;
-	axon_out_energy = 0.0;
+	return;
+}
+
+int sim_potential_probe_is_due(
+	const struct simulation *const sim, const long int timestep)
+{
+	return ((timestep % sim->potential_probe_interval) == 0);
+}
+
+void sim_potential_trace_write_binary_header(
+	const struct simulation *const sim)
+{
+	// The header gives the probed neurons, i.e. the columns of the trace.
+	//  Potentials follow as float32 rows, one for each recorded timestep
+	const uint32_t version = SIM_POTENTIAL_TRACE_VERSION;
+	const uint32_t probe_count = sim->potential_probe_count;
+	const uint32_t interval = sim->potential_probe_interval;
+	const uint32_t reserved = 0;
+	const uint64_t first_timestep = ((sim->ts.timestep /
+		sim->potential_probe_interval) + 1) *
+		sim->potential_probe_interval;
+
+	assert(sim->potential_trace_fp != NULL);
+	fwrite(SIM_POTENTIAL_TRACE_MAGIC, 1, strlen(SIM_POTENTIAL_TRACE_MAGIC),
+		sim->potential_trace_fp);
+	fwrite(&version, sizeof(version), 1, sim->potential_trace_fp);
+	fwrite(&probe_count, sizeof(probe_count), 1, sim->potential_trace_fp);
+	fwrite(&interval, sizeof(interval), 1, sim->potential_trace_fp);
+	fwrite(&reserved, sizeof(reserved), 1, sim->potential_trace_fp);
+	fwrite(&first_timestep, sizeof(first_timestep), 1,
+		sim->potential_trace_fp);
+	for (int i = 0; i < sim->potential_probe_count; i++)
+	{
+		const struct neuron *n = sim->potential_probes[i];
+		const uint32_t ids[2] = {(uint32_t) n->group->id,
+			(uint32_t) n->id};
+		fwrite(ids, sizeof(uint32_t), 2, sim->potential_trace_fp);
+	}
+
+	return;
+}
+
+void sim_trace_record_potentials_binary(struct simulation *const sim)
+{
+	assert(sim->potential_trace_fp != NULL);
+	if (sim->potential_probe_count == 0)
+	{
+		return;
+	}
+
+	for (int i = 0; i < sim->potential_probe_count; i++)
+	{
+		sim->potential_probe_values[i] =
+			sim_neuron_potential(sim->potential_probes[i]);
+	}
+	sim_trace_write(sim, sim->potential_trace_fp,
+		sim->potential_probe_values,
+		sizeof(float) * sim->potential_probe_count);
+
+	return;
+}
+
+double sim_neuron_potential(const struct neuron *const n)
+{
+	if (n->group->soma_block != NULL)
+	{
+		return n->group->soma_block->get_potential(n->id);
+	}
+	else if (n->soma_class != NULL)
+	{
+		return n->soma_class->get_potential();
+	}
+
+	return 0.0;
+}
+
+void sim_trace_record_message(
+	struct simulation *const sim, const struct message *const m)
+{
+	struct message_trace_record message;
+	struct message_trace_record *record = &message;
+
+	if (sim->writer != NULL)
+	{
+		record = (struct message_trace_record *) sim_writer_reserve(
+			sim->writer, sim->message_trace_fp, SIM_WRITE_MESSAGE,
+			sizeof(message));
+	}
+	sim_message_trace_fill_record(record, m);
+	if (sim->writer == NULL)
+	{
+		sim_trace_write_message_record(sim->message_trace_fp, record);
+	}
+
+	return;
+}
+
+void sim_trace_write_message_record(
+	FILE *fp, const struct message_trace_record *const record)
+{
+	fprintf(fp, "%ld,", (long int) record->timestep);
+	fprintf(fp, "%d.%d,", record->src_group_id, record->src_neuron_id);
+	fprintf(fp, "%d.%d,", record->src_tile_id, record->src_core_id);
+	fprintf(fp, "%d.%d,", record->dest_tile_id, record->dest_core_id);
+	fprintf(fp, "%d,", record->hops);
+	fprintf(fp, "%d,", record->spikes);
+	fprintf(fp, "%le,", record->generation_latency);
+	fprintf(fp, "%le,", record->network_latency);
+	fprintf(fp, "%le,", record->receive_latency);
+	fprintf(fp, "%le,", record->blocked_latency);
+	fprintf(fp, "%le,", record->sent_timestamp);
+	fprintf(fp, "%le\n", record->processed_timestamp);
+}
 
-	for (int i = 0; i < arch->tile_count; i++)
+void sim_trace_record_messages(
+	struct simulation *const sim, const struct timestep *const ts)
+{
+	// Trace a sample of the messages sent this timestep. Each core's
+	//  messages are followed by its dummy message, which has no
+	//  destination
+	int core_count;
+
+	if ((ts->timestep % sim->message_trace_interval) != 0)
 	{
-		const struct tile *t = &(arch->tiles[i]);
-		double total_hop_energy = t->east_hops * t->energy_east_hop;
+		return;
+	}
 
-		total_hop_energy += t->west_hops * t->energy_west_hop;
-		total_hop_energy += t->south_hops * t->energy_south_hop;
-		total_hop_energy +=  t->north_hops * t->energy_north_hop;
-		network_energy += total_hop_energy;
+	core_count = ts->core_count;
+	if (sim->message_trace_core_count > 0)
+	{
+		core_count = sim->message_trace_core_count;
+	}
+	for (int i = 0; i < core_count; i++)
+	{
+		int core_id = i;
+		if (sim->message_trace_core_count > 0)
+		{
+			core_id = sim->message_trace_cores[i];
+			if (core_id >= ts->core_count)
+			{
+				continue;
+			}
+		}
 
-		for (int j = 0; j < t->core_count; j++)
+		for (int j = 0; ts->messages[core_id][j].dest_neuron != NULL;
+			j++)
 		{
-			const struct core *c = &(t->cores[j]);
+			const struct message *m = &(ts->messages[core_id][j]);
+			if ((sim->message_trace_fraction < 1.0) &&
+				(sim_message_trace_random(sim) >=
+					sim->message_trace_fraction))
+			{
+				continue;
+			}
 
-			axon_in_energy += c->axon_in.spike_messages_in *
-				c->axon_in.energy_spike_message;
-			for (int k = 0; k < c->synapse_count; k++)
+			if (sim->log_messages_binary)
 			{
-				synapse_energy +=
-					c->synapse[k].spikes_processed *
-					c->synapse[k].energy_spike_op;
+				sim_trace_record_message_binary(sim, m);
 			}
-			for (int k = 0; k < c->soma_count; k++)
+			else
 			{
-
-				soma_energy += c->soma[k].neuron_count *
-					c->soma[k].energy_access_neuron;
-				soma_energy += c->soma[k].neuron_updates *
-					c->soma[k].energy_update_neuron;
-				soma_energy += c->soma[k].neurons_fired *
-					c->soma[k].energy_spiking;
+				sim_trace_record_message(sim, m);
 			}
-
-			axon_out_energy += c->axon_out.packets_out *
-				c->axon_out.energy_access;
 		}
 	}
 
-	total_energy = axon_in_energy + synapse_energy + soma_energy +
-		axon_out_energy + network_energy;
-
-	return total_energy;
+	return;
 }
 
-void sim_reset_measurements(struct network *net, struct architecture *arch)
+void sim_message_trace_write_binary_header(struct simulation *const sim)
 {
-	for (int i = 0; i < net->neuron_group_count; i++)
-	{
-		struct neuron_group *group = &(net->groups[i]);
+	const uint32_t version = SIM_MESSAGE_TRACE_VERSION;
+	const uint32_t record_size = sizeof(struct message_trace_record);
 
-		for (int j = 0; j < group->neuron_count; j++)
+	assert(sim->message_trace_fp != NULL);
+	fwrite(SIM_MESSAGE_TRACE_MAGIC, 1, strlen(SIM_MESSAGE_TRACE_MAGIC),
+		sim->message_trace_fp);
+	fwrite(&version, sizeof(version), 1, sim->message_trace_fp);
+	fwrite(&record_size, sizeof(record_size), 1, sim->message_trace_fp);
+
+	if (sim->message_trace_buffer == NULL)
+	{
+		sim->message_trace_buffer = (struct message_trace_record *)
+			malloc(sizeof(struct message_trace_record) *
+				SIM_MESSAGE_TRACE_BUFFER_SIZE);
+		if (sim->message_trace_buffer == NULL)
 		{
-			struct neuron *n = &(group->neurons[j]);
-			// Neurons can be manually forced to update, for example
-			//  if they have a constant input bias
-			n->update_needed |=
-				(n->force_update || (n->neuron_status >= 1));
-			n->processing_latency = 0.0;
-			n->fired = 0;
-
-			for (int k = 0; k < n->maps_out_count; k++)
-			{
-				struct connection_map *a = n->maps_out[k];
-				a->spikes_received = 0;
-			}
+			INFO("Error: Couldn't allocate message trace buffer.\n");
+			exit(1);
 		}
 	}
+	sim->message_trace_buffer_used = 0;
 
-	// Reset any energy, time latency or other measurements of network
-	//  hardware
-	for (int i = 0; i < arch->tile_count; i++)
-	{
-		struct tile *t = &(arch->tiles[i]);
-		// Reset tile
-		t->energy = 0.0;
-		t->blocked_until = 0.0;
+	return;
+}
 
-		t->hops = 0;
-		t->east_hops = 0;
-		t->west_hops = 0;
-		t->south_hops = 0;
-		t->north_hops = 0;
-		t->messages_received = 0;
-		for (int j = 0; j < t->core_count; j++)
-		{
-			struct core *c = &(t->cores[j]);
-			// Reset core
-			c->energy = 0.0;
-			c->blocked_until = 0.0;
-			arch_init_message(&(c->next_message));
+void sim_trace_record_message_binary(
+	struct simulation *const sim, const struct message *const m)
+{
+	struct message_trace_record *record;
 
-			c->axon_in.spike_messages_in = 0L;
-			c->axon_in.energy = 0.0;
-			c->axon_in.time = 0;
-			c->dendrite.energy = 0.0;
-			c->dendrite.time = 0.0;
+	assert(sim->message_trace_buffer != NULL);
+	if (sim->message_trace_buffer_used >= SIM_MESSAGE_TRACE_BUFFER_SIZE)
+	{
+		sim_trace_flush_messages(sim);
+	}
+	record = &(sim->message_trace_buffer[sim->message_trace_buffer_used]);
+	sim->message_trace_buffer_used++;
+	sim_message_trace_fill_record(record, m);
 
-			for (int k = 0; k < c->synapse_count; k++)
-			{
-				c->synapse[k].energy = 0.0;
-				c->synapse[k].time = 0.0;
-				c->synapse[k].spikes_processed = 0;
-			}
+	return;
+}
 
-			for (int k = 0; k < c->soma_count; k++)
-			{
-				c->soma[k].energy = 0.0;
-				c->soma[k].time = 0.0;
-				c->soma[k].neuron_updates = 0L;
-				c->soma[k].neurons_fired = 0L;
-			}
+void sim_message_trace_fill_record(
+	struct message_trace_record *const record, const struct message *const m)
+{
+	assert(m->src_neuron != NULL);
+	assert(m->src_neuron->core != NULL);
+	assert(m->src_neuron->core->t != NULL);
+	assert(m->dest_neuron->core != NULL);
+	assert(m->dest_neuron->core->t != NULL);
 
-			c->axon_out.energy = 0.0;
-			c->axon_out.time = 0.0;
-			c->axon_out.packets_out = 0;
-		}
-	}
+	record->timestep = m->timestep;
+	record->src_group_id = m->src_neuron->group->id;
+	record->src_neuron_id = m->src_neuron->id;
+	record->src_tile_id = m->src_neuron->core->t->id;
+	record->src_core_id = m->src_neuron->core->id;
+	record->dest_tile_id = m->dest_neuron->core->t->id;
+	record->dest_core_id = m->dest_neuron->core->id;
+	record->hops = m->hops;
+	record->spikes = m->spikes;
+	record->generation_latency = m->generation_latency;
+	record->network_latency = m->network_latency;
+	record->receive_latency = m->receive_latency;
+	record->blocked_latency = m->blocked_latency;
+	record->sent_timestamp = m->sent_timestamp;
+	record->processed_timestamp = m->processed_timestamp;
+
+	return;
 }
 
-void sim_perf_write_header(FILE *fp)
+void sim_trace_flush_messages(struct simulation *const sim)
 {
-	fprintf(fp, "time,");
-	fprintf(fp, "fired,");
-	fprintf(fp, "packets,");
-	fprintf(fp, "hops,");
-	fprintf(fp, "total_energy,");
-	fprintf(fp, "\n");
+	if ((sim->message_trace_fp != NULL) &&
+		(sim->message_trace_buffer_used > 0))
+	{
+		sim_trace_write(sim, sim->message_trace_fp,
+			sim->message_trace_buffer,
+			sizeof(struct message_trace_record) *
+				sim->message_trace_buffer_used);
+		sim_trace_flush_file(sim, sim->message_trace_fp);
+	}
+	sim->message_trace_buffer_used = 0;
+
+	return;
 }
 
-void sim_perf_log_timestep(const struct timestep *const ts, FILE *fp)
+double sim_message_trace_random(struct simulation *const sim)
 {
-	fprintf(fp, "%le,", ts->sim_time);
-	fprintf(fp, "%ld,", ts->total_neurons_fired);
-	fprintf(fp, "%ld,", ts->packets_sent);
-	fprintf(fp, "%ld,", ts->total_hops);
-	fprintf(fp, "%le,", ts->energy);
-	fprintf(fp, "\n");
+	// Uniform random number in [0, 1), using a separate xorshift
+	//  generator so that sampling doesn't change any random inputs
+	uint64_t x = sim->message_trace_rng;
+
+	x ^= x << 13;
+	x ^= x >> 7;
+	x ^= x << 17;
+	sim->message_trace_rng = x;
+
+	return (x >> 11) * (1.0 / 9007199254740992.0);
 }
 
-void sim_write_summary(FILE *fp, const struct simulation *sim)
+void sim_trace_write(struct simulation *const sim, FILE *fp,
+	const void *data, const size_t size)
 {
-	// Write the simulation summary to file
-	fprintf(fp, "git_version: %s\n", GIT_COMMIT);
-	fprintf(fp, "energy: %e\n", sim->total_energy);
-	fprintf(fp, "time: %e\n", sim->total_sim_time);
-	fprintf(fp, "total_spikes: %ld\n", sim->total_spikes);
-	fprintf(fp, "total_packets: %ld\n", sim->total_messages_sent);
-	fprintf(fp, "total_neurons_fired: %ld\n", sim->total_neurons_fired);
-	fprintf(fp, "wall_time: %lf\n", sim->wall_time);
-	fprintf(fp, "timesteps: %ld\n", sim->timesteps);
+	// Write raw trace data, either now or by the writer thread
+	if (sim->writer != NULL)
+	{
+		void *payload = sim_writer_reserve(sim->writer, fp,
+			SIM_WRITE_BYTES, size);
+		memcpy(payload, data, size);
+	}
+	else
+	{
+		fwrite(data, 1, size, fp);
+	}
+
+	return;
 }
 
-void sim_spike_trace_write_header(const struct simulation *const sim)
+void sim_trace_flush_file(struct simulation *const sim, FILE *fp)
 {
-	assert(sim->spike_trace_fp != NULL);
-	fprintf(sim->spike_trace_fp, "gid.nid,timestep\n");
+	if (sim->writer != NULL)
+	{
+		sim_writer_reserve(sim->writer, fp, SIM_WRITE_FLUSH, 0);
+	}
+	else
+	{
+		fflush(fp);
+	}
 
 	return;
 }
 
-void sim_potential_trace_write_header(
-	const struct simulation *const sim, const struct network *net)
+struct sim_writer *sim_writer_init(void)
 {
-	// Write csv header for probe outputs - record which neurons have been
-	//  probed
-	for (int i = 0; i < net->external_input_count; i++)
+	struct sim_writer *w =
+		(struct sim_writer *) malloc(sizeof(struct sim_writer));
+	if (w == NULL)
 	{
-		const struct input *in = &(net->external_inputs[i]);
-
-		if (sim->potential_trace_fp && sim->log_potential)
-		{
-			fprintf(sim->potential_trace_fp, "i.%d,", in->id);
-		}
+		INFO("Error: Couldn't allocate trace writer.\n");
+		exit(1);
 	}
 
-	for (int i = 0; i < net->neuron_group_count; i++)
+	for (int i = 0; i < 2; i++)
 	{
-		const struct neuron_group *group = &(net->groups[i]);
-		for (int j = 0; j < group->neuron_count; j++)
+		w->blocks[i].data = (unsigned char *) malloc(
+			sizeof(unsigned char) * SIM_WRITER_BLOCK_SIZE);
+		if (w->blocks[i].data == NULL)
 		{
-			const struct neuron *n = &(group->neurons[j]);
-			if (sim->potential_trace_fp && sim->log_potential &&
-				n->log_potential)
-			{
-				fprintf(sim->potential_trace_fp, "%d.%d,",
-					group->id, n->id);
-			}
+			INFO("Error: Couldn't allocate trace writer block.\n");
+			exit(1);
 		}
+		w->blocks[i].used = 0;
+		w->blocks[i].capacity = SIM_WRITER_BLOCK_SIZE;
 	}
-
-	if (sim->potential_trace_fp)
+	w->filling = &(w->blocks[0]);
+	w->writing = NULL;
+	w->stalls = 0;
+	w->stop = 0;
+
+	pthread_mutex_init(&(w->lock), NULL);
+	pthread_cond_init(&(w->block_ready), NULL);
+	pthread_cond_init(&(w->block_done), NULL);
+	if (pthread_create(&(w->thread), NULL, sim_writer_thread, w) != 0)
 	{
-		fputc('\n', sim->potential_trace_fp);
+		INFO("Error: Couldn't start trace writer thread.\n");
+		exit(1);
 	}
 
-	return;
+	return w;
 }
 
-void sim_message_trace_write_header(const struct simulation *const sim)
+void sim_writer_free(struct sim_writer *const w)
 {
-	assert(sim->message_trace_fp);
-	fprintf(sim->message_trace_fp, "timestep,src_neuron,");
-	fprintf(sim->message_trace_fp, "src_hw,dest_hw,hops,spikes,");
-	fprintf(sim->message_trace_fp, "generation_latency,network_latency,");
-	fprintf(sim->message_trace_fp, "processing_latency,blocking_latency\n");
+	// Write everything still buffered, then stop the thread
+	sim_writer_flush(w);
+	pthread_mutex_lock(&(w->lock));
+	w->stop = 1;
+	pthread_cond_signal(&(w->block_ready));
+	pthread_mutex_unlock(&(w->lock));
+	pthread_join(w->thread, NULL);
+	TRACE1("Trace writer stalled %ld times.\n", w->stalls);
+
+	pthread_mutex_destroy(&(w->lock));
+	pthread_cond_destroy(&(w->block_ready));
+	pthread_cond_destroy(&(w->block_done));
+	free(w->blocks[0].data);
+	free(w->blocks[1].data);
+	free(w);
+
+	return;
 }
 
-void sim_trace_record_spikes(
-	const struct simulation *const sim, const struct network *net)
+void *sim_writer_reserve(struct sim_writer *const w, FILE *fp,
+	const int type, const size_t size)
 {
-	// A trace of all spikes that are generated
-	int spike_probe_count = 0;
-	assert(sim->spike_trace_fp != NULL);
-
-	for (int i = 0; i < net->external_input_count; i++)
+	// Add a record to the block being filled and return its payload. If
+	//  the block is full, hand it over, waiting for the writer thread to
+	//  finish the other block if needed
+	struct sim_write_header *header;
+	const size_t padded = (size + 7) & ~((size_t) 7);
+	const size_t record_size = sizeof(struct sim_write_header) + padded;
+
+	assert(fp != NULL);
+	if ((w->filling->used + record_size) > w->filling->capacity)
 	{
-		const struct input *in = &(net->external_inputs[i]);
-		if (in->send_spike)
+		sim_writer_submit(w, 1);
+	}
+	if (record_size > w->filling->capacity)
+	{
+		// Only single records larger than a block grow it
+		w->filling->data = (unsigned char *) realloc(
+			w->filling->data, record_size);
+		if (w->filling->data == NULL)
 		{
-			fprintf(sim->spike_trace_fp, "i.%d,%d,", in->id,
-				in->send_spike);
+			INFO("Error: Couldn't allocate trace writer block.\n");
+			exit(1);
 		}
+		w->filling->capacity = record_size;
 	}
 
-	for (int i = 0; i < net->neuron_group_count; i++)
-	{
-		const struct neuron_group *group = &(net->groups[i]);
+	header = (struct sim_write_header *)
+		&(w->filling->data[w->filling->used]);
+	header->fp = fp;
+	header->type = type;
+	header->size = size;
+	w->filling->used += record_size;
 
-		for (int j = 0; j < group->neuron_count; j++)
+	return (void *) &(header[1]);
+}
+
+void sim_writer_submit(struct sim_writer *const w, const int wait)
+{
+	// Hand the filled block to the writer thread. If the thread is still
+	//  writing the other block, either wait for it or keep filling
+	pthread_mutex_lock(&(w->lock));
+	while (w->writing != NULL)
+	{
+		if (!wait)
 		{
-			const struct neuron *n = &(group->neurons[j]);
-			if (n->log_spikes && n->fired)
-			{
-				fprintf(sim->spike_trace_fp, "%d.%d,%ld\n",
-					n->group->id, n->id, sim->timesteps);
-				spike_probe_count++;
-			}
+			pthread_mutex_unlock(&(w->lock));
+			return;
+		}
+		w->stalls++;
+		pthread_cond_wait(&(w->block_done), &(w->lock));
+	}
+	if (w->filling->used > 0)
+	{
+		w->writing = w->filling;
+		if (w->filling == &(w->blocks[0]))
+		{
+			w->filling = &(w->blocks[1]);
+		}
+		else
+		{
+			w->filling = &(w->blocks[0]);
 		}
+		pthread_cond_signal(&(w->block_ready));
 	}
+	pthread_mutex_unlock(&(w->lock));
 
 	return;
 }
 
-void sim_trace_record_potentials(
-	const struct simulation *const sim, const struct network *net)
+void sim_writer_flush(struct sim_writer *const w)
 {
-	// Each line of this csv file is the potential of all probed neurons for
-	//  one time-step
-	int potential_probe_count = 0;
+	// Wait until every record so far has been written
+	sim_writer_submit(w, 1);
+	pthread_mutex_lock(&(w->lock));
+	while (w->writing != NULL)
+	{
+		pthread_cond_wait(&(w->block_done), &(w->lock));
+	}
+	pthread_mutex_unlock(&(w->lock));
 
-	for (int i = 0; i < net->external_input_count; i++)
+	return;
+}
+
+void *sim_writer_thread(void *arg)
+{
+	struct sim_writer *w = (struct sim_writer *) arg;
+
+	pthread_mutex_lock(&(w->lock));
+	while (1)
 	{
-		const struct input *in = &(net->external_inputs[i]);
-		if (sim->potential_trace_fp)
+		struct sim_writer_block *block;
+
+		while ((w->writing == NULL) && !w->stop)
 		{
-			fprintf(sim->potential_trace_fp, "%lf,", in->spike_val);
+			pthread_cond_wait(&(w->block_ready), &(w->lock));
 		}
-	}
+		if (w->writing == NULL)
+		{
+			break;
+		}
+		block = w->writing;
+		pthread_mutex_unlock(&(w->lock));
 
-	// for (int i = 0; i < net->neuron_group_count; i++)
-	// {
-	// 	const struct neuron_group *group = &(net->groups[i]);
-	// 	for (int j = 0; j < group->neuron_count; j++)
-	// 	{
-	// 		const struct neuron *n = &(group->neurons[j]);
-	// 		if (sim->potential_trace_fp && n->log_potential)
-	// 		{
-	// 			fprintf(sim->potential_trace_fp, "%lf,",
-	// 				n->potential);
-	// 			potential_probe_count++;
-	// 		}
-	// 	}
-	// }
+		sim_writer_write_block(block);
 
-	// Each timestep takes up a line in the respective csv file
-	if (sim->potential_trace_fp && (potential_probe_count > 0))
-	{
-		fputc('\n', sim->potential_trace_fp);
+		pthread_mutex_lock(&(w->lock));
+		block->used = 0;
+		w->writing = NULL;
+		pthread_cond_signal(&(w->block_done));
 	}
+	pthread_mutex_unlock(&(w->lock));
 
-	return;
+	return NULL;
 }
 
-void sim_trace_record_message(
-	const struct simulation *const sim, const struct message *const m)
+void sim_writer_write_block(const struct sim_writer_block *const block)
 {
-	fprintf(sim->message_trace_fp, "%ld,", m->timestep);
-	assert(m->src_neuron != NULL);
-	fprintf(sim->message_trace_fp, "%d.%d,", m->src_neuron->group->id,
-		m->src_neuron->id);
-	assert(m->src_neuron->core != NULL);
-	assert(m->src_neuron->core->t != NULL);
-	fprintf(sim->message_trace_fp, "%d.%d,", m->src_neuron->core->t->id,
-		m->src_neuron->core->id);
+	// Format and write every record in the block, in the order they were
+	//  added
+	size_t pos = 0;
 
-	assert(m->dest_neuron->core != NULL);
-	assert(m->dest_neuron->core->t != NULL);
-	fprintf(sim->message_trace_fp, "%d.%d,", m->dest_neuron->core->t->id,
-		m->dest_neuron->core->id);
-	fprintf(sim->message_trace_fp, "%d,", m->hops);
-	fprintf(sim->message_trace_fp, "%d,", m->spikes);
-	fprintf(sim->message_trace_fp, "%le,", m->generation_latency);
-	fprintf(sim->message_trace_fp, "%le,", m->network_latency);
-	fprintf(sim->message_trace_fp, "%le,", m->receive_latency);
-	fprintf(sim->message_trace_fp, "%le,", m->blocked_latency);
-	fprintf(sim->message_trace_fp, "%le,", m->sent_timestamp);
-	fprintf(sim->message_trace_fp, "%le\n", m->processed_timestamp);
+	while (pos < block->used)
+	{
+		const struct sim_write_header *header =
+			(const struct sim_write_header *) &(block->data[pos]);
+		const void *payload = (const void *) &(header[1]);
+
+		switch (header->type)
+		{
+		case SIM_WRITE_BYTES:
+			fwrite(payload, 1, header->size, header->fp);
+			break;
+		case SIM_WRITE_FLUSH:
+			fflush(header->fp);
+			break;
+		case SIM_WRITE_SPIKE:
+			sim_trace_write_spike(header->fp,
+				(const struct sim_write_spike *) payload);
+			break;
+		case SIM_WRITE_POTENTIALS:
+		{
+			const int *row = (const int *) payload;
+			sim_trace_write_potentials(header->fp,
+				(const double *) &(row[2]), row[0], row[1]);
+			break;
+		}
+		case SIM_WRITE_PERF:
+			sim_perf_write_timestep(header->fp,
+				(const struct sim_write_perf *) payload);
+			break;
+		case SIM_WRITE_MESSAGE:
+			sim_trace_write_message_record(header->fp,
+				(const struct message_trace_record *) payload);
+			break;
+		default:
+			break;
+		}
+		pos += sizeof(struct sim_write_header) +
+			((header->size + 7) & ~((size_t) 7));
+	}
 
 	return;
 }
@@ -13,19 +13,112 @@
 
 #define RAND_SEED 0xbeef // For srand()
 #define MIN(x, y) (((x) < (y)) ? (x) : (y))
+#define MAX(x, y) (((x) > (y)) ? (x) : (y))
 #define MAX_NOISE_FILE_ENTRY 128
+#define SIM_NEURON_CHUNK 256 // Neurons processed together in one core
+#define SIM_SPIKE_TRACE_MAGIC "SANASPKB"
+#define SIM_SPIKE_TRACE_VERSION 1
+#define SIM_SPIKE_TRACE_BUFFER_SIZE (1 << 20) // Bytes
+#define SIM_SPIKE_TRACE_MAX_RECORD 30 // Three varints of up to 10 bytes
+#define SIM_POTENTIAL_TRACE_MAGIC "SANAPOTB"
+#define SIM_POTENTIAL_TRACE_VERSION 1
+#define SIM_PERF_INITIAL_CAPACITY 1024 // Timesteps
+#define SIM_SPIKE_RECORD_INITIAL_CAPACITY 4096 // Spikes
+#define SIM_MESSAGE_TRACE_MAGIC "SANAMSGB"
+#define SIM_MESSAGE_TRACE_VERSION 1
+#define SIM_MESSAGE_TRACE_BUFFER_SIZE 65536 // Records
+#define SIM_WRITER_BLOCK_SIZE (4 << 20) // Bytes
 
 #include "arch.hpp"
 #include "network.hpp"
 #include "stdio.h"
+#include <pthread.h>
+#include <stdint.h>
 
 struct timestep
 {
-	struct message messages[ARCH_MAX_CORES][ARCH_MAX_CONNECTION_MAP+1];
-	struct message_fifo message_queues[ARCH_MAX_CORES];
+	// Each core has its own message arena, indexed by the core id. The
+	//  arenas are sized for the most messages a core can send in a single
+	//  timestep (i.e. one per output connection map + one dummy message)
+	struct message **messages;
+	struct message *message_arena;
+	struct message_fifo *message_queues;
 	long int timestep, spike_count, total_hops, packets_sent;
 	long int total_neurons_fired, spikes;
 	double energy, sim_time;
+	int core_count;
+};
+
+struct message_trace_record
+{
+	// Fixed-size record in the binary message trace. Cores use their
+	//  global id
+	int64_t timestep;
+	int32_t src_group_id, src_neuron_id, src_tile_id, src_core_id;
+	int32_t dest_tile_id, dest_core_id, hops, spikes;
+	double generation_latency, network_latency, receive_latency;
+	double blocked_latency, sent_timestamp, processed_timestamp;
+};
+
+enum sim_write_type
+{
+	SIM_WRITE_BYTES,
+	SIM_WRITE_FLUSH,
+	SIM_WRITE_SPIKE,
+	SIM_WRITE_POTENTIALS,
+	SIM_WRITE_PERF,
+	SIM_WRITE_MESSAGE,
+};
+
+struct sim_write_header
+{
+	// Every record in a writer block starts with this header. Payloads
+	//  are padded to keep the following header aligned
+	FILE *fp;
+	int type, size;
+};
+
+struct sim_write_spike
+{
+	long int timestep;
+	int group_id, neuron_id;
+};
+
+struct sim_write_perf
+{
+	double sim_time, energy;
+	long int fired, packets, hops;
+};
+
+struct sim_writer_block
+{
+	unsigned char *data;
+	size_t used, capacity;
+};
+
+struct sim_writer
+{
+	// Trace records are formatted and written by a background thread. The
+	//  simulation fills one block while the thread writes the other. It
+	//  only waits for the thread if its block fills up first, so at most
+	//  two blocks of trace data are ever held in memory
+	pthread_t thread;
+	pthread_mutex_t lock;
+	pthread_cond_t block_ready, block_done;
+	struct sim_writer_block blocks[2];
+	struct sim_writer_block *filling, *writing;
+	long int stalls;
+	int stop;
+};
+
+struct sim_perf_buffer
+{
+	// Performance counters stored as columns, one entry per timestep. The
+	//  buffer is shared with any arrays returned to Python and is freed
+	//  once nothing refers to it
+	double *time, *energy;
+	long int *fired, *packets, *hops;
+	long int references;
 };
 
 struct simulation
@@ -38,15 +131,120 @@ struct simulation
 	int gui_on;
 	FILE *spike_trace_fp, *potential_trace_fp, *message_trace_fp, *perf_fp;
 	FILE *stats_fp;
+	// Binary spike traces are delta encoded and written in large blocks
+	int log_spikes_binary;
+	unsigned char *spike_trace_buffer;
+	long int spike_trace_buffer_used, spike_trace_last_timestep;
+	int spike_trace_last_group_id, spike_trace_last_neuron_id;
+	// Neurons with potential probes, found once when the network is set.
+	//  Probes are recorded every interval timesteps
+	struct neuron **potential_probes;
+	float *potential_probe_values;
+	int potential_probe_count, potential_probe_interval;
+	int log_potential_binary;
+	// Performance counters for every timestep simulated, kept in memory
+	struct sim_perf_buffer *perf;
+	long int perf_count, perf_capacity;
+	// Spikes recorded in memory for the selected groups, kept until they
+	//  are drained
+	int record_spikes;
+	char spike_record_groups[NETWORK_MAX_NEURON_GROUPS];
+	long int *spike_record_timesteps;
+	int *spike_record_group_ids, *spike_record_neuron_ids;
+	long int spike_record_count, spike_record_capacity;
+	// Messages may be sampled, only tracing every interval timesteps, a
+	//  random fraction of messages or messages from selected cores. Binary
+	//  records are buffered and written in bulk
+	int log_messages_binary, message_trace_interval;
+	int *message_trace_cores;
+	int message_trace_core_count;
+	double message_trace_fraction;
+	uint64_t message_trace_rng;
+	struct message_trace_record *message_trace_buffer;
+	long int message_trace_buffer_used;
+	// Writes traces asynchronously if set, otherwise traces are written
+	//  as they are recorded
+	struct sim_writer *writer;
+};
+
+struct timing_queue
+{
+	// Binary min-heap of core message queues, ordered by the send time of
+	//  the next message in each queue. Ties are broken using an insertion
+	//  order, which matches the original sorted-list scheduler exactly
+	struct message_fifo **heap;
+	long int front_order, back_order;
+	int count, capacity;
+};
+
+struct lookahead_entry
+{
+	double time;
+	struct message_fifo *q;
+	struct message *m;
+};
+
+struct lookahead_queue
+{
+	// Binary min-heap of the earliest time each core could send its
+	//  following message, used by the parallel scheduler
+	struct lookahead_entry *heap;
+	long int count, capacity;
+};
+
+struct connection_map_state
+{
+	long int last_updated;
+	int spikes_received, active_synapses;
+};
+
+struct sim_variant
+{
+	// The dynamic state of one variant in a batch. All variants share the
+	//  same network topology and connection maps, so only the state that
+	//  changes while simulating is stored. The state of the active variant
+	//  is held in the network and architecture structures themselves
+	struct simulation *sim;
+	struct neuron_state *neurons;
+	char *neuron_active;
+	struct connection_map_state *maps;
+	double *connection_currents;
+	long int neuron_count, connection_count, map_count;
 };
 
 void sim_timestep(struct timestep *const ts, struct network *const net, struct architecture *const arch);
 struct simulation *sim_init_sim(void);
 void sim_init_timestep(struct timestep *const ts);
+void sim_allocate_messages(struct timestep *const ts, const struct architecture *const arch);
+void sim_free_messages(struct timestep *const ts);
 
+int sim_thread_count(const struct architecture *const arch);
 void sim_process_neurons(struct timestep *const ts, struct network *net, struct architecture *arch);
+void sim_process_core_neurons(struct timestep *const ts, struct core *c);
+int sim_update_soma_blocks(struct core *c, const int first, const int last, int run_id);
+void sim_process_active_neurons(struct timestep *const ts, struct core *c);
+void sim_update_active_soma_blocks(struct core *c, const int first, const int last);
+void sim_add_idle_latency(struct core *c, const int first, const int last);
+void sim_init_neuron_state(struct architecture *const arch);
+void sim_init_soma_block_runs(struct core *c);
+void sim_init_active_neurons(struct architecture *const arch);
+void sim_list_active_neurons(struct core *c);
+int sim_neuron_is_active(const struct neuron *const n);
+void sim_activate_neuron(struct neuron *const n);
+void sim_init_variant(struct sim_variant *const v, struct simulation *const sim, const struct network *const net, const struct architecture *const arch);
+void sim_free_variant(struct sim_variant *const v);
+void sim_save_variant(struct sim_variant *const v, const struct network *const net, const struct architecture *const arch);
+void sim_load_variant(const struct sim_variant *const v, struct network *const net, struct architecture *const arch, const int variant_id);
 void sim_receive_messages(struct timestep *const sim, struct architecture *arch);
-double sim_schedule_messages(struct message_fifo *const messages_sent);
+double sim_schedule_messages(struct message_fifo *const messages_sent, const int core_count);
+double sim_schedule_messages_parallel(struct message_fifo *const messages_sent, const int core_count, const int tile_count, const int thread_count);
+double sim_schedule_message(struct message_fifo *const q);
+double sim_message_lookahead(const struct message_fifo *const q);
+int sim_message_dest_tile(const struct message *const m, const int tile_count);
+void sim_init_lookahead(struct lookahead_queue *const lookahead, const long int capacity);
+void sim_free_lookahead(struct lookahead_queue *const lookahead);
+void sim_push_lookahead(struct lookahead_queue *const lookahead, struct message_fifo *const q);
+double sim_earliest_lookahead(struct lookahead_queue *const lookahead);
 // TODO: reimplement
 int sim_input_spikes(struct network *net);
 
@@ -55,14 +253,16 @@ double sim_pipeline_receive(struct timestep *const ts, struct core *c, struct co
 double sim_update_synapse(struct timestep *const ts, struct connection_map *axon, const int synaptic_lookup);
 double sim_update_dendrite(struct timestep *const ts, struct neuron *n, const double charge);
 double sim_update_soma(struct timestep *const ts, struct neuron *n, const double current_in);
+double sim_update_soma_status(struct timestep *const ts, struct neuron *n);
 double sim_update_axon(struct neuron *n);
-double sim_estimate_network_costs(struct tile *const src, struct tile *const dest);
+double sim_estimate_network_costs(struct tile *const src, struct core *const dest_core);
 void sim_neuron_send_spike_message(struct timestep *const ts, struct neuron *n);
 
 double sim_update_soma_latency(struct timestep *const ts, struct neuron *n);
 double sim_update_soma_lif(struct timestep *const ts, struct neuron *n, const double current_in);
 double sim_update_soma_truenorth(struct timestep *const ts, struct neuron *n, const double current_in);
 
+void sim_reset_neuron(struct neuron *const n);
 void sim_reset_measurements(struct network *net, struct architecture *arch);
 double sim_calculate_energy(const struct architecture *const arch);
 double sim_calculate_time(const struct architecture *const arch);
@@ -73,17 +273,56 @@ void sim_write_summary(FILE *fp, const struct simulation *stats);
 void sim_spike_trace_write_header(const struct simulation *const sim);
 void sim_potential_trace_write_header(const struct simulation *const sim, const struct network *net);
 void sim_message_trace_write_header(const struct simulation *const sim);
-void sim_trace_record_spikes(const struct simulation *const sim, const struct network *net);
-void sim_trace_record_potentials(const struct simulation *const sim, const struct network *net);
-void sim_trace_record_message(const struct simulation *const sim, const struct message *const m);
+void sim_trace_record_spikes(struct simulation *const sim, const struct network *net);
+void sim_trace_write_spike(FILE *fp, const struct sim_write_spike *const spike);
+void sim_spike_trace_write_binary_header(struct simulation *const sim);
+void sim_trace_record_spikes_binary(struct simulation *const sim, const struct network *net);
+void sim_trace_flush_spikes(struct simulation *const sim);
+int sim_trace_write_varint(unsigned char *buffer, uint64_t value);
+void sim_trace_record_potentials(struct simulation *const sim, const struct network *net);
+void sim_trace_write_potentials(FILE *fp, const double *potentials, const int count, const int newline);
+void sim_init_potential_probes(struct simulation *const sim, const struct network *net);
+void sim_free_potential_probes(struct simulation *const sim);
+int sim_potential_probe_is_due(const struct simulation *const sim, const long int timestep);
+void sim_potential_trace_write_binary_header(const struct simulation *const sim);
+void sim_trace_record_potentials_binary(struct simulation *const sim);
+double sim_neuron_potential(const struct neuron *const n);
+void sim_trace_record_message(struct simulation *const sim, const struct message *const m);
+void sim_trace_record_messages(struct simulation *const sim, const struct timestep *const ts);
+void sim_message_trace_write_binary_header(struct simulation *const sim);
+void sim_trace_record_message_binary(struct simulation *const sim, const struct message *const m);
+void sim_trace_flush_messages(struct simulation *const sim);
+double sim_message_trace_random(struct simulation *const sim);
+void sim_message_trace_fill_record(struct message_trace_record *const record, const struct message *const m);
+void sim_trace_write_message_record(FILE *fp, const struct message_trace_record *const record);
+void sim_trace_write(struct simulation *const sim, FILE *fp, const void *data, const size_t size);
+void sim_trace_flush_file(struct simulation *const sim, FILE *fp);
+struct sim_writer *sim_writer_init(void);
+void sim_writer_free(struct sim_writer *const w);
+void *sim_writer_reserve(struct sim_writer *const w, FILE *fp, const int type, const size_t size);
+void sim_writer_submit(struct sim_writer *const w, const int wait);
+void sim_writer_flush(struct sim_writer *const w);
+void *sim_writer_thread(void *arg);
+void sim_writer_write_block(const struct sim_writer_block *const block);
 void sim_perf_write_header(FILE *perf_fp);
-void sim_perf_log_timestep(const struct timestep *const ts, FILE *fp);
+void sim_perf_log_timestep(struct simulation *const sim, const struct timestep *const ts);
+void sim_perf_write_timestep(FILE *fp, const struct sim_write_perf *const perf);
+void sim_perf_record_timestep(struct simulation *const sim, const struct timestep *const ts);
+void sim_free_perf(struct simulation *const sim);
+struct sim_perf_buffer *sim_alloc_perf_buffer(const long int capacity);
+void sim_release_perf_buffer(struct sim_perf_buffer *const buffer);
+void sim_record_spikes(struct simulation *const sim, const struct network *net, const long int timestep);
+void sim_record_spike(struct simulation *const sim, const long int timestep, const int group_id, const int neuron_id);
+void sim_free_spike_record(struct simulation *const sim);
 int sim_poisson_input(const double firing_probability);
 int sim_rate_input(const double firing_rate, double *spike_val);
 
-struct message_fifo *sim_init_timing_priority(struct message_fifo *const send_queues);
-void sim_insert_priority_queue(struct message_fifo **priority_queue, struct message_fifo *c);
-struct message_fifo *sim_pop_priority_queue(struct message_fifo **priority_queue);
+void sim_init_timing_priority(struct timing_queue *const priority_queue, struct message_fifo *const send_queues, const int core_count);
+void sim_free_timing_priority(struct timing_queue *const priority_queue);
+void sim_push_priority_queue(struct timing_queue *const priority_queue, struct message_fifo *core_message_fifo);
+void sim_insert_priority_queue(struct timing_queue *const priority_queue, struct message_fifo *c);
+struct message_fifo *sim_pop_priority_queue(struct timing_queue *const priority_queue);
+int sim_priority_queue_less(const struct message_fifo *const a, const struct message_fifo *const b);
 
 void sim_message_fifo_push(struct message_fifo *queue, struct message *m);
 struct message *sim_message_fifo_pop(struct message_fifo *queue);
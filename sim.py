@@ -8,10 +8,46 @@ sim.py - Simulator script and utility functionality
 """
 import sys
 import os
+import struct
+import hashlib
+import gzip
+import re
+import warnings
 import yaml
+import numpy as np
+from array import array
+from collections.abc import Sequence
+from itertools import repeat
 
 NETWORK_FILENAME = "runs/connected_layers.net"
 ARCH_FILENAME = "loihi.arch"
+NETB_MAGIC = b"SANANETB"
+NETB_VERSION = 1
+NETB_NONE = 0xffffffff
+_NETB_HEADER = struct.Struct("<8sII7Q")
+SPIKE_TRACE_MAGIC = b"SANASPKB"
+SPIKE_TRACE_VERSION = 1
+_SPIKE_TRACE_HEADER = struct.Struct("<8sII")
+POTENTIAL_TRACE_MAGIC = b"SANAPOTB"
+POTENTIAL_TRACE_VERSION = 1
+_POTENTIAL_TRACE_HEADER = struct.Struct("<8sIIIIQ")
+MESSAGE_TRACE_MAGIC = b"SANAMSGB"
+MESSAGE_TRACE_VERSION = 1
+_MESSAGE_TRACE_HEADER = struct.Struct("<8sII")
+_MESSAGE_TRACE_FIELDS = (
+    ("timestep", "<i8"), ("src_group_id", "<i4"), ("src_neuron_id", "<i4"),
+    ("src_tile_id", "<i4"), ("src_core_id", "<i4"), ("dest_tile_id", "<i4"),
+    ("dest_core_id", "<i4"), ("hops", "<i4"), ("spikes", "<i4"),
+    ("generation_latency", "<f8"), ("network_latency", "<f8"),
+    ("receive_latency", "<f8"), ("blocked_latency", "<f8"),
+    ("sent_timestamp", "<f8"), ("processed_timestamp", "<f8"))
+ARCH_CACHE_SIZE = 64
+SAVE_BUFFER_SIZE = 1 << 20
+SAVE_BLOCK_EDGES = 1 << 18
+SAVE_BLOCK_NEURONS = 1 << 16
+SAVE_GZIP_LEVEL = 6
+LOAD_BLOCK_SIZE = 1 << 24
+_parsed_arch_cache = {}
 
 ### SNN utility functions ###
 
@@ -45,79 +81,371 @@ class Network:
         self.inputs.append(input_node)
         return input_node
 
-    def save(self, filename, group_idx=None):
+    def save(self, filename, group_idx=None, compress=None):
+        """Save the network, in the binary format if filename ends in .netb
+        and otherwise in the text format.
+
+        Text networks are written a block of neurons at a time. If compress
+        is set, or is None and filename ends in .gz, the text is gzipped;
+        note that the simulator can't read gzipped networks directly.
+        """
+        if filename.endswith(".netb"):
+            self.save_binary(filename, group_idx)
+            return
         if group_idx is None:
             group_idx = slice(0, len(self.groups))
-        with open(filename, 'w') as network_file:
+        if compress is None:
+            compress = filename.endswith(".gz")
+        if compress:
+            network_file = gzip.open(filename, "wb",
+                                     compresslevel=SAVE_GZIP_LEVEL)
+        else:
+            network_file = open(filename, "wb", buffering=SAVE_BUFFER_SIZE)
+        with network_file:
             if self.external_inputs > 0:
-                network_file.write("x {0} rate\n".format(self.external_inputs))
+                network_file.write(
+                    "x {0} rate\n".format(self.external_inputs).encode())
             for group in self.groups[group_idx]:
-                network_file.write(str(group))
+                network_file.write(str(group).encode())
 
             for group in self.groups[group_idx]:
-                for neuron in group.neurons:
-                    neuron._save_mappings = self._save_mappings
-                    network_file.write(str(neuron))
+                group._write_neurons(network_file, self._save_mappings)
 
             for input_node in self.inputs:
-                network_file.write(str(input_node))
+                network_file.write(str(input_node).encode())
 
-    def load(self, filename):
-        with open(filename, 'r') as network_file:
-            for line in network_file:
-                fields = line.split()
-                if fields and fields[0] == 'g':
-                    # TODO: support other fields to be loaded
-                    neuron_count = int(fields[1])
-                    group = self.create_group(0.0, 0.0, 0)
-                    for _ in range(0, neuron_count):
-                        group.create_neuron()
-
-                elif fields and fields[0] == 'n':
-                    pass
-                    #neuron_address = fields[1]
-                    #gid = int(neuron_address.split('.')[0])
-                    #group = self.groups[gid]
-                    #group.create_neuron()
-                elif fields and fields[0] == 'e':
-                    edge_info = fields[1]
-                    src_address = edge_info.split("->")[0]
-                    dest_address = edge_info.split("->")[1]
-
-                    src_gid = int(src_address.split(".")[0])
-                    src_nid = int(src_address.split(".")[1])
-                    src = self.groups[src_gid].neurons[src_nid]
-
-                    dest_gid = int(dest_address.split(".")[0])
-                    dest_nid = int(dest_address.split(".")[1])
-                    dest = self.groups[dest_gid].neurons[dest_nid]
-
-                    weight = None
-                    for f in fields:
-                        if "w=" in f or "weight=" in f:
-                            weight = float(f.split("=")[1])
-                    src.add_connection(dest, weight)
-                elif fields and fields[0] == '&':
-                    # TODO: for now ignore the mappings, the whole reason I'm
-                    #  trying this code is to explore different mappings
-                    pass
+    def save_binary(self, filename, group_idx=None):
+        """Save the network in the binary (.netb) format.
 
+        Unlike the text format, weights are stored exactly. External
+        inputs aren't supported by the simulator and are not saved.
         """
-        for g in self.groups:
-            for n in g.neurons:
-                print(n)
+        if group_idx is None:
+            group_idx = slice(0, len(self.groups))
+        groups = self.groups[group_idx]
+
+        tables = BinaryNetwork()
+        first_neuron = np.full(len(self.groups), -1, dtype=np.int64)
+        neuron_count = 0
+        for group in groups:
+            first_neuron[group.id] = neuron_count
+            neuron_count += len(group.neurons)
+            tables.add_group(len(group.neurons), group._attributes())
+
+        for group in groups:
+            offsets, dest_group_ids, dest, weights, synapses = group.edges()
+            group_first = first_neuron[dest_group_ids]
+            if np.any(group_first < 0):
+                raise ValueError(f"Group {group.id} has edges to a group "
+                                 "that isn't saved")
+            dest = (group_first + dest).tolist()
+            weights = weights.tolist()
+            offsets = offsets.tolist()
+            if np.any(synapses >= 0):
+                synapses = [group._synapse_names[s] if s >= 0 else None
+                            for s in synapses.tolist()]
+            else:
+                synapses = [None] * len(dest)
+            for i in range(len(group.neurons)):
+                first, last = offsets[i], offsets[i + 1]
+                neuron_id = tables.add_neuron(
+                    group._neuron_attributes(i, last - first),
+                    zip(dest[first:last], weights[first:last],
+                        synapses[first:last]))
+                if self._save_mappings:
+                    tables.add_mapping(neuron_id, int(group.tiles[i]),
+                                       int(group.cores[i]))
+
+        tables.save(filename)
+
+    def load(self, filename):
+        """Load a text network, which may be gzipped, adding its groups,
+        neurons, edges, mappings and inputs to this network.
+
+        The file is parsed a block at a time. Lines in the form written by
+        save() are parsed using NumPy, and other lines are parsed one at a
+        time, the same way as the simulator. Saving a loaded network writes
+        the same file again.
         """
-        return
+        with open(filename, "rb") as network_file:
+            is_gzip = network_file.read(2) == b"\x1f\x8b"
+        first_group = len(self.groups)
+        remainder = b""
+        with (gzip.open if is_gzip else open)(filename, "rb") as network_file:
+            while True:
+                data = network_file.read(LOAD_BLOCK_SIZE)
+                if not data:
+                    break
+                data = remainder + data
+                end = data.rfind(b"\n") + 1
+                remainder = data[end:]
+                self._load_block(data[:end], first_group)
+        if remainder:
+            self._load_block(remainder + b"\n", first_group)
+
+    def _load_block(self, block, first_group):
+        chars = np.frombuffer(block, dtype=np.uint8)
+        line_ends = np.flatnonzero(chars == ord("\n"))
+        line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+        entry_types = chars[line_starts]
+        if np.any((entry_types == ord(" ")) | (entry_types == ord("\t"))):
+            # The type of indented lines isn't known until they are split,
+            #  so load every line in order
+            self._load_lines(block.split(b"\n"), first_group)
+            return
+
+        def lines_of_type(entry_type):
+            is_type = entry_types == ord(entry_type)
+            return chars[np.repeat(is_type, line_ends - line_starts + 1)]
+
+        # Groups and other rare entries are loaded first, one at a time
+        is_other = ~np.isin(entry_types, np.frombuffer(b"ne&#\n", np.uint8))
+        self._load_lines([block[start:end] for start, end in zip(
+            line_starts[is_other].tolist(), line_ends[is_other].tolist())],
+                         first_group)
+
+        lines = lines_of_type("n").tobytes()
+        matches = _NEURON_LINE.findall(lines)
+        if not (len(matches) == lines.count(b"\n") and (
+                not matches or self._load_neurons(
+                    np.array(matches, dtype=bytes), first_group))):
+            self._load_lines(lines.split(b"\n"), first_group)
+
+        lines = lines_of_type("e")
+        if len(lines) > 0:
+            edges = _parse_edge_lines(lines)
+            if edges is None:
+                self._load_lines(lines.tobytes().split(b"\n"), first_group)
+            else:
+                self._load_edges(edges + [None], first_group)
+
+        lines = lines_of_type("&")
+        if len(lines) > 0:
+            mappings = _parse_lines(lines, b"& ", (b".", b"@", b".", b"\n"))
+            if mappings is None:
+                self._load_lines(lines.tobytes().split(b"\n"), first_group)
+            else:
+                self._load_mappings(np.column_stack(mappings[0]),
+                                    first_group)
+
+    def _load_lines(self, lines, first_group):
+        # Load lines one at a time, the same way as the simulator
+        edges = []
+        for line in lines:
+            self._load_entry(line, first_group, edges)
+        if edges:
+            columns = list(zip(*edges))
+            self._load_edges(
+                [np.array(column, dtype=dtype) for column, dtype in
+                 zip(columns, (np.int64, np.int64, np.int64, np.int64,
+                               np.float64, np.int8))] + [columns[6]],
+                first_group)
+
+    def _load_entry(self, line, first_group, edges):
+        # Edges are appended to edges, and other entries are loaded
+        fields = line.decode().split()
+        if not fields or fields[0][0] == "#":
+            return
+        entry_type = fields[0][0]
+        if entry_type == "x":
+            self.external_inputs = int(fields[1])
+            return
+        elif entry_type == "<":
+            input_node = self.create_input()
+            values = fields[2:]
+            for i in range(0, len(values) - len(values) % 3, 3):
+                dest = self.groups[first_group + int(values[i])]
+                input_node.add_connection(dest.neurons[int(values[i + 1])],
+                                          _parse_value(values[i + 2]))
+            return
+
+        attributes = [_split_attribute(field) for field in fields[2:]]
+        if entry_type == "g":
+            group = self.create_group(None, None, None, log_spikes=None,
+                                      log_potential=None, force_update=None)
+            group.create_neurons(int(fields[1]))
+            group._neuron_arrays["defined"][:len(group.neurons)] = 0
+            group._attribute_order = [key for key, _ in attributes]
+            for key, value in attributes:
+                if key in _GROUP_ATTRIBUTES:
+                    setattr(group, _GROUP_ATTRIBUTES[key], _parse_value(value))
+                else:
+                    group._extra_attributes.append((key, value))
+        elif entry_type == "n":
+            group, neuron_id = self._load_address(fields[1], first_group)
+            arrays = group._neuron_arrays
+            arrays["defined"][neuron_id] = 1
+            for key, value in attributes:
+                if key == "bias":
+                    bias = _parse_number(value)
+                    arrays["bias"][neuron_id] = bias
+                    arrays["integer_bias"][neuron_id] = _is_integer(bias)
+                elif key in _NEURON_FLAGS:
+                    arrays[_NEURON_FLAGS[key]][neuron_id] = int(value)
+                elif key != "connections_out":
+                    # The number of connections is saved from the edges
+                    group._neuron_extra_attributes.setdefault(
+                        neuron_id, []).append((key, value))
+        elif entry_type == "e":
+            src, dest = fields[1].split("->")
+            src_gid, src_nid = src.split(".")
+            dest_gid, dest_nid = dest.split(".")
+            weight, synapse_name = 1.0, None
+            for key, value in attributes:
+                if key[0] == "w":
+                    weight = _parse_number(value)
+                elif key == "name":
+                    synapse_name = value
+                else:
+                    raise ValueError(f"Invalid attribute ({key}:{value})")
+            edges.append((int(src_gid), int(src_nid), int(dest_gid),
+                          int(dest_nid), weight, _is_integer(weight),
+                          synapse_name))
+        elif entry_type == "&":
+            neuron, hw = fields[1].split("@")
+            group, neuron_id = self._load_address(neuron, first_group)
+            tile, core = (_parse_value(value) for value in hw.split("."))
+            group.tiles[neuron_id] = -1 if tile is None else tile
+            group.cores[neuron_id] = -1 if core is None else core
+            self._save_mappings = True
+        else:
+            print(f"Warning: {entry_type} entries not supported, skipping")
+
+    def _load_address(self, address, first_group):
+        gid, nid = address.split(".")
+        group = self.groups[first_group + int(gid)]
+        neuron_id = int(nid)
+        if neuron_id < 0 or neuron_id >= len(group.neurons):
+            raise IndexError(f"Neuron {address} out of range")
+        return group, neuron_id
+
+    def _load_groups(self, group_ids, neuron_ids, first_group):
+        # Yield each group in the block with a selection of its entries
+        group_ids = group_ids + first_group
+        if group_ids.min() < first_group or group_ids.max() >= len(self.groups):
+            raise IndexError("Group id out of range")
+        unique_ids = np.unique(group_ids).tolist()
+        for group_id in unique_ids:
+            group = self.groups[group_id]
+            if len(unique_ids) == 1:
+                select = slice(None)
+            else:
+                select = group_ids == group_id
+            ids = neuron_ids[select]
+            if ids.min() < 0 or ids.max() >= len(group.neurons):
+                raise IndexError("Neuron id out of range")
+            yield group, select, ids
+
+    def _load_neurons(self, columns, first_group):
+        # Returns False if any value can't be parsed here, so that the lines
+        #  are parsed one at a time instead
+        try:
+            bias = np.where(columns[:, 2] == b"", b"nan",
+                            columns[:, 2]).astype(np.float64)
+            integer_bias = np.char.isdigit(np.char.lstrip(columns[:, 2],
+                                                          b"+-"))
+            flags = np.where(columns[:, 3:] == b"", b"-1",
+                             columns[:, 3:]).astype(np.int64)
+        except ValueError:
+            return False
+        if np.any(flags > np.iinfo(np.int8).max):
+            return False
+
+        for group, select, ids in self._load_groups(
+                columns[:, 0].astype(np.int64), columns[:, 1].astype(np.int64),
+                first_group):
+            arrays = group._neuron_arrays
+            arrays["defined"][ids] = 1
+            values = bias[select]
+            is_set = ~np.isnan(values)
+            arrays["bias"][ids[is_set]] = values[is_set]
+            arrays["integer_bias"][ids[is_set]] = integer_bias[select][is_set]
+            for i, name in enumerate(_NEURON_FLAGS.values()):
+                values = flags[select, i]
+                is_set = values >= 0
+                arrays[name][ids[is_set]] = values[is_set]
+        return True
+
+    def _load_edges(self, edges, first_group):
+        src_gids, src, dest_gids, dest, weights, integer, synapse_names = (
+            edges)
+        dest_gids = dest_gids + first_group
+        neuron_counts = np.array([len(group.neurons) for group in self.groups])
+        if dest_gids.min() < first_group or dest_gids.max() >= len(self.groups):
+            raise IndexError("Group id out of range")
+        if dest.min() < 0 or np.any(dest >= neuron_counts[dest_gids]):
+            raise IndexError("Neuron id out of range")
+
+        for group, select, group_src in self._load_groups(src_gids, src,
+                                                          first_group):
+            group_dest_gids = dest_gids[select]
+            for dest_gid in np.unique(group_dest_gids).tolist():
+                group._dest_groups[dest_gid] = self.groups[dest_gid]
+            if synapse_names is None:
+                synapses = np.full(len(group_src), -1, dtype=np.int64)
+            else:
+                synapses = np.array(
+                    [group._synapse_name_id(name) for name in
+                     np.array(synapse_names, dtype=object)[select]],
+                    dtype=np.int64)
+            group._append_edges((group_src, group_dest_gids, dest[select],
+                                 weights[select], synapses, integer[select]))
+
+    def _load_mappings(self, columns, first_group):
+        for group, select, ids in self._load_groups(
+                columns[:, 0], columns[:, 1], first_group):
+            group.tiles[ids] = columns[select, 2]
+            group.cores[ids] = columns[select, 3]
+        self._save_mappings = True
+
+
+# Attributes of groups, and the NeuronGroup fields they're loaded into
+_GROUP_ATTRIBUTES = {
+    "soma_hw_name": "neuron_model", "threshold": "threshold",
+    "reset": "reset", "reverse_threshold": "reverse_threshold",
+    "reverse_reset": "reverse_reset", "leak_decay": "leak_decay",
+    "reset_mode": "reset_mode", "reverse_reset_mode": "reverse_reset_mode",
+    "log_spikes": "log_spikes", "log_v": "log_potential",
+    "force_update": "force_update", "connections_out": "connections_out",
+    "synapse_hw_name": "default_synapse_model"}
+_NEURON_FLAGS = {"log_spikes": "log_spikes", "log_v": "log_potential",
+                 "force_update": "force_update"}
+
+# Neuron lines in the form written by save()
+_NEURON_LINE = re.compile(
+    rb"^n (\d+)\.(\d+)(?: bias=(\S+))?(?: log_spikes=(\d+))?"
+    rb"(?: log_v=(\d+))?(?: force_update=(\d+))?(?: connections_out=\d+)?$",
+    re.M)
+
+
+def _parse_value(value):
+    # Parse an attribute value into the type it would have been saved from
+    if value == "None":
+        return None
+    for value_type in (int, float):
+        try:
+            return value_type(value)
+        except ValueError:
+            pass
+    return value
 
 
 class NeuronGroup:
+    """A group of neurons sharing the same default attributes.
+
+    Per-neuron attributes and mappings are held in NumPy arrays, with -1
+    (or NaN for biases) marking values that aren't set. Edges leaving the
+    group are stored as arrays of source neurons, destination neurons,
+    weights and synapse h/w names, and are added in bulk with connect().
+    Neuron objects are only views of these arrays.
+    """
     def __init__(self, group_id, threshold, reset, leak, log_spikes=None,
                  log_potential=None, force_update=None, connections_out=None,
                  reverse_reset=None, reverse_reset_mode=None,
                  neuron_model=None, default_synapse_model=None):
         # TODO: support all features here
         self.id = group_id
-        self.neurons = []
+        self.neurons = _NeuronList(self)
         self.threshold = threshold
         self.reset = reset
         self.reset_mode = None
@@ -132,47 +460,561 @@ class NeuronGroup:
         self.neuron_model = neuron_model
         self.default_synapse_model = default_synapse_model
 
+        self._neuron_count = 0
+        self._neuron_arrays = {name: np.full(0, fill, dtype=dtype)
+                               for name, dtype, fill in _NEURON_FIELDS}
+        # Edges are kept as a list of (src, dest group id, dest, weight,
+        #  synapse name id, integer weight) array blocks, plus edges added one
+        #  at a time by Neuron views. Synapse name ids of -1 use the group
+        #  default. Weights given as integers are saved as integers
+        self._edge_blocks = []
+        self._pending_edges = _new_edge_arrays()
+        self._dest_groups = {}
+        self._synapse_names = []
+        self._synapse_name_ids = {}
+        self._edge_table = None
+        # Attributes that aren't otherwise supported, kept as strings
+        self._extra_attributes = []
+        self._neuron_extra_attributes = {}
+        # Order of the attributes of a loaded group, which is kept on saving
+        self._attribute_order = []
+
     def __str__(self):
-        neuron_count = len(self.neurons)
+        group_str = f"g {len(self.neurons)}"
+        for key, value in self._attributes():
+            group_str += f" {key}={value}"
+        group_str += "\n"
+        return group_str
+
+    @property
+    def neuron_bias(self):
+        return self._neuron_arrays["bias"][:self._neuron_count]
+
+    @property
+    def neuron_log_spikes(self):
+        return self._neuron_arrays["log_spikes"][:self._neuron_count]
 
-        group_str = f"g {neuron_count}"
+    @property
+    def neuron_log_potential(self):
+        return self._neuron_arrays["log_potential"][:self._neuron_count]
+
+    @property
+    def neuron_force_update(self):
+        return self._neuron_arrays["force_update"][:self._neuron_count]
+
+    @property
+    def tiles(self):
+        return self._neuron_arrays["tile"][:self._neuron_count]
+
+    @property
+    def cores(self):
+        return self._neuron_arrays["core"][:self._neuron_count]
+
+    def _attributes(self):
+        attributes = []
         if self.neuron_model is not None:
-            group_str += f" soma_hw_name={self.neuron_model}"
+            attributes.append(("soma_hw_name", self.neuron_model))
         if self.threshold is not None:
-            group_str += f" threshold={self.threshold}"
+            attributes.append(("threshold", self.threshold))
         if self.reset is not None:
-            group_str += f" reset={self.reset}"
+            attributes.append(("reset", self.reset))
         if self.reverse_threshold is not None:
-            group_str += f" reverse_threshold={self.reverse_threshold}"
+            attributes.append(("reverse_threshold", self.reverse_threshold))
         if self.reverse_reset is not None:
-            group_str += f" reverse_reset={self.reverse_reset}"
+            attributes.append(("reverse_reset", self.reverse_reset))
         if self.leak_decay is not None:
-            group_str += f" leak_decay={self.leak_decay}"
+            attributes.append(("leak_decay", self.leak_decay))
         if self.reset_mode is not None:
-            group_str += f" reset_mode={self.reset_mode}"
+            attributes.append(("reset_mode", self.reset_mode))
         if self.reverse_reset_mode is not None:
-            group_str += f" reverse_reset_mode={self.reverse_reset_mode}"
+            attributes.append(("reverse_reset_mode", self.reverse_reset_mode))
         if self.log_spikes is not None:
-            group_str += f" log_spikes={int(self.log_spikes)}"
+            attributes.append(("log_spikes", int(self.log_spikes)))
         if self.log_potential is not None:
-            group_str += f" log_v={int(self.log_potential)}"
+            attributes.append(("log_v", int(self.log_potential)))
         if self.force_update is not None:
-            group_str += f" force_update={int(self.force_update)}"
+            attributes.append(("force_update", int(self.force_update)))
         if self.connections_out is not None:
-            group_str += f" connections_out={self.connections_out}"
+            attributes.append(("connections_out", self.connections_out))
         if self.default_synapse_model is not None:
-            group_str += f" synapse_hw_name={self.default_synapse_model}"
+            attributes.append(("synapse_hw_name", self.default_synapse_model))
+        attributes.extend(self._extra_attributes)
+        if self._attribute_order:
+            order = {key: i for i, key in enumerate(self._attribute_order)}
+            attributes.sort(key=lambda attribute: order.get(attribute[0],
+                                                            len(order)))
 
-        group_str += "\n"
-        return group_str
+        return attributes
 
     def create_neuron(self, log_spikes=None, log_potential=None,
                       force_update=None):
-        neuron_id = len(self.neurons)
-        neuron = Neuron(self, neuron_id, log_spikes=log_spikes,
-                        log_potential=log_potential, force_update=force_update)
-        self.neurons.append(neuron)
-        return neuron
+        neuron_id = self._neuron_count
+        self.create_neurons(1, log_spikes=log_spikes,
+                            log_potential=log_potential,
+                            force_update=force_update)
+        return Neuron(self, neuron_id)
+
+    def create_neurons(self, count, log_spikes=None, log_potential=None,
+                       force_update=None, bias=None, tiles=None, cores=None):
+        """Add count neurons to the group, returning their ids.
+
+        Each attribute is either a single value for every new neuron or an
+        array with one value per neuron. Attributes left as None aren't set.
+        """
+        first = self._neuron_count
+        last = first + count
+        capacity = len(self._neuron_arrays["tile"])
+        if last > capacity:
+            capacity = max(last, 2 * capacity)
+            for name, dtype, fill in _NEURON_FIELDS:
+                grown = np.full(capacity, fill, dtype=dtype)
+                grown[:first] = self._neuron_arrays[name][:first]
+                self._neuron_arrays[name] = grown
+        self._neuron_count = last
+
+        values = (("bias", bias), ("log_spikes", log_spikes),
+                  ("log_potential", log_potential),
+                  ("force_update", force_update), ("tile", tiles),
+                  ("core", cores))
+        for name, value in values:
+            if value is not None:
+                self._neuron_arrays[name][first:last] = value
+        if bias is not None:
+            self._neuron_arrays["integer_bias"][first:last] = _is_integer(bias)
+        self._edge_table = None
+
+        return np.arange(first, last)
+
+    def connect(self, dest_group, src_idx, dst_idx=None, weights=1.0,
+                synapse_name=None):
+        """Add edges from neurons in this group to neurons in dest_group.
+
+        src_idx and dst_idx are arrays of neuron ids within each group, with
+        one entry per edge. weights is either one weight for every edge or
+        an array of weights. Alternatively, src_idx can be a scipy.sparse
+        matrix with shape (len(self.neurons), len(dest_group.neurons)),
+        where each stored entry is the weight of an edge. If synapse_name is
+        given, the edges use that synapse h/w instead of the group default.
+        """
+        if hasattr(src_idx, "tocoo"):
+            if dst_idx is not None:
+                raise ValueError("dst_idx isn't used with a sparse matrix")
+            matrix = src_idx.tocoo()
+            src_idx, dst_idx, weights = matrix.row, matrix.col, matrix.data
+
+        src = np.asarray(src_idx, dtype=np.int64).ravel()
+        dest = np.asarray(dst_idx, dtype=np.int64).ravel()
+        if src.shape != dest.shape:
+            raise ValueError("src_idx and dst_idx must have the same length")
+        weights = _weight_array(weights)
+        integer = np.full(len(src), weights.dtype.kind == "i", dtype=np.int8)
+        weights = np.array(np.broadcast_to(weights.astype(np.float64),
+                                           src.shape))
+        if len(src) == 0:
+            return
+        if (src.min() < 0 or src.max() >= self._neuron_count or
+                dest.min() < 0 or dest.max() >= dest_group._neuron_count):
+            raise IndexError("Neuron id out of range")
+
+        self._dest_groups[dest_group.id] = dest_group
+        dest_group_ids = np.full(len(src), dest_group.id, dtype=np.int64)
+        synapses = np.full(len(src), self._synapse_name_id(synapse_name),
+                           dtype=np.int64)
+        self._append_edges((src, dest_group_ids, dest, weights, synapses,
+                            integer))
+
+    def _synapse_name_id(self, synapse_name):
+        if synapse_name is None:
+            return -1
+        if synapse_name not in self._synapse_name_ids:
+            self._synapse_name_ids[synapse_name] = len(self._synapse_names)
+            self._synapse_names.append(synapse_name)
+        return self._synapse_name_ids[synapse_name]
+
+    def _add_edge(self, src, dest_group, dest, weight, synapse_name=None):
+        self._dest_groups[dest_group.id] = dest_group
+        for edges, value in zip(self._pending_edges,
+                                (src, dest_group.id, dest, weight,
+                                 self._synapse_name_id(synapse_name),
+                                 _is_integer(weight))):
+            edges.append(value)
+        self._edge_table = None
+
+    def _append_edges(self, block):
+        # Keep edges in the order they were added, including any added one
+        #  at a time before this block
+        self._flush_pending_edges()
+        self._edge_blocks.append(block)
+        self._edge_table = None
+
+    def _flush_pending_edges(self):
+        if len(self._pending_edges[0]) > 0:
+            self._edge_blocks.append(tuple(
+                np.frombuffer(edges, dtype=edges.typecode).astype(dtype)
+                for edges, dtype in zip(self._pending_edges, _EDGE_DTYPES)))
+            self._pending_edges = _new_edge_arrays()
+
+    def edges(self):
+        """Return the edges leaving this group, sorted by source neuron.
+
+        Returns (offsets, dest_group_ids, dest, weights, synapses) arrays in
+        CSR format, where the edges of neuron i are offsets[i]:offsets[i+1].
+        Synapses are indexes into the group's synapse names, or -1 for the
+        group default. Edges of the same neuron are in the order they were
+        added.
+        """
+        return self._sorted_edges()[:5]
+
+    def _sorted_edges(self):
+        # Returns the edges() arrays, plus whether each weight is an integer
+        if self._edge_table is not None:
+            return self._edge_table
+
+        self._flush_pending_edges()
+        if self._edge_blocks:
+            columns = [np.concatenate(column)
+                       for column in zip(*self._edge_blocks)]
+        else:
+            columns = [np.zeros(0, dtype=dtype) for dtype in _EDGE_DTYPES]
+
+        order = np.argsort(columns[0], kind="stable")
+        columns = [column[order] for column in columns]
+        # Keep the sorted edges, so they are only sorted again after changes
+        self._edge_blocks = [tuple(columns)]
+        offsets = np.zeros(self._neuron_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns[0], minlength=self._neuron_count),
+                  out=offsets[1:])
+        self._edge_table = (offsets, *columns[1:])
+        return self._edge_table
+
+    def _neuron_attributes(self, neuron_id, connection_count):
+        # Neurons that were loaded without being defined have no attributes
+        arrays = self._neuron_arrays
+        if not arrays["defined"][neuron_id]:
+            return None
+        attributes = []
+        bias = arrays["bias"][neuron_id]
+        if not np.isnan(bias):
+            attributes.append(("bias", int(bias) if
+                               arrays["integer_bias"][neuron_id] else
+                               float(bias)))
+        for name, key in (("log_spikes", "log_spikes"),
+                          ("log_potential", "log_v"),
+                          ("force_update", "force_update")):
+            value = arrays[name][neuron_id]
+            if value >= 0:
+                attributes.append((key, int(value)))
+        if (self.connections_out is None or
+                connection_count > self.connections_out):
+            attributes.append(("connections_out", connection_count))
+        attributes.extend(self._neuron_extra_attributes.get(neuron_id, ()))
+
+        return attributes
+
+    def _format_neurons(self, first, last, save_mappings):
+        """Format neurons first to last-1 as text, with their edges and
+        optionally their mappings, returning bytes."""
+        (offsets, dest_group_ids, dest, weights, synapses,
+         integer) = self._sorted_edges()
+        arrays = self._neuron_arrays
+        neuron_ids = range(first, last)
+
+        # Build each neuron line from columns of attributes
+        columns = [[f"n {self.id}.{i}" for i in neuron_ids],
+                   [(f" bias={int(bias) if is_int else bias}"
+                     if bias == bias else "")
+                    for bias, is_int in zip(
+                        arrays["bias"][first:last].tolist(),
+                        arrays["integer_bias"][first:last].tolist())]]
+        for name, key in (("log_spikes", "log_spikes"),
+                          ("log_potential", "log_v"),
+                          ("force_update", "force_update")):
+            columns.append([f" {key}={value}" if value >= 0 else ""
+                            for value in arrays[name][first:last].tolist()])
+        counts = np.diff(offsets[first:last + 1])
+        if self.connections_out is None:
+            save_count = np.ones(len(counts), dtype=bool)
+        else:
+            save_count = counts > self.connections_out
+        columns.append([f" connections_out={count}" if save else ""
+                        for count, save in zip(counts.tolist(),
+                                               save_count.tolist())])
+        extra = self._neuron_extra_attributes
+        columns.append(["".join(f" {key}={value}" for key, value in extra[i])
+                        if i in extra else "" for i in neuron_ids])
+        columns.append(repeat("\n", len(counts)))
+        neuron_lines = [line.encode() if defined else b""
+                        for line, defined in zip(
+                            map("".join, zip(*columns)),
+                            arrays["defined"][first:last].tolist())]
+
+        edge_first, edge_last = offsets[first], offsets[last]
+        edge_count = edge_last - edge_first
+        fields = [f"e {self.id}.".encode(),
+                  _int_chars(np.repeat(np.arange(first, last), counts)), b"->",
+                  _int_chars(dest_group_ids[edge_first:edge_last]), b".",
+                  _int_chars(dest[edge_first:edge_last]), b" w=",
+                  _weight_chars(weights[edge_first:edge_last],
+                                integer[edge_first:edge_last] != 0)]
+        synapses = synapses[edge_first:edge_last]
+        if np.any(synapses >= 0):
+            # The last row, used for edges without a name, is empty
+            names = np.array([f" name={name}".encode()
+                              for name in self._synapse_names] + [b""])
+            names = names.view(np.uint8).reshape(len(names), -1)
+            fields.append(names[synapses])
+        fields.append(b"\n")
+        chars = _join_chars(fields, edge_count)
+        used = chars != 0
+        edge_lines = chars[used].tobytes()
+        # Find where the edges of each neuron start and end in the block
+        edge_ends = np.zeros(edge_count + 1, dtype=np.int64)
+        np.cumsum(np.count_nonzero(used, axis=1), out=edge_ends[1:])
+        edge_ends = edge_ends[offsets[first:last + 1] - edge_first].tolist()
+
+        if save_mappings:
+            mapping_lines = [
+                f"& {self.id}.{i}@{None if tile < 0 else tile}."
+                f"{None if core < 0 else core}\n".encode()
+                for i, tile, core in zip(neuron_ids,
+                                         arrays["tile"][first:last].tolist(),
+                                         arrays["core"][first:last].tolist())]
+        else:
+            mapping_lines = repeat(b"", len(counts))
+
+        # Each neuron is followed by its edges and then its mapping
+        block = []
+        for i, (neuron_line, mapping_line) in enumerate(
+                zip(neuron_lines, mapping_lines)):
+            block.append(neuron_line)
+            block.append(edge_lines[edge_ends[i]:edge_ends[i + 1]])
+            block.append(mapping_line)
+        return b"".join(block)
+
+    def _write_neurons(self, network_file, save_mappings):
+        # Write neurons in blocks of a bounded number of edges, so that
+        #  memory use doesn't depend on the size of the group
+        offsets = self.edges()[0]
+        first = 0
+        while first < self._neuron_count:
+            last = int(np.searchsorted(
+                offsets, offsets[first] + SAVE_BLOCK_EDGES, side="right")) - 1
+            last = min(max(last, first + 1), first + SAVE_BLOCK_NEURONS,
+                       self._neuron_count)
+            network_file.write(
+                self._format_neurons(first, last, save_mappings))
+            first = last
+
+
+_NEURON_FIELDS = (("bias", np.float64, np.nan),
+                  ("log_spikes", np.int8, -1),
+                  ("log_potential", np.int8, -1),
+                  ("force_update", np.int8, -1),
+                  ("tile", np.int64, -1),
+                  ("core", np.int64, -1),
+                  ("defined", np.int8, 1),
+                  ("integer_bias", np.int8, 0))
+_EDGE_DTYPES = (np.int64, np.int64, np.int64, np.float64, np.int64, np.int8)
+
+
+def _new_edge_arrays():
+    return tuple(array(np.dtype(dtype).char) for dtype in _EDGE_DTYPES)
+
+
+def _is_integer(values):
+    # Values given as integers are saved as integers, the same as str()
+    return np.asarray(values).dtype.kind in "iu"
+
+
+def _weight_array(weights):
+    # Keep integer weights as integers, and convert anything else to floats
+    weights = np.asarray(weights)
+    if weights.dtype.kind in "iu":
+        return weights.astype(np.int64)
+    return weights.astype(np.float64)
+
+
+# Text networks are formatted a block at a time using NumPy. Each line is
+#  built as a fixed width row of ASCII characters, padded with NUL
+#  characters that are removed when the block is converted to bytes
+def _int_chars(values, min_digits=1):
+    # Format non-negative integers, zero padded to at least min_digits
+    values = np.asarray(values, dtype=np.int64)
+    width = min_digits
+    if len(values) > 0:
+        width = max(width, len(str(int(values.max()))))
+    chars = np.empty((len(values), width), dtype=np.uint8)
+    remaining = values
+    for column in range(width - 1, -1, -1):
+        remaining, digit = np.divmod(remaining, 10)
+        chars[:, column] = digit + ord("0")
+    for column in range(width - min_digits):
+        chars[values < 10 ** (width - 1 - column), column] = 0
+    return chars
+
+
+def _weight_chars(weights, integer):
+    # Format integer weights as integers and other weights like "%.5e"
+    if not np.any(integer):
+        return _exponent_chars(weights)
+    ints = weights[integer].astype(np.int64)
+    sign = np.where(ints < 0, ord("-"), 0).astype(np.uint8)
+    parts = (_exponent_chars(weights[~integer]),
+             _join_chars([sign[:, None], _int_chars(np.abs(ints))],
+                         len(ints)))
+    chars = np.zeros((len(weights), max(part.shape[1] for part in parts)),
+                     dtype=np.uint8)
+    chars[~integer, :parts[0].shape[1]] = parts[0]
+    chars[integer, :parts[1].shape[1]] = parts[1]
+    return chars
+
+
+def _exponent_chars(values):
+    # Format floats like "%.5e". Mantissas that are close to halfway between
+    #  two outputs, or values that aren't normal numbers, are formatted by
+    #  Python instead, so that the rounding always matches
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.abs(values)
+    nonzero = magnitude > 0
+    exact = np.isfinite(values) & ((magnitude == 0) | (magnitude > 1e-300))
+    with np.errstate(all="ignore"):
+        exponent = np.floor(np.log10(np.where(exact & nonzero, magnitude,
+                                              1.0))).astype(np.int64)
+        for _ in range(2):
+            scaled = np.where(exact, magnitude / 10.0 ** (exponent - 5), 0.0)
+            exponent += nonzero & (scaled >= 1e6)
+            exponent -= nonzero & (scaled < 1e5)
+        scaled = np.where(exact, magnitude / 10.0 ** (exponent - 5), 0.0)
+    exact &= ~nonzero | ((scaled >= 1e5) & (scaled < 1e6) &
+                         (np.abs(scaled - np.floor(scaled) - 0.5) > 1e-6))
+    mantissa = np.rint(scaled).astype(np.int64)
+    carry = mantissa >= 1000000
+    mantissa[carry] = 100000
+    exponent += carry
+
+    sign = np.where(np.signbit(values), ord("-"), 0).astype(np.uint8)
+    exponent_sign = np.where(exponent < 0, ord("-"), ord("+"))
+    chars = _join_chars(
+        [sign[:, None], _int_chars(mantissa // 100000), b".",
+         _int_chars(mantissa % 100000, 5), b"e",
+         exponent_sign.astype(np.uint8)[:, None],
+         _int_chars(np.abs(exponent), 2)], len(values))
+
+    inexact = np.flatnonzero(~exact)
+    if len(inexact) > 0:
+        strings = [f"{value:.5e}".encode()
+                   for value in values[inexact].tolist()]
+        width = max(len(string) for string in strings)
+        if width > chars.shape[1]:
+            chars = np.pad(chars, ((0, 0), (0, width - chars.shape[1])))
+        for row, string in zip(inexact.tolist(), strings):
+            chars[row] = 0
+            chars[row, :len(string)] = np.frombuffer(string, dtype=np.uint8)
+    return chars
+
+
+def _parse_digits(chars, starts, ends):
+    # Parse the integers in chars[starts:ends], which are all digits
+    lengths = ends - starts
+    values = np.zeros(len(starts), dtype=np.int64)
+    for i in range(lengths.max()):
+        is_digit = lengths > i
+        digits = chars[np.where(is_digit, starts + i, 0)] - ord("0")
+        values = np.where(is_digit, values * 10 + digits, values)
+    return values
+
+
+def _parse_lines(chars, prefix, separators):
+    # Parse lines made up of a prefix and integers, each followed by a
+    #  separator. Returns a list of integer arrays and where each line
+    #  continues after the last separator, or None if any line is different
+    template = prefix + b"".join(separators)
+    others = np.flatnonzero((chars < ord("0")) | (chars > ord("9")))
+    line_ends = others[chars[others] == ord("\n")]
+    line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+    # Every line must have the characters of the template, in order, as its
+    #  first characters that aren't digits
+    first = np.searchsorted(others, line_starts)
+    if first[-1] + len(template) > len(others):
+        return None
+    positions = [others[first + i] for i in range(len(template))]
+    if np.any(positions[0] != line_starts):
+        return None
+    for i, char in enumerate(template):
+        if np.any(chars[positions[i]] != char):
+            return None
+
+    # Characters of the same separator must be next to each other, with at
+    #  least one digit between separators
+    fields = []
+    i = len(prefix)
+    for separator in separators:
+        if np.any(positions[i] <= positions[i - 1] + 1):
+            return None
+        for j in range(i + 1, i + len(separator)):
+            if np.any(positions[j] != positions[j - 1] + 1):
+                return None
+        if np.any(positions[i] - positions[i - 1] > 19):
+            return None
+        fields.append(_parse_digits(chars, positions[i - 1] + 1,
+                                    positions[i]))
+        i += len(separator)
+    return fields, positions[-1] + 1, line_ends
+
+
+def _parse_edge_lines(chars):
+    # Parse edge lines in the form written by save(), returning columns of
+    #  source and destination addresses, weights and whether each weight is
+    #  an integer, or None
+    parsed = _parse_lines(chars, b"e ", (b".", b"->", b".", b" w="))
+    if parsed is None:
+        return None
+    fields, weight_starts, line_ends = parsed
+    # Gather the weights, each followed by its newline, and parse them
+    lengths = line_ends + 1 - weight_starts
+    offsets = np.cumsum(lengths) - lengths
+    weight_chars = chars[np.arange(lengths.sum()) +
+                         np.repeat(weight_starts - offsets, lengths)]
+    try:
+        weights = np.fromstring(weight_chars.tobytes(), sep=" ")
+    except ValueError:
+        return None
+    if len(weights) != len(line_ends):
+        return None
+    # Weights without a point, exponent, inf or nan are integers
+    is_float = np.isin(weight_chars,
+                       np.frombuffer(b".eEiInN", dtype=np.uint8))
+    integer = np.add.reduceat(is_float, offsets) == 0
+    return fields + [weights, integer.astype(np.int8)]
+
+
+def _join_chars(fields, count):
+    # Concatenate fields on each of count rows, where each field is either
+    #  bytes, which are the same on every row, or a matrix of characters
+    return np.concatenate(
+        [np.broadcast_to(np.frombuffer(field, dtype=np.uint8),
+                         (count, len(field)))
+         if isinstance(field, bytes) else field for field in fields], axis=1)
+
+
+class _NeuronList(Sequence):
+    """Sequence of Neuron views over a group's arrays."""
+    def __init__(self, group):
+        self._group = group
+
+    def __len__(self):
+        return self._group._neuron_count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Neuron(self._group, i)
+                    for i in range(*index.indices(len(self)))]
+        count = len(self)
+        if index < 0:
+            index += count
+        if index < 0 or index >= count:
+            raise IndexError("Neuron id out of range")
+        return Neuron(self._group, int(index))
 
 
 class Input:
@@ -188,83 +1030,701 @@ class Input:
         for connection in self.connections:
             dest_neuron, weight = connection
             line += " {0} {1} {2}".format(
-                dest_neuron.group_id, dest_neuron.id, weight)
+                dest_neuron.group.id, dest_neuron.id, weight)
         line += '\n'
         return line
 
 
+def _neuron_field(name):
+    # Property for an integer neuron attribute, where -1 means it isn't set
+    def get_field(neuron):
+        value = neuron.group._neuron_arrays[name][neuron.id]
+        return None if value < 0 else int(value)
+
+    def set_field(neuron, value):
+        neuron.group._neuron_arrays[name][neuron.id] = (
+            -1 if value is None else value)
+
+    return property(get_field, set_field)
+
+
 class Neuron:
-    def __init__(self, group, neuron_id, log_spikes=None,
-                 log_potential=None, force_update=None):
+    """A view of one neuron, stored in its NeuronGroup's arrays."""
+    __slots__ = ("group", "id")
+
+    def __init__(self, group, neuron_id):
         self.group = group
         self.id = neuron_id
-        self.log_spikes = log_spikes
-        self.log_potential = log_potential
-        self.force_update = force_update
-        self.connections = []
-        self.tile = None
-        self.core = None
-        self.bias = None
-        self._save_mappings = False
 
-    def add_connection(self, dest, weight):
-        self.connections.append((dest, weight))
+    def __eq__(self, other):
+        return (isinstance(other, Neuron) and self.group is other.group and
+                self.id == other.id)
+
+    def __hash__(self):
+        return hash((self.group.id, self.id))
+
+    @property
+    def bias(self):
+        arrays = self.group._neuron_arrays
+        bias = arrays["bias"][self.id]
+        if np.isnan(bias):
+            return None
+        return int(bias) if arrays["integer_bias"][self.id] else float(bias)
+
+    @bias.setter
+    def bias(self, bias):
+        arrays = self.group._neuron_arrays
+        arrays["bias"][self.id] = np.nan if bias is None else bias
+        arrays["integer_bias"][self.id] = _is_integer(bias)
+
+    log_spikes = _neuron_field("log_spikes")
+    log_potential = _neuron_field("log_potential")
+    force_update = _neuron_field("force_update")
+    tile = _neuron_field("tile")
+    core = _neuron_field("core")
+
+    @property
+    def connections(self):
+        """List of (dest neuron, weight) edges leaving this neuron."""
+        (offsets, dest_group_ids, dest, weights, _,
+         integer) = self.group._sorted_edges()
+        dest_groups = self.group._dest_groups
+        return [(Neuron(dest_groups[dest_group_ids[i]], int(dest[i])),
+                 int(weights[i]) if integer[i] else float(weights[i]))
+                for i in range(offsets[self.id], offsets[self.id + 1])]
+
+    def add_connection(self, dest, weight, synapse_name=None):
+        weight = 1.0 if weight is None else weight
+        self.group._add_edge(self.id, dest.group, dest.id, weight,
+                             synapse_name)
 
     def add_bias(self, bias):
         self.bias = bias
 
-    def __str__(self, map_neuron=True):
-        neuron_str = f"n {self.group.id}.{self.id}"
-        if self.bias is not None:
-            neuron_str += f" bias={self.bias}"
-        if self.log_spikes is not None:
-            self.log_spikes = int(self.log_spikes)
-            neuron_str += f" log_spikes={int(self.log_spikes)}"
-        if self.log_potential is not None:
-            neuron_str += f" log_v={int(self.log_potential)}"
-        if self.force_update is not None:
-            neuron_str += f" force_update={int(self.force_update)}"
-        if (self.group.connections_out is None or (self.connections and
-            (len(self.connections) > self.group.connections_out))):
-           neuron_str += f" connections_out={len(self.connections)}"
-        neuron_str += "\n"
+    def __str__(self, map_neuron=False):
+        return self.group._format_neurons(self.id, self.id + 1,
+                                          map_neuron).decode()
 
-        for connection in self.connections:
-            dest_neuron, weight = connection
-            neuron_str += f"e {self.group.id}.{self.id}->"
-            neuron_str += f"{dest_neuron.group.id}.{dest_neuron.id}"
-            if isinstance(weight, float):
-                neuron_str += f" w={weight:.5e}"
+    def _attributes(self):
+        offsets = self.group.edges()[0]
+        return self.group._neuron_attributes(
+            self.id, int(offsets[self.id + 1] - offsets[self.id]))
+
+
+class BinaryNetwork:
+    """Tables stored in a binary network description (.netb).
+
+    Groups and neurons refer to sets of key=value attributes, which are
+    stored once and shared. Neurons are numbered in group order. Edges are
+    stored in compressed sparse row (CSR) format, with a destination
+    neuron, weight and optional synapse h/w name for each edge. Mappings
+    are applied in the order they are stored.
+    """
+    def __init__(self):
+        self.strings = []
+        self.attribute_sets = []
+        self.groups = []
+        self.neuron_attribute_sets = array("I")
+        self.edge_offsets = array("Q", [0])
+        self.edge_dest = array("I")
+        self.edge_synapse = array("I")
+        self.edge_weights = array("d")
+        self.mapping_neurons = array("I")
+        self.mapping_tiles = array("I")
+        self.mapping_cores = array("I")
+        self._string_ids = {}
+        self._attribute_set_ids = {}
+
+    def string_id(self, string):
+        string = f"{string}"
+        if string not in self._string_ids:
+            self._string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return self._string_ids[string]
+
+    def attribute_set_id(self, attributes):
+        attributes = tuple((self.string_id(key), self.string_id(value))
+                           for key, value in attributes)
+        if attributes not in self._attribute_set_ids:
+            self._attribute_set_ids[attributes] = len(self.attribute_sets)
+            self.attribute_sets.append(attributes)
+        return self._attribute_set_ids[attributes]
+
+    def add_group(self, neuron_count, attributes):
+        self.groups.append((neuron_count, self.attribute_set_id(attributes)))
+
+    def add_neuron(self, attributes, edges):
+        """Add the next neuron, with a list of (dest, weight, synapse name)
+        edges. Neurons that aren't defined have attributes set to None."""
+        neuron_id = len(self.neuron_attribute_sets)
+        if attributes is None:
+            self.neuron_attribute_sets.append(NETB_NONE)
+        else:
+            self.neuron_attribute_sets.append(
+                self.attribute_set_id(attributes))
+        for dest, weight, synapse_name in edges:
+            self.edge_dest.append(dest)
+            self.edge_weights.append(weight)
+            if synapse_name is None:
+                self.edge_synapse.append(NETB_NONE)
             else:
-                neuron_str += f" w={weight}"
-            neuron_str += "\n"
+                self.edge_synapse.append(self.string_id(synapse_name))
+        self.edge_offsets.append(len(self.edge_dest))
+        return neuron_id
+
+    def add_mapping(self, neuron_id, tile, core):
+        self.mapping_neurons.append(neuron_id)
+        self.mapping_tiles.append(tile)
+        self.mapping_cores.append(core)
+
+    def save(self, filename):
+        string_data = b"".join(s.encode() + b"\0" for s in self.strings)
+        string_offsets = array("Q", [0])
+        for string in self.strings:
+            string_offsets.append(string_offsets[-1] + len(string.encode()) + 1)
+        attribute_set_offsets = array("Q", [0])
+        attribute_strings = array("I")
+        for attributes in self.attribute_sets:
+            for key, value in attributes:
+                attribute_strings.extend((key, value))
+            attribute_set_offsets.append(len(attribute_strings) // 2)
+        groups = array("I")
+        for neuron_count, attribute_set in self.groups:
+            groups.extend((neuron_count, attribute_set))
+
+        header = _NETB_HEADER.pack(
+            NETB_MAGIC, NETB_VERSION, len(self.groups),
+            len(self.neuron_attribute_sets), len(self.edge_dest),
+            len(self.mapping_neurons), len(self.strings), len(string_data),
+            len(self.attribute_sets), len(attribute_strings) // 2)
+        with open(filename, "wb") as network_file:
+            network_file.write(header)
+            for table in (string_offsets, string_data,
+                          attribute_set_offsets, attribute_strings, groups,
+                          self.neuron_attribute_sets, self.edge_offsets,
+                          self.edge_dest, self.edge_synapse,
+                          self.edge_weights, self.mapping_neurons,
+                          self.mapping_tiles, self.mapping_cores):
+                if isinstance(table, array):
+                    if sys.byteorder != "little":
+                        table = array(table.typecode, table)
+                        table.byteswap()
+                    table = table.tobytes()
+                network_file.write(table)
+                # Every table starts on an 8 byte boundary
+                network_file.write(b"\0" * (-len(table) % 8))
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "rb") as network_file:
+            data = network_file.read()
+        if data[:len(NETB_MAGIC)] != NETB_MAGIC:
+            raise ValueError(f"{filename} is not a binary network")
+        (_, version, group_count, neuron_count, edge_count, mapping_count,
+         string_count, string_bytes, attribute_set_count,
+         attribute_count) = _NETB_HEADER.unpack_from(data)
+        if version != NETB_VERSION:
+            raise ValueError(f"Binary network version {version} not "
+                             "supported")
+
+        pos = _NETB_HEADER.size
+        def read_table(typecode, count):
+            nonlocal pos
+            table = array(typecode)
+            size = count * table.itemsize
+            table.frombytes(data[pos:pos + size])
+            if sys.byteorder != "little":
+                table.byteswap()
+            pos += size + (-size % 8)
+            return table
+
+        tables = cls()
+        string_offsets = read_table("Q", string_count + 1)
+        string_data = data[pos:pos + string_bytes]
+        pos += string_bytes + (-string_bytes % 8)
+        for i in range(string_count):
+            tables.string_id(string_data[string_offsets[i]:
+                                         string_offsets[i+1] - 1].decode())
+        attribute_set_offsets = read_table("Q", attribute_set_count + 1)
+        attribute_strings = read_table("I", 2 * attribute_count)
+        for i in range(attribute_set_count):
+            first, last = attribute_set_offsets[i], attribute_set_offsets[i+1]
+            attributes = tuple(
+                (attribute_strings[2*j], attribute_strings[2*j + 1])
+                for j in range(first, last))
+            tables._attribute_set_ids[attributes] = i
+            tables.attribute_sets.append(attributes)
+        groups = read_table("I", 2 * group_count)
+        tables.groups = list(zip(groups[0::2], groups[1::2]))
+        tables.neuron_attribute_sets = read_table("I", neuron_count)
+        tables.edge_offsets = read_table("Q", neuron_count + 1)
+        tables.edge_dest = read_table("I", edge_count)
+        tables.edge_synapse = read_table("I", edge_count)
+        tables.edge_weights = read_table("d", edge_count)
+        tables.mapping_neurons = read_table("I", mapping_count)
+        tables.mapping_tiles = read_table("I", mapping_count)
+        tables.mapping_cores = read_table("I", mapping_count)
+
+        return tables
+
+
+def convert_network(input_filename, output_filename):
+    """Convert a network description between the text (.net) and binary
+    (.netb) formats. The format of the input is detected from its contents.
+    """
+    with open(input_filename, "rb") as network_file:
+        is_binary = network_file.read(len(NETB_MAGIC)) == NETB_MAGIC
+    if is_binary:
+        _convert_binary_to_text(input_filename, output_filename)
+    else:
+        _convert_text_to_binary(input_filename, output_filename)
+
+
+def _split_attribute(field):
+    # Attributes are split the same way as the simulator, using strtok()
+    parts = [part for part in field.split("=") if part]
+    if len(parts) < 2:
+        raise ValueError(f"Invalid attribute: {field}")
+    return parts[0], parts[1]
+
+
+def _parse_number(value):
+    # Integers are kept as integers, so that they are saved the same way
+    if value.lstrip("+-").isdigit():
+        return int(value)
+    return _parse_float(value)
+
+
+def _parse_float(value):
+    # Like sscanf(), parse the longest prefix that is a valid number
+    for end in range(len(value), 0, -1):
+        try:
+            return float(value[:end])
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid number: {value}")
+
+
+def _convert_text_to_binary(input_filename, output_filename):
+    groups = []
+    neurons = {}
+    edges = {}
+    mappings = []
+    with open(input_filename, "r") as network_file:
+        for line in network_file:
+            fields = line.rstrip("\n").replace("\t", " ").split(" ")
+            fields = [field for field in fields if field]
+            if not fields or fields[0][0] == "#":
+                continue
+            entry_type = fields[0][0]
+            attributes = [_split_attribute(f) for f in fields[2:]]
+            if entry_type == "g":
+                groups.append((int(fields[1]), attributes))
+            elif entry_type == "n":
+                gid, nid = fields[1].split(".")
+                neurons[(int(gid), int(nid))] = attributes
+            elif entry_type == "e":
+                src, dest = fields[1].split("->")
+                src_gid, src_nid = src.split(".")
+                dest_gid, dest_nid = dest.split(".")
+                weight, synapse_name = 1.0, None
+                for key, value in attributes:
+                    if key[0] == "w":
+                        weight = _parse_float(value)
+                    elif key == "name":
+                        synapse_name = value
+                    else:
+                        raise ValueError(f"Invalid attribute ({key}:{value})")
+                edges.setdefault((int(src_gid), int(src_nid)), []).append(
+                    ((int(dest_gid), int(dest_nid)), weight, synapse_name))
+            elif entry_type == "&":
+                neuron, hw = fields[1].split("@")
+                gid, nid = neuron.split(".")
+                tile, core = hw.split(".")
+                mappings.append(((int(gid), int(nid)), int(tile), int(core)))
+            else:
+                print(f"Warning: {entry_type} entries not supported, "
+                      "skipping")
+
+    tables = BinaryNetwork()
+    first_neuron = []
+    total_neurons = 0
+    for neuron_count, attributes in groups:
+        first_neuron.append(total_neurons)
+        total_neurons += neuron_count
+        tables.add_group(neuron_count, attributes)
+    for gid, (neuron_count, _) in enumerate(groups):
+        for nid in range(neuron_count):
+            neuron_edges = []
+            for dest, weight, synapse_name in edges.get((gid, nid), ()):
+                dest_gid, dest_nid = dest
+                neuron_edges.append((first_neuron[dest_gid] + dest_nid,
+                                     weight, synapse_name))
+            tables.add_neuron(neurons.get((gid, nid)), neuron_edges)
+    for (gid, nid), tile, core in mappings:
+        tables.add_mapping(first_neuron[gid] + nid, tile, core)
+    tables.save(output_filename)
+
+
+def _convert_binary_to_text(input_filename, output_filename):
+    tables = BinaryNetwork.load(input_filename)
+
+    def attribute_str(attribute_set):
+        return "".join(f" {tables.strings[key]}={tables.strings[value]}"
+                       for key, value in tables.attribute_sets[attribute_set])
+
+    addresses = []
+    with open(output_filename, "w") as network_file:
+        for gid, (neuron_count, attribute_set) in enumerate(tables.groups):
+            network_file.write(f"g {neuron_count}" +
+                               attribute_str(attribute_set) + "\n")
+            addresses.extend(f"{gid}.{nid}" for nid in range(neuron_count))
+
+        for neuron_id, attribute_set in enumerate(
+                tables.neuron_attribute_sets):
+            if attribute_set != NETB_NONE:
+                network_file.write(f"n {addresses[neuron_id]}" +
+                                   attribute_str(attribute_set) + "\n")
+            for edge in range(tables.edge_offsets[neuron_id],
+                              tables.edge_offsets[neuron_id + 1]):
+                edge_str = (f"e {addresses[neuron_id]}->"
+                            f"{addresses[tables.edge_dest[edge]]} "
+                            f"w={tables.edge_weights[edge]!r}")
+                if tables.edge_synapse[edge] != NETB_NONE:
+                    edge_str += (" name=" +
+                                 tables.strings[tables.edge_synapse[edge]])
+                network_file.write(edge_str + "\n")
+
+        for neuron_id, tile, core in zip(tables.mapping_neurons,
+                                         tables.mapping_tiles,
+                                         tables.mapping_cores):
+            network_file.write(f"& {addresses[neuron_id]}@{tile}.{core}\n")
+
+
+### Binary spike traces ###
+def iter_spike_trace(filename, chunk_size=1 << 24):
+    """Stream a binary spike trace (spikes.bin) in chunks.
+
+    Reads roughly chunk_size bytes at a time, yielding a tuple of NumPy
+    arrays (timesteps, group_ids, neuron_ids) for the spikes in each chunk.
+    """
+    with open(filename, "rb") as trace:
+        header = trace.read(_SPIKE_TRACE_HEADER.size)
+        if len(header) < _SPIKE_TRACE_HEADER.size:
+            raise ValueError(f"{filename} is not a binary spike trace")
+        magic, version, _ = _SPIKE_TRACE_HEADER.unpack(header)
+        if magic != SPIKE_TRACE_MAGIC:
+            raise ValueError(f"{filename} is not a binary spike trace")
+        if version != SPIKE_TRACE_VERSION:
+            raise ValueError(f"Unsupported spike trace version {version}")
+
+        # The decoder state carried between chunks: the last spike read
+        last = (0, 0, 0)
+        remainder = b""
+        while True:
+            block = trace.read(chunk_size)
+            data = np.frombuffer(remainder + block, dtype=np.uint8)
+            if len(data) == 0:
+                break
 
-        if self._save_mappings:
-            neuron_str += "& {0}.{1}@{2}.{3}\n".format(self.group.id, self.id,
-                                                    self.tile, self.core)
-        return neuron_str
+            # Only decode complete records, i.e. groups of three varints
+            ends = np.flatnonzero(data < 0x80)
+            complete = len(ends) - (len(ends) % 3)
+            used = ends[complete-1] + 1 if complete > 0 else 0
+            remainder = data[used:].tobytes()
+            if complete == 0:
+                if not block:
+                    break
+                continue
+
+            values = _decode_varints(data[:used], ends[:complete])
+            spikes, last = _decode_spikes(values.reshape(-1, 3), last)
+            yield spikes
 
+            if not block:
+                break
 
-def init_compartments(max_tiles, max_cores, max_compartments):
-    compartments = []
-    for tile in range(0, max_tiles):
-        c = []
-        for core in range(0, max_cores):
-            c.append(max_compartments)
-        compartments.append(c)
+        if remainder:
+            raise ValueError(f"{filename} ends with a truncated record")
 
-    return compartments
 
+def read_spike_trace(filename):
+    """Load a binary spike trace into (timesteps, group_ids, neuron_ids)."""
+    chunks = list(iter_spike_trace(filename))
+    if not chunks:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty.copy(), empty.copy()
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+
+def spike_trace_to_csv(filename, output_filename="spikes.trace"):
+    """Convert a binary spike trace to the text trace format."""
+    with open(output_filename, "w") as csv_file:
+        csv_file.write("gid.nid,timestep\n")
+        for timesteps, group_ids, neuron_ids in iter_spike_trace(filename):
+            np.savetxt(csv_file,
+                       np.column_stack((group_ids, neuron_ids, timesteps)),
+                       fmt="%d.%d,%d")
+    return
+
+
+def spike_trace_to_spiketrain(filename, output_filename="spiketrain.csv",
+                              group_id=1):
+    """Convert one group's spikes to the snntoolbox two-row format.
+
+    The first row lists neuron ids and the second the matching spike
+    times, sorted by neuron id.
+    """
+    timesteps, group_ids, neuron_ids = read_spike_trace(filename)
+    in_group = (group_ids == group_id)
+    timesteps, neuron_ids = timesteps[in_group], neuron_ids[in_group]
+    order = np.argsort(neuron_ids, kind="stable")
+
+    with open(output_filename, "w") as csv_file:
+        np.savetxt(csv_file, neuron_ids[order][np.newaxis], fmt="%d",
+                   delimiter=",")
+        np.savetxt(csv_file, timesteps[order][np.newaxis], fmt="%d",
+                   delimiter=",")
+    return
+
+
+def read_potential_trace(filename, mmap=True):
+    """Load a binary potential trace (potential.bin).
+
+    Returns (timesteps, probes, potentials). probes is an array of
+    (group_id, neuron_id) pairs, giving the neuron for each column of the
+    float32 potentials array, which has one row per recorded timestep. By
+    default the potentials are memory-mapped rather than read into memory.
+    """
+    with open(filename, "rb") as trace:
+        header = trace.read(_POTENTIAL_TRACE_HEADER.size)
+        if len(header) < _POTENTIAL_TRACE_HEADER.size:
+            raise ValueError(f"{filename} is not a binary potential trace")
+        (magic, version, probe_count, interval, _,
+         first_timestep) = _POTENTIAL_TRACE_HEADER.unpack(header)
+        if magic != POTENTIAL_TRACE_MAGIC:
+            raise ValueError(f"{filename} is not a binary potential trace")
+        if version != POTENTIAL_TRACE_VERSION:
+            raise ValueError(
+                f"Unsupported potential trace version {version}")
+        probes = np.fromfile(trace, dtype="<u4", count=2*probe_count)
+        probes = probes.astype(np.int64).reshape(probe_count, 2)
+        offset = trace.tell()
+        size = trace.seek(0, os.SEEK_END)
+
+    row_bytes = 4 * probe_count
+    rows = (size - offset) // row_bytes if row_bytes > 0 else 0
+    if rows == 0:
+        potentials = np.zeros((0, probe_count), dtype=np.float32)
+    elif mmap:
+        potentials = np.memmap(filename, dtype="<f4", mode="r",
+                               offset=offset, shape=(rows, probe_count))
+    else:
+        potentials = np.fromfile(filename, dtype="<f4",
+                                 count=rows*probe_count, offset=offset)
+        potentials = potentials.reshape(rows, probe_count)
+    timesteps = first_timestep + interval*np.arange(rows, dtype=np.int64)
+
+    return timesteps, probes, potentials
+
+
+def read_message_trace(filename, mmap=True):
+    """Load a binary message trace (messages.bin) as a NumPy record array.
+
+    Each record is one traced message, with the fields of messages.trace.
+    Core ids are the global core ids. By default the records are
+    memory-mapped rather than read into memory.
+    """
+    dtype = np.dtype(list(_MESSAGE_TRACE_FIELDS))
+    with open(filename, "rb") as trace:
+        header = trace.read(_MESSAGE_TRACE_HEADER.size)
+        if len(header) < _MESSAGE_TRACE_HEADER.size:
+            raise ValueError(f"{filename} is not a binary message trace")
+        magic, version, record_size = _MESSAGE_TRACE_HEADER.unpack(header)
+        if magic != MESSAGE_TRACE_MAGIC:
+            raise ValueError(f"{filename} is not a binary message trace")
+        if version != MESSAGE_TRACE_VERSION:
+            raise ValueError(f"Unsupported message trace version {version}")
+        if record_size != dtype.itemsize:
+            raise ValueError(f"Unexpected message record size {record_size}")
+        size = trace.seek(0, os.SEEK_END)
+
+    count = (size - _MESSAGE_TRACE_HEADER.size) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype).view(np.recarray)
+    if mmap:
+        messages = np.memmap(filename, dtype=dtype, mode="r",
+                             offset=_MESSAGE_TRACE_HEADER.size,
+                             shape=(count,))
+    else:
+        messages = np.fromfile(filename, dtype=dtype, count=count,
+                               offset=_MESSAGE_TRACE_HEADER.size)
+    return messages.view(np.recarray)
+
+
+def _decode_varints(data, ends):
+    # Decode unsigned LEB128 varints, given the index of each final byte
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    shifts = 7 * (np.arange(len(data)) - np.repeat(starts, lengths))
+    payload = (data & 0x7f).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.bitwise_or.reduceat(payload, starts).astype(np.int64)
+
+
+def _decode_spikes(deltas, last):
+    # Undo the delta encoding used by sim_trace_record_spikes_binary()
+    last_timestep, last_group_id, last_neuron_id = last
+    timestep_deltas, group_deltas, neuron_deltas = deltas.T
+
+    timesteps = last_timestep + np.cumsum(timestep_deltas)
+    new_timestep = (timestep_deltas != 0)
+    group_ids = _segmented_cumsum(group_deltas, new_timestep, last_group_id)
+    new_group = new_timestep | (group_deltas != 0)
+    neuron_ids = _segmented_cumsum(neuron_deltas, new_group, last_neuron_id)
+
+    last = (timesteps[-1], group_ids[-1], neuron_ids[-1])
+    return (timesteps, group_ids, neuron_ids), last
+
+
+def _segmented_cumsum(values, resets, initial):
+    # Cumulative sum that restarts wherever resets is set. Values before
+    #  the first reset continue on from initial
+    total = np.cumsum(values)
+    before = total - values
+    positions = np.where(resets, np.arange(len(values)), -1)
+    last_reset = np.maximum.accumulate(positions)
+    base = np.where(last_reset >= 0, before[np.maximum(last_reset, 0)],
+                    -initial)
+    return total - base
+
+
+class CompartmentAllocator:
+    """Free compartments of every core, used to place neurons on hardware.
+
+    Neurons are placed with one of the PLACEMENT_POLICIES:
+      fill_first   fill each core before moving to the next, in order
+      round_robin  place one neuron on each core in turn
+      balanced     place one neuron on each tile in turn, filling the cores
+                   of each tile in order
+      block        fill the given block of (tile, core) pairs in order
+    Each policy keeps a cursor, so later layers continue where the last
+    one stopped. Neurons that don't fit are left unmapped (-1).
+    """
+    PLACEMENT_POLICIES = ("fill_first", "round_robin", "balanced", "block")
+
+    def __init__(self, max_tiles, max_cores, max_compartments,
+                 policy="fill_first"):
+        if policy not in self.PLACEMENT_POLICIES:
+            raise ValueError(f"Unknown placement policy: {policy}")
+        self.max_tiles = max_tiles
+        self.max_cores = max_cores
+        self.policy = policy
+        self.free = np.full((max_tiles, max_cores), max_compartments,
+                            dtype=np.int64)
+        self._next_core = 0
+        self._next_round_robin_core = 0
+        self._next_tile = 0
+        self._next_tile_cores = np.zeros(max_tiles, dtype=np.int64)
+
+    def allocate(self, count, policy=None, block=None):
+        """Place count neurons, returning arrays of their tiles and cores."""
+        if policy is None:
+            policy = self.policy if block is None else "block"
+        free = self.free.reshape(-1)
+        if policy == "fill_first":
+            placed, self._next_core = _fill_first(free, self._next_core,
+                                                  count)
+        elif policy == "round_robin":
+            placed, self._next_round_robin_core = _round_robin(
+                free, self._next_round_robin_core, count)
+        elif policy == "balanced":
+            placed = self._allocate_balanced(count)
+        elif policy == "block":
+            if block is None:
+                raise ValueError("Block placement needs a block of cores")
+            block = np.asarray(block, dtype=np.int64).reshape(-1, 2)
+            block_cores = block[:, 0] * self.max_cores + block[:, 1]
+            block_free = free[block_cores]
+            placed, _ = _fill_first(block_free, 0, count)
+            free[block_cores] = block_free
+            placed = block_cores[placed]
+        else:
+            raise ValueError(f"Unknown placement policy: {policy}")
+
+        tiles = np.full(count, -1, dtype=np.int64)
+        cores = np.full(count, -1, dtype=np.int64)
+        tiles[:len(placed)], cores[:len(placed)] = np.divmod(placed,
+                                                             self.max_cores)
+        return tiles, cores
+
+    def _allocate_balanced(self, count):
+        tile_free = self.free.sum(axis=1)
+        tiles, self._next_tile = _round_robin(tile_free, self._next_tile,
+                                              count)
+        placed = np.empty(len(tiles), dtype=np.int64)
+        for tile in np.unique(tiles).tolist():
+            select = tiles == tile
+            tile_cores, self._next_tile_cores[tile] = _fill_first(
+                self.free[tile], self._next_tile_cores[tile],
+                np.count_nonzero(select))
+            placed[select] = tile * self.max_cores + tile_cores
+        return placed
+
+
+def _fill_first(free, start, count):
+    # Take count compartments from free, one core at a time from start.
+    #  Cores before start must already be full. Returns the core of every
+    #  compartment taken and the first core that isn't full
+    taken = []
+    core = start
+    while count > 0 and core < len(free):
+        n = min(int(free[core]), count)
+        taken.append(n)
+        free[core] -= n
+        count -= n
+        if free[core] == 0:
+            core += 1
+    placed = np.repeat(np.arange(start, start + len(taken)), taken)
+    return placed, core
+
+
+def _round_robin(free, start, count):
+    # Take count compartments from free, one from each core in turn
+    #  starting at start, skipping full cores. Returns the core of every
+    #  compartment taken and the core to start from next time
+    placed = []
+    order = np.roll(np.arange(len(free)), -start)
+    while count > 0:
+        available = order[free[order] > 0]
+        if len(available) == 0:
+            break
+        # Take whole rounds at once, until a core fills up
+        rounds = min(int(free[available].min()), count // len(available))
+        if rounds > 0:
+            placed.append(np.tile(available, rounds))
+            free[available] -= rounds
+            count -= rounds * len(available)
+        else:
+            placed.append(available[:count])
+            free[available[:count]] -= 1
+            start = (int(available[count - 1]) + 1) % len(free)
+            count = 0
+    placed = np.concatenate(placed) if placed else np.empty(0, np.int64)
+    return placed, start
+
+
+def init_compartments(max_tiles, max_cores, max_compartments,
+                      policy="fill_first"):
+    return CompartmentAllocator(max_tiles, max_cores, max_compartments,
+                                policy)
 
-def map_neuron_to_compartment(compartments):
-    for tile, cores in enumerate(compartments):
-        for core, _ in enumerate(cores):
-            if compartments[tile][core] > 0:
-                compartments[tile][core] -= 1
-                return tile, core
 
-    # No free compartments left
-    return None, None
+def map_neuron_to_compartment(compartments):
+    tiles, cores = compartments.allocate(1)
+    if tiles[0] < 0:
+        # No free compartments left
+        return None, None
+    return int(tiles[0]), int(cores[0])
 
 
 def create_layer(network, layer_neuron_count, compartments,
@@ -272,7 +1732,8 @@ def create_layer(network, layer_neuron_count, compartments,
                  threshold=1.0, reset=0.0, leak=1.0, mappings=None,
                  connections_out=None, reverse_threshold=None,
                  reverse_reset_mode=None, neuron_model=None,
-                 synapse_model=None):
+                 synapse_model=None, tiles=None, cores=None, policy=None,
+                 block=None):
     print("Creating layer with {0} neurons".format(layer_neuron_count))
     layer_group = network.create_group(threshold, reset, leak, log_spikes,
                                        log_potential, force_update,
@@ -284,36 +1745,193 @@ def create_layer(network, layer_neuron_count, compartments,
 
     if mappings is not None:
         assert(len(mappings) == layer_neuron_count)
+        mappings = np.asarray(mappings).astype(np.int64).reshape(-1, 2)
+        tiles, cores = mappings[:, 0], mappings[:, 1]
+    elif tiles is None:
+        tiles, cores = compartments.allocate(layer_neuron_count, policy,
+                                             block)
+    layer_group.create_neurons(layer_neuron_count, tiles=tiles, cores=cores)
 
-    for i in range(0, layer_neuron_count):
-        if (i % 10000) == 0:
-            print(f"Creating neuron {i}")
-        neuron = layer_group.create_neuron()
+    return layer_group
 
-        if mappings is not None:
-            tile, core = mappings[i]
-        else:
-            tile, core = map_neuron_to_compartment(compartments)
-        neuron.tile, neuron.core = tile, core
 
-    return layer_group
+### Connectivity generators ###
+# Each generator returns (src, dst, weights) arrays of neuron ids within the
+#  source and destination groups, one entry per edge, ordered by source
+#  neuron. They can be passed straight to NeuronGroup.connect(), e.g.
+#  layer_1.connect(layer_2, *sim.dense_connections(10, 10, 0.5)). Random
+#  generators take a seed, or a numpy.random.Generator, so networks can be
+#  regenerated exactly. Integer weights are returned as integers, so that
+#  they are saved as integers.
+CONNECTION_CHUNK_SIZE = 1 << 22
+
+
+def dense_connections(src_count, dest_count, weights=1.0):
+    """Connect every source neuron to every destination neuron. weights
+    is one weight, or a (src_count, dest_count) matrix of weights."""
+    src = np.repeat(np.arange(src_count), dest_count)
+    dst = np.tile(np.arange(dest_count), src_count)
+    weights = np.broadcast_to(_weight_array(weights),
+                              (src_count, dest_count)).reshape(-1)
+    return src, dst, weights
+
+
+def bernoulli_connections(src_count, dest_count, probability, weights=1.0,
+                          seed=None):
+    """Connect each pair of neurons independently with the given
+    probability."""
+    rng = np.random.default_rng(seed)
+    rows_per_chunk = max(1, CONNECTION_CHUNK_SIZE // max(dest_count, 1))
+    src, dst = [], []
+    for first in range(0, src_count, rows_per_chunk):
+        rows = min(rows_per_chunk, src_count - first)
+        chunk_src, chunk_dst = np.nonzero(
+            rng.random((rows, dest_count)) < probability)
+        src.append(chunk_src + first)
+        dst.append(chunk_dst)
+    src = np.concatenate(src) if src else np.empty(0, dtype=np.int64)
+    dst = np.concatenate(dst) if dst else np.empty(0, dtype=np.int64)
+    return src, dst, _edge_weights(weights, len(src))
+
+
+def fan_out_connections(src_count, dest_cores, cores_per_neuron,
+                        neurons_per_core=1, weights=1.0, seed=None):
+    """Connect every source neuron to neurons_per_core random neurons on
+    each of cores_per_neuron different random cores.
+
+    dest_cores gives the core of every destination neuron, for example
+    group.tiles * max_cores + group.cores.
+    """
+    rng = np.random.default_rng(seed)
+    _, core_of_dest = np.unique(np.asarray(dest_cores), return_inverse=True)
+    core_sizes = np.bincount(core_of_dest.reshape(-1))
+    if cores_per_neuron > len(core_sizes):
+        raise ValueError(f"Can't connect to {cores_per_neuron} of "
+                         f"{len(core_sizes)} cores")
+    if neurons_per_core > core_sizes.min():
+        raise ValueError(f"Can't connect to {neurons_per_core} neurons of a "
+                         f"core with {core_sizes.min()} neurons")
+    dest_by_core = np.argsort(core_of_dest.reshape(-1), kind="stable")
+    core_starts = np.cumsum(core_sizes) - core_sizes
+
+    cores = _sample_distinct(rng, np.full(src_count, len(core_sizes)),
+                             cores_per_neuron).reshape(-1)
+    neurons = _sample_distinct(rng, core_sizes[cores], neurons_per_core)
+    dst = dest_by_core[core_starts[cores, np.newaxis] + neurons].reshape(-1)
+    src = np.repeat(np.arange(src_count), cores_per_neuron * neurons_per_core)
+    return src, dst, _edge_weights(weights, len(src))
+
+
+def conv2d_connections(input_shape, kernel, stride=1, padding=0):
+    """Connect a (channels, height, width) input to the output of a 2-D
+    convolution with kernel, an (out_channels, in_channels, kernel_height,
+    kernel_width) array of weights.
+
+    Neurons are numbered channel by channel, then by row and column, in
+    both layers. The output has out_channels * out_height * out_width
+    neurons, where out_height = (height + 2*padding - kernel_height) //
+    stride + 1, and similarly for the width. stride and padding are one
+    value or a (rows, columns) pair.
+    """
+    kernel = _weight_array(kernel)
+    out_channels, in_channels, kernel_height, kernel_width = kernel.shape
+    channels, height, width = input_shape
+    if channels != in_channels:
+        raise ValueError(f"Kernel expects {in_channels} channels, "
+                         f"input has {channels}")
+    stride_y, stride_x = np.broadcast_to(stride, 2)
+    padding_y, padding_x = np.broadcast_to(padding, 2)
+    out_height = (height + 2*padding_y - kernel_height) // stride_y + 1
+    out_width = (width + 2*padding_x - kernel_width) // stride_x + 1
+
+    # One edge for every input channel, kernel row and column, and output
+    #  channel, row and column, laid out in source order
+    ic, ky, kx, oc, oy, ox = np.ix_(
+        np.arange(in_channels), np.arange(kernel_height),
+        np.arange(kernel_width), np.arange(out_channels),
+        np.arange(out_height), np.arange(out_width))
+    iy = oy*stride_y - padding_y + ky
+    ix = ox*stride_x - padding_x + kx
+    shape = np.broadcast_shapes(ic.shape, ky.shape, kx.shape, oc.shape,
+                                oy.shape, ox.shape)
+    valid = np.broadcast_to((iy >= 0) & (iy < height) &
+                            (ix >= 0) & (ix < width), shape)
+    src = np.broadcast_to((ic*height + iy)*width + ix, shape)[valid]
+    dst = np.broadcast_to((oc*out_height + oy)*out_width + ox, shape)[valid]
+    weights = np.broadcast_to(kernel[oc, ic, ky, kx], shape)[valid]
+    order = np.argsort(src, kind="stable")
+    return src[order], dst[order], weights[order]
+
+
+def one_to_one_connections(count, weights=1.0):
+    """Connect neuron i of the source to neuron i of the destination."""
+    ids = np.arange(count)
+    return ids, ids.copy(), _edge_weights(weights, count)
+
+
+def winner_take_all_connections(count, weights=-1.0):
+    """Connect every neuron to every other neuron in the same group, with
+    inhibitory weights by default."""
+    src, dst, _ = dense_connections(count, count)
+    is_other = src != dst
+    return src[is_other], dst[is_other], _edge_weights(
+        weights, count * (count - 1))
+
+
+def _edge_weights(weights, count):
+    return np.broadcast_to(_weight_array(weights), (count,)).copy()
+
+
+def _sample_distinct(rng, n, m):
+    # Sample m distinct values from range(n[i]) for every row i, using
+    #  Floyd's algorithm vectorized over rows
+    samples = np.empty((len(n), m), dtype=np.int64)
+    for step in range(m):
+        j = n - m + step
+        t = rng.integers(0, j + 1)
+        taken = np.any(samples[:, :step] == t[:, np.newaxis], axis=1)
+        samples[:, step] = np.where(taken, j, t)
+    return samples
 
 
 ### Architecture description parsing ###
 def parse_file(input_filename, output_filename):
-    with open(input_filename, "r") as arch_file:
-        arch_dict = yaml.safe_load(arch_file)
+    description = parse_arch_description(input_filename)
+
+    # Write to a temporary file first, so that simulations running at the
+    #  same time never read a partially written file
+    temp_filename = f"{output_filename}.{os.getpid()}.tmp"
+    with open(temp_filename, "w") as list_file:
+        list_file.write(description)
+    os.replace(temp_filename, output_filename)
+    return
+
+
+def parse_arch_description(input_filename):
+    """Parse an architecture YAML file into the simulator's description format.
 
+    Parsed descriptions are cached, keyed by a hash of the YAML content, so
+    that sweeps only parse each architecture once. The result can be passed
+    straight to SANA_FE.set_arch_description().
+    """
+    with open(input_filename, "rb") as arch_file:
+        content = arch_file.read()
+    key = hashlib.sha256(content).hexdigest()
+    if key in _parsed_arch_cache:
+        return _parsed_arch_cache[key]
+
+    arch_dict = yaml.safe_load(content)
     if "architecture" not in arch_dict:
         raise Exception("Error: no architecture defined")
 
     parse_arch(arch_dict["architecture"])
-    arch_elements = _entry_list
+    description = "".join(line + '\n' for line in _entry_list)
 
-    with open(output_filename, "w") as list_file:
-        for line in arch_elements:
-            list_file.write(line + '\n')
-    return
+    if len(_parsed_arch_cache) >= ARCH_CACHE_SIZE:
+        # Evict the oldest entry
+        del _parsed_arch_cache[next(iter(_parsed_arch_cache))]
+    _parsed_arch_cache[key] = description
+    return description
 
 
 def parse_arch(arch):
@@ -494,13 +2112,46 @@ def create_noc(noc_dict):
 
 
 project_dir = os.path.dirname(os.path.abspath(__file__))
-def run(arch_path, network_path, timesteps,
-        run_dir=os.path.join(project_dir, "runs"),
+
+
+def _warn_run_dir(run_dir):
+    if run_dir is not None:
+        warnings.warn("run_dir is no longer used, use output_dir instead",
+                      DeprecationWarning, stacklevel=3)
+
+
+def run(arch_path, network_path, timesteps, run_dir=None,
         perf_trace=True, spike_trace=False, potential_trace=False,
-        message_trace=False, run_alive=False, gui=False):
-    parsed_filename = os.path.join(run_dir,
-                                   os.path.basename(arch_path) + ".parsed")
-    parse_file(arch_path, parsed_filename)
+        message_trace=False, run_alive=False, gui=False,
+        event_driven=False, parallel_schedule=False, threads=None,
+        binary_spike_trace=False, binary_potential_trace=False,
+        probe_interval=1, write_summary=True, record_spikes=False,
+        binary_message_trace=False, message_sampling=None,
+        async_trace=False, output_dir=None, snapshot=None):
+    """Simulate an SNN on an architecture for a number of timesteps.
+
+    Returns the run summary, as written to run_summary.yaml. The "perf"
+    entry holds the per-timestep counters written to perf.csv, as a dict
+    of NumPy arrays. Neither file is needed to get the results, so both
+    can be disabled with perf_trace=False and write_summary=False. If
+    record_spikes is set, "spikes" holds the (timesteps, group_ids,
+    neuron_ids) arrays of every spike, recorded in memory.
+    message_sampling is a dict of SANA_FE.set_message_sampling() arguments
+    (interval, fraction and cores), used to trace a sample of the messages.
+    If async_trace is set, traces are written by a background thread while
+    the following timesteps are simulated. If output_dir is given, all
+    files for this run are written there instead of the working
+    directory, so that many simulations can run at the same time. The
+    architecture is parsed in memory, so run_dir is deprecated and ignored.
+    If snapshot is given, the mapped network is loaded from that file,
+    or saved to it if the snapshot is missing or out of date. With
+    event_driven, only neurons that can change are updated, giving the
+    same results as updating every neuron.
+    """
+    _warn_run_dir(run_dir)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    arch_description = parse_arch_description(arch_path)
 
     # Set some flags for the dynamic linking library
     # Important to do before importing the simcpp .so library!
@@ -509,19 +2160,35 @@ def run(arch_path, network_path, timesteps,
 
     # Parse inputs and run simulation
     sana_fe = sim.SANA_FE()
+    if output_dir is not None:
+        sana_fe.set_output_dir(output_dir)
     if spike_trace:
-        sana_fe.set_spike_flag()
+        sana_fe.set_spike_flag(binary=binary_spike_trace)
     if potential_trace:
-        sana_fe.set_pot_flag()
+        sana_fe.set_pot_flag(binary=binary_potential_trace)
+    if probe_interval != 1:
+        sana_fe.set_probe_interval(probe_interval)
+    if record_spikes:
+        sana_fe.set_spike_recorder()
     if perf_trace:
         sana_fe.set_perf_flag()
     if message_trace:
-        sana_fe.set_mess_flag()
+        sana_fe.set_mess_flag(binary=binary_message_trace)
+    if message_sampling is not None:
+        sana_fe.set_message_sampling(**message_sampling)
+    if async_trace:
+        sana_fe.set_async_trace_flag()
     if gui:
         sana_fe.set_gui_flag()
+    if event_driven:
+        sana_fe.set_event_driven_flag()
+    if parallel_schedule:
+        sana_fe.set_parallel_schedule_flag()
+    if threads is not None:
+        sana_fe.set_thread_count(threads)
     
-    sana_fe.set_arch(parsed_filename)
-    sana_fe.set_net(network_path)
+    sana_fe.set_arch_description(arch_description)
+    _load_network(sana_fe, network_path, snapshot)
 
     if run_alive:
         while True:
@@ -580,11 +2247,86 @@ def run(arch_path, network_path, timesteps,
         sana_fe.run_timesteps(timesteps)
     
     print('-----------Total Run Summary-----------')
-    sana_fe.sim_summary()
+    results = _summary_results(sana_fe.sim_summary(write_summary))
+    results["git_version"] = sim.git_version
+    results["perf"] = sana_fe.get_perf()
+    if record_spikes:
+        results["spikes"] = sana_fe.get_spikes()
 
-    with open("run_summary.yaml", "r") as run_summary:
-        results = yaml.safe_load(run_summary)
+    sana_fe.clean_up()
 
+    return results
+
+
+def _summary_results(summary):
+    # Counts are returned as doubles by the simulator, convert them back
+    results = dict(summary)
+    for key in ("total_spikes", "total_packets", "total_neurons_fired",
+                "timesteps"):
+        if key in results:
+            results[key] = int(results[key])
+    return results
+
+
+def _load_network(sana_fe, network_path, snapshot):
+    # Loading a snapshot skips parsing and mapping the network, it is only
+    #  used if it was saved for the same architecture and network
+    if snapshot is None:
+        sana_fe.set_net(network_path)
+    elif not sana_fe.load_snapshot(snapshot, network_path):
+        sana_fe.set_net(network_path)
+        sana_fe.save_snapshot(snapshot)
+
+
+def run_batch(arch_path, network_path, timesteps, variants,
+              run_dir=None, event_driven=False, parallel_schedule=False,
+              threads=None, snapshot=None):
+    """Simulate a batch of network variants that share the same topology.
+
+    The architecture and network are loaded and mapped once. Each entry in
+    variants is a list of (group_id, neuron_id, attributes) tuples, giving
+    the soma parameters that differ from the network description for that
+    variant. The variants share the network's connection maps, but are
+    simulated one after another rather than together, so the run time
+    still grows with the number of variants. Returns a list of results, one for each variant, including
+    the per-timestep "perf" counters. snapshot and run_dir are used as for
+    run().
+    """
+    _warn_run_dir(run_dir)
+    arch_description = parse_arch_description(arch_path)
+
+    sys.setdlopenflags(os.RTLD_GLOBAL | os.RTLD_LAZY)
+    import simcpp as sim
+
+    sana_fe = sim.SANA_FE()
+    if event_driven:
+        sana_fe.set_event_driven_flag()
+    if parallel_schedule:
+        sana_fe.set_parallel_schedule_flag()
+    if threads is not None:
+        sana_fe.set_thread_count(threads)
+    sana_fe.set_batch_size(len(variants))
+
+    sana_fe.set_arch_description(arch_description)
+    _load_network(sana_fe, network_path, snapshot)
+
+    for variant_id, updates in enumerate(variants):
+        for group_id, n_id, attributes in updates:
+            kwargs = [f"{key}={value}" for key, value in attributes.items()]
+            sana_fe.update_neuron(group_id, n_id, kwargs, len(kwargs),
+                                  variant_id)
+
+    if timesteps < 1:
+        print(f"Error: Given {timesteps} timesteps, require int > 1.")
+        exit(1)
+    sana_fe.run_timesteps(timesteps)
+    results = [_summary_results(summary)
+               for summary in sana_fe.batch_summary()]
+
+    print('-----------Total Run Summary-----------')
+    for variant_id, variant_results in enumerate(results):
+        print(f"variant {variant_id}: {variant_results}")
+        variant_results["perf"] = sana_fe.get_perf(variant_id)
     sana_fe.clean_up()
 
     return results
@@ -600,14 +2342,19 @@ if __name__ == "__main__":
     parser.add_argument("snn", help="Spiking Neural Network description file path", type=str)
     parser.add_argument("timesteps", help="Number of timesteps to simulate", type=int)
     parser.add_argument("-s", "--spikes", help="Trace spikes", action="store_true")
+    parser.add_argument("-b", "--binary-spikes", help="Trace spikes in the binary format", action="store_true")
     parser.add_argument("-v", "--voltages", help="Trace membrane voltages", action="store_true")
     parser.add_argument("-r", "--run", help="Keep simulation alive", action="store_true")
     parser.add_argument("-g", "--gui", help="Turn on gui traces", action="store_true")
+    parser.add_argument("-o", "--output-dir", help="Directory for trace and summary files", type=str)
+    parser.add_argument("-S", "--snapshot", help="Load the mapped network from this file, or save it there", type=str)
 
     args = parser.parse_args()
     print(args)
 
     run(args.architecture, args.snn, args.timesteps,
-        spike_trace=args.spikes, potential_trace=args.voltages,
-        run_alive=args.run, gui=args.gui)
+        spike_trace=(args.spikes or args.binary_spikes),
+        binary_spike_trace=args.binary_spikes,
+        potential_trace=args.voltages, run_alive=args.run, gui=args.gui,
+        output_dir=args.output_dir, snapshot=args.snapshot)
     print("sim finished")
@@ -0,0 +1,865 @@
+// Copyright (c) 2023 - The University of Texas at Austin
+//  This work was produced under contract #2317831 to National Technology and
+//  Engineering Solutions of Sandia, LLC which is under contract
+//  No. DE-NA0003525 with the U.S. Department of Energy.
+// snapshot.cpp
+#include <assert.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <map>
+#include <string>
+
+#include "snapshot.hpp"
+#include "arch.hpp"
+#include "description.hpp"
+#include "network.hpp"
+#include "print.hpp"
+
+uint64_t snapshot_hash(uint64_t hash, const char *data, const long int size)
+{
+	// 64 bit FNV-1a hash, continuing from a previous hash
+	for (long int i = 0; i < size; i++)
+	{
+		hash ^= (unsigned char) data[i];
+		hash *= 0x100000001b3ULL;
+	}
+
+	return hash;
+}
+
+uint64_t snapshot_hash_file_info(uint64_t hash, FILE *fp)
+{
+	// Hash the size and modification time of a file, which is much faster
+	//  than reading large network files and still changes when they do
+	struct stat info;
+	uint64_t fields[3];
+
+	if (fstat(fileno(fp), &info) != 0)
+	{
+		INFO("Error: Couldn't get file information for hashing.\n");
+		exit(1);
+	}
+	fields[0] = (uint64_t) info.st_size;
+	fields[1] = (uint64_t) info.st_mtim.tv_sec;
+	fields[2] = (uint64_t) info.st_mtim.tv_nsec;
+
+	return snapshot_hash(hash, (const char *) fields, sizeof(fields));
+}
+
+uint64_t snapshot_hash_file(uint64_t hash, FILE *fp)
+{
+	// Hash the rest of the file, then go back to the start so that it can
+	//  still be parsed
+	char *buffer = (char *) malloc(SNAPSHOT_HASH_CHUNK);
+	size_t len;
+
+	if (buffer == NULL)
+	{
+		INFO("Error: Couldn't allocate memory for hashing.\n");
+		exit(1);
+	}
+	while ((len = fread(buffer, 1, SNAPSHOT_HASH_CHUNK, fp)) > 0)
+	{
+		hash = snapshot_hash(hash, buffer, len);
+	}
+	free(buffer);
+	rewind(fp);
+
+	return hash;
+}
+
+static void snapshot_write_table(FILE *fp, const void *table,
+	const uint64_t count, const size_t element_size)
+{
+	// Write a table, padded so that the next one starts on an 8 byte
+	//  boundary (see description_binary_table())
+	const char padding[8] = {0};
+	const uint64_t size = count * element_size;
+
+	if (size > 0)
+	{
+		fwrite(table, element_size, count, fp);
+	}
+	fwrite(padding, 1, ((size + 7) & ~((uint64_t) 7)) - size, fp);
+}
+
+static struct core **snapshot_core_list(struct architecture *const arch)
+{
+	// List all cores by their id
+	struct core **cores = (struct core **) malloc(
+		sizeof(struct core *) * (arch->core_count + 1));
+
+	if (cores == NULL)
+	{
+		INFO("Error: Couldn't allocate snapshot memory.\n");
+		exit(1);
+	}
+	for (int i = 0; i < arch->tile_count; i++)
+	{
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			struct core *c = &(t->cores[j]);
+			assert(c->id < arch->core_count);
+			cores[c->id] = c;
+		}
+	}
+
+	return cores;
+}
+
+int snapshot_save(FILE *fp, struct network *const net,
+	struct architecture *const arch, const uint64_t arch_hash,
+	const uint64_t net_hash)
+{
+	struct snapshot_header header;
+	std::map<std::string, uint32_t> string_ids;
+	struct core **cores;
+	uint64_t *group_first, *string_offsets, *connection_offsets;
+	uint64_t *core_offsets, *map_offsets;
+	uint32_t *groups, *neuron_sets, *connection_dest, *connection_synapse;
+	uint32_t *core_neurons, *map_cores, *map_counts;
+	double *connection_weights;
+	char *strings;
+	uint64_t neuron_count, connection_count, map_count, string_bytes;
+
+	if (net->external_input_count > 0)
+	{
+		INFO("Error: Can't save a snapshot of a network with inputs.\n");
+		return RET_FAIL;
+	}
+
+	// Give every neuron a global index, in group order
+	group_first = (uint64_t *) malloc(
+		sizeof(uint64_t) * (net->neuron_group_count + 1));
+	if (group_first == NULL)
+	{
+		INFO("Error: Couldn't allocate snapshot memory.\n");
+		exit(1);
+	}
+	neuron_count = 0;
+	connection_count = 0;
+	map_count = 0;
+	for (int i = 0; i < net->neuron_group_count; i++)
+	{
+		struct neuron_group *group = &(net->groups[i]);
+
+		group_first[i] = neuron_count;
+		neuron_count += group->neuron_count;
+		for (int j = 0; j < group->neuron_count; j++)
+		{
+			struct neuron *n = &(group->neurons[j]);
+
+			if (n->core == NULL)
+			{
+				INFO("Error: Neuron %d.%d isn't mapped.\n",
+					group->id, n->id);
+				free(group_first);
+				return RET_FAIL;
+			}
+			connection_count += n->connection_out_count;
+			map_count += n->maps_out_count;
+		}
+	}
+	group_first[net->neuron_group_count] = neuron_count;
+
+	groups = (uint32_t *) malloc(
+		sizeof(uint32_t) * 2 * (net->neuron_group_count + 1));
+	neuron_sets = (uint32_t *) malloc(
+		sizeof(uint32_t) * (neuron_count + 1));
+	connection_offsets = (uint64_t *) malloc(
+		sizeof(uint64_t) * (neuron_count + 1));
+	connection_dest = (uint32_t *) malloc(
+		sizeof(uint32_t) * (connection_count + 1));
+	connection_synapse = (uint32_t *) malloc(
+		sizeof(uint32_t) * (connection_count + 1));
+	connection_weights = (double *) malloc(
+		sizeof(double) * (connection_count + 1));
+	core_offsets = (uint64_t *) malloc(
+		sizeof(uint64_t) * (arch->core_count + 1));
+	core_neurons = (uint32_t *) malloc(
+		sizeof(uint32_t) * (neuron_count + 1));
+	map_offsets = (uint64_t *) malloc(
+		sizeof(uint64_t) * (neuron_count + 1));
+	map_cores = (uint32_t *) malloc(sizeof(uint32_t) * (map_count + 1));
+	map_counts = (uint32_t *) malloc(sizeof(uint32_t) * (map_count + 1));
+	if ((groups == NULL) || (neuron_sets == NULL) ||
+		(connection_offsets == NULL) || (connection_dest == NULL) ||
+		(connection_synapse == NULL) || (connection_weights == NULL) ||
+		(core_offsets == NULL) || (core_neurons == NULL) ||
+		(map_offsets == NULL) || (map_cores == NULL) ||
+		(map_counts == NULL))
+	{
+		INFO("Error: Couldn't allocate snapshot memory.\n");
+		exit(1);
+	}
+
+	// Neurons and their connections, synapse names are only stored if
+	//  they aren't the default for the destination group
+	string_bytes = 0;
+	connection_count = 0;
+	map_count = 0;
+	for (int i = 0; i < net->neuron_group_count; i++)
+	{
+		struct neuron_group *group = &(net->groups[i]);
+
+		groups[2 * i] = group->neuron_count;
+		groups[(2 * i) + 1] = group->attribute_set;
+		for (int j = 0; j < group->neuron_count; j++)
+		{
+			struct neuron *n = &(group->neurons[j]);
+			const uint64_t id = group_first[i] + j;
+
+			neuron_sets[id] = (n->attribute_set < 0) ?
+				SNAPSHOT_NONE : n->attribute_set;
+			connection_offsets[id] = connection_count;
+			for (int k = 0; k < n->connection_out_count; k++)
+			{
+				const struct connection *con =
+					&(n->connections_out[k]);
+				const struct neuron *dest = con->post_neuron;
+				uint32_t synapse = SNAPSHOT_NONE;
+
+				if (strncmp(con->synapse_hw_name,
+					dest->group->default_synapse_hw_name,
+					MAX_FIELD_LEN) != 0)
+				{
+					std::string name(con->synapse_hw_name);
+					if (!string_ids.count(name))
+					{
+						const uint32_t string_id =
+							string_ids.size();
+						string_ids[name] = string_id;
+						string_bytes += name.size() + 1;
+					}
+					synapse = string_ids[name];
+				}
+				connection_dest[connection_count] =
+					group_first[dest->group->id] + dest->id;
+				connection_synapse[connection_count] = synapse;
+				connection_weights[connection_count] =
+					con->weight;
+				connection_count++;
+			}
+
+			// Each map is stored as its destination core and the
+			//  number of connections in the map
+			map_offsets[id] = map_count;
+			for (int m = 0; m < n->maps_out_count; m++)
+			{
+				const struct connection_map *map =
+					n->maps_out[m];
+
+				assert(map->connection_count > 0);
+				map_cores[map_count] = map->connections[0]->
+					post_neuron->core->id;
+				map_counts[map_count] = map->connection_count;
+				map_count++;
+			}
+		}
+	}
+	connection_offsets[neuron_count] = connection_count;
+	map_offsets[neuron_count] = map_count;
+
+	string_offsets = (uint64_t *) malloc(
+		sizeof(uint64_t) * (string_ids.size() + 1));
+	strings = (char *) malloc(string_bytes + 1);
+	if ((string_offsets == NULL) || (strings == NULL))
+	{
+		INFO("Error: Couldn't allocate snapshot memory.\n");
+		exit(1);
+	}
+	string_offsets[0] = 0;
+	for (std::map<std::string, uint32_t>::const_iterator it =
+		string_ids.begin(); it != string_ids.end(); it++)
+	{
+		string_offsets[it->second + 1] = it->first.size() + 1;
+	}
+	for (size_t i = 0; i < string_ids.size(); i++)
+	{
+		string_offsets[i + 1] += string_offsets[i];
+	}
+	for (std::map<std::string, uint32_t>::const_iterator it =
+		string_ids.begin(); it != string_ids.end(); it++)
+	{
+		memcpy(&(strings[string_offsets[it->second]]),
+			it->first.c_str(), it->first.size() + 1);
+	}
+
+	// Neurons mapped to each core, in the order they were mapped so that
+	//  every neuron keeps the same local id
+	cores = snapshot_core_list(arch);
+	header.mapped_count = 0;
+	for (int i = 0; i < arch->core_count; i++)
+	{
+		struct core *c = cores[i];
+
+		core_offsets[i] = header.mapped_count;
+		for (int k = 0; k < c->neuron_count; k++)
+		{
+			const struct neuron *n = c->neurons[k];
+			core_neurons[header.mapped_count++] =
+				group_first[n->group->id] + n->id;
+		}
+	}
+	core_offsets[arch->core_count] = header.mapped_count;
+
+	memcpy(header.magic, SNAPSHOT_MAGIC, sizeof(header.magic));
+	header.version = SNAPSHOT_VERSION;
+	header.group_count = net->neuron_group_count;
+	header.arch_hash = arch_hash;
+	header.net_hash = net_hash;
+	header.neuron_count = neuron_count;
+	header.connection_count = connection_count;
+	header.core_count = arch->core_count;
+	header.map_count = map_count;
+	header.attribute_set_count = net->attribute_set_count;
+	header.attribute_bytes = net->attribute_data_size;
+	header.string_count = string_ids.size();
+	header.string_bytes = string_bytes;
+
+	fwrite(&header, sizeof(header), 1, fp);
+	if (net->attribute_set_count > 0)
+	{
+		snapshot_write_table(fp, net->attribute_set_offsets,
+			net->attribute_set_count + 1, sizeof(long int));
+	}
+	else
+	{
+		const long int offset = 0;
+		snapshot_write_table(fp, &offset, 1, sizeof(long int));
+	}
+	snapshot_write_table(fp, net->attribute_data,
+		net->attribute_data_size, sizeof(char));
+	snapshot_write_table(fp, string_offsets, header.string_count + 1,
+		sizeof(uint64_t));
+	snapshot_write_table(fp, strings, string_bytes, sizeof(char));
+	snapshot_write_table(fp, groups, 2 * (uint64_t) header.group_count,
+		sizeof(uint32_t));
+	snapshot_write_table(fp, neuron_sets, neuron_count, sizeof(uint32_t));
+	snapshot_write_table(fp, connection_offsets, neuron_count + 1,
+		sizeof(uint64_t));
+	snapshot_write_table(fp, connection_dest, connection_count,
+		sizeof(uint32_t));
+	snapshot_write_table(fp, connection_synapse, connection_count,
+		sizeof(uint32_t));
+	snapshot_write_table(fp, connection_weights, connection_count,
+		sizeof(double));
+	snapshot_write_table(fp, core_offsets, header.core_count + 1,
+		sizeof(uint64_t));
+	snapshot_write_table(fp, core_neurons, header.mapped_count,
+		sizeof(uint32_t));
+	snapshot_write_table(fp, map_offsets, neuron_count + 1,
+		sizeof(uint64_t));
+	snapshot_write_table(fp, map_cores, map_count, sizeof(uint32_t));
+	snapshot_write_table(fp, map_counts, map_count, sizeof(uint32_t));
+
+	free(cores);
+	free(strings);
+	free(string_offsets);
+	free(map_counts);
+	free(map_cores);
+	free(map_offsets);
+	free(core_neurons);
+	free(core_offsets);
+	free(connection_weights);
+	free(connection_synapse);
+	free(connection_dest);
+	free(connection_offsets);
+	free(neuron_sets);
+	free(groups);
+	free(group_first);
+
+	if (ferror(fp))
+	{
+		INFO("Error: Couldn't write snapshot.\n");
+		return RET_FAIL;
+	}
+	INFO("Saved snapshot of %lu neurons and %lu connections.\n",
+		neuron_count, connection_count);
+
+	return RET_OK;
+}
+
+static int snapshot_check_offsets(const uint64_t *offsets,
+	const uint64_t count, const uint64_t total)
+{
+	// Check a compressed sparse row table is in order and in range
+	if ((offsets[0] != 0) || (offsets[count] != total))
+	{
+		return RET_FAIL;
+	}
+	for (uint64_t i = 0; i < count; i++)
+	{
+		if (offsets[i] > offsets[i + 1])
+		{
+			return RET_FAIL;
+		}
+	}
+
+	return RET_OK;
+}
+
+static int snapshot_check(const struct snapshot_header *header,
+	const char *attribute_data, const uint64_t *attribute_set_offsets,
+	const uint64_t *string_offsets, const char *strings,
+	const uint32_t *groups, const uint32_t *neuron_sets,
+	const uint64_t *connection_offsets, const uint32_t *connection_dest,
+	const uint32_t *connection_synapse, const uint64_t *core_offsets,
+	const uint32_t *core_neurons, const uint64_t *map_offsets,
+	const uint32_t *map_cores, const uint32_t *map_counts)
+{
+	// Check every index in the snapshot before building anything, so that
+	//  a corrupt snapshot can't leave the network half built
+	uint32_t *neuron_cores, *core_connection_count;
+	uint64_t neuron_count;
+	int ret;
+
+	if ((snapshot_check_offsets(attribute_set_offsets,
+		header->attribute_set_count, header->attribute_bytes) ==
+			RET_FAIL) ||
+		(snapshot_check_offsets(string_offsets, header->string_count,
+			header->string_bytes) == RET_FAIL) ||
+		(snapshot_check_offsets(connection_offsets,
+			header->neuron_count, header->connection_count) ==
+			RET_FAIL) ||
+		(snapshot_check_offsets(core_offsets, header->core_count,
+			header->mapped_count) == RET_FAIL) ||
+		(snapshot_check_offsets(map_offsets, header->neuron_count,
+			header->map_count) == RET_FAIL))
+	{
+		INFO("Error: Invalid snapshot offsets.\n");
+		return RET_FAIL;
+	}
+
+	// Every attribute set and string must be null terminated
+	for (uint64_t i = 0; i < header->attribute_set_count; i++)
+	{
+		if ((attribute_set_offsets[i] < attribute_set_offsets[i + 1]) &&
+			(attribute_data[attribute_set_offsets[i + 1] - 1] !=
+				'\0'))
+		{
+			INFO("Error: Invalid snapshot attributes (%lu).\n", i);
+			return RET_FAIL;
+		}
+	}
+	for (uint64_t i = 0; i < header->string_count; i++)
+	{
+		if ((string_offsets[i] >= string_offsets[i + 1]) ||
+			(strings[string_offsets[i + 1] - 1] != '\0'))
+		{
+			INFO("Error: Invalid snapshot string (%lu).\n", i);
+			return RET_FAIL;
+		}
+	}
+
+	neuron_count = 0;
+	for (uint32_t i = 0; i < header->group_count; i++)
+	{
+		neuron_count += groups[2 * i];
+		if (groups[(2 * i) + 1] >= header->attribute_set_count)
+		{
+			INFO("Error: Invalid snapshot group (%u).\n", i);
+			return RET_FAIL;
+		}
+	}
+	if ((neuron_count != header->neuron_count) ||
+		(header->mapped_count != header->neuron_count))
+	{
+		INFO("Error: Snapshot has %lu neurons, expected %lu.\n",
+			neuron_count, header->neuron_count);
+		return RET_FAIL;
+	}
+	for (uint64_t i = 0; i < neuron_count; i++)
+	{
+		if ((neuron_sets[i] != SNAPSHOT_NONE) &&
+			(neuron_sets[i] >= header->attribute_set_count))
+		{
+			INFO("Error: Invalid snapshot neuron (%lu).\n", i);
+			return RET_FAIL;
+		}
+	}
+	for (uint64_t i = 0; i < header->connection_count; i++)
+	{
+		if ((connection_dest[i] >= neuron_count) ||
+			((connection_synapse[i] != SNAPSHOT_NONE) &&
+			(connection_synapse[i] >= header->string_count)))
+		{
+			INFO("Error: Invalid snapshot connection (%lu).\n", i);
+			return RET_FAIL;
+		}
+	}
+
+	// Every neuron is mapped to exactly one core, and each neuron's maps
+	//  must match the cores its connections go to
+	neuron_cores = (uint32_t *) malloc(
+		sizeof(uint32_t) * (neuron_count + 1));
+	core_connection_count = (uint32_t *) calloc(
+		header->core_count + 1, sizeof(uint32_t));
+	if ((neuron_cores == NULL) || (core_connection_count == NULL))
+	{
+		INFO("Error: Couldn't allocate snapshot memory.\n");
+		exit(1);
+	}
+	for (uint64_t i = 0; i < neuron_count; i++)
+	{
+		neuron_cores[i] = SNAPSHOT_NONE;
+	}
+	ret = RET_OK;
+	for (uint64_t c = 0; (c < header->core_count) && (ret != RET_FAIL);
+		c++)
+	{
+		for (uint64_t k = core_offsets[c]; k < core_offsets[c + 1]; k++)
+		{
+			const uint32_t id = core_neurons[k];
+			if ((id >= neuron_count) ||
+				(neuron_cores[id] != SNAPSHOT_NONE))
+			{
+				INFO("Error: Invalid snapshot mapping (%lu).\n",
+					k);
+				ret = RET_FAIL;
+				break;
+			}
+			neuron_cores[id] = c;
+		}
+	}
+	for (uint64_t i = 0; (i < neuron_count) && (ret != RET_FAIL); i++)
+	{
+		for (uint64_t e = connection_offsets[i];
+			e < connection_offsets[i + 1]; e++)
+		{
+			core_connection_count[
+				neuron_cores[connection_dest[e]]]++;
+		}
+		for (uint64_t m = map_offsets[i]; m < map_offsets[i + 1]; m++)
+		{
+			if ((map_cores[m] >= header->core_count) ||
+				((m > map_offsets[i]) &&
+				(map_cores[m] <= map_cores[m - 1])) ||
+				(core_connection_count[map_cores[m]] !=
+					map_counts[m]))
+			{
+				INFO("Error: Invalid snapshot map (%lu).\n", m);
+				ret = RET_FAIL;
+				break;
+			}
+			core_connection_count[map_cores[m]] = 0;
+		}
+		for (uint64_t e = connection_offsets[i];
+			e < connection_offsets[i + 1]; e++)
+		{
+			const uint32_t c = neuron_cores[connection_dest[e]];
+			if (core_connection_count[c] != 0)
+			{
+				INFO("Error: Snapshot connection %lu has no "
+					"map.\n", e);
+				ret = RET_FAIL;
+				break;
+			}
+		}
+	}
+	free(core_connection_count);
+	free(neuron_cores);
+
+	return ret;
+}
+
+int snapshot_load(FILE *fp, struct network *const net,
+	struct architecture *const arch, const uint64_t arch_hash,
+	const uint64_t net_hash)
+{
+	// Rebuild a mapped network from a snapshot. Returns RET_FAIL without
+	//  changing anything if the snapshot doesn't match the architecture
+	//  and network, or can't be read
+	const struct snapshot_header *header;
+	const uint64_t *attribute_set_offsets, *string_offsets;
+	const uint64_t *connection_offsets, *core_offsets, *map_offsets;
+	const uint32_t *groups, *neuron_sets, *connection_dest;
+	const uint32_t *connection_synapse, *core_neurons, *map_cores;
+	const uint32_t *map_counts;
+	const double *connection_weights;
+	const char *buffer, *attribute_data, *strings;
+	struct attributes *attr;
+	struct neuron **neurons;
+	struct core **cores;
+	struct stat file_stat;
+	uint64_t *group_first;
+	uint64_t neuron_count, last_set;
+	long int size, pos;
+	int ret, attribute_count;
+
+	if ((fstat(fileno(fp), &file_stat) != 0) ||
+		!S_ISREG(file_stat.st_mode) ||
+		(file_stat.st_size < (long int) sizeof(struct snapshot_header)))
+	{
+		INFO("Error: Snapshot is truncated.\n");
+		return RET_FAIL;
+	}
+	size = file_stat.st_size;
+	buffer = (const char *) mmap(
+		NULL, size, PROT_READ, MAP_PRIVATE, fileno(fp), 0);
+	if (buffer == MAP_FAILED)
+	{
+		INFO("Error: Couldn't map snapshot.\n");
+		return RET_FAIL;
+	}
+
+	header = (const struct snapshot_header *) buffer;
+	if ((memcmp(header->magic, SNAPSHOT_MAGIC, sizeof(header->magic))
+		!= 0) || (header->version != SNAPSHOT_VERSION))
+	{
+		INFO("Snapshot format not supported.\n");
+		munmap((void *) buffer, size);
+		return RET_FAIL;
+	}
+	if ((header->arch_hash != arch_hash) || (header->net_hash != net_hash))
+	{
+		INFO("Snapshot is out of date.\n");
+		munmap((void *) buffer, size);
+		return RET_FAIL;
+	}
+	if ((net->neuron_group_count > 0) ||
+		(header->group_count > NETWORK_MAX_NEURON_GROUPS) ||
+		(header->core_count != (uint64_t) arch->core_count) ||
+		(header->neuron_count >= SNAPSHOT_NONE))
+	{
+		INFO("Error: Snapshot doesn't match the loaded network or "
+			"architecture.\n");
+		munmap((void *) buffer, size);
+		return RET_FAIL;
+	}
+
+	// Find all the tables, they are stored in this order
+	pos = sizeof(struct snapshot_header);
+	attribute_set_offsets = (const uint64_t *) description_binary_table(
+		buffer, size, &pos, header->attribute_set_count + 1,
+		sizeof(uint64_t));
+	attribute_data = (const char *) description_binary_table(buffer, size,
+		&pos, header->attribute_bytes, sizeof(char));
+	string_offsets = (const uint64_t *) description_binary_table(buffer,
+		size, &pos, header->string_count + 1, sizeof(uint64_t));
+	strings = (const char *) description_binary_table(
+		buffer, size, &pos, header->string_bytes, sizeof(char));
+	groups = (const uint32_t *) description_binary_table(buffer, size,
+		&pos, 2 * (uint64_t) header->group_count, sizeof(uint32_t));
+	neuron_sets = (const uint32_t *) description_binary_table(buffer, size,
+		&pos, header->neuron_count, sizeof(uint32_t));
+	connection_offsets = (const uint64_t *) description_binary_table(
+		buffer, size, &pos, header->neuron_count + 1,
+		sizeof(uint64_t));
+	connection_dest = (const uint32_t *) description_binary_table(buffer,
+		size, &pos, header->connection_count, sizeof(uint32_t));
+	connection_synapse = (const uint32_t *) description_binary_table(
+		buffer, size, &pos, header->connection_count,
+		sizeof(uint32_t));
+	connection_weights = (const double *) description_binary_table(buffer,
+		size, &pos, header->connection_count, sizeof(double));
+	core_offsets = (const uint64_t *) description_binary_table(buffer,
+		size, &pos, header->core_count + 1, sizeof(uint64_t));
+	core_neurons = (const uint32_t *) description_binary_table(buffer,
+		size, &pos, header->mapped_count, sizeof(uint32_t));
+	map_offsets = (const uint64_t *) description_binary_table(buffer,
+		size, &pos, header->neuron_count + 1, sizeof(uint64_t));
+	map_cores = (const uint32_t *) description_binary_table(buffer, size,
+		&pos, header->map_count, sizeof(uint32_t));
+	map_counts = (const uint32_t *) description_binary_table(buffer, size,
+		&pos, header->map_count, sizeof(uint32_t));
+	if ((attribute_set_offsets == NULL) || (attribute_data == NULL) ||
+		(string_offsets == NULL) || (strings == NULL) ||
+		(groups == NULL) || (neuron_sets == NULL) ||
+		(connection_offsets == NULL) || (connection_dest == NULL) ||
+		(connection_synapse == NULL) || (connection_weights == NULL) ||
+		(core_offsets == NULL) || (core_neurons == NULL) ||
+		(map_offsets == NULL) || (map_cores == NULL) ||
+		(map_counts == NULL))
+	{
+		INFO("Error: Snapshot is truncated.\n");
+		munmap((void *) buffer, size);
+		return RET_FAIL;
+	}
+	madvise((void *) buffer, size, MADV_SEQUENTIAL);
+	if (snapshot_check(header, attribute_data, attribute_set_offsets,
+		string_offsets, strings, groups, neuron_sets,
+		connection_offsets, connection_dest, connection_synapse,
+		core_offsets, core_neurons, map_offsets, map_cores,
+		map_counts) == RET_FAIL)
+	{
+		munmap((void *) buffer, size);
+		return RET_FAIL;
+	}
+
+	attr = (struct attributes *) malloc(
+		sizeof(struct attributes) * MAX_FIELDS);
+	neurons = (struct neuron **) malloc(
+		sizeof(struct neuron *) * (header->neuron_count + 1));
+	group_first = (uint64_t *) malloc(
+		sizeof(uint64_t) * (header->group_count + 1));
+	if ((attr == NULL) || (neurons == NULL) || (group_first == NULL))
+	{
+		INFO("Error: Couldn't allocate snapshot memory.\n");
+		exit(1);
+	}
+
+	ret = RET_OK;
+	neuron_count = 0;
+	for (uint32_t i = 0; i < header->group_count; i++)
+	{
+		group_first[i] = neuron_count;
+		neuron_count += groups[2 * i];
+	}
+
+	// Create the groups and neurons, using the attributes they were
+	//  originally created with. Soma plugins keep their parameters
+	//  private, so the only way to restore them is to set them again
+	neuron_count = 0;
+	for (uint32_t i = 0; i < header->group_count; i++)
+	{
+		const uint32_t set = groups[(2 * i) + 1];
+		struct neuron_group *group;
+
+		attribute_count = network_unpack_attributes(
+			&(attribute_data[attribute_set_offsets[set]]),
+			attribute_set_offsets[set + 1] -
+				attribute_set_offsets[set], attr);
+		network_create_neuron_group(
+			net, groups[2 * i], attr, attribute_count);
+		group = &(net->groups[net->neuron_group_count - 1]);
+		for (int j = 0; j < group->neuron_count; j++)
+		{
+			neurons[neuron_count++] = &(group->neurons[j]);
+		}
+	}
+	last_set = SNAPSHOT_NONE;
+	attribute_count = 0;
+	for (uint64_t i = 0; (i < neuron_count) && (ret != RET_FAIL); i++)
+	{
+		const uint32_t set = neuron_sets[i];
+
+		if (set == SNAPSHOT_NONE)
+		{
+			continue; // Neuron wasn't defined
+		}
+		if (set != last_set)
+		{
+			attribute_count = network_unpack_attributes(
+				&(attribute_data[attribute_set_offsets[set]]),
+				attribute_set_offsets[set + 1] -
+					attribute_set_offsets[set], attr);
+			last_set = set;
+		}
+		if (network_create_neuron(net, neurons[i], attr,
+			attribute_count) == NETWORK_INVALID_NID)
+		{
+			ret = RET_FAIL;
+		}
+	}
+
+	// Connect neurons
+	for (uint64_t i = 0; (i < neuron_count) && (ret != RET_FAIL); i++)
+	{
+		struct neuron *n = neurons[i];
+
+		if ((connection_offsets[i + 1] - connection_offsets[i]) >
+			(uint64_t) n->max_connections_out)
+		{
+			INFO("Error: Snapshot neuron %lu has too many "
+				"connections.\n", i);
+			ret = RET_FAIL;
+			break;
+		}
+		for (uint64_t e = connection_offsets[i];
+			e < connection_offsets[i + 1]; e++)
+		{
+			struct connection *con =
+				&(n->connections_out[n->connection_out_count]);
+			const uint32_t synapse = connection_synapse[e];
+
+			n->connection_out_count++;
+			network_connect_neurons(
+				con, n, neurons[connection_dest[e]], NULL, 0);
+			con->weight = connection_weights[e];
+			if (synapse != SNAPSHOT_NONE)
+			{
+				strncpy(con->synapse_hw_name,
+					&(strings[string_offsets[synapse]]),
+					MAX_FIELD_LEN - 1);
+				con->synapse_hw_name[MAX_FIELD_LEN - 1] = '\0';
+			}
+		}
+	}
+
+	// Map neurons to cores in their original order, then recreate the
+	//  connection maps without having to count them again
+	cores = snapshot_core_list(arch);
+	for (uint64_t c = 0; (c < header->core_count) && (ret != RET_FAIL);
+		c++)
+	{
+		for (uint64_t k = core_offsets[c]; k < core_offsets[c + 1]; k++)
+		{
+			arch_map_neuron(neurons[core_neurons[k]], cores[c]);
+		}
+		cores[c]->axon_in.max_maps = 0;
+		cores[c]->axon_out.max_maps = 0;
+	}
+	for (uint64_t i = 0; (i < neuron_count) && (ret != RET_FAIL); i++)
+	{
+		struct core *c = neurons[i]->core;
+
+		c->axon_out.max_maps += map_offsets[i + 1] - map_offsets[i];
+		for (uint64_t m = map_offsets[i]; m < map_offsets[i + 1]; m++)
+		{
+			cores[map_cores[m]]->axon_in.max_maps++;
+		}
+	}
+	if (ret != RET_FAIL)
+	{
+		arch_allocate_core_maps(arch);
+	}
+	for (int i = 0; (i < arch->tile_count) && (ret != RET_FAIL); i++)
+	{
+		struct tile *t = &(arch->tiles[i]);
+		for (int j = 0; j < t->core_count; j++)
+		{
+			struct core *c = &(t->cores[j]);
+			for (int k = 0; k < c->neuron_count; k++)
+			{
+				struct neuron *n = c->neurons[k];
+				const uint64_t id =
+					group_first[n->group->id] + n->id;
+
+				for (uint64_t m = map_offsets[id];
+					m < map_offsets[id + 1]; m++)
+				{
+					arch_allocate_connection_map(n,
+						cores[map_cores[m]],
+						map_counts[m]);
+				}
+				for (int e = 0; e < n->connection_out_count;
+					e++)
+				{
+					struct connection *con =
+						&(n->connections_out[e]);
+					arch_add_connection_to_map(
+						con, con->post_neuron->core);
+				}
+			}
+		}
+	}
+
+	if (ret != RET_FAIL)
+	{
+		arch_print_connection_map_summary(arch);
+		INFO("Loaded snapshot of %lu neurons and %lu connections.\n",
+			header->neuron_count, header->connection_count);
+	}
+
+	free(cores);
+	free(group_first);
+	free(neurons);
+	free(attr);
+	munmap((void *) buffer, size);
+
+	return ret;
+}
@@ -0,0 +1,43 @@
+// Copyright (c) 2023 - The University of Texas at Austin
+//  This work was produced under contract #2317831 to National Technology and
+//  Engineering Solutions of Sandia, LLC which is under contract
+//  No. DE-NA0003525 with the U.S. Department of Energy.
+// snapshot.h - Save and load a network after it has been mapped to hardware
+//  A snapshot holds everything built from the network description, including
+//  the mapping and connection maps. It is only valid for the same
+//  architecture and network files it was saved from, which are checked using
+//  a hash of each file.
+#ifndef SNAPSHOT_HEADER_INCLUDED_
+#define SNAPSHOT_HEADER_INCLUDED_
+
+#define SNAPSHOT_MAGIC "SANASNAP"
+#define SNAPSHOT_VERSION 1
+#define SNAPSHOT_NONE 0xffffffffU
+#define SNAPSHOT_HASH_INIT 0xcbf29ce484222325ULL // FNV-1a offset basis
+#define SNAPSHOT_HASH_CHUNK (1 << 20)
+
+#include <stdint.h>
+#include <stdio.h>
+
+struct snapshot_header
+{
+	// Snapshot files start with this header, followed by the tables
+	//  written in snapshot_save(), each starting on an 8 byte boundary
+	char magic[8];
+	uint32_t version, group_count;
+	uint64_t arch_hash, net_hash;
+	uint64_t neuron_count, connection_count, core_count, mapped_count;
+	uint64_t map_count, attribute_set_count, attribute_bytes;
+	uint64_t string_count, string_bytes;
+};
+
+struct architecture;
+struct network;
+
+uint64_t snapshot_hash(uint64_t hash, const char *data, const long int size);
+uint64_t snapshot_hash_file(uint64_t hash, FILE *fp);
+uint64_t snapshot_hash_file_info(uint64_t hash, FILE *fp);
+int snapshot_save(FILE *fp, struct network *const net, struct architecture *const arch, const uint64_t arch_hash, const uint64_t net_hash);
+int snapshot_load(FILE *fp, struct network *const net, struct architecture *const arch, const uint64_t arch_hash, const uint64_t net_hash);
+
+#endif